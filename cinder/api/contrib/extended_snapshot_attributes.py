@@ -69,17 +69,18 @@ class ExtendedSnapshotAttributesController(wsgi.Controller):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedSnapshotAttributesTemplate())
 
-            snapshots = list(resp_obj.obj.get('snapshots', []))
             db_snapshots = self._get_snapshots(context)
 
-            for snapshot_object in snapshots:
+            def extend(snapshot_object):
                 try:
                     snapshot_data = db_snapshots[snapshot_object['id']]
                 except KeyError:
-                    continue
+                    return
 
                 self._extend_snapshot(context, snapshot_object, snapshot_data)
 
+            wsgi.each_item(resp_obj.obj.get('snapshots', []), extend)
+
 
 class Extended_snapshot_attributes(extensions.ExtensionDescriptor):
     """Extended SnapshotAttributes support."""
@@ -14,6 +14,8 @@
 
 """The Volume Image Metadata API extension."""
 
+import functools
+
 from cinder.api import extensions
 from cinder.api.openstack import wsgi
 from cinder.api import xmlutil
@@ -52,8 +54,9 @@ class VolumeImageMetadataController(wsgi.Controller):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumesImageMetadataTemplate())
-            for volume in list(resp_obj.obj.get('volumes', [])):
-                self._add_image_metadata(context, volume)
+            wsgi.each_item(resp_obj.obj.get('volumes', []),
+                           functools.partial(self._add_image_metadata,
+                                             context))
 
 
 class Volume_image_metadata(extensions.ExtensionDescriptor):
@@ -12,6 +12,8 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import functools
+
 from cinder.api import extensions
 from cinder.api.openstack import wsgi
 from cinder.api import xmlutil
@@ -48,8 +50,9 @@ class VolumeTenantAttributeController(wsgi.Controller):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeListTenantAttributeTemplate())
-            for volume in list(resp_obj.obj['volumes']):
-                self._add_volume_tenant_attribute(context, volume)
+            wsgi.each_item(resp_obj.obj['volumes'],
+                           functools.partial(
+                               self._add_volume_tenant_attribute, context))
 
 
 class Volume_tenant_attribute(extensions.ExtensionDescriptor):
@@ -16,6 +16,7 @@
 #    under the License.
 
 import inspect
+import itertools
 import math
 import time
 import webob
@@ -247,12 +248,154 @@ class DictSerializer(ActionDispatcher):
         return ""
 
 
+class StreamingList(object):
+    """List of a list response, whose views are made as it is serialized.
+
+    Holds the items of a list response, such as db volumes, and the
+    function making the view of each of them, so JSON responses can be
+    written one view at a time instead of making every view and the whole
+    body first. Extensions add to the views through each_item().
+
+    Used as a list, e.g. iterated or indexed, it makes every view once and
+    keeps them, so changes made to the views are kept too.
+    """
+
+    def __init__(self, items, func):
+        self._items = items
+        self._funcs = [func]
+        self._views = None
+
+    def each(self, func):
+        """Call func on every view, as it is made."""
+        if self._views is not None:
+            for view in self._views:
+                func(view)
+        else:
+            self._funcs.append(func)
+
+    def _make_view(self, item):
+        view = self._funcs[0](item)
+        for func in self._funcs[1:]:
+            func(view)
+        return view
+
+    def stream(self):
+        """Iterate over the views without keeping them."""
+        if self._views is not None:
+            return iter(self._views)
+        return (self._make_view(item) for item in self._items)
+
+    def to_list(self):
+        """Make every view, once, and return the list of them."""
+        if self._views is None:
+            self._views = [self._make_view(item) for item in self._items]
+            self._items = None
+        return self._views
+
+    def __getattr__(self, name):
+        # The other list methods, e.g. append() or pop()
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.to_list(), name)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __len__(self):
+        if self._views is None:
+            return len(self._items)
+        return len(self._views)
+
+    def __getitem__(self, index):
+        return self.to_list()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, StreamingList):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+
+def each_item(items, func):
+    """Call func on every view of a list response."""
+    if isinstance(items, StreamingList):
+        items.each(func)
+    else:
+        for item in items:
+            func(item)
+
+
+def _is_streamed(data):
+    return (isinstance(data, dict) and
+            any(isinstance(value, StreamingList) for value in data.values()))
+
+
+def _abort_on_error(request, chunks):
+    """Yield the chunks of a streamed body, aborting it on an error.
+
+    The status and headers are sent by then, so the error is logged and
+    raised again for the server to drop the connection, rather than
+    ending the body and passing truncated JSON off as a success.
+    """
+    try:
+        for chunk in chunks:
+            yield chunk
+    except Exception:
+        LOG.exception(_('Error while streaming the response of %s, '
+                        'closing the connection') % request.url)
+        raise
+
+
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization"""
 
+    # Bytes of views written at once when streaming a list
+    chunk_size = 64 * 1024
+
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def serialize_iter(self, data):
+        """Serialize data in chunks, streaming its StreamingList values.
+
+        Produces the same JSON as serialize().
+        """
+        if not _is_streamed(data):
+            yield self.serialize(data)
+            return
+
+        chunk = []
+        size = 0
+        separator = '{'
+        for key, value in data.iteritems():
+            chunk.append('%s%s: ' % (separator, jsonutils.dumps(key)))
+            separator = ', '
+            if not isinstance(value, StreamingList):
+                chunk.append(jsonutils.dumps(value))
+                continue
+
+            item_separator = '['
+            for view in value.stream():
+                view = jsonutils.dumps(view)
+                chunk.append(item_separator)
+                chunk.append(view)
+                item_separator = ', '
+                size += len(view)
+                if size >= self.chunk_size:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+            if item_separator == '[':
+                chunk.append('[')
+            chunk.append(']')
+        chunk.append('}')
+        yield ''.join(chunk)
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -521,7 +664,21 @@ class ResponseObject(object):
             response.headers[hdr] = value
         response.headers['Content-Type'] = content_type
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            if not _is_streamed(self.obj):
+                response.body = serializer.serialize(self.obj)
+            elif isinstance(serializer, JSONDictSerializer):
+                # Write the list views as they are made. The first chunk
+                # is made now, so an error in the first views is still
+                # returned as an error response.
+                chunks = serializer.serialize_iter(self.obj)
+                first = chunks.next()
+                response.app_iter = _abort_on_error(
+                    request, itertools.chain([first], chunks))
+            else:
+                obj = dict((key, value.to_list()
+                            if isinstance(value, StreamingList) else value)
+                           for key, value in self.obj.items())
+                response.body = serializer.serialize(obj)
 
         return response
 
@@ -15,6 +15,8 @@
 
 """The volumes api."""
 
+import functools
+
 import webob
 from webob import exc
 
@@ -259,7 +261,8 @@ class VolumeController(wsgi.Controller):
                                           sort_key='created_at',
                                           sort_dir='desc', filters=search_opts)
         limited_list = common.limited(volumes, req)
-        res = [entity_maker(context, vol) for vol in limited_list]
+        res = wsgi.StreamingList(limited_list,
+                                 functools.partial(entity_maker, context))
         return {'volumes': res}
 
     def _image_uuid_from_href(self, image_href):
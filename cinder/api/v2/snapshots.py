@@ -15,6 +15,8 @@
 
 """The volumes snapshots api."""
 
+import functools
+
 import webob
 from webob import exc
 
@@ -153,7 +155,8 @@ class SnapshotsController(wsgi.Controller):
         snapshots = self.volume_api.get_all_snapshots(context,
                                                       search_opts=search_opts)
         limited_list = common.limited(snapshots, req)
-        res = [entity_maker(context, snapshot) for snapshot in limited_list]
+        res = wsgi.StreamingList(limited_list,
+                                 functools.partial(entity_maker, context))
         return {'snapshots': res}
 
     @wsgi.response(202)
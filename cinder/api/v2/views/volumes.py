@@ -16,6 +16,7 @@
 #    under the License.
 
 from cinder.api import common
+from cinder.api.openstack import wsgi
 from cinder.openstack.common import log as logging
 
 
@@ -110,7 +111,8 @@ class ViewBuilder(common.ViewBuilder):
 
     def _list_view(self, func, request, volumes):
         """Provide a view for a list of volumes."""
-        volumes_list = [func(request, volume)['volume'] for volume in volumes]
+        volumes_list = wsgi.StreamingList(
+            volumes, lambda volume: func(request, volume)['volume'])
         volumes_links = self._get_collection_links(request,
                                                    volumes,
                                                    self._collection_name)
@@ -14,6 +14,7 @@
 #    under the License.
 
 from cinder.api import common
+from cinder.api.openstack import wsgi
 from cinder.openstack.common import log as logging
 
 
@@ -78,7 +79,8 @@ class ViewBuilder(common.ViewBuilder):
 
     def _list_view(self, func, request, backups):
         """Provide a view for a list of backups."""
-        backups_list = [func(request, backup)['backup'] for backup in backups]
+        backups_list = wsgi.StreamingList(
+            backups, lambda backup: func(request, backup)['backup'])
         backups_links = self._get_collection_links(request,
                                                    backups,
                                                    self._collection_name)
@@ -31,6 +31,17 @@ XMLNS_VOLUME_V2 = ('http://docs.openstack.org/api/openstack-volume/2.0/'
                    'content')
 
 
+# Bumped whenever a template element compiled in a render plan changes, so
+# the plans compiled before are compiled again.
+_template_generation = 0
+
+
+def _template_changed(elem):
+    global _template_generation
+    if elem._compiled:
+        _template_generation += 1
+
+
 def validate_schema(xml, schema_name):
     if isinstance(xml, str):
         xml = etree.fromstring(xml)
@@ -175,6 +186,8 @@ class TemplateElement(object):
         self._text = None
         self._children = []
         self._childmap = {}
+        self._plans = {}
+        self._compiled = False
 
         # Run the incoming attributes through set() so that they
         # become selectorized
@@ -222,6 +235,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        _template_changed(self)
 
     def extend(self, elems):
         """Append children to the element."""
@@ -243,6 +257,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        _template_changed(self)
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -256,6 +271,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        _template_changed(self)
 
     def remove(self, elem):
         """Remove a child element."""
@@ -269,6 +285,7 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        _template_changed(self)
 
     def get(self, key):
         """Get an attribute.
@@ -299,6 +316,7 @@ class TemplateElement(object):
             value = Selector(value)
 
         self.attrib[key] = value
+        _template_changed(self)
 
     def keys(self):
         """Return the attribute names."""
@@ -456,9 +474,11 @@ class TemplateElement(object):
             value = Selector(value)
 
         self._text = value
+        _template_changed(self)
 
     def _text_del(self):
         self._text = None
+        _template_changed(self)
 
     text = property(_text_get, _text_set, _text_del)
 
@@ -492,6 +512,153 @@ class TemplateElement(object):
                 (' '.join(contents), ''.join(children), self.tag))
 
 
+def _selector_key(selector):
+    """Return the key a Selector indexes with, if that is all it does."""
+    if (type(selector) is Selector and len(selector.chain) == 1 and
+            not callable(selector.chain[0])):
+        return selector.chain[0]
+    return None
+
+
+class _NotCompilable(Exception):
+    pass
+
+
+class CompiledElement(object):
+    """Render plan of a template element.
+
+    Compiled once from a template element and the elements of the slave
+    templates patching it: their attributes, texts and merged children are
+    resolved ahead of time, and the selectors which only index the datum
+    are replaced by their key. Rendering an object then only walks the
+    plan, and renders the same tree as TemplateElement.render().
+    """
+
+    def __init__(self, siblings):
+        """
+        :param siblings: the template element followed by the elements
+                         patching it.
+        """
+        for sibling in siblings:
+            cls = type(sibling)
+            if (cls.render.im_func is not TemplateElement.render.im_func or
+                    cls._render.im_func is not
+                    TemplateElement._render.im_func or
+                    cls.apply.im_func is not TemplateElement.apply.im_func):
+                raise _NotCompilable()
+
+        for sibling in siblings:
+            sibling._compiled = True
+
+        first = siblings[0]
+        self.tag = first.tag
+        self.tag_is_selector = callable(first.tag)
+        self.selector = first.selector
+        self.selector_key = _selector_key(first.selector)
+        self.subselector = first.subselector
+        self.will_render = first.will_render
+
+        self.texts = [sibling.text for sibling in siblings
+                      if sibling.text is not None]
+        self.attrib = []
+        for sibling in siblings:
+            for name, value in sibling.attrib.items():
+                self.attrib.append((name, _selector_key(value), value))
+
+        # Children are merged the way Template._serialize() does
+        self.children = []
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+                self.children.append(CompiledElement(nieces))
+
+    def _select(self, obj):
+        key = self.selector_key
+        if key is None:
+            return self.selector(obj)
+        try:
+            return obj[key]
+        except (KeyError, IndexError):
+            return None
+
+    def _element(self, parent, datum, nsmap):
+        if self.tag_is_selector:
+            tagname = self.tag(datum)
+        else:
+            tagname = self.tag
+        if parent is None:
+            elem = etree.Element(tagname, nsmap=nsmap)
+        else:
+            elem = etree.SubElement(parent, tagname)
+        if datum is None:
+            return elem
+
+        for text in self.texts:
+            elem.text = unicode(text(datum))
+        for name, key, value in self.attrib:
+            try:
+                if key is None:
+                    value = value(datum, True)
+                else:
+                    value = datum[key]
+            except (KeyError, IndexError):
+                # Attribute has no value, so don't include it
+                continue
+            elem.set(name, unicode(value))
+        return elem
+
+    def render(self, parent, obj, nsmap=None):
+        """Render an object, returning the first element made, if any."""
+        data = None if obj is None else self._select(obj)
+        if not self.will_render(data):
+            return None
+
+        if data is None:
+            data = [None]
+        else:
+            if not isinstance(data, list):
+                data = [data]
+            elif parent is None:
+                raise ValueError(_('root element selecting a list'))
+            if self.subselector is not None:
+                data = [self.subselector(datum) for datum in data]
+
+        first = None
+        for datum in data:
+            elem = self._element(parent, datum, nsmap)
+            if first is None:
+                first = elem
+            for child in self.children:
+                child.render(elem, datum)
+        return first
+
+
+def compile_siblings(siblings):
+    """Return the render plan of a template element and its patches.
+
+    Plans are kept on the template element until a template changes.
+    Returns None for elements which override how they are rendered.
+    """
+    root = siblings[0]
+    key = tuple(siblings[1:])
+    cached = root._plans.get(key)
+    if cached is not None and cached[0] == _template_generation:
+        return cached[1]
+    try:
+        plan = CompiledElement(siblings)
+    except _NotCompilable:
+        plan = None
+    root._plans[key] = (_template_generation, plan)
+    return plan
+
+
 def SubTemplateElement(parent, tag, attrib=None, selector=None,
                        subselector=None, **extra):
     """Create a template element as a child of another.
@@ -612,8 +779,11 @@ class Template(object):
         siblings = self._siblings()
         nsmap = self._nsmap()
 
-        # Form the element tree
-        return self._serialize(None, obj, siblings, nsmap)
+        # Form the element tree, from the compiled plan if there is one
+        plan = compile_siblings(siblings)
+        if plan is None:
+            return self._serialize(None, obj, siblings, nsmap)
+        return plan.render(None, obj, nsmap)
 
     def _siblings(self):
         """Hook method for computing root siblings.
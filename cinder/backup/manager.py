@@ -32,6 +32,9 @@ Volume backups can be created, restored, deleted and listed.
 
 """
 
+import collections
+
+import eventlet
 from oslo.config import cfg
 
 from cinder import context
@@ -39,6 +42,7 @@ from cinder import exception
 from cinder import manager
 from cinder.openstack.common import excutils
 from cinder.openstack.common import importutils
+from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 
 
@@ -48,12 +52,97 @@ backup_manager_opts = [
     cfg.StrOpt('backup_service',
                default='cinder.backup.services.swift',
                help='Service to use for backups.'),
+    cfg.BoolOpt('backup_use_temp_snapshot',
+                default=True,
+                help='Back volumes up from a temporary snapshot when the '
+                     'volume driver supports it, so that the volume is '
+                     'available again as soon as the snapshot is taken.'),
+    cfg.BoolOpt('backup_resume_interrupted',
+                default=True,
+                help='Resume the backups and restores interrupted by a '
+                     'restart of the backup service from their last '
+                     'checkpoint, rather than failing them.'),
+    cfg.IntOpt('backup_max_concurrent_jobs',
+               default=4,
+               help='The maximum number of backups and restores a backup '
+                    'service runs at the same time, the others are queued '
+                    'and the projects take turns to run them. 0 means no '
+                    'limit.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(backup_manager_opts)
 
 
+class BackupJobQueue(object):
+    """Runs backup jobs, at most max_jobs of them at a time.
+
+    The jobs that can not run yet wait in one queue per project, and the
+    projects take turns as jobs finish, so that a project queueing a large
+    batch of backups does not hold the others back.
+    """
+
+    def __init__(self, max_jobs, on_change=None):
+        self.max_jobs = max_jobs
+        self.running = 0
+        self._queues = collections.OrderedDict()
+        self._on_change = on_change
+
+    @property
+    def queued(self):
+        return sum(len(queue) for queue in self._queues.itervalues())
+
+    def is_full(self):
+        """Whether a new job would be queued rather than run."""
+        return bool(self._queues) or (self.max_jobs > 0 and
+                                      self.running >= self.max_jobs)
+
+    def run(self, project_id, func, *args):
+        """Run func(*args) in this greenthread, or queue it if the maximum
+        number of jobs are running.
+
+        Returns whether the job ran.
+        """
+        if self.is_full():
+            queue = self._queues.setdefault(project_id, collections.deque())
+            queue.append((func, args))
+            self._changed()
+            return False
+
+        self.running += 1
+        self._changed()
+        try:
+            func(*args)
+        finally:
+            self._finished()
+        return True
+
+    def _run_queued(self, func, args):
+        try:
+            func(*args)
+        except Exception:
+            LOG.exception(_('Queued backup job failed'))
+        finally:
+            self._finished()
+
+    def _finished(self):
+        self.running -= 1
+        while self._queues and not (self.max_jobs > 0 and
+                                    self.running >= self.max_jobs):
+            project_id, queue = self._queues.popitem(last=False)
+            func, args = queue.popleft()
+            if queue:
+                # The project goes to the back of the line.
+                self._queues[project_id] = queue
+            self.running += 1
+            eventlet.spawn_n(self._run_queued, func, args)
+        self._changed()
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change()
+
+
 class BackupManager(manager.SchedulerDependentManager):
     """Manages backup of block storage devices."""
 
@@ -65,6 +154,8 @@ class BackupManager(manager.SchedulerDependentManager):
         self.volume_manager = importutils.import_object(
             CONF.volume_manager)
         self.driver = self.volume_manager.driver
+        self.jobs = BackupJobQueue(CONF.backup_max_concurrent_jobs,
+                                   on_change=self._report_load)
         super(BackupManager, self).__init__(service_name='backup',
                                             *args, **kwargs)
         self.driver.db = self.db
@@ -78,9 +169,20 @@ class BackupManager(manager.SchedulerDependentManager):
         self.driver.do_setup(ctxt)
         self.driver.check_for_setup_error()
 
+        backups = self.db.backup_get_all_by_host(ctxt, self.host)
+        resumed = {}
+        for backup in backups:
+            job = self._get_interrupted_job(backup)
+            if job is not None:
+                resumed[backup['id']] = job
+        resumed_volume_ids = [volume_id for _status, volume_id
+                              in resumed.values()]
+
         LOG.info(_("Cleaning up incomplete backup operations"))
         volumes = self.db.volume_get_all_by_host(ctxt, self.host)
         for volume in volumes:
+            if volume['id'] in resumed_volume_ids:
+                continue
             if volume['status'] == 'backing-up':
                 LOG.info(_('Resetting volume %s to available '
                            '(was backing-up)') % volume['id'])
@@ -92,16 +194,30 @@ class BackupManager(manager.SchedulerDependentManager):
                 self.db.volume_update(ctxt, volume['id'],
                                       {'status': 'error_restoring'})
 
-        # TODO(smulcahy) implement full resume of backup and restore
-        # operations on restart (rather than simply resetting)
-        backups = self.db.backup_get_all_by_host(ctxt, self.host)
         for backup in backups:
+            if backup['id'] in resumed:
+                LOG.info(_('Resuming backup %(backup_id)s '
+                           '(was %(status)s)') %
+                         {'backup_id': backup['id'],
+                          'status': backup['status']})
+                status, volume_id = resumed[backup['id']]
+                eventlet.spawn_n(self._resume, ctxt, backup, status,
+                                 volume_id)
+                continue
             if backup['status'] == 'creating':
                 LOG.info(_('Resetting backup %s to error '
                            '(was creating)') % backup['id'])
                 err = 'incomplete backup reset on manager restart'
                 self.db.backup_update(ctxt, backup['id'], {'status': 'error',
                                                            'fail_reason': err})
+                try:
+                    volume = self.db.volume_get(ctxt, backup['volume_id'])
+                except exception.VolumeNotFound:
+                    pass
+                else:
+                    # The volume may be backed up from a snapshot the
+                    # interrupted backup left behind.
+                    self._delete_backup_snapshot(ctxt, backup, volume)
             if backup['status'] == 'restoring':
                 LOG.info(_('Resetting backup %s to available '
                            '(was restoring)') % backup['id'])
@@ -111,10 +227,75 @@ class BackupManager(manager.SchedulerDependentManager):
                 LOG.info(_('Resuming delete on backup: %s') % backup['id'])
                 self.delete_backup(ctxt, backup['id'])
 
+    def _get_interrupted_job(self, backup):
+        """Return the job to run again for a backup that was queued, or
+        interrupted by a restart, as a (status, volume_id) tuple.
+        """
+        checkpoint = {}
+        if backup['checkpoint']:
+            checkpoint = jsonutils.loads(backup['checkpoint'])
+        if backup['status'] == 'queued':
+            # Queued jobs did not start, they are run again.
+            if 'restore' in checkpoint:
+                return 'restoring', checkpoint['restore']['volume_id']
+            return 'creating', backup['volume_id']
+        if not CONF.backup_resume_interrupted:
+            return None
+        if backup['status'] == 'creating' and 'backup' in checkpoint:
+            return 'creating', backup['volume_id']
+        if backup['status'] == 'restoring' and 'restore' in checkpoint:
+            return 'restoring', checkpoint['restore']['volume_id']
+        return None
+
+    def _resume(self, context, backup, status, volume_id):
+        try:
+            if status == 'creating':
+                self._run_job(context, backup, status, self._create_backup,
+                              context, backup['id'])
+            else:
+                self._run_job(context, backup, status, self._restore_backup,
+                              context, backup['id'], volume_id)
+        except Exception:
+            LOG.exception(_('Failed to resume backup %s') % backup['id'])
+
+    def _report_load(self):
+        self.update_service_capabilities({
+            'backups_running': self.jobs.running,
+            'backups_queued': self.jobs.queued,
+            'backup_max_concurrent_jobs': self.jobs.max_jobs})
+
+    def _run_job(self, context, backup, status, func, *args):
+        """Run a backup or restore, or queue it behind the running ones.
+
+        The backup is shown as queued until the job starts, and then takes
+        the given status.
+        """
+        backup_id = backup['id']
+        queued = self.jobs.is_full()
+        if queued:
+            LOG.info(_('Queueing backup %(backup_id)s, %(running)d backups '
+                       'and restores running, %(queued)d queued') %
+                     {'backup_id': backup_id,
+                      'running': self.jobs.running,
+                      'queued': self.jobs.queued})
+            self.db.backup_update(context, backup_id, {'status': 'queued'})
+
+        def job():
+            if queued or backup['status'] == 'queued':
+                self.db.backup_update(context, backup_id, {'status': status})
+            func(*args)
+
+        self.jobs.run(backup['project_id'], job)
+
     def create_backup(self, context, backup_id):
         """
         Create volume backups using configured backup service.
         """
+        backup = self.db.backup_get(context, backup_id)
+        self._run_job(context, backup, 'creating', self._create_backup,
+                      context, backup_id)
+
+    def _create_backup(self, context, backup_id):
         backup = self.db.backup_get(context, backup_id)
         volume_id = backup['volume_id']
         volume = self.db.volume_get(context, volume_id)
@@ -125,9 +306,16 @@ class BackupManager(manager.SchedulerDependentManager):
                                                    'service':
                                                    CONF.backup_service})
 
+        snapshot = None
+        if backup['checkpoint']:
+            # The data backed up before the checkpoint was read from the
+            # snapshot of the interrupted backup, if there is one.
+            snapshot = self.driver.get_backup_snapshot(context, backup,
+                                                       volume)
+
         expected_status = 'backing-up'
         actual_status = volume['status']
-        if actual_status != expected_status:
+        if actual_status != expected_status and snapshot is None:
             err = _('create_backup aborted, expected volume status '
                     '%(expected_status)s but got %(actual_status)s') % {
                         'expected_status': expected_status,
@@ -136,6 +324,8 @@ class BackupManager(manager.SchedulerDependentManager):
             self.db.backup_update(context, backup_id, {'status': 'error',
                                                        'fail_reason': err})
             raise exception.InvalidVolume(reason=err)
+        # A resumed backup may have released its volume already.
+        released = actual_status != expected_status
 
         expected_status = 'creating'
         actual_status = backup['status']
@@ -145,33 +335,90 @@ class BackupManager(manager.SchedulerDependentManager):
                         'expected_status': expected_status,
                         'actual_status': actual_status,
                     }
-            self.db.volume_update(context, volume_id, {'status': 'available'})
+            if not released:
+                self.db.volume_update(context, volume_id,
+                                      {'status': 'available'})
             self.db.backup_update(context, backup_id, {'status': 'error',
                                                        'fail_reason': err})
             raise exception.InvalidBackup(reason=err)
 
         try:
             backup_service = self.service.get_backup_service(context)
-            self.driver.backup_volume(context, backup, backup_service)
+            if snapshot is None and CONF.backup_use_temp_snapshot:
+                snapshot = self._create_backup_snapshot(context, backup,
+                                                        volume)
+            if snapshot is None:
+                self.driver.backup_volume(context, backup, backup_service)
+            else:
+                if not released:
+                    # The snapshot holds the data to back up, the volume
+                    # can be used again while the backup is read from it.
+                    self.db.volume_update(context, volume_id,
+                                          {'status': 'available'})
+                    released = True
+                try:
+                    self.driver.backup_snapshot(context, backup, snapshot,
+                                                backup_service)
+                finally:
+                    self._delete_backup_snapshot(context, backup, volume)
         except Exception as err:
             with excutils.save_and_reraise_exception():
-                self.db.volume_update(context, volume_id,
-                                      {'status': 'available'})
+                if not released:
+                    self.db.volume_update(context, volume_id,
+                                          {'status': 'available'})
                 self.db.backup_update(context, backup_id,
                                       {'status': 'error',
                                        'fail_reason': unicode(err)})
 
-        self.db.volume_update(context, volume_id, {'status': 'available'})
+        if not released:
+            self.db.volume_update(context, volume_id, {'status': 'available'})
         self.db.backup_update(context, backup_id, {'status': 'available',
                                                    'size': volume['size'],
                                                    'availability_zone':
                                                    self.az})
         LOG.info(_('create_backup finished. backup: %s'), backup_id)
 
+    def _create_backup_snapshot(self, context, backup, volume):
+        """Return a temporary snapshot of the volume, or None.
+
+        A snapshot that can not be taken, e.g. because the volume group
+        is full, is not fatal: the volume is then backed up while busy.
+        """
+        try:
+            return self.driver.create_backup_snapshot(context, backup, volume)
+        except Exception:
+            LOG.exception(_('Failed to take a temporary snapshot of volume '
+                            '%(volume_id)s for backup %(backup_id)s, backing '
+                            'up the volume itself') %
+                          {'volume_id': volume['id'],
+                           'backup_id': backup['id']})
+            # Do not leave a partly created snapshot behind.
+            self._delete_backup_snapshot(context, backup, volume)
+            return None
+
+    def _delete_backup_snapshot(self, context, backup, volume):
+        try:
+            self.driver.delete_backup_snapshot(context, backup, volume)
+        except Exception:
+            LOG.exception(_('Failed to delete the temporary snapshot of '
+                            'volume %(volume_id)s for backup %(backup_id)s') %
+                          {'volume_id': volume['id'],
+                           'backup_id': backup['id']})
+
     def restore_backup(self, context, backup_id, volume_id):
         """
         Restore volume backups from configured backup service.
         """
+        # Only a restore interrupted by a restart resumes from its
+        # checkpoint, a new restore starts over. The checkpoint records
+        # the volume restored to until the restore makes progress.
+        checkpoint = jsonutils.dumps({'restore': {'volume_id': volume_id}})
+        self.db.backup_update(context, backup_id, {'checkpoint': checkpoint})
+        backup = self.db.backup_get(context, backup_id)
+        self._run_job(context, backup, 'restoring', self._restore_backup,
+                      context, backup_id, volume_id)
+
+    def _restore_backup(self, context, backup_id, volume_id):
         LOG.info(_('restore_backup started, restoring backup: %(backup_id)s'
                    ' to volume: %(volume_id)s') %
                  {'backup_id': backup_id, 'volume_id': volume_id})
@@ -235,7 +482,8 @@ class BackupManager(manager.SchedulerDependentManager):
                                       {'status': 'available'})
 
         self.db.volume_update(context, volume_id, {'status': 'available'})
-        self.db.backup_update(context, backup_id, {'status': 'available'})
+        self.db.backup_update(context, backup_id, {'status': 'available',
+                                                   'checkpoint': None})
         LOG.info(_('restore_backup finished, backup: %(backup_id)s restored'
                    ' to volume: %(volume_id)s') %
                  {'backup_id': backup_id, 'volume_id': volume_id})
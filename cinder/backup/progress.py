@@ -0,0 +1,135 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Progress tracking of backups and restores.
+
+**Related Flags**
+
+:backup_progress_interval: The number of seconds between the progress
+                           updates of a backup or restore, 0 to only
+                           report it when it finishes (default: 30).
+"""
+
+import contextlib
+import json
+
+from oslo.config import cfg
+
+from cinder.openstack.common import log as logging
+from cinder.openstack.common.notifier import api as notifier_api
+from cinder.openstack.common import timeutils
+from cinder import units
+
+
+LOG = logging.getLogger(__name__)
+
+backup_progress_opts = [
+    cfg.IntOpt('backup_progress_interval',
+               default=30,
+               help='The number of seconds between the progress updates '
+                    'a backup or restore records on the backup and sends '
+                    'as a notification, 0 to only report it when it '
+                    'finishes'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(backup_progress_opts)
+
+
+class BackupProgress(object):
+    """Progress of a backup or restore.
+
+    Counts the bytes and objects processed and the time spent in each stage
+    of the operation, and records them on the backup at most every
+    backup_progress_interval seconds, along with the current throughput.
+    """
+
+    def __init__(self, context, db, backup, operation, processed_bytes=0,
+                 processed_objects=0):
+        self.context = context
+        self.db = db
+        self.backup = backup
+        self.operation = operation
+        self.interval = CONF.backup_progress_interval
+        self.total_bytes = (backup['size'] or 0) * units.GiB
+        self.bytes = processed_bytes
+        self.objects = processed_objects
+        self.stages = {}
+        self._last_update = timeutils.utcnow()
+        self._last_bytes = processed_bytes
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Account the time spent in the with block to the given stage."""
+        start = timeutils.utcnow()
+        try:
+            yield
+        finally:
+            elapsed = timeutils.delta_seconds(start, timeutils.utcnow())
+            self.stages[name] = self.stages.get(name, 0) + elapsed
+
+    def add(self, processed_bytes, processed_objects=1):
+        """Count processed data, and update the progress if it is due."""
+        self.bytes += processed_bytes
+        self.objects += processed_objects
+        if self.interval <= 0:
+            return
+        now = timeutils.utcnow()
+        if timeutils.delta_seconds(self._last_update, now) >= self.interval:
+            self._update(now, 'progress')
+
+    def finish(self):
+        """Record the final progress and stage timings."""
+        progress = self._update(timeutils.utcnow(), 'end')
+        LOG.info(_('backup %(backup_id)s %(operation)s processed '
+                   '%(bytes)d bytes in %(objects)d objects, seconds spent '
+                   'per stage: %(stages)s') %
+                 {'operation': self.operation,
+                  'backup_id': self.backup['id'],
+                  'bytes': self.bytes,
+                  'objects': self.objects,
+                  'stages': progress['stages']})
+
+    def _update(self, now, event):
+        elapsed = timeutils.delta_seconds(self._last_update, now)
+        throughput = 0
+        if elapsed > 0:
+            throughput = int((self.bytes - self._last_bytes) / elapsed)
+        self._last_update = now
+        self._last_bytes = self.bytes
+
+        progress = {'operation': self.operation,
+                    'bytes': self.bytes,
+                    'objects': self.objects,
+                    'throughput': throughput,
+                    'stages': dict((name, round(seconds, 2))
+                                   for name, seconds
+                                   in self.stages.iteritems())}
+        if self.total_bytes:
+            progress['percent'] = min(100, self.bytes * 100 /
+                                      self.total_bytes)
+        LOG.debug(_('progress of backup %(backup_id)s: %(progress)s') %
+                  {'backup_id': self.backup['id'], 'progress': progress})
+        self.db.backup_update(self.context, self.backup['id'],
+                              {'progress': json.dumps(progress)})
+
+        payload = dict(progress, backup_id=self.backup['id'],
+                       volume_id=self.backup['volume_id'])
+        notifier_api.notify(self.context, 'backup.%s' % CONF.host,
+                            'backup.%s.%s' % (self.operation, event),
+                            notifier_api.INFO, payload)
+        return progress
@@ -0,0 +1,470 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Implementation of a backup service that uses a POSIX filesystem, such as
+a local disk or an NFS mount, as the backend
+
+Backups are split into compressed files laid out like the objects of the
+Swift backup service, with the same metadata file, under a directory per
+container in a directory per project.
+
+**Related Flags**
+
+:backup_posix_path: The directory the backup containers are created in
+                    (default: $state_path/backup).
+:backup_posix_container: The default container directory to use
+                         (default: volumebackups).
+:backup_posix_object_size: The size in bytes of the files used for volume
+                           backups (default: 52428800).
+:backup_posix_workers: The number of backup files compressed and written,
+                       or read and decompressed, at the same time
+                       (default: 4).
+:backup_compression_algorithm: Compression algorithm to use for volume
+                               backups. Supported options are:
+                               None (to disable), zlib and bz2 (default: zlib)
+"""
+
+import collections
+import contextlib
+import hashlib
+import json
+import os
+
+import eventlet
+from eventlet import tpool
+from oslo.config import cfg
+
+from cinder.db import base
+from cinder import exception
+from cinder.openstack.common import fileutils
+from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
+
+
+LOG = logging.getLogger(__name__)
+
+posixbackup_service_opts = [
+    cfg.StrOpt('backup_posix_path',
+               default='$state_path/backup',
+               help='The directory the backup containers are created in, '
+                    'on a local disk or an NFS mount'),
+    cfg.StrOpt('backup_posix_container',
+               default='volumebackups',
+               help='The default container directory to use'),
+    cfg.IntOpt('backup_posix_object_size',
+               default=52428800,
+               help='The size in bytes of the files used for volume '
+                    'backups'),
+    cfg.IntOpt('backup_posix_workers',
+               default=4,
+               help='The number of backup files compressed and written, or '
+                    'read and decompressed, at the same time'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(posixbackup_service_opts)
+CONF.import_opt('backup_compression_algorithm',
+                'cinder.backup.services.swift')
+
+
+class PosixBackupService(base.Base):
+    """Provides backup, restore and delete of backup files in a directory."""
+
+    SERVICE_VERSION = '1.0.0'
+    SERVICE_VERSION_MAPPING = {'1.0.0': '_restore_v1'}
+
+    def _get_compressor(self, algorithm):
+        try:
+            if algorithm.lower() in ('none', 'off', 'no'):
+                return None
+            elif algorithm.lower() in ('zlib', 'gzip'):
+                import zlib as compressor
+                return compressor
+            elif algorithm.lower() in ('bz2', 'bzip2'):
+                import bz2 as compressor
+                return compressor
+        except ImportError:
+            pass
+
+        err = _('unsupported compression algorithm: %s') % algorithm
+        raise ValueError(unicode(err))
+
+    def __init__(self, context, db_driver=None):
+        self.context = context
+        self.az = CONF.storage_availability_zone
+        self.backup_path = CONF.backup_posix_path
+        self.data_block_size_bytes = CONF.backup_posix_object_size
+        self.workers = max(CONF.backup_posix_workers, 1)
+        self.compression_algorithm = CONF.backup_compression_algorithm.lower()
+        self.compressor = self._get_compressor(self.compression_algorithm)
+        super(PosixBackupService, self).__init__(db_driver)
+
+    def _container_path(self, backup):
+        """Directory of the container of a backup, in its project directory.
+
+        The container name comes from the tenant, it must be a single path
+        component so that the files stay under backup_posix_path.
+        """
+        path = self.backup_path
+        for name in (backup['project_id'], backup['container']):
+            if (not name or name in (os.curdir, os.pardir) or
+                    os.sep in name or (os.altsep and os.altsep in name)):
+                err = _('invalid backup container %s') % backup['container']
+                raise exception.InvalidBackup(reason=err)
+            path = os.path.join(path, name)
+        return path
+
+    def _object_path(self, backup, object_name):
+        return os.path.join(self._container_path(backup), object_name)
+
+    def _write_file(self, path, data):
+        """Write a whole file in one go, and only name it once it is
+        safely on disk.
+        """
+        partial_path = '%s.part' % path
+        try:
+            with open(partial_path, 'wb') as partial_file:
+                partial_file.write(data)
+                partial_file.flush()
+                os.fsync(partial_file.fileno())
+            os.rename(partial_path, path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.unlink(partial_path)
+            raise
+
+    def _read_file(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _generate_object_name_prefix(self, backup):
+        az = 'az_%s' % self.az
+        backup_name = '%s_backup_%s' % (az, backup['id'])
+        volume = 'volume_%s' % (backup['volume_id'])
+        timestamp = timeutils.strtime(fmt="%Y%m%d%H%M%S")
+        prefix = volume + '/' + timestamp + '/' + backup_name
+        LOG.debug(_('_generate_object_name_prefix: %s') % prefix)
+        return prefix
+
+    def _list_files(self, backup):
+        prefix = backup['service_metadata']
+        directory, name = os.path.split(self._object_path(backup, prefix))
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            return []
+        return [os.path.join(os.path.dirname(prefix), filename)
+                for filename in filenames if filename.startswith(name)]
+
+    def _generate_object_names(self, backup):
+        object_names = [object_name for object_name in self._list_files(backup)
+                        if not object_name.endswith('.part')]
+        LOG.debug(_('generated object list: %s') % object_names)
+        return object_names
+
+    def _metadata_filename(self, backup):
+        object_name = backup['service_metadata']
+        filename = '%s_metadata' % object_name
+        return filename
+
+    def _write_metadata(self, backup, volume_id, container, object_list):
+        filename = self._metadata_filename(backup)
+        LOG.debug(_('_write_metadata started, container name: %(container)s,'
+                    ' metadata filename: %(filename)s') %
+                  {'container': container, 'filename': filename})
+        metadata = {}
+        metadata['version'] = self.SERVICE_VERSION
+        metadata['backup_id'] = backup['id']
+        metadata['volume_id'] = volume_id
+        metadata['backup_name'] = backup['display_name']
+        metadata['backup_description'] = backup['display_description']
+        metadata['created_at'] = str(backup['created_at'])
+        metadata['objects'] = object_list
+        metadata_json = json.dumps(metadata, sort_keys=True, indent=2)
+        self._write_file(self._object_path(backup, filename),
+                         metadata_json)
+        LOG.debug(_('_write_metadata finished'))
+
+    def _read_metadata(self, backup):
+        container = backup['container']
+        filename = self._metadata_filename(backup)
+        LOG.debug(_('_read_metadata started, container name: %(container)s, '
+                    'metadata filename: %(filename)s') %
+                  {'container': container, 'filename': filename})
+        try:
+            body = self._read_file(self._object_path(backup, filename))
+        except IOError as err:
+            raise exception.InvalidBackup(reason=unicode(err))
+        metadata = json.loads(body)
+        LOG.debug(_('_read_metadata finished (%s)') % metadata)
+        return metadata
+
+    def prepare_backup(self, backup):
+        """Prepare the backup process and return the backup metadata"""
+        backup_id = backup['id']
+        volume_id = backup['volume_id']
+        volume = self.db.volume_get(self.context, volume_id)
+
+        if volume['size'] <= 0:
+            err = _('volume size %d is invalid.') % volume['size']
+            raise exception.InvalidVolume(reason=err)
+
+        container = backup['container']
+        if container is None:
+            container = CONF.backup_posix_container
+            backup['container'] = container
+            self.db.backup_update(self.context, backup_id,
+                                  {'container': container})
+
+        object_prefix = self._generate_object_name_prefix(backup)
+        backup['service_metadata'] = object_prefix
+        self.db.backup_update(self.context, backup_id, {'service_metadata':
+                                                        object_prefix})
+        fileutils.ensure_tree(os.path.dirname(
+            self._object_path(backup, object_prefix)))
+        LOG.debug(_('starting backup of volume: %(volume_id)s to '
+                    '%(backup_path)s, volume size: %(volume_size)dG, '
+                    'object names prefix %(object_prefix)s') %
+                  {
+                      'volume_id': volume_id,
+                      'backup_path': self.backup_path,
+                      'volume_size': volume['size'],
+                      'object_prefix': object_prefix,
+                  })
+        object_meta = {'id': 1, 'list': [], 'prefix': object_prefix}
+        return object_meta, container
+
+    def _map_in_order(self, func, args_list):
+        """Call func with each of the args, in up to backup_posix_workers
+        greenthreads at a time, and yield the results in order.
+
+        No call is started once one failed or the caller stopped, e.g.
+        on an error of its own, and the calls still running are waited
+        for before that, so no greenthread or file write outlives the
+        backup or restore.
+        """
+        running = collections.deque()
+        try:
+            for args in args_list:
+                running.append(eventlet.spawn(func, *args))
+                if len(running) >= self.workers:
+                    yield running.popleft().wait()
+            while running:
+                yield running.popleft().wait()
+        finally:
+            while running:
+                try:
+                    running.popleft().wait()
+                except Exception:
+                    # Only the first error is raised.
+                    pass
+
+    def _compress(self, data):
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        return data, hashlib.md5(data).hexdigest()
+
+    def _backup_object(self, backup, object_name, data, data_offset):
+        """Compress and write one backup file, in a native thread so that
+        several of them can run at the same time.
+        """
+        obj = {}
+        obj[object_name] = {}
+        obj[object_name]['offset'] = data_offset
+        obj[object_name]['length'] = len(data)
+        if self.compressor is not None:
+            obj[object_name]['compression'] = self.compression_algorithm
+        else:
+            obj[object_name]['compression'] = 'none'
+        data, md5 = tpool.execute(self._compress, data)
+        obj[object_name]['md5'] = md5
+        tpool.execute(self._write_file,
+                      self._object_path(backup, object_name), data)
+        LOG.debug(_('wrote %(length)d bytes to %(object_name)s') %
+                  {'length': len(data), 'object_name': object_name})
+        return obj
+
+    def finalize_backup(self, backup, container, object_meta):
+        """Finalize the backup by writing its metadata file"""
+        object_list = object_meta['list']
+        object_id = object_meta['id']
+        self._write_metadata(backup,
+                             backup['volume_id'],
+                             container,
+                             object_list)
+        self.db.backup_update(self.context, backup['id'],
+                              {'object_count': object_id})
+        LOG.debug(_('backup %s finished.') % backup['id'])
+
+    def backup(self, backup, volume_file):
+        """Backup the given volume to files using the given backup metadata.
+
+        The volume is read sequentially while up to backup_posix_workers
+        files are compressed and written.
+        """
+        object_meta, container = self.prepare_backup(backup)
+        object_prefix = object_meta['prefix']
+
+        def chunks():
+            object_id = object_meta['id']
+            while True:
+                data = volume_file.read(self.data_block_size_bytes)
+                data_offset = volume_file.tell()
+                if data == '':
+                    break
+                object_name = '%s-%05d' % (object_prefix, object_id)
+                yield backup, object_name, data, data_offset
+                object_id += 1
+
+        objs = self._map_in_order(self._backup_object, chunks())
+        with contextlib.closing(objs):
+            for obj in objs:
+                object_meta['list'].append(obj)
+                object_meta['id'] += 1
+        self.finalize_backup(backup, container, object_meta)
+
+    def _restore_object(self, backup, metadata_object):
+        """Read, check and decompress one backup file."""
+        object_name = metadata_object.keys()[0]
+        object_info = metadata_object[object_name]
+        try:
+            body = tpool.execute(self._read_file,
+                                 self._object_path(backup, object_name))
+        except IOError as err:
+            raise exception.InvalidBackup(reason=unicode(err))
+        md5 = object_info.get('md5')
+        if md5 is not None and hashlib.md5(body).hexdigest() != md5:
+            err = _('restore_backup aborted, the MD5 of %(object_name)s '
+                    'is not the one stored in metadata') % {
+                        'object_name': object_name}
+            raise exception.InvalidBackup(reason=err)
+        decompressor = self._get_compressor(object_info['compression'])
+        if decompressor is not None:
+            body = tpool.execute(decompressor.decompress, body)
+        return body
+
+    def _restore_v1(self, backup, volume_id, metadata, volume_file):
+        """Restore a v1 volume backup from files."""
+        backup_id = backup['id']
+        LOG.debug(_('v1 posix volume backup restore of %s started'),
+                  backup_id)
+        metadata_objects = metadata['objects']
+        metadata_object_names = sum((obj.keys() for obj in metadata_objects),
+                                    [])
+        LOG.debug(_('metadata_object_names = %s') % metadata_object_names)
+        prune_list = [self._metadata_filename(backup)]
+        object_names = [object_name for object_name in
+                        self._generate_object_names(backup)
+                        if object_name not in prune_list]
+        if sorted(object_names) != sorted(metadata_object_names):
+            err = _('restore_backup aborted, actual object list in '
+                    'the backup directory does not match object list '
+                    'stored in metadata')
+            raise exception.InvalidBackup(reason=err)
+
+        # Files are read ahead and written to the volume in order.
+        bodies = self._map_in_order(self._restore_object,
+                                    [(backup, metadata_object)
+                                     for metadata_object in metadata_objects])
+        with contextlib.closing(bodies):
+            for body in bodies:
+                volume_file.write(body)
+                # force flush every write to avoid long blocking write on
+                # close
+                volume_file.flush()
+
+                # Be tolerant to IO implementations that do not support
+                # fileno()
+                try:
+                    fileno = volume_file.fileno()
+                except IOError:
+                    LOG.info("volume_file does not support fileno() so "
+                             "skipping fsync()")
+                else:
+                    os.fsync(fileno)
+                eventlet.sleep(0)
+        LOG.debug(_('v1 posix volume backup restore of %s finished'),
+                  backup_id)
+
+    def restore(self, backup, volume_id, volume_file):
+        """Restore the given volume backup from files."""
+        backup_id = backup['id']
+        container = backup['container']
+        object_prefix = backup['service_metadata']
+        LOG.debug(_('starting restore of backup %(object_prefix)s from '
+                    'container: %(container)s, to volume %(volume_id)s, '
+                    'backup: %(backup_id)s') %
+                  {
+                      'object_prefix': object_prefix,
+                      'container': container,
+                      'volume_id': volume_id,
+                      'backup_id': backup_id,
+                  })
+        metadata = self._read_metadata(backup)
+        metadata_version = metadata['version']
+        LOG.debug(_('Restoring posix backup version %s'), metadata_version)
+        try:
+            restore_func = getattr(self, self.SERVICE_VERSION_MAPPING.get(
+                metadata_version))
+        except TypeError:
+            err = (_('No support to restore posix backup version %s')
+                   % metadata_version)
+            raise exception.InvalidBackup(reason=err)
+        restore_func(backup, volume_id, metadata, volume_file)
+        LOG.debug(_('restore %(backup_id)s to %(volume_id)s finished.') %
+                  {'backup_id': backup_id, 'volume_id': volume_id})
+
+    def delete(self, backup):
+        """Delete the given backup files."""
+        container = backup['container']
+        object_prefix = backup['service_metadata']
+        LOG.debug('delete started, backup: %s, container: %s, prefix: %s',
+                  backup['id'], container, object_prefix)
+
+        if container is not None and object_prefix is not None:
+            # Partial files of an interrupted backup are deleted as well.
+            for object_name in self._list_files(backup):
+                try:
+                    os.unlink(self._object_path(backup, object_name))
+                except OSError:
+                    LOG.warn(_('error while deleting backup file %s, '
+                               'continuing with delete') % object_name)
+                else:
+                    LOG.debug(_('deleted backup file: %(object_name)s'
+                                ' in container: %(container)s') %
+                              {
+                                  'object_name': object_name,
+                                  'container': container
+                              })
+
+            # Remove the directories of the backup once they are empty,
+            # but never the container itself.
+            container_path = self._container_path(backup)
+            directory = os.path.dirname(self._object_path(backup,
+                                                          object_prefix))
+            while directory.startswith(container_path + os.sep):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
+        LOG.debug(_('delete %s finished') % backup['id'])
+
+
+def get_backup_service(context):
+    return PosixBackupService(context)
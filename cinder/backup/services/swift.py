@@ -28,6 +28,12 @@
 :backup_compression_algorithm: Compression algorithm to use for volume
                                backups. Supported options are:
                                None (to disable), zlib and bz2 (default: zlib)
+:backup_swift_checkpoint_interval: The number of Swift objects written or
+                                   restored between checkpoints that an
+                                   interrupted backup or restore resumes
+                                   from, 0 to disable (default: 10).
+:backup_progress_interval: The number of seconds between the progress
+                           updates of a backup or restore (default: 30).
 """
 
 import hashlib
@@ -40,6 +46,7 @@ import StringIO
 import eventlet
 from oslo.config import cfg
 
+from cinder.backup import progress
 from cinder.db import base
 from cinder import exception
 from cinder.openstack.common import log as logging
@@ -77,6 +84,11 @@ swiftbackup_service_opts = [
     cfg.StrOpt('backup_compression_algorithm',
                default='zlib',
                help='Compression algorithm (None to disable)'),
+    cfg.IntOpt('backup_swift_checkpoint_interval',
+               default=10,
+               help='The number of Swift objects written or restored '
+                    'between checkpoints of a backup or restore, 0 to '
+                    'disable checkpoints'),
 ]
 
 CONF = cfg.CONF
@@ -113,8 +125,9 @@ class SwiftBackupService(base.Base):
         self.data_block_size_bytes = CONF.backup_swift_object_size
         self.swift_attempts = CONF.backup_swift_retry_attempts
         self.swift_backoff = CONF.backup_swift_retry_backoff
-        self.compressor = \
-            self._get_compressor(CONF.backup_compression_algorithm)
+        self.compression_algorithm = CONF.backup_compression_algorithm.lower()
+        self.compressor = self._get_compressor(self.compression_algorithm)
+        self.checkpoint_interval = CONF.backup_swift_checkpoint_interval
         LOG.debug('Connect to %s in "%s" mode' % (CONF.backup_swift_url,
                                                   CONF.backup_swift_auth))
         if CONF.backup_swift_auth == 'single_user':
@@ -262,6 +275,7 @@ class SwiftBackupService(base.Base):
         object_prefix = object_meta['prefix']
         object_list = object_meta['list']
         object_id = object_meta['id']
+        backup_progress = object_meta['progress']
         object_name = '%s-%05d' % (object_prefix, object_id)
         obj = {}
         obj[object_name] = {}
@@ -269,10 +283,11 @@ class SwiftBackupService(base.Base):
         obj[object_name]['length'] = len(data)
         LOG.debug(_('reading chunk of data from volume'))
         if self.compressor is not None:
-            algorithm = CONF.backup_compression_algorithm.lower()
+            algorithm = self.compression_algorithm
             obj[object_name]['compression'] = algorithm
             data_size_bytes = len(data)
-            data = self.compressor.compress(data)
+            with backup_progress.stage('compress'):
+                data = self.compressor.compress(data)
             comp_size_bytes = len(data)
             LOG.debug(_('compressed %(data_size_bytes)d bytes of data '
                         'to %(comp_size_bytes)d bytes using '
@@ -289,13 +304,15 @@ class SwiftBackupService(base.Base):
         reader = StringIO.StringIO(data)
         LOG.debug(_('About to put_object'))
         try:
-            etag = self.conn.put_object(container, object_name, reader,
-                                        content_length=len(data))
+            with backup_progress.stage('upload'):
+                etag = self.conn.put_object(container, object_name, reader,
+                                            content_length=len(data))
         except socket.error as err:
             raise exception.SwiftConnectionFailed(reason=str(err))
         LOG.debug(_('swift MD5 for %(object_name)s: %(etag)s') %
                   {'object_name': object_name, 'etag': etag, })
-        md5 = hashlib.md5(data).hexdigest()
+        with backup_progress.stage('hash'):
+            md5 = hashlib.md5(data).hexdigest()
         obj[object_name]['md5'] = md5
         LOG.debug(_('backup MD5 for %(object_name)s: %(md5)s') %
                   {'object_name': object_name, 'md5': md5})
@@ -308,6 +325,7 @@ class SwiftBackupService(base.Base):
         object_id += 1
         object_meta['list'] = object_list
         object_meta['id'] = object_id
+        backup_progress.add(obj[object_name]['length'])
         LOG.debug(_('Calling eventlet.sleep(0)'))
         eventlet.sleep(0)
 
@@ -323,20 +341,112 @@ class SwiftBackupService(base.Base):
         except socket.error as err:
             raise exception.SwiftConnectionFailed(reason=str(err))
         self.db.backup_update(self.context, backup['id'],
-                              {'object_count': object_id})
+                              {'object_count': object_id,
+                               'checkpoint': None})
         LOG.debug(_('backup %s finished.') % backup['id'])
 
+    def _get_checkpoint(self, backup, operation):
+        """Return the checkpoint of an interrupted backup or restore."""
+        if not backup['checkpoint']:
+            return None
+        return json.loads(backup['checkpoint']).get(operation)
+
+    def _save_checkpoint(self, backup, operation, checkpoint):
+        LOG.debug(_('%(operation)s of backup %(backup_id)s reached '
+                    'checkpoint %(checkpoint)s') %
+                  {'operation': operation,
+                   'backup_id': backup['id'],
+                   'checkpoint': checkpoint})
+        checkpoint = json.dumps({operation: checkpoint})
+        backup['checkpoint'] = checkpoint
+        self.db.backup_update(self.context, backup['id'],
+                              {'checkpoint': checkpoint})
+
+    def _resume_backup(self, backup, checkpoint):
+        """Rebuild the object metadata of an interrupted backup.
+
+        The objects written before the checkpoint are fetched back from
+        the container listing, their offset and length follow from the
+        object size the backup was started with.
+        """
+        container = backup['container']
+        object_prefix = backup['service_metadata']
+        object_size = checkpoint['object_size']
+        self.data_block_size_bytes = object_size
+        self.compression_algorithm = checkpoint['compression']
+        self.compressor = self._get_compressor(self.compression_algorithm)
+        if self.compressor is None:
+            compression = 'none'
+        else:
+            compression = self.compression_algorithm
+        try:
+            swift_objects = self.conn.get_container(container,
+                                                    prefix=object_prefix,
+                                                    full_listing=True)[1]
+        except socket.error as err:
+            raise exception.SwiftConnectionFailed(reason=str(err))
+        md5s = dict((swift_obj['name'], swift_obj['hash'])
+                    for swift_obj in swift_objects)
+
+        object_list = []
+        for object_id in xrange(1, checkpoint['id']):
+            object_name = '%s-%05d' % (object_prefix, object_id)
+            if object_name not in md5s:
+                err = _('can not resume backup, swift object %s written '
+                        'before the checkpoint is missing') % object_name
+                raise exception.InvalidBackup(reason=err)
+            object_list.append({object_name: {'offset': object_id *
+                                              object_size,
+                                              'length': object_size,
+                                              'compression': compression,
+                                              'md5': md5s[object_name]}})
+        LOG.debug(_('resuming backup %(backup_id)s at offset %(offset)d') %
+                  {'backup_id': backup['id'], 'offset': checkpoint['offset']})
+        object_meta = {'id': checkpoint['id'],
+                       'list': object_list,
+                       'prefix': object_prefix}
+        return object_meta, container
+
     def backup(self, backup, volume_file):
-        """Backup the given volume to swift using the given backup metadata."""
-        object_meta, container = self.prepare_backup(backup)
+        """Backup the given volume to swift using the given backup metadata.
+
+        The backup resumes from its checkpoint if it was interrupted.
+        """
+        checkpoint = self._get_checkpoint(backup, 'backup')
+        if checkpoint is None:
+            object_meta, container = self.prepare_backup(backup)
+            processed_bytes = 0
+        else:
+            object_meta, container = self._resume_backup(backup, checkpoint)
+            volume_file.seek(checkpoint['offset'])
+            processed_bytes = checkpoint['offset']
+        backup_progress = progress.BackupProgress(
+            self.context, self.db, backup, 'create',
+            processed_bytes=processed_bytes,
+            processed_objects=object_meta['id'] - 1)
+        object_meta['progress'] = backup_progress
+        checkpoint_id = object_meta['id']
         while True:
-            data = volume_file.read(self.data_block_size_bytes)
+            with backup_progress.stage('read'):
+                data = volume_file.read(self.data_block_size_bytes)
             data_offset = volume_file.tell()
             if data == '':
                 break
             self.backup_chunk(backup, container, data,
                               data_offset, object_meta)
+            if (self.checkpoint_interval > 0 and
+                    object_meta['id'] - checkpoint_id >=
+                    self.checkpoint_interval):
+                checkpoint_id = object_meta['id']
+                self._save_checkpoint(backup, 'backup',
+                                      {'id': checkpoint_id,
+                                       'offset': data_offset,
+                                       'object_size':
+                                       self.data_block_size_bytes,
+                                       'compression':
+                                       self.compression_algorithm})
         self.finalize_backup(backup, container, object_meta)
+        backup_progress.finish()
 
     def _restore_v1(self, backup, volume_id, metadata, volume_file):
         """Restore a v1 swift volume backup from swift."""
@@ -356,7 +466,24 @@ class SwiftBackupService(base.Base):
                     'swift does not match object list stored in metadata')
             raise exception.InvalidBackup(reason=err)
 
-        for metadata_object in metadata_objects:
+        restored = 0
+        offset = 0
+        checkpoint = self._get_checkpoint(backup, 'restore')
+        if checkpoint is not None and checkpoint['volume_id'] == volume_id:
+            # A restore that had not saved its progress yet starts over.
+            restored = checkpoint.get('index', 0)
+            offset = checkpoint.get('offset', 0)
+            LOG.debug(_('resuming restore of %(backup_id)s at offset '
+                        '%(offset)d') %
+                      {'backup_id': backup_id, 'offset': offset})
+            volume_file.seek(offset)
+
+        backup_progress = progress.BackupProgress(self.context, self.db,
+                                                  backup, 'restore',
+                                                  processed_bytes=offset,
+                                                  processed_objects=restored)
+        for index, metadata_object in enumerate(metadata_objects[restored:],
+                                                restored + 1):
             object_name = metadata_object.keys()[0]
             LOG.debug(_('restoring object from swift. backup: %(backup_id)s, '
                         'container: %(container)s, swift object name: '
@@ -368,7 +495,9 @@ class SwiftBackupService(base.Base):
                           'volume_id': volume_id,
                       })
             try:
-                (resp, body) = self.conn.get_object(container, object_name)
+                with backup_progress.stage('download'):
+                    (resp, body) = self.conn.get_object(container,
+                                                        object_name)
             except socket.error as err:
                 raise exception.SwiftConnectionFailed(reason=str(err))
             compression_algorithm = metadata_object[object_name]['compression']
@@ -376,27 +505,39 @@ class SwiftBackupService(base.Base):
             if decompressor is not None:
                 LOG.debug(_('decompressing data using %s algorithm') %
                           compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                volume_file.write(decompressed)
-            else:
+                with backup_progress.stage('decompress'):
+                    body = decompressor.decompress(body)
+            with backup_progress.stage('write'):
                 volume_file.write(body)
+                offset += len(body)
 
-            # force flush every write to avoid long blocking write on close
-            volume_file.flush()
+                # force flush every write to avoid long blocking write on
+                # close
+                volume_file.flush()
 
-            # Be tolerant to IO implementations that do not support fileno()
-            try:
-                fileno = volume_file.fileno()
-            except IOError:
-                LOG.info("volume_file does not support fileno() so skipping "
-                         "fsync()")
-            else:
-                os.fsync(fileno)
+                # Be tolerant to IO implementations that do not support
+                # fileno()
+                try:
+                    fileno = volume_file.fileno()
+                except IOError:
+                    LOG.info("volume_file does not support fileno() so "
+                             "skipping fsync()")
+                else:
+                    os.fsync(fileno)
+            backup_progress.add(len(body))
+
+            if (self.checkpoint_interval > 0 and
+                    index % self.checkpoint_interval == 0):
+                self._save_checkpoint(backup, 'restore',
+                                      {'volume_id': volume_id,
+                                       'index': index,
+                                       'offset': offset})
 
             # Restoring a backup to a volume can take some time. Yield so other
             # threads can run, allowing for among other things the service
             # status to be updated
             eventlet.sleep(0)
+        backup_progress.finish()
         LOG.debug(_('v1 swift volume backup restore of %s finished'),
                   backup_id)
 
@@ -428,6 +569,7 @@ class SwiftBackupService(base.Base):
                    % metadata_version)
             raise exception.InvalidBackup(reason=err)
         restore_func(backup, volume_id, metadata, volume_file)
+        self.db.backup_update(self.context, backup_id, {'checkpoint': None})
         LOG.debug(_('restore %(backup_id)s to %(volume_id)s finished.') %
                   {'backup_id': backup_id, 'volume_id': volume_id})
 
@@ -23,6 +23,7 @@ Helper code for the iSCSI volume driver.
 
 import os
 import re
+import time
 
 from oslo.config import cfg
 
@@ -58,7 +59,12 @@ iscsi_helper_opt = [cfg.StrOpt('iscsi_helper',
                                      'to either perform blockio or fileio '
                                      'optionally, auto can be set and Cinder '
                                      'will autodetect type of backing device')
-                               )
+                               ),
+                    cfg.IntOpt('iscsi_targets_refresh_interval',
+                               default=300,
+                               help='Seconds after which the cached table '
+                                    'of the targets of the iSCSI target '
+                                    'daemon is listed again')
                     ]
 
 CONF = cfg.CONF
@@ -66,6 +72,50 @@ CONF.register_opts(iscsi_helper_opt)
 CONF.import_opt('volume_name_template', 'cinder.db')
 
 
+class TargetTable(object):
+    """Cached table of the targets of an iSCSI target daemon.
+
+    Maps target iqns to tids, so looking a target up does not list all
+    the targets of the daemon every time. The table is listed again when
+    it is older than iscsi_targets_refresh_interval, when an iqn is
+    missing from it and after it was invalidated by a failed command.
+    Targets created through the helper are added to it directly.
+    """
+
+    def __init__(self, list_targets):
+        """
+        :param list_targets: function returning a dict of iqn to tid
+        """
+        self._list_targets = list_targets
+        self._targets = {}
+        self._refreshed_at = None
+
+    def _is_stale(self):
+        return (self._refreshed_at is None or
+                time.time() - self._refreshed_at >
+                CONF.iscsi_targets_refresh_interval)
+
+    def refresh(self):
+        self._targets = self._list_targets()
+        self._refreshed_at = time.time()
+        return self._targets
+
+    def invalidate(self):
+        self._refreshed_at = None
+
+    def get(self, iqn):
+        """Return the tid of a target, or None if it does not exist."""
+        if self._is_stale() or iqn not in self._targets:
+            self.refresh()
+        return self._targets.get(iqn)
+
+    def add(self, iqn, tid):
+        self._targets[iqn] = tid
+
+    def remove(self, iqn):
+        self._targets.pop(iqn, None)
+
+
 class TargetAdmin(object):
     """iSCSI target administration.
 
@@ -88,6 +138,22 @@ class TargetAdmin(object):
         """Create a iSCSI target and logical unit"""
         raise NotImplementedError()
 
+    def create_iscsi_targets(self, targets, **kwargs):
+        """Create many iSCSI targets at once.
+
+        :param targets: list of dicts with the name, tid, lun, path,
+                        chap_auth and old_name arguments of
+                        create_iscsi_target()
+        :returns: dict of target name to tid
+        """
+        tids = {}
+        for target in targets:
+            tids[target['name']] = self.create_iscsi_target(
+                target['name'], target['tid'], target['lun'],
+                target['path'], target.get('chap_auth'),
+                old_name=target.get('old_name'), **kwargs)
+        return tids
+
     def remove_iscsi_target(self, tid, lun, vol_id, **kwargs):
         """Remove a iSCSI target and logical unit"""
         raise NotImplementedError()
@@ -118,25 +184,21 @@ class TgtAdm(TargetAdmin):
 
     def __init__(self, execute=utils.execute):
         super(TgtAdm, self).__init__('tgtadm', execute)
+        self.targets = TargetTable(self._get_targets)
 
     def _get_target(self, iqn):
-        (out, err) = self._execute('tgt-admin', '--show', run_as_root=True)
-        lines = out.split('\n')
-        for line in lines:
-            if iqn in line:
-                parsed = line.split()
-                tid = parsed[1]
-                return tid[:-1]
+        return self.targets.get(iqn)
 
-        return None
-
-    def create_iscsi_target(self, name, tid, lun, path,
-                            chap_auth=None, **kwargs):
-        # Note(jdg) tid and lun aren't used by TgtAdm but remain for
-        # compatibility
-
-        fileutils.ensure_tree(CONF.volumes_dir)
+    def _get_targets(self):
+        """Return a dict of iqn to tid of all the targets of tgtd."""
+        (out, err) = self._execute('tgt-admin', '--show', run_as_root=True)
+        # Only the target lines matter, the LUN details of each target
+        # are skipped without splitting them.
+        return dict((iqn, tid) for (tid, iqn) in
+                    re.findall(r'^Target (\d+): (\S+)\s*$', out, re.M))
 
+    def _write_volume_conf(self, name, path, chap_auth=None):
+        """Write the persistent tgtd config of a target."""
         vol_id = name.split(':')[1]
         if chap_auth is None:
             volume_conf = """
@@ -152,13 +214,23 @@ class TgtAdm(TargetAdmin):
                 </target>
             """ % (name, path, chap_auth)
 
-        LOG.info(_('Creating iscsi_target for: %s') % vol_id)
-        volumes_dir = CONF.volumes_dir
-        volume_path = os.path.join(volumes_dir, vol_id)
-
+        volume_path = os.path.join(CONF.volumes_dir, vol_id)
         f = open(volume_path, 'w+')
         f.write(volume_conf)
         f.close()
+        return volume_path
+
+    def create_iscsi_target(self, name, tid, lun, path,
+                            chap_auth=None, **kwargs):
+        # Note(jdg) tid and lun aren't used by TgtAdm but remain for
+        # compatibility
+
+        fileutils.ensure_tree(CONF.volumes_dir)
+
+        vol_id = name.split(':')[1]
+        LOG.info(_('Creating iscsi_target for: %s') % vol_id)
+        volumes_dir = CONF.volumes_dir
+        volume_path = self._write_volume_conf(name, path, chap_auth)
 
         old_persist_file = None
         old_name = kwargs.get('old_name', None)
@@ -166,7 +238,10 @@ class TgtAdm(TargetAdmin):
             old_persist_file = os.path.join(volumes_dir, old_name)
 
         try:
+            # --verbose echoes the tgtadm commands run for the update,
+            # which include the tid tgtd gave the new target.
             (out, err) = self._execute('tgt-admin',
+                                       '--verbose',
                                        '--update',
                                        name,
                                        run_as_root=True)
@@ -177,10 +252,19 @@ class TgtAdm(TargetAdmin):
 
             #Don't forget to remove the persistent file we created
             os.unlink(volume_path)
+            self.targets.invalidate()
             raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
 
         iqn = '%s%s' % (CONF.iscsi_target_prefix, vol_id)
-        tid = self._get_target(iqn)
+        match = re.search(r'--tid (\d+) -T %s\s*$' % re.escape(iqn),
+                          out or '', re.M)
+        if match:
+            tid = match.group(1)
+            self.targets.add(iqn, tid)
+        else:
+            # The target already existed, or this tgt-admin does not
+            # echo its commands: look the target up in a full listing.
+            tid = self._get_target(iqn)
         if tid is None:
             LOG.error(_("Failed to create iscsi target for volume "
                         "id:%(vol_id)s. Please ensure your tgtd config file "
@@ -195,6 +279,57 @@ class TgtAdm(TargetAdmin):
 
         return tid
 
+    def create_iscsi_targets(self, targets, **kwargs):
+        """Create many targets with a single tgt-admin update.
+
+        All the persistent configs are written first, then tgtd is updated
+        from them and queried once, instead of once per target.
+        """
+        if not targets:
+            return {}
+
+        fileutils.ensure_tree(CONF.volumes_dir)
+        LOG.info(_('Creating %d iscsi_targets') % len(targets))
+        for target in targets:
+            self._write_volume_conf(target['name'], target['path'],
+                                    target.get('chap_auth'))
+
+        try:
+            self._execute('tgt-admin', '--update', 'ALL', run_as_root=True)
+        except exception.ProcessExecutionError as e:
+            LOG.warn(_("Failed to update all iscsi targets at once, "
+                       "falling back to one target at a time: %s") % e)
+            self.targets.invalidate()
+            return super(TgtAdm, self).create_iscsi_targets(targets,
+                                                            **kwargs)
+
+        existing = self.targets.refresh()
+        tids = {}
+        missing = []
+        for target in targets:
+            vol_id = target['name'].split(':')[1]
+            iqn = '%s%s' % (CONF.iscsi_target_prefix, vol_id)
+            if iqn not in existing:
+                missing.append(vol_id)
+                continue
+            tids[target['name']] = existing[iqn]
+            old_name = target.get('old_name')
+            if old_name is not None:
+                old_persist_file = os.path.join(CONF.volumes_dir, old_name)
+                if os.path.exists(old_persist_file):
+                    os.unlink(old_persist_file)
+
+        if missing:
+            LOG.error(_("Failed to create iscsi target for volumes "
+                        "%(vol_ids)s. Please ensure your tgtd config file "
+                        "contains 'include %(volumes_dir)s/*'") % {
+                            'vol_ids': ', '.join(missing),
+                            'volumes_dir': CONF.volumes_dir,
+                        })
+            raise exception.NotFound()
+
+        return tids
+
     def remove_iscsi_target(self, tid, lun, vol_id, **kwargs):
         LOG.info(_('Removing iscsi_target for: %s') % vol_id)
         vol_uuid_file = CONF.volume_name_template % vol_id
@@ -216,8 +351,10 @@ class TgtAdm(TargetAdmin):
             LOG.error(_("Failed to remove iscsi target for volume "
                         "id:%(vol_id)s: %(e)s")
                       % {'vol_id': vol_id, 'e': str(e)})
+            self.targets.invalidate()
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
 
+        self.targets.remove(iqn)
         os.unlink(volume_path)
 
     def show_target(self, tid, iqn=None, **kwargs):
@@ -242,6 +379,13 @@ class IetAdm(TargetAdmin):
         else:
             return CONF.iscsi_iotype
 
+    def _volume_conf(self, name, path, chap_auth):
+        return """
+                        Target %s
+                            %s
+                            Lun 0 Path=%s,Type=%s
+                """ % (name, chap_auth, path, self._iotype(path))
+
     def create_iscsi_target(self, name, tid, lun, path,
                             chap_auth=None, **kwargs):
 
@@ -257,11 +401,7 @@ class IetAdm(TargetAdmin):
         conf_file = CONF.iet_conf
         if os.path.exists(conf_file):
             try:
-                volume_conf = """
-                        Target %s
-                            %s
-                            Lun 0 Path=%s,Type=%s
-                """ % (name, chap_auth, path, self._iotype(path))
+                volume_conf = self._volume_conf(name, path, chap_auth)
 
                 with utils.temporary_chown(conf_file):
                     f = open(conf_file, 'a+')
@@ -275,6 +415,40 @@ class IetAdm(TargetAdmin):
                 raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
         return tid
 
+    def create_iscsi_targets(self, targets, **kwargs):
+        """Create many targets, updating the ietd config file once.
+
+        Targets already present in the config file are not appended to it
+        again.
+        """
+        tids = {}
+        for target in targets:
+            tid = target['tid']
+            self._new_target(target['name'], tid, **kwargs)
+            self._new_logicalunit(tid, target['lun'], target['path'],
+                                  **kwargs)
+            if target.get('chap_auth') is not None:
+                (type, username, password) = target['chap_auth'].split()
+                self._new_auth(tid, type, username, password, **kwargs)
+            tids[target['name']] = tid
+
+        conf_file = CONF.iet_conf
+        if targets and os.path.exists(conf_file):
+            with utils.temporary_chown(conf_file):
+                f = open(conf_file, 'a+')
+                try:
+                    f.seek(0)
+                    configured = set(line.split()[1] for line in f
+                                     if line.strip().startswith('Target '))
+                    f.write(''.join(
+                        self._volume_conf(target['name'], target['path'],
+                                          target.get('chap_auth'))
+                        for target in targets
+                        if target['name'] not in configured))
+                finally:
+                    f.close()
+        return tids
+
     def remove_iscsi_target(self, tid, lun, vol_id, **kwargs):
         LOG.info(_('Removing iscsi_target for volume: %s') % vol_id)
         self._delete_logicalunit(tid, lun, **kwargs)
@@ -353,6 +527,12 @@ class FakeIscsiHelper(object):
         self.tid += 1
         return self.tid
 
+    def create_iscsi_targets(self, targets, **kwargs):
+        tids = {}
+        for target in targets:
+            tids[target['name']] = self.create_iscsi_target()
+        return tids
+
 
 class LioAdm(TargetAdmin):
     """iSCSI target administration for LIO using python-rtslib."""
@@ -364,17 +544,17 @@ class LioAdm(TargetAdmin):
         except (OSError, exception.ProcessExecutionError):
             LOG.error(_('rtstool is not installed correctly'))
             raise
+        self.targets = TargetTable(self._get_targets)
 
     def _get_target(self, iqn):
+        return self.targets.get(iqn)
+
+    def _get_targets(self):
+        """Return a dict of the iqns of the LIO targets to themselves."""
         (out, err) = self._execute('rtstool',
                                    'get-targets',
                                    run_as_root=True)
-        lines = out.split('\n')
-        for line in lines:
-            if iqn in line:
-                return line
-
-        return None
+        return dict((iqn, iqn) for iqn in out.split())
 
     def create_iscsi_target(self, name, tid, lun, path,
                             chap_auth=None, **kwargs):
@@ -409,10 +589,14 @@ class LioAdm(TargetAdmin):
                 LOG.error(_("Failed to create iscsi target for volume "
                             "id:%s.") % vol_id)
                 LOG.error("%s" % str(e))
+                self.targets.invalidate()
 
                 raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
 
         iqn = '%s%s' % (CONF.iscsi_target_prefix, vol_id)
+        # rtstool only returns once the target exists, and LIO targets
+        # are known by their iqn, so there is nothing to look up.
+        self.targets.add(iqn, iqn)
         tid = self._get_target(iqn)
         if tid is None:
             LOG.error(_("Failed to create iscsi target for volume "
@@ -435,8 +619,11 @@ class LioAdm(TargetAdmin):
             LOG.error(_("Failed to remove iscsi target for volume "
                         "id:%s.") % vol_id)
             LOG.error("%s" % str(e))
+            self.targets.invalidate()
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
 
+        self.targets.remove(iqn)
+
     def show_target(self, tid, iqn=None, **kwargs):
         if iqn is None:
             raise exception.InvalidParameterValue(
@@ -19,6 +19,7 @@
 LVM class for performing LVM operations.
 """
 
+import collections
 import math
 
 from itertools import izip
@@ -43,10 +44,16 @@ class VolumeGroupCreationFailed(Exception):
 
 
 class LVM(object):
-    """LVM object to enable various LVM related operations."""
+    """LVM object to enable various LVM related operations.
+
+    The object keeps an inventory of the VG and its LVs, loaded with a
+    single lvs report and kept up to date by the create, snapshot and
+    delete methods of the object, so that looking up LVs does not take
+    the VG lock every time.
+    """
 
     def __init__(self, vg_name, create_vg=False,
-                 physical_volumes=None):
+                 physical_volumes=None, root_helper='sudo', executor=None):
         """Initialize the LVM object.
 
         The LVM object is based on an LVM VolumeGroup, one instantiation
@@ -56,6 +63,9 @@ class LVM(object):
         :param create_vg: Indicates the VG doesn't exist
                           and we want to create it
         :param physical_volumes: List of PVs to build VG on
+        :param root_helper: Root helper to run the LVM commands with
+        :param executor: Function to run the LVM commands with, default
+                         is processutils.execute
 
         """
         self.vg_name = vg_name
@@ -65,6 +75,11 @@ class LVM(object):
         self.vg_available_space = 0
         self.vg_lv_count = 0
         self.vg_uuid = None
+        self._root_helper = root_helper
+        self._executor = executor
+        # The VG and LVs as of the last lvs report, None until loaded.
+        self._vg_info = None
+        self._lvs = None
 
         if create_vg and physical_volumes is not None:
             self.pv_list = physical_volumes
@@ -82,6 +97,10 @@ class LVM(object):
             LOG.error(_('Unable to locate Volume Group %s') % vg_name)
             raise VolumeGroupNotFound(vg_name=vg_name)
 
+    def _run(self, *cmd):
+        execute = self._executor or putils.execute
+        return execute(*cmd, root_helper=self._root_helper, run_as_root=True)
+
     def _size_str(self, size_in_g):
         if '.00' in size_in_g:
             size_in_g = size_in_g.replace('.00', '')
@@ -99,7 +118,7 @@ class LVM(object):
         """
         exists = False
         cmd = ['vgs', '--noheadings', '-o', 'name']
-        (out, err) = putils.execute(*cmd, root_helper='sudo', run_as_root=True)
+        (out, err) = self._run(*cmd)
 
         if out is not None:
             volume_groups = out.split()
@@ -110,7 +129,7 @@ class LVM(object):
 
     def _create_vg(self, pv_list):
         cmd = ['vgcreate', self.vg_name, ','.join(pv_list)]
-        putils.execute(*cmd, root_helper='sudo', run_as_root=True)
+        self._run(*cmd)
 
     def _get_vg_uuid(self):
         (out, err) = putils.execute('vgs', '--noheadings',
@@ -121,14 +140,18 @@ class LVM(object):
             return []
 
     @staticmethod
-    def supports_thin_provisioning():
+    def supports_thin_provisioning(root_helper='sudo', executor=None):
         """Static method to check for thin LVM support on a system.
 
+        :param root_helper: Root helper to run vgs with
+        :param executor: Function to run vgs with, default is
+                         processutils.execute
         :returns: True if supported, False otherwise
 
         """
         cmd = ['vgs', '--version']
-        (out, err) = putils.execute(*cmd, root_helper='sudo', run_as_root=True)
+        execute = executor or putils.execute
+        (out, err) = execute(*cmd, root_helper=root_helper, run_as_root=True)
         lines = out.split('\n')
 
         for line in lines:
@@ -164,13 +187,92 @@ class LVM(object):
 
         return lv_list
 
+    @staticmethod
+    def _gb(size):
+        # lvs reports sizes with the decimal separator of the locale.
+        return float(size.replace(',', '.') or 0)
+
+    def refresh_inventory(self):
+        """Reload the VG and LV inventory with a single lvs report."""
+        fields = ['vg_name', 'vg_size', 'vg_free', 'vg_uuid', 'lv_name',
+                  'lv_attr', 'lv_size', 'origin', 'pool_lv', 'data_percent',
+                  'metadata_percent']
+        cmd = ['lvs', '--noheadings', '--nosuffix', '--unit=g',
+               '--separator', ':', '-o', ','.join(fields), self.vg_name]
+        (out, err) = self._run(*cmd)
+
+        vg_info = None
+        lvs = collections.OrderedDict()
+        for line in (out or '').split():
+            row = dict(zip(fields, line.split(':')))
+            vg_info = {'name': row['vg_name'],
+                       'size': self._gb(row['vg_size']),
+                       'available': self._gb(row['vg_free']),
+                       'uuid': row['vg_uuid']}
+            lvs[row['lv_name']] = {
+                'name': row['lv_name'],
+                'attr': row['lv_attr'],
+                'size': self._gb(row['lv_size']),
+                'origin': row['origin'],
+                'pool_lv': row['pool_lv'],
+                'data_percent': self._gb(row['data_percent']),
+                'metadata_percent': self._gb(row['metadata_percent'])}
+
+        if vg_info is None:
+            # A VG without LVs does not show in the lvs report.
+            cmd = ['vgs', '--noheadings', '--nosuffix', '--unit=g',
+                   '--separator', ':', '-o', 'name,size,free,uuid',
+                   self.vg_name]
+            (out, err) = self._run(*cmd)
+            if not out or not out.strip():
+                LOG.error(_('Unable to find VG: %s') % self.vg_name)
+                raise VolumeGroupNotFound(vg_name=self.vg_name)
+            name, size, free, uuid = out.split()[0].split(':')
+            vg_info = {'name': name,
+                       'size': self._gb(size),
+                       'available': self._gb(free),
+                       'uuid': uuid}
+
+        self._vg_info = vg_info
+        self._lvs = lvs
+
+    def _inventory(self):
+        if self._lvs is None:
+            self.refresh_inventory()
+        return self._lvs
+
+    def _find_lv(self, name):
+        lv = self._inventory().get(name)
+        if lv is None:
+            # The LV may have been created since the inventory was loaded.
+            self.refresh_inventory()
+            lv = self._lvs.get(name)
+        return lv
+
+    def _add_lv(self, name, size, origin='', pool_lv=''):
+        lvs = self._inventory()
+        lvs[name] = {'name': name,
+                     'attr': '',
+                     'size': size,
+                     'origin': origin,
+                     'pool_lv': pool_lv,
+                     'data_percent': 0.0,
+                     'metadata_percent': 0.0}
+        if not pool_lv:
+            # Thin volumes take their space from the pool.
+            self._vg_info['available'] -= size
+            self.vg_available_space = self._vg_info['available']
+
     def get_volumes(self):
         """Get all LV's associated with this instantiation (VG).
 
         :returns: List of Dictionaries with LV info
 
         """
-        self.lv_list = self.get_all_volumes(self.vg_name)
+        self.lv_list = [{'vg': self.vg_name,
+                         'name': lv['name'],
+                         'size': '%.2fg' % lv['size']}
+                        for lv in self._inventory().itervalues()]
         return self.lv_list
 
     def get_volume(self, name):
@@ -179,10 +281,46 @@ class LVM(object):
         :returns: dict representation of Logical Volume if exists
 
         """
-        ref_list = self.get_volumes()
-        for r in ref_list:
-            if r['name'] == name:
-                return r
+        lv = self._find_lv(name)
+        if lv is not None:
+            return {'vg': self.vg_name,
+                    'name': lv['name'],
+                    'size': '%.2fg' % lv['size']}
+
+    def lv_has_snapshot(self, name):
+        """Whether the Logical Volume is the origin of a snapshot.
+
+        The inventory is reloaded first, since the snapshot may have been
+        created or removed by another process, e.g. the backup service.
+        """
+        self.refresh_inventory()
+        return any(lv['origin'] == name and not lv['pool_lv']
+                   for lv in self._lvs.itervalues())
+
+    def get_thin_pool_info(self, name=None):
+        """Get the usage of a thin provisioning pool of this VG.
+
+        :param name: Name of the pool, default is "<vg-name>-pool"
+        :returns: Dictionary of the pool size, free space and capacity
+                  provisioned to its volumes in GB, and its data and
+                  metadata usage in percent, None if there is no pool
+
+        """
+        if name is None:
+            name = '%s-pool' % self.vg_name
+        lvs = self._inventory()
+        pool = lvs.get(name)
+        if pool is None or not pool['attr'].startswith('t'):
+            return None
+        provisioned = sum(lv['size'] for lv in lvs.itervalues()
+                          if lv['pool_lv'] == name)
+        return {'name': name,
+                'size': pool['size'],
+                'free': round(pool['size'] *
+                              (100 - pool['data_percent']) / 100, 2),
+                'provisioned': round(provisioned, 2),
+                'data_percent': pool['data_percent'],
+                'metadata_percent': pool['metadata_percent']}
 
     @staticmethod
     def get_all_physical_volumes(vg_name=None):
@@ -259,28 +397,25 @@ class LVM(object):
         :returns: Dictionaries of VG info
 
         """
-        vg_list = self.get_all_volume_groups(self.vg_name)
-
-        if len(vg_list) != 1:
-            LOG.error(_('Unable to find VG: %s') % self.vg_name)
-            raise VolumeGroupNotFound(vg_name=self.vg_name)
+        self.refresh_inventory()
 
-        self.vg_size = vg_list[0]['size']
-        self.vg_available_space = vg_list[0]['available']
-        self.vg_lv_count = vg_list[0]['lv_count']
-        self.vg_uuid = vg_list[0]['uuid']
+        self.vg_size = self._vg_info['size']
+        self.vg_available_space = self._vg_info['available']
+        self.vg_lv_count = len(self._lvs)
+        self.vg_uuid = self._vg_info['uuid']
 
-        return vg_list[0]
+        return dict(self._vg_info, lv_count=self.vg_lv_count)
 
     def create_thin_pool(self, name=None, size_str=0):
         """Creates a thin provisioning pool for this VG.
 
         :param name: Name to use for pool, default is "<vg-name>-pool"
-        :param size_str: Size to allocate for pool, default is entire VG
+        :param size_str: LVM size string of the pool, default is entire VG
 
         """
 
-        if not self.supports_thin_provisioning():
+        if not self.supports_thin_provisioning(self._root_helper,
+                                               self._executor):
             LOG.error(_('Requested to setup thin provisioning, '
                         'however current LVM version does not '
                         'support it.'))
@@ -291,25 +426,41 @@ class LVM(object):
 
         if size_str == 0:
             self.update_volume_group_info()
-            size_str = self.vg_size
-
-        self.create_volume(name, size_str, 'thin')
-
-    def create_volume(self, name, size_str, lv_type='default', mirror_count=0):
+            size_str = self._size_str('%d' % self.vg_size)
+
+        self._run('lvcreate', '-T', '-L', size_str,
+                  '%s/%s' % (self.vg_name, name))
+        # The pool takes room for its metadata besides its size, the
+        # inventory is reloaded when next used.
+        self._lvs = None
+        return True
+
+    def _size_in_g(self, size):
+        if size.endswith('M'):
+            return float(size[:-1]) / 1024
+        return float(size[:-1])
+
+    def create_volume(self, name, size_str, lv_type='default', mirror_count=0,
+                      pool_name=None):
         """Creates a logical volume on the object's VG.
 
         :param name: Name to use when creating Logical Volume
         :param size_str: Size to use when creating Logical Volume
         :param lv_type: Type of Volume (default or thin)
         :param mirror_count: Use LVM mirroring with specified count
+        :param pool_name: Thin pool of a thin volume,
+                          default is "<vg-name>-pool"
 
         """
         size = self._size_str(size_str)
-        cmd = ['lvcreate', '-n', name, self.vg_name]
         if lv_type == 'thin':
-            cmd += ['-T', '-V', size]
+            if pool_name is None:
+                pool_name = '%s-pool' % self.vg_name
+            cmd = ['lvcreate', '-T', '-V', size, '-n', name,
+                   '%s/%s' % (self.vg_name, pool_name)]
         else:
-            cmd += ['-L', size]
+            pool_name = ''
+            cmd = ['lvcreate', '-n', name, self.vg_name, '-L', size]
 
         if mirror_count > 0:
             cmd += ['-m', mirror_count, '--nosync']
@@ -320,9 +471,8 @@ class LVM(object):
                 #             http://red.ht/U2BPOD
                 cmd += ['-R', str(rsize)]
 
-        putils.execute(*cmd,
-                       root_helper='sudo',
-                       run_as_root=True)
+        self._run(*cmd)
+        self._add_lv(name, self._size_in_g(size), pool_lv=pool_name)
 
     def create_lv_snapshot(self, name, source_lv_name, lv_type='default'):
         """Creates a snapshot of a logical volume.
@@ -332,19 +482,21 @@ class LVM(object):
         :param lv_type: Type of LV (default or thin)
 
         """
-        source_lvref = self.get_volume(source_lv_name)
-        if source_lvref is None:
+        source_lv = self._find_lv(source_lv_name)
+        if source_lv is None:
             LOG.error(_("Unable to find LV: %s") % source_lv_name)
             return False
         cmd = ['lvcreate', '--name', name,
                '--snapshot', '%s/%s' % (self.vg_name, source_lv_name)]
         if lv_type != 'thin':
-            size = source_lvref['size']
+            size = '%.2fg' % source_lv['size']
             cmd += ['-L', size]
 
-        putils.execute(*cmd,
-                       root_helper='sudo',
-                       run_as_root=True)
+        self._run(*cmd)
+        self._add_lv(name, source_lv['size'], origin=source_lv_name,
+                     pool_lv=source_lv['pool_lv'] if lv_type == 'thin'
+                     else '')
+        return True
 
     def delete(self, name):
         """Delete logical volume or snapshot.
@@ -352,10 +504,12 @@ class LVM(object):
         :param name: Name of LV to delete
 
         """
-        putils.execute('lvremove',
-                       '-f',
-                       '%s/%s' % (self.vg_name, name),
-                       root_helper='sudo', run_as_root=True)
+        self._run('lvremove', '-f', '%s/%s' % (self.vg_name, name))
+        if self._lvs is not None:
+            lv = self._lvs.pop(name, None)
+            if lv is not None and not lv['pool_lv']:
+                self._vg_info['available'] += lv['size']
+                self.vg_available_space = self._vg_info['available']
 
     def revert(self, snapshot_name):
         """Revert an LV from snapshot.
@@ -363,6 +517,7 @@ class LVM(object):
         :param snapshot_name: Name of snapshot to revert
 
         """
-        putils.execute('lvconvert', '--merge',
-                       snapshot_name, root_helper='sudo',
-                       run_as_root=True)
+        self._run('lvconvert', '--merge', snapshot_name)
+        # The merge completes in the background, the inventory is
+        # reloaded when next used.
+        self._lvs = None
@@ -145,6 +145,18 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_heartbeat(context, service_ids):
+    """Atomically bump report_count and updated_at of the given services.
+
+    All services are updated with a single UPDATE statement, without
+    reading them first.
+
+    :returns: the number of services updated.
+
+    """
+    return IMPL.service_heartbeat(context, service_ids)
+
+
 ###################
 def migration_update(context, id, values):
     """Update a migration instance."""
@@ -192,6 +204,16 @@ def iscsi_target_create_safe(context, values):
     return IMPL.iscsi_target_create_safe(context, values)
 
 
+def iscsi_target_create_missing(context, host, num_targets):
+    """Create the iscsi_targets 1 to num_targets a host does not have yet.
+
+    The missing targets are inserted with a single statement. Returns
+    the number of iscsi_targets created.
+
+    """
+    return IMPL.iscsi_target_create_missing(context, host, num_targets)
+
+
 ###############
 
 def volume_allocate_iscsi_target(context, volume_id, host):
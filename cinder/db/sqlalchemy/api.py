@@ -369,6 +369,20 @@ def service_update(context, service_id, values):
         service_ref.save(session=session)
 
 
+@require_admin_context
+def service_heartbeat(context, service_ids):
+    if not service_ids:
+        return 0
+    session = get_session()
+    with session.begin():
+        return model_query(context, models.Service, session=session,
+                           read_deleted="no").\
+            filter(models.Service.id.in_(service_ids)).\
+            update({'report_count': models.Service.report_count + 1,
+                    'updated_at': timeutils.utcnow()},
+                   synchronize_session=False)
+
+
 ###################
 
 
@@ -425,6 +439,42 @@ def iscsi_target_create_safe(context, values):
         return None
 
 
+@require_admin_context
+def iscsi_target_create_missing(context, host, num_targets):
+    session = get_session()
+    # NOTE: deleted rows still hold their unique (target_num, host) pair.
+    existing = set(target_num for (target_num,) in
+                   model_query(context, models.IscsiTarget.target_num,
+                               session=session, read_deleted="yes").
+                   filter_by(host=host).all())
+    # NOTE(vish): Target ids start at 1, not 0.
+    missing = [target_num for target_num in xrange(1, num_targets + 1)
+               if target_num not in existing]
+    if not missing:
+        return 0
+
+    now = timeutils.utcnow()
+    rows = [{'host': host, 'target_num': target_num, 'created_at': now,
+             'deleted': False} for target_num in missing]
+    try:
+        with session.begin():
+            session.execute(models.IscsiTarget.__table__.insert(), rows)
+    except db_exc.DBDuplicateEntry:
+        # Another service created some of them concurrently, so insert
+        # them one at a time and skip the existing ones.
+        created = 0
+        for row in rows:
+            try:
+                with session.begin():
+                    session.execute(models.IscsiTarget.__table__.insert(),
+                                    row)
+                created += 1
+            except db_exc.DBDuplicateEntry:
+                pass
+        return created
+    return len(missing)
+
+
 ###################
 
 
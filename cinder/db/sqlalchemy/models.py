@@ -389,6 +389,12 @@ class Backup(BASE, CinderBase):
     service = Column(String(255))
     size = Column(Integer)
     object_count = Column(Integer)
+    # Progress of an interrupted backup or restore, saved by the backup
+    # service to resume from.
+    checkpoint = Column(String(255))
+    # Progress of a running backup or restore, and the last progress of a
+    # finished one, as reported by the backup service.
+    progress = Column(String(255))
 
 
 class Transfer(BASE, CinderBase):
@@ -139,6 +139,12 @@ global_opts = [
     cfg.StrOpt('backup_topic',
                default='cinder-backup',
                help='the topic volume backup nodes listen on'),
+    cfg.BoolOpt('slim_rpc_payloads',
+                default=False,
+                help='Send create_volume requests with ids only and let the '
+                     'scheduler and volume nodes read the request spec '
+                     'from the database. Only enable once all the nodes '
+                     'run a release supporting it'),
     cfg.BoolOpt('enable_v1_api',
                 default=True,
                 help=_("Deploy v1 of the Cinder API. ")),
@@ -199,6 +205,11 @@ global_opts = [
                default=None,
                help='Path to the rootwrap configuration file to use for '
                     'running commands as root'),
+    cfg.BoolOpt('use_rootwrap_daemon',
+                default=False,
+                help='Run the commands needing root through a '
+                     'cinder-rootwrap-daemon started once per service '
+                     'instead of running sudo cinder-rootwrap per command'),
     cfg.BoolOpt('monkey_patch',
                 default=False,
                 help='Whether to log monkey patching'),
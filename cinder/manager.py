@@ -64,7 +64,16 @@ from cinder.scheduler import rpcapi as scheduler_rpcapi
 from cinder import version
 
 
+manager_opts = [
+    cfg.IntOpt('capabilities_full_sync_interval',
+               default=10,
+               help='Number of periodic capability publications between '
+                    'full resyncs to the schedulers. Publications in '
+                    'between only carry capabilities that changed.'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(manager_opts)
 LOG = logging.getLogger(__name__)
 
 
@@ -116,12 +125,21 @@ class SchedulerDependentManager(Manager):
     manager.Manager directly. Updates are only sent after
     update_service_capabilities is called with non-None values.
 
+    Each update carries a generation number. Only capabilities that
+    changed since the previous update are sent, except for a full resync
+    every capabilities_full_sync_interval publications. An update is sent
+    every period even when nothing changed, so that the schedulers know
+    the capabilities they hold are current.
+
     """
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
         self.last_capabilities = None
         self.service_name = service_name
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        self._published_capabilities = None
+        self._capabilities_generation = 0
+        self._publications_since_full_sync = 0
         super(SchedulerDependentManager, self).__init__(host, db_driver)
 
     def update_service_capabilities(self, capabilities):
@@ -129,12 +147,40 @@ class SchedulerDependentManager(Manager):
         self.last_capabilities = capabilities
 
     @periodic_task.periodic_task
-    def _publish_service_capabilities(self, context):
+    def _publish_service_capabilities(self, context, full_sync=False):
         """Pass data back to the scheduler at a periodic interval."""
-        if self.last_capabilities:
-            LOG.debug(_('Notifying Schedulers of capabilities ...'))
-            self.scheduler_rpcapi.update_service_capabilities(
-                context,
-                self.service_name,
-                self.host,
-                self.last_capabilities)
+        if not self.last_capabilities:
+            return
+
+        capabilities = self.last_capabilities
+        published = self._published_capabilities
+        removed = []
+        if (full_sync or published is None or
+                self._publications_since_full_sync >=
+                CONF.capabilities_full_sync_interval):
+            full_sync = True
+            changed = capabilities
+        else:
+            changed = dict((key, value)
+                           for key, value in capabilities.iteritems()
+                           if key not in published or
+                           published[key] != value)
+            removed = [key for key in published if key not in capabilities]
+
+        self._publications_since_full_sync += 1
+        self._capabilities_generation += 1
+        if full_sync:
+            self._publications_since_full_sync = 0
+        LOG.debug(_('Notifying Schedulers of capabilities '
+                    '(generation %(generation)d, full sync: %(full)s) ...'),
+                  {'generation': self._capabilities_generation,
+                   'full': full_sync})
+        self.scheduler_rpcapi.update_service_capabilities(
+            context,
+            self.service_name,
+            self.host,
+            changed,
+            generation=self._capabilities_generation,
+            full_sync=full_sync,
+            removed=removed)
+        self._published_capabilities = dict(capabilities)
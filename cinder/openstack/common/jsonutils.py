@@ -108,6 +108,15 @@ def to_primitive(value, convert_instances=False, convert_datetime=True,
     if level > max_depth:
         return '?'
 
+    # Dicts and lists of simple values, which most messages are made of,
+    # are converted without recursing into each value.
+    if isinstance(value, dict):
+        if all(isinstance(v, _simple_types) for v in value.itervalues()):
+            return dict(value)
+    elif isinstance(value, (list, tuple)):
+        if all(isinstance(v, _simple_types) for v in value):
+            return list(value)
+
     # The try block may not be necessary after the class check above,
     # but just in case ...
     try:
@@ -147,7 +156,67 @@ def to_primitive(value, convert_instances=False, convert_datetime=True,
         return six.text_type(value)
 
 
+def _model_to_primitive(model, max_depth=3):
+    """to_primitive() for db models, visiting each model only once.
+
+    db models refer to each other through their relationships, so
+    to_primitive() converts the same models again and again until it
+    reaches max_depth. The items of each model and the conversion of
+    each model at a given depth are kept for the length of the call, the
+    result is the same.
+    """
+    items = {}
+    converted = {}
+
+    def convert(value, level):
+        if isinstance(value, _simple_types):
+            return value
+        if isinstance(value, datetime.datetime):
+            return timeutils.strtime(value)
+        if level > max_depth:
+            return '?'
+        if isinstance(value, dict):
+            return dict((k, convert(v, level)) for k, v in value.iteritems())
+        if isinstance(value, (list, tuple)):
+            return [convert(v, level) for v in value]
+        if (hasattr(value, 'iteritems') and
+                getattr(value, '__module__', None) != 'mox'):
+            key = (id(value), level)
+            if key not in converted:
+                if id(value) not in items:
+                    # The model is kept to keep its id from being reused.
+                    items[id(value)] = (value, dict(value.iteritems()))
+                converted[key] = convert(items[id(value)][1], level + 1)
+            return converted[key]
+        return to_primitive(value, level=level, max_depth=max_depth)
+
+    try:
+        return convert(model, 0)
+    except TypeError:
+        return to_primitive(model, max_depth=max_depth)
+
+
+def _encode_default(value):
+    """Convert what json can not encode, for dumps().
+
+    json only calls this for values it does not know and walks the result
+    itself, so plain dicts and lists of a message never go through
+    to_primitive(). The result is the same as with to_primitive().
+    """
+    if isinstance(value, datetime.datetime):
+        return timeutils.strtime(value)
+    if (hasattr(value, 'iteritems') and
+            getattr(value, '__module__', None) != 'mox'):
+        return _model_to_primitive(value)
+    return to_primitive(value)
+
+
+_encoder = json.JSONEncoder(default=_encode_default)
+
+
 def dumps(value, default=to_primitive, **kwargs):
+    if default is to_primitive and not kwargs:
+        return _encoder.encode(value)
     return json.dumps(value, default=default, **kwargs)
 
 
@@ -73,6 +73,31 @@ def _subprocess_setup():
     signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
 
+def _popen_communicate(cmd, process_input, shell):
+    _PIPE = subprocess.PIPE  # pylint: disable=E1101
+
+    if os.name == 'nt':
+        preexec_fn = None
+        close_fds = False
+    else:
+        preexec_fn = _subprocess_setup
+        close_fds = True
+
+    obj = subprocess.Popen(cmd,
+                           stdin=_PIPE,
+                           stdout=_PIPE,
+                           stderr=_PIPE,
+                           close_fds=close_fds,
+                           preexec_fn=preexec_fn,
+                           shell=shell)
+    if process_input is not None:
+        (stdout, stderr) = obj.communicate(process_input)
+    else:
+        (stdout, stderr) = obj.communicate()
+    obj.stdin.close()  # pylint: disable=E1101
+    return (stdout, stderr, obj.returncode)  # pylint: disable=E1101
+
+
 def execute(*cmd, **kwargs):
     """Helper method to shell out and execute a command through subprocess.
 
@@ -97,8 +122,9 @@ def execute(*cmd, **kwargs):
                             in the root_helper kwarg.
     :type run_as_root:      boolean
     :param root_helper:     command to prefix to commands called with
-                            run_as_root=True
-    :type root_helper:      string
+                            run_as_root=True, or a rootwrap client.Client
+                            running them through a rootwrap daemon
+    :type root_helper:      string or rootwrap client.Client
     :param shell:           whether or not there should be a shell used to
                             execute this command. Defaults to false.
     :type shell:            boolean
@@ -127,42 +153,33 @@ def execute(*cmd, **kwargs):
         raise UnknownArgumentError(_('Got unknown keyword args '
                                      'to utils.execute: %r') % kwargs)
 
+    root_client = None
     if run_as_root and os.geteuid() != 0:
         if not root_helper:
             raise NoRootWrapSpecified(
                 message=('Command requested root, but did not specify a root '
                          'helper.'))
-        cmd = shlex.split(root_helper) + list(cmd)
+        if isinstance(root_helper, basestring):
+            cmd = shlex.split(root_helper) + list(cmd)
+        else:
+            root_client = root_helper
 
     cmd = map(str, cmd)
 
     while attempts > 0:
         attempts -= 1
         try:
-            LOG.debug(_('Running cmd (subprocess): %s'), ' '.join(cmd))
-            _PIPE = subprocess.PIPE  # pylint: disable=E1101
-
-            if os.name == 'nt':
-                preexec_fn = None
-                close_fds = False
-            else:
-                preexec_fn = _subprocess_setup
-                close_fds = True
-
-            obj = subprocess.Popen(cmd,
-                                   stdin=_PIPE,
-                                   stdout=_PIPE,
-                                   stderr=_PIPE,
-                                   close_fds=close_fds,
-                                   preexec_fn=preexec_fn,
-                                   shell=shell)
-            result = None
-            if process_input is not None:
-                result = obj.communicate(process_input)
+            if root_client is not None:
+                LOG.debug(_('Running cmd (rootwrap daemon): %s'),
+                          ' '.join(cmd))
+                (_returncode, stdout, stderr) = root_client.execute(
+                    cmd, process_input)
+                result = (stdout, stderr)
             else:
-                result = obj.communicate()
-            obj.stdin.close()  # pylint: disable=E1101
-            _returncode = obj.returncode  # pylint: disable=E1101
+                LOG.debug(_('Running cmd (subprocess): %s'), ' '.join(cmd))
+                (stdout, stderr, _returncode) = _popen_communicate(
+                    cmd, process_input, shell)
+                result = (stdout, stderr)
             if _returncode:
                 LOG.debug(_('Result was %s') % _returncode)
                 if not ignore_exit_code and _returncode not in check_exit_code:
@@ -0,0 +1,117 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Client side of the root wrapper daemon, for eventlet based services."""
+
+import base64
+
+from eventlet.green import socket
+from eventlet.green import subprocess
+from eventlet import semaphore
+
+from cinder.openstack.common.rootwrap import daemon
+
+
+class DaemonError(Exception):
+    """Raised when the rootwrap daemon can not run a command."""
+    pass
+
+
+class Client(object):
+    """Runs commands through a rootwrap daemon started on first use.
+
+    The daemon is started again if it exited, for instance because it
+    was killed, so a long running service survives a restart of it.
+    """
+
+    def __init__(self, daemon_cmd):
+        """
+        :param daemon_cmd: command starting the daemon, such as
+                           ['sudo', 'cinder-rootwrap-daemon', config]
+        """
+        self.daemon_cmd = daemon_cmd
+        self._lock = semaphore.Semaphore()
+        self._process = None
+        self._address = None
+        self._authkey = None
+
+    def _start_daemon(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            process = subprocess.Popen(self.daemon_cmd,
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE,
+                                       close_fds=True)
+            address = process.stdout.readline().strip()
+            authkey = process.stdout.readline().strip()
+            if not authkey:
+                process.stdin.close()
+                process.wait()
+                raise DaemonError('Failed to start %s: %s' %
+                                  (' '.join(self.daemon_cmd), address))
+            (self._process, self._address, self._authkey) = (process,
+                                                             address,
+                                                             authkey)
+
+    def _stop_daemon(self):
+        with self._lock:
+            if self._process is not None:
+                # The daemon exits once its stdin is closed.
+                self._process.stdin.close()
+                self._process = None
+
+    def _connect(self):
+        if self._process is None or self._process.poll() is not None:
+            self._start_daemon()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._address)
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def execute(self, cmd, process_input=None):
+        """Run cmd as root and return (returncode, stdout, stderr)."""
+        try:
+            sock = self._connect()
+        except socket.error:
+            # Nothing was sent yet, so the command is safe to retry
+            # against a fresh daemon.
+            self._stop_daemon()
+            sock = self._connect()
+
+        try:
+            challenge = daemon.recv_message(sock)['challenge']
+            request = {'cmd': list(cmd),
+                       'digest': daemon.sign(self._authkey, challenge)}
+            if process_input is not None:
+                request['stdin'] = base64.b64encode(process_input)
+            daemon.send_message(sock, request)
+            reply = daemon.recv_message(sock)
+        except (EOFError, socket.error) as exc:
+            raise DaemonError('Lost connection to the rootwrap daemon: %s'
+                              % exc)
+        finally:
+            sock.close()
+
+        if 'error' in reply:
+            raise DaemonError(reply['error'])
+        return (reply['returncode'],
+                base64.b64decode(reply['stdout']),
+                base64.b64decode(reply['stderr']))
@@ -0,0 +1,246 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Root wrapper daemon for OpenStack services
+
+   Runs as root for the lifetime of a service and executes the commands
+   the service sends it over a local socket, once they match one of the
+   filters loaded at startup. This saves the sudo call and the Python
+   interpreter startup cinder-rootwrap costs on every command.
+
+   To use this with cinder, you should set the following in
+   cinder.conf:
+   rootwrap_config=/etc/cinder/rootwrap.conf
+   use_rootwrap_daemon=True
+
+   You also need to let the cinder user run cinder-rootwrap-daemon
+   as root in sudoers:
+   cinder ALL = (root) NOPASSWD: /usr/bin/cinder-rootwrap-daemon
+                                   /etc/cinder/rootwrap.conf
+
+   The daemon prints the path of its socket and an authentication key
+   on stdout, and exits when its stdin is closed, which happens when the
+   service that started it exits. The socket lives in a directory only
+   the user that ran sudo can access, and every request must answer a
+   challenge with the authentication key.
+"""
+
+import base64
+import binascii
+import ConfigParser
+import errno
+import hashlib
+import hmac
+import json
+import logging
+import os
+import pwd
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+from cinder.openstack.common.rootwrap import cmd
+from cinder.openstack.common.rootwrap import wrapper
+
+
+def send_message(sock, message):
+    """Send a JSON message prefixed by its length."""
+    data = json.dumps(message)
+    sock.sendall(struct.pack('!I', len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise EOFError('Connection closed by peer')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def recv_message(sock):
+    """Receive a message sent by send_message()."""
+    (size,) = struct.unpack('!I', _recv_exactly(sock, 4))
+    return json.loads(_recv_exactly(sock, size))
+
+
+def sign(authkey, challenge):
+    """Answer to a challenge of the daemon."""
+    return hmac.new(str(authkey), str(challenge), hashlib.sha256).hexdigest()
+
+
+def _constant_time_compare(first, second):
+    if len(first) != len(second):
+        return False
+    result = 0
+    for x, y in zip(first, second):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+class RootwrapServer(object):
+    """Executes the filtered commands received over a listening socket."""
+
+    def __init__(self, config, filters, authkey):
+        self.config = config
+        self.filters = filters
+        self.authkey = authkey
+
+    def run_command(self, userargs, stdin=None):
+        """Run userargs if a filter allows it.
+
+        Returns a (returncode, stdout, stderr) tuple, using the exit codes
+        of cinder-rootwrap when the command is refused.
+        """
+        try:
+            filtermatch = wrapper.match_filter(self.filters, userargs,
+                                               exec_dirs=self.config.exec_dirs)
+        except wrapper.FilterMatchNotExecutable as exc:
+            msg = ("Executable not found: %s (filter match = %s)"
+                   % (exc.match.exec_path, exc.match.name))
+            if self.config.use_syslog:
+                logging.error(msg)
+            return (cmd.RC_NOEXECFOUND, '', msg)
+        except wrapper.NoFilterMatched:
+            msg = ("Unauthorized command: %s (no filter matched)"
+                   % ' '.join(userargs))
+            if self.config.use_syslog:
+                logging.error(msg)
+            return (cmd.RC_UNAUTHORIZED, '', msg)
+
+        command = filtermatch.get_command(userargs,
+                                          exec_dirs=self.config.exec_dirs)
+        if self.config.use_syslog:
+            logging.info("(%s > %s) Executing %s (filter match = %s)" % (
+                os.environ.get('SUDO_USER', '?'),
+                pwd.getpwuid(os.getuid())[0],
+                command, filtermatch.name))
+
+        obj = subprocess.Popen(command,
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               close_fds=True,
+                               preexec_fn=cmd._subprocess_setup,
+                               env=filtermatch.get_environment(userargs))
+        (stdout, stderr) = obj.communicate(stdin)
+        return (obj.returncode, stdout, stderr)
+
+    def handle(self, conn):
+        """Serve one request: challenge, command, result."""
+        try:
+            challenge = binascii.hexlify(os.urandom(20))
+            send_message(conn, {'challenge': challenge})
+            request = recv_message(conn)
+            if not _constant_time_compare(request.get('digest', ''),
+                                          sign(self.authkey, challenge)):
+                send_message(conn, {'error': 'Authentication failed'})
+                return
+            userargs = [arg.encode('utf-8') for arg in request['cmd']]
+            stdin = request.get('stdin')
+            if stdin is not None:
+                stdin = base64.b64decode(stdin)
+            (returncode, stdout, stderr) = self.run_command(userargs, stdin)
+            send_message(conn, {'returncode': returncode,
+                                'stdout': base64.b64encode(stdout),
+                                'stderr': base64.b64encode(stderr)})
+        except Exception as exc:
+            logging.exception("Failed to serve request: %s" % exc)
+        finally:
+            conn.close()
+
+    def serve(self, listener):
+        """Serve requests until the listening socket is shut down."""
+        while True:
+            try:
+                (conn, _address) = listener.accept()
+            except socket.error as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                break
+            thread = threading.Thread(target=self.handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+
+def _wait_for_parent(listener):
+    # The service holds our stdin open for as long as it runs.
+    sys.stdin.read()
+    listener.shutdown(socket.SHUT_RDWR)
+
+
+def daemon_start(config, filters):
+    """Listen for commands until stdin is closed."""
+    uid = int(os.environ.get('SUDO_UID', os.getuid()))
+    gid = int(os.environ.get('SUDO_GID', os.getgid()))
+    temp_dir = tempfile.mkdtemp(prefix='rootwrap-')
+    try:
+        os.chown(temp_dir, uid, gid)
+        address = os.path.join(temp_dir, 'rootwrap.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(address)
+        os.chown(address, uid, gid)
+        listener.listen(32)
+
+        authkey = binascii.hexlify(os.urandom(32))
+        server = RootwrapServer(config, filters, authkey)
+
+        watcher = threading.Thread(target=_wait_for_parent, args=(listener,))
+        watcher.daemon = True
+        watcher.start()
+
+        sys.stdout.write('%s\n%s\n' % (address, authkey))
+        sys.stdout.flush()
+        server.serve(listener)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    execname = sys.argv.pop(0)
+    if len(sys.argv) != 1:
+        cmd._exit_error(execname, "No configuration file specified",
+                        cmd.RC_BADCONFIG, log=False)
+    configfile = sys.argv[0]
+
+    # Load configuration
+    try:
+        rawconfig = ConfigParser.RawConfigParser()
+        rawconfig.read(configfile)
+        config = wrapper.RootwrapConfig(rawconfig)
+    except ValueError as exc:
+        msg = "Incorrect value in %s: %s" % (configfile, exc.message)
+        cmd._exit_error(execname, msg, cmd.RC_BADCONFIG, log=False)
+    except ConfigParser.Error:
+        cmd._exit_error(execname,
+                        "Incorrect configuration file: %s" % configfile,
+                        cmd.RC_BADCONFIG, log=False)
+
+    if config.use_syslog:
+        wrapper.setup_syslog(execname,
+                             config.syslog_log_facility,
+                             config.syslog_log_level)
+
+    # Filters are only loaded once, for the lifetime of the daemon
+    filters = wrapper.load_filters(config.filters_path)
+    daemon_start(config, filters)
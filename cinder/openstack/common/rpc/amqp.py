@@ -28,6 +28,7 @@ AMQP, but is deprecated and predates this code.
 import collections
 import inspect
 import sys
+import time
 import uuid
 
 from eventlet import greenpool
@@ -288,7 +289,9 @@ def unpack_context(conf, msg):
     context_dict['reply_q'] = msg.pop('_reply_q', None)
     context_dict['conf'] = conf
     ctx = RpcContext.from_dict(context_dict)
-    rpc_common._safe_log(LOG.debug, _('unpacked context: %s'), ctx.to_dict())
+    if rpc_common._log_enabled(LOG.debug):
+        rpc_common._safe_log(LOG.debug, _('unpacked context: %s'),
+                             ctx.to_dict())
     return ctx
 
 
@@ -375,6 +378,106 @@ class CallbackWrapper(_ThreadPoolWithWait):
         self.pool.spawn_n(self.callback, message_data)
 
 
+class DispatchLanes(object):
+    """Prioritized dispatch of incoming calls with per-method limits.
+
+    Every method is routed to a lane.  Whenever a worker is free, the
+    lanes are served in priority order, and within a lane the oldest call
+    whose method is below its concurrency limit runs first, so a burst of
+    long calls of one method neither starves the other lanes nor the calls
+    queued behind it.  The calls run on a private pool of ``pool_size``
+    green threads shared by every consumer of the proxy.
+    """
+
+    def __init__(self, pool_size, lanes, default_lane, method_lanes=None,
+                 method_limits=None):
+        """
+        :param pool_size: maximum number of calls running at once
+        :param lanes: lane names, highest priority first
+        :param default_lane: lane of the methods not in method_lanes
+        :param method_lanes: dict of method name to lane name
+        :param method_limits: dict of method name to the maximum number of
+                              calls of that method running at once
+        """
+        self.pool = greenpool.GreenPool(pool_size)
+        self.pool_size = pool_size
+        self.lanes = list(lanes)
+        self.default_lane = default_lane
+        self.method_lanes = method_lanes or {}
+        self.method_limits = method_limits or {}
+        self._queues = dict((lane, collections.deque()) for lane in self.lanes)
+        self._running = collections.defaultdict(int)
+        self._workers = 0
+        self._stats = dict((lane, {'running': 0,
+                                   'dispatched': 0,
+                                   'wait_total': 0.0,
+                                   'wait_max': 0.0})
+                           for lane in self.lanes)
+
+    def spawn(self, method, func, *args):
+        """Queue func(*args) in the lane of method and run it when due."""
+        lane = self.method_lanes.get(method, self.default_lane)
+        self._queues[lane].append((method, func, args, time.time()))
+        if self._workers < self.pool_size:
+            self._workers += 1
+            self.pool.spawn_n(self._worker)
+
+    def wait(self):
+        """Wait for all queued and running calls to finish."""
+        self.pool.waitall()
+
+    def get_stats(self):
+        """Return the queue depth, running calls and wait times per lane."""
+        stats = {}
+        for lane in self.lanes:
+            lane_stats = self._stats[lane]
+            dispatched = lane_stats['dispatched']
+            stats[lane] = {
+                'queued': len(self._queues[lane]),
+                'running': lane_stats['running'],
+                'dispatched': dispatched,
+                'wait_avg': (lane_stats['wait_total'] / dispatched
+                             if dispatched else 0.0),
+                'wait_max': lane_stats['wait_max'],
+            }
+        return stats
+
+    def _next(self):
+        for lane in self.lanes:
+            queue = self._queues[lane]
+            for index, item in enumerate(queue):
+                limit = self.method_limits.get(item[0])
+                if limit is None or self._running[item[0]] < limit:
+                    del queue[index]
+                    return lane, item
+        return None, None
+
+    def _worker(self):
+        # A worker keeps taking the next due call until nothing can run,
+        # which also picks up the calls held back by a method limit as
+        # soon as a call of that method finishes.
+        try:
+            while True:
+                lane, item = self._next()
+                if item is None:
+                    return
+                method, func, args, queued_at = item
+                wait = time.time() - queued_at
+                lane_stats = self._stats[lane]
+                lane_stats['dispatched'] += 1
+                lane_stats['wait_total'] += wait
+                lane_stats['wait_max'] = max(lane_stats['wait_max'], wait)
+                lane_stats['running'] += 1
+                self._running[method] += 1
+                try:
+                    func(*args)
+                finally:
+                    self._running[method] -= 1
+                    lane_stats['running'] -= 1
+        finally:
+            self._workers -= 1
+
+
 class ProxyCallback(_ThreadPoolWithWait):
     """Calls methods on a proxy object based on method and args."""
 
@@ -385,6 +488,15 @@ class ProxyCallback(_ThreadPoolWithWait):
         )
         self.proxy = proxy
         self.msg_id_cache = _MsgIdCache()
+        # Proxies may bring their own DispatchLanes to prioritize and
+        # limit the methods they serve.
+        self.lanes = getattr(proxy, 'lanes', None)
+
+    def wait(self):
+        """Wait for all callback threads to exit."""
+        super(ProxyCallback, self).wait()
+        if self.lanes is not None:
+            self.lanes.wait()
 
     def __call__(self, message_data):
         """Consumer callback to call a method on a proxy object.
@@ -415,8 +527,12 @@ class ProxyCallback(_ThreadPoolWithWait):
             ctxt.reply(_('No method for message: %s') % message_data,
                        connection_pool=self.connection_pool)
             return
-        self.pool.spawn_n(self._process_data, ctxt, version, method,
-                          namespace, args)
+        if self.lanes is not None:
+            self.lanes.spawn(method, self._process_data, ctxt, version,
+                             method, namespace, args)
+        else:
+            self.pool.spawn_n(self._process_data, ctxt, version, method,
+                              namespace, args)
 
     def _process_data(self, ctxt, version, method, namespace, args):
         """Process a message in a new thread.
@@ -18,6 +18,7 @@
 #    under the License.
 
 import copy
+import logging as std_logging
 import sys
 import traceback
 
@@ -251,8 +252,20 @@ class Connection(object):
         raise NotImplementedError()
 
 
+def _log_enabled(log_func):
+    """Tell whether a logger method such as LOG.debug would log anything."""
+    logger = getattr(log_func, 'im_self', None)
+    level = getattr(std_logging, getattr(log_func, '__name__', '').upper(),
+                    None)
+    if logger is None or not isinstance(level, int):
+        return True
+    return logger.isEnabledFor(level)
+
+
 def _safe_log(log_func, msg, msg_data):
     """Sanitizes the msg_data field before logging."""
+    if not _log_enabled(log_func):
+        return
     SANITIZE = {'set_admin_password': [('args', 'new_pass')],
                 'run_instance': [('args', 'admin_password')],
                 'route_message': [('args', 'message', 'args', 'method_info',
@@ -267,13 +280,15 @@ def _safe_log(log_func, msg, msg_data):
     if not any([has_method, has_context_token, has_token]):
         return log_func(msg, msg_data)
 
-    msg_data = copy.deepcopy(msg_data)
+    # Only the dicts on the way to a sanitized value are copied.
+    msg_data = copy.copy(msg_data)
 
     if has_method:
         for arg in SANITIZE.get(msg_data['method'], []):
             try:
                 d = msg_data
                 for elem in arg[:-1]:
+                    d[elem] = copy.copy(d[elem])
                     d = d[elem]
                 d[arg[-1]] = '<SANITIZED>'
             except KeyError, e:
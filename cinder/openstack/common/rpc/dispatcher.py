@@ -93,14 +93,17 @@ class RpcDispatcher(object):
     contains a list of underlying managers that have an API_VERSION attribute.
     """
 
-    def __init__(self, callbacks):
+    def __init__(self, callbacks, lanes=None):
         """Initialize the rpc dispatcher.
 
         :param callbacks: List of proxy objects that are an instance
                           of a class with rpc methods exposed.  Each proxy
                           object should have an RPC_API_VERSION attribute.
+        :param lanes: Optional amqp.DispatchLanes used by the consumers to
+                      prioritize and limit the dispatched methods.
         """
         self.callbacks = callbacks
+        self.lanes = lanes
         super(RpcDispatcher, self).__init__()
 
     def dispatch(self, ctxt, version, method, namespace, **kwargs):
@@ -70,11 +70,16 @@ class Scheduler(object):
         """
         return self.host_manager.get_service_capabilities()
 
-    def update_service_capabilities(self, service_name, host, capabilities):
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    generation=None, full_sync=True,
+                                    removed=None):
         """Process a capability update from a service node."""
         self.host_manager.update_service_capabilities(service_name,
                                                       host,
-                                                      capabilities)
+                                                      capabilities,
+                                                      generation=generation,
+                                                      full_sync=full_sync,
+                                                      removed=removed)
 
     def hosts_up(self, context, topic):
         """Return the list of hosts that have a running service for topic."""
@@ -47,6 +47,9 @@ class CapacityFilter(filters.BaseHostFilter):
             return True
         reserved = float(host_state.reserved_percentage) / 100
         free = math.floor(free_space * (1 - reserved))
+        if (host_state.thin_provisioning_support and
+                host_state.max_over_subscription_ratio >= 1):
+            return self._thin_host_passes(host_state, volume_size, free)
         if free < volume_size:
             LOG.warning(_("Insufficient free space for volume creation "
                         "(requested / avail): "
@@ -55,3 +58,36 @@ class CapacityFilter(filters.BaseHostFilter):
                            'available': free})
 
         return free >= volume_size
+
+    def _thin_host_passes(self, host_state, volume_size, free):
+        """Return True if a thin provisioned host can take the volume
+        without going over its over-subscription ratio.
+        """
+        ratio = host_state.max_over_subscription_ratio
+        total = host_state.total_capacity_gb
+        if total == 'infinite' or total == 'unknown' or not total:
+            return True
+        provisioned = host_state.provisioned_capacity_gb + volume_size
+        if provisioned > total * ratio:
+            LOG.warning(_("Insufficient capacity for volume creation, "
+                          "provisioned capacity would be %(provisioned)s "
+                          "over the %(total)s total capacity, more than "
+                          "the max over-subscription ratio %(ratio)s") %
+                        {'provisioned': provisioned,
+                         'total': total,
+                         'ratio': ratio})
+            return False
+        # The volume only takes space on the back-end once written to,
+        # the free space is shared by the volumes provisioned. A volume
+        # needing more than its share of the free space at the ratio
+        # would fill the pool.
+        if free <= 0 or free * ratio < volume_size:
+            LOG.warning(_("Insufficient free space for thin provisioned "
+                          "volume creation (requested / avail): "
+                          "%(requested)s/%(available)s at the max "
+                          "over-subscription ratio %(ratio)s") %
+                        {'requested': volume_size,
+                         'available': free,
+                         'ratio': ratio})
+            return False
+        return True
@@ -21,6 +21,7 @@ import UserDict
 
 from oslo.config import cfg
 
+from cinder import context as cinder_context
 from cinder import db
 from cinder import exception
 from cinder.openstack.common import log as logging
@@ -28,6 +29,7 @@ from cinder.openstack.common.scheduler import filters
 from cinder.openstack.common.scheduler import weights
 from cinder.openstack.common import timeutils
 from cinder import utils
+from cinder.volume import rpcapi as volume_rpcapi
 
 
 host_manager_opts = [
@@ -101,6 +103,12 @@ class HostState(object):
         self.total_capacity_gb = 0
         self.free_capacity_gb = None
         self.reserved_percentage = 0
+        # Thin provisioned back-ends also report the capacity provisioned
+        # to volumes, which can go over the total capacity up to the
+        # over-subscription ratio.
+        self.provisioned_capacity_gb = 0
+        self.thin_provisioning_support = False
+        self.max_over_subscription_ratio = 1.0
 
         self.updated = None
 
@@ -129,6 +137,12 @@ class HostState(object):
             self.total_capacity_gb = capability['total_capacity_gb']
             self.free_capacity_gb = capability['free_capacity_gb']
             self.reserved_percentage = capability['reserved_percentage']
+            self.provisioned_capacity_gb = capability.get(
+                'provisioned_capacity_gb', 0)
+            self.thin_provisioning_support = capability.get(
+                'thin_provisioning_support', False)
+            self.max_over_subscription_ratio = capability.get(
+                'max_over_subscription_ratio', 1.0)
 
             self.updated = capability['timestamp']
 
@@ -143,6 +157,7 @@ class HostState(object):
             pass
         else:
             self.free_capacity_gb -= volume_gb
+        self.provisioned_capacity_gb += volume_gb
         self.updated = timeutils.utcnow()
 
     def __repr__(self):
@@ -157,6 +172,10 @@ class HostManager(object):
 
     def __init__(self):
         self.service_states = {}  # { <host>: {<service>: {cap k : v}}}
+        self.service_generations = {}  # { <host>: <capabilities generation>}
+        self.resync_requested = set()  # hosts asked for a full update
+        self.backup_states = {}  # { <host>: {backup load k : v}}
+        self.backup_generations = {}  # { <host>: <capabilities generation>}
         self.host_state_map = {}
         self.filter_handler = filters.HostFilterHandler('cinder.scheduler.'
                                                         'filters')
@@ -234,8 +253,18 @@ class HostManager(object):
                                                        hosts,
                                                        weight_properties)
 
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Update the per-service capabilities based on this notification."""
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    generation=None, full_sync=True,
+                                    removed=None):
+        """Update the per-service capabilities based on this notification.
+
+        A full update replaces the capabilities known for the host, a
+        delta (full_sync=False) is applied in place on top of them.
+        """
+        if service_name == 'backup':
+            self._update_backup_state(host, capabilities, generation,
+                                      full_sync, removed)
+            return
         if service_name != 'volume':
             LOG.debug(_('Ignoring %(service_name)s service update '
                         'from %(host)s'),
@@ -246,10 +275,83 @@ class HostManager(object):
                     "%(host)s.") %
                   {'service_name': service_name, 'host': host})
 
-        # Copy the capabilities, so we don't modify the original dict
-        capab_copy = dict(capabilities)
-        capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
-        self.service_states[host] = capab_copy
+        if full_sync:
+            # Copy the capabilities, so we don't modify the original dict
+            capab_copy = dict(capabilities)
+            capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
+            self.service_states[host] = capab_copy
+            self.service_generations[host] = generation
+            self.resync_requested.discard(host)
+            return
+
+        last_generation = self.service_generations.get(host)
+        if host not in self.service_states or last_generation is None:
+            LOG.debug(_('Ignoring capabilities delta from %s until a full '
+                        'update is received'), host)
+            self._request_resync(host)
+            return
+        if generation <= last_generation:
+            LOG.debug(_('Ignoring stale capabilities delta %(generation)s '
+                        'from %(host)s'),
+                      {'generation': generation, 'host': host})
+            return
+        if generation != last_generation + 1:
+            # The delta applies on top of one that was lost, the known
+            # capabilities stay as they are until a full update arrives.
+            LOG.warning(_('Missed capabilities deltas from %(host)s between '
+                          'generations %(last)s and %(generation)s'),
+                        {'host': host, 'last': last_generation,
+                         'generation': generation})
+            self.service_generations[host] = None
+            self._request_resync(host)
+            return
+
+        capab = self.service_states[host]
+        capab.update(capabilities)
+        for key in removed or []:
+            capab.pop(key, None)
+        capab["timestamp"] = timeutils.utcnow()  # Reported time
+        self.service_generations[host] = generation
+
+    def _update_backup_state(self, host, capabilities, generation,
+                             full_sync, removed):
+        """Record the load of the backup jobs reported by a backup host.
+
+        Backups are not scheduled, this only keeps the running and queued
+        jobs of each backup host in backup_states. A host whose deltas
+        were lost is left out until its next full update.
+        """
+        LOG.debug(_("Received backup service update from %s."), host)
+        if full_sync:
+            capab_copy = dict(capabilities)
+            capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
+            self.backup_states[host] = capab_copy
+            self.backup_generations[host] = generation
+            return
+
+        last_generation = self.backup_generations.get(host)
+        if last_generation is not None and generation <= last_generation:
+            return
+        if (host not in self.backup_states or last_generation is None or
+                generation != last_generation + 1):
+            self.backup_states.pop(host, None)
+            self.backup_generations.pop(host, None)
+            return
+
+        capab = self.backup_states[host]
+        capab.update(capabilities)
+        for key in removed or []:
+            capab.pop(key, None)
+        capab["timestamp"] = timeutils.utcnow()  # Reported time
+        self.backup_generations[host] = generation
+
+    def _request_resync(self, host):
+        """Ask a volume host for a full update of its capabilities."""
+        if host in self.resync_requested:
+            return
+        self.resync_requested.add(host)
+        volume_rpcapi.VolumeAPI().publish_service_capabilities(
+            cinder_context.get_admin_context(), host=host)
 
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager
@@ -48,7 +48,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.2'
+    RPC_API_VERSION = '1.4'
 
     def __init__(self, scheduler_driver=None, service_name=None,
                  *args, **kwargs):
@@ -70,35 +70,29 @@ class SchedulerManager(manager.Manager):
         return self.driver.get_service_capabilities()
 
     def update_service_capabilities(self, context, service_name=None,
-                                    host=None, capabilities=None, **kwargs):
+                                    host=None, capabilities=None,
+                                    generation=None, full_sync=True,
+                                    removed=None, **kwargs):
         """Process a capability update from a service node."""
         if capabilities is None:
             capabilities = {}
         self.driver.update_service_capabilities(service_name,
                                                 host,
-                                                capabilities)
+                                                capabilities,
+                                                generation=generation,
+                                                full_sync=full_sync,
+                                                removed=removed)
 
     def create_volume(self, context, topic, volume_id, snapshot_id=None,
                       image_id=None, request_spec=None,
                       filter_properties=None):
         try:
             if request_spec is None:
-                # For RPC version < 1.2 backward compatibility
-                request_spec = {}
-                volume_ref = db.volume_get(context, volume_id)
-                size = volume_ref.get('size')
-                availability_zone = volume_ref.get('availability_zone')
-                volume_type_id = volume_ref.get('volume_type_id')
-                vol_type = db.volume_type_get(context, volume_type_id)
-                volume_properties = {'size': size,
-                                     'availability_zone': availability_zone,
-                                     'volume_type_id': volume_type_id}
-                request_spec.update(
-                    {'volume_id': volume_id,
-                     'snapshot_id': snapshot_id,
-                     'image_id': image_id,
-                     'volume_properties': volume_properties,
-                     'volume_type': dict(vol_type).iteritems()})
+                # For RPC version < 1.2 backward compatibility, and for
+                # the slim messages of version 1.4.
+                request_spec = self._build_request_spec(context, volume_id,
+                                                        snapshot_id,
+                                                        image_id)
 
             self.driver.schedule_create_volume(context, request_spec,
                                                filter_properties)
@@ -114,6 +108,37 @@ class SchedulerManager(manager.Manager):
                                                   volume_state,
                                                   context, ex, request_spec)
 
+    def _build_request_spec(self, context, volume_id, snapshot_id,
+                            image_id):
+        """Read the request_spec of a create_volume from the database."""
+        volume_ref = db.volume_get(context, volume_id)
+        volume_type = None
+        if volume_ref['volume_type_id']:
+            volume_type = db.volume_type_get(context,
+                                             volume_ref['volume_type_id'])
+        metadata = dict((item['key'], item['value'])
+                        for item in volume_ref['volume_metadata'])
+        volume_properties = {'size': volume_ref['size'],
+                             'user_id': volume_ref['user_id'],
+                             'project_id': volume_ref['project_id'],
+                             'snapshot_id': volume_ref['snapshot_id'],
+                             'availability_zone':
+                             volume_ref['availability_zone'],
+                             'status': volume_ref['status'],
+                             'attach_status': volume_ref['attach_status'],
+                             'display_name': volume_ref['display_name'],
+                             'display_description':
+                             volume_ref['display_description'],
+                             'volume_type_id': volume_ref['volume_type_id'],
+                             'metadata': metadata,
+                             'source_volid': volume_ref['source_volid']}
+        return {'volume_properties': volume_properties,
+                'volume_type': volume_type,
+                'volume_id': volume_id,
+                'snapshot_id': snapshot_id,
+                'image_id': image_id,
+                'source_volid': volume_ref['source_volid']}
+
     def _set_volume_state_and_notify(self, method, updates, context, ex,
                                      request_spec):
         LOG.error(_("Failed to schedule_%(method)s: %(ex)s") %
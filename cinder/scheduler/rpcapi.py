@@ -36,6 +36,10 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
         1.1 - Add create_volume() method
         1.2 - Add request_spec, filter_properties arguments
               to create_volume()
+        1.3 - Add generation, full_sync and removed arguments to
+              update_service_capabilities()
+        1.4 - create_volume() can be sent without request_spec, which the
+              scheduler then reads from the database
     '''
 
     RPC_API_VERSION = '1.0'
@@ -48,7 +52,12 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
     def create_volume(self, ctxt, topic, volume_id, snapshot_id=None,
                       image_id=None, request_spec=None,
                       filter_properties=None):
-        request_spec_p = jsonutils.to_primitive(request_spec)
+        if CONF.slim_rpc_payloads:
+            request_spec_p = None
+            version = '1.4'
+        else:
+            request_spec_p = jsonutils.to_primitive(request_spec)
+            version = '1.2'
         return self.cast(ctxt, self.make_msg(
             'create_volume',
             topic=topic,
@@ -57,11 +66,16 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
             image_id=image_id,
             request_spec=request_spec_p,
             filter_properties=filter_properties),
-            version='1.2')
+            version=version)
 
     def update_service_capabilities(self, ctxt,
                                     service_name, host,
-                                    capabilities):
+                                    capabilities, generation=None,
+                                    full_sync=True, removed=None):
         self.fanout_cast(ctxt, self.make_msg('update_service_capabilities',
                          service_name=service_name, host=host,
-                         capabilities=capabilities))
+                         capabilities=capabilities,
+                         generation=generation,
+                         full_sync=full_sync,
+                         removed=removed),
+                         version='1.3')
@@ -52,6 +52,14 @@ class CapacityWeigher(weights.BaseHostWeigher):
             #(zhiteng) 'infinite' and 'unknown' are treated the same
             # here, for sorting purpose.
             free = float('inf')
+        elif (host_state.thin_provisioning_support and
+                host_state.max_over_subscription_ratio >= 1):
+            # Thin provisioned hosts are weighed by the capacity they can
+            # still provision.
+            total = host_state.total_capacity_gb
+            free = math.floor(total * host_state.max_over_subscription_ratio
+                              - host_state.provisioned_capacity_gb
+                              - total * reserved)
         else:
             free = math.floor(host_state.free_capacity_gb * (1 - reserved))
         return free
@@ -49,6 +49,11 @@ service_opts = [
     cfg.IntOpt('report_interval',
                default=10,
                help='seconds between nodes reporting state to datastore'),
+    cfg.BoolOpt('report_state_batched',
+                default=False,
+                help='Report the state of all services running in the same '
+                     'process with a single database update every '
+                     'report_interval'),
     cfg.IntOpt('periodic_interval',
                default=60,
                help='seconds between running periodic tasks'),
@@ -364,6 +369,10 @@ class Service(object):
                                                  self.host,
                                                  self.binary)
             self.service_id = service_ref['id']
+            zone = CONF.storage_availability_zone
+            if zone != service_ref['availability_zone']:
+                db.service_update(ctxt, self.service_id,
+                                  {'availability_zone': zone})
         except exception.NotFound:
             self._create_service_ref(ctxt)
 
@@ -385,10 +394,13 @@ class Service(object):
         self.conn.consume_in_thread()
 
         if self.report_interval:
-            pulse = utils.LoopingCall(self.report_state)
-            pulse.start(interval=self.report_interval,
-                        initial_delay=self.report_interval)
-            self.timers.append(pulse)
+            if CONF.report_state_batched:
+                _get_batched_reporter(self.report_interval).add(self)
+            else:
+                pulse = utils.LoopingCall(self.report_state)
+                pulse.start(interval=self.report_interval,
+                            initial_delay=self.report_interval)
+                self.timers.append(pulse)
 
         if self.periodic_interval:
             if self.periodic_fuzzy_delay:
@@ -468,6 +480,9 @@ class Service(object):
             self.conn.close()
         except Exception:
             pass
+        reporter = _batched_reporters.get(self.report_interval)
+        if reporter:
+            reporter.remove(self)
         for x in self.timers:
             try:
                 x.stop()
@@ -490,34 +505,83 @@ class Service(object):
     def report_state(self):
         """Update the state of this service in the datastore."""
         ctxt = context.get_admin_context()
-        zone = CONF.storage_availability_zone
-        state_catalog = {}
         try:
-            try:
-                service_ref = db.service_get(ctxt, self.service_id)
-            except exception.NotFound:
+            if not db.service_heartbeat(ctxt, [self.service_id]):
                 LOG.debug(_('The service database object disappeared, '
                             'Recreating it.'))
                 self._create_service_ref(ctxt)
-                service_ref = db.service_get(ctxt, self.service_id)
+            self._state_reported()
+
+        # TODO(vish): this should probably only catch connection errors
+        except Exception:  # pylint: disable=W0702
+            self._state_report_failed()
+
+    def _state_reported(self):
+        # TODO(termie): make this pattern be more elegant.
+        if getattr(self, 'model_disconnected', False):
+            self.model_disconnected = False
+            LOG.error(_('Recovered model server connection!'))
+
+    def _state_report_failed(self):
+        if not getattr(self, 'model_disconnected', False):
+            self.model_disconnected = True
+            LOG.exception(_('model server went away'))
 
-            state_catalog['report_count'] = service_ref['report_count'] + 1
-            if zone != service_ref['availability_zone']:
-                state_catalog['availability_zone'] = zone
 
-            db.service_update(ctxt,
-                              self.service_id, state_catalog)
+class BatchedStateReporter(object):
+    """Reports the state of several services with one database update."""
 
-            # TODO(termie): make this pattern be more elegant.
-            if getattr(self, 'model_disconnected', False):
-                self.model_disconnected = False
-                LOG.error(_('Recovered model server connection!'))
+    def __init__(self, report_interval):
+        self.report_interval = report_interval
+        self.services = []
+        self.timer = None
+
+    def add(self, service):
+        self.services.append(service)
+        if self.timer is None:
+            self.timer = utils.LoopingCall(self.report_state)
+            self.timer.start(interval=self.report_interval,
+                             initial_delay=self.report_interval)
+
+    def remove(self, service):
+        if service in self.services:
+            self.services.remove(service)
+        if not self.services and self.timer is not None:
+            self.timer.stop()
+            self.timer = None
 
+    def report_state(self):
+        """Update the state of all services in the datastore."""
+        ctxt = context.get_admin_context()
+        services = list(self.services)
+        try:
+            updated = db.service_heartbeat(
+                ctxt, [service.service_id for service in services])
         # TODO(vish): this should probably only catch connection errors
         except Exception:  # pylint: disable=W0702
-            if not getattr(self, 'model_disconnected', False):
-                self.model_disconnected = True
-                LOG.exception(_('model server went away'))
+            for service in services:
+                service._state_report_failed()
+            return
+
+        if updated == len(services):
+            for service in services:
+                service._state_reported()
+        else:
+            # Some database objects disappeared, let each service find out
+            # whether it has to recreate its own.
+            for service in services:
+                service.report_state()
+
+
+_batched_reporters = {}
+
+
+def _get_batched_reporter(report_interval):
+    reporter = _batched_reporters.get(report_interval)
+    if reporter is None:
+        reporter = BatchedStateReporter(report_interval)
+        _batched_reporters[report_interval] = reporter
+    return reporter
 
 
 class WSGIService(object):
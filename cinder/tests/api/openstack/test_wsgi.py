@@ -5,6 +5,7 @@ import webob
 
 from cinder.api.openstack import wsgi
 from cinder import exception
+from cinder.openstack.common import jsonutils
 from cinder import test
 from cinder.tests.api import fakes
 
@@ -120,6 +121,64 @@ class JSONDictSerializerTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_json_stream(self):
+        items = [dict(id=i, name='server-%d' % i) for i in range(10)]
+        serializer = wsgi.JSONDictSerializer()
+        serializer.chunk_size = 50
+        for servers in (items, []):
+            input_dict = dict(servers=wsgi.StreamingList(servers, dict),
+                              servers_links=[dict(rel='next')])
+            expected_json = jsonutils.dumps(dict(
+                servers=servers, servers_links=[dict(rel='next')]))
+            chunks = list(serializer.serialize_iter(input_dict))
+            self.assertEqual(''.join(chunks), expected_json)
+        self.assertTrue(len(chunks) == 1)
+
+        chunks = list(serializer.serialize_iter(
+            dict(servers=wsgi.StreamingList(items, dict))))
+        self.assertTrue(len(chunks) > 1)
+
+
+class StreamingListTest(test.TestCase):
+    def setUp(self):
+        super(StreamingListTest, self).setUp()
+        self.made = []
+
+    def _view(self, item):
+        self.made.append(item)
+        return dict(id=item)
+
+    def test_stream(self):
+        views = wsgi.StreamingList([1, 2, 3], self._view)
+        views.each(lambda view: view.update(name='name-%d' % view['id']))
+        self.assertEqual(len(views), 3)
+        self.assertEqual(self.made, [])
+
+        self.assertEqual(list(views.stream()),
+                         [dict(id=1, name='name-1'),
+                          dict(id=2, name='name-2'),
+                          dict(id=3, name='name-3')])
+        self.assertEqual(self.made, [1, 2, 3])
+
+    def test_as_list(self):
+        views = wsgi.StreamingList([1, 2, 3], self._view)
+        for view in views:
+            view['name'] = 'name-%d' % view['id']
+        views.each(lambda view: view.update(size=1))
+
+        # Views are made once and changes made to them are kept
+        self.assertEqual(views[0], dict(id=1, name='name-1', size=1))
+        self.assertEqual(views.pop(), dict(id=3, name='name-3', size=1))
+        self.assertEqual(list(views.stream()),
+                         [dict(id=1, name='name-1', size=1),
+                          dict(id=2, name='name-2', size=1)])
+        self.assertEqual(self.made, [1, 2, 3])
+
+    def test_each_item(self):
+        views = [dict(id=1), dict(id=2)]
+        wsgi.each_item(views, lambda view: view.update(size=1))
+        self.assertEqual(views, [dict(id=1, size=1), dict(id=2, size=1)])
+
 
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
@@ -828,6 +887,57 @@ class ResponseObjectTest(test.TestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_streaming_list(self):
+        class XMLSerializer(object):
+            def serialize(self, obj):
+                return repr(obj)
+
+        def make_obj():
+            return dict(servers=wsgi.StreamingList([1, 2], str))
+
+        robj = wsgi.ResponseObject(make_obj(),
+                                   json=wsgi.JSONDictSerializer,
+                                   xml=XMLSerializer)
+        request = wsgi.Request.blank('/tests')
+        response = robj.serialize(request, 'application/json')
+        self.assertFalse(isinstance(response.app_iter, list))
+        self.assertEqual(response.body, '{"servers": ["1", "2"]}')
+
+        # Other serializers get the list of the views
+        robj.obj = make_obj()
+        response = robj.serialize(request, 'application/xml')
+        self.assertEqual(response.body, "{'servers': ['1', '2']}")
+
+    def test_serialize_streaming_list_error(self):
+        def view(item):
+            if item == 'bad':
+                raise exception.NotFound()
+            return item
+
+        errors = []
+        self.stubs.Set(wsgi.LOG, 'exception',
+                       lambda msg, *args: errors.append(msg))
+        self.stubs.Set(wsgi.JSONDictSerializer, 'chunk_size', 1)
+        request = wsgi.Request.blank('/tests')
+
+        # An error in the first views is raised before anything is sent
+        robj = wsgi.ResponseObject(
+            dict(servers=wsgi.StreamingList(['bad', 'a'], view)),
+            json=wsgi.JSONDictSerializer)
+        self.assertRaises(exception.NotFound, robj.serialize, request,
+                          'application/json')
+
+        # A later one aborts the body instead of ending it
+        robj = wsgi.ResponseObject(
+            dict(servers=wsgi.StreamingList(['a', 'b', 'bad'], view)),
+            json=wsgi.JSONDictSerializer)
+        response = robj.serialize(request, 'application/json')
+        self.assertEqual(response.status_int, 200)
+        chunks = iter(response.app_iter)
+        self.assertEqual(chunks.next(), '{"servers": ["a"')
+        self.assertRaises(exception.NotFound, list, chunks)
+        self.assertEqual(len(errors), 1)
+
 
 class ValidBodyTest(test.TestCase):
 
@@ -627,6 +627,79 @@ class TemplateTest(test.TestCase):
                          str(obj['test']['image']['id']))
         self.assertEqual(result[idx].text, obj['test']['image']['name'])
 
+    def _attached_master(self):
+        root = xmlutil.TemplateElement('test', selector='test',
+                                       name='name', size='size')
+        value = xmlutil.SubTemplateElement(root, 'value', selector='values')
+        value.text = xmlutil.Selector()
+        attrs = xmlutil.SubTemplateElement(root, 'attrs', selector='attrs')
+        xmlutil.SubTemplateElement(attrs, 'attr', selector=xmlutil.get_items,
+                                   key=0, value=1)
+        master = xmlutil.MasterTemplate(root, 1, nsmap=dict(f='foo'))
+
+        root_slave = xmlutil.TemplateElement('test', selector='test',
+                                             owner='owner')
+        image = xmlutil.SubTemplateElement(root_slave, 'image',
+                                           selector='image', id='id')
+        image.text = xmlutil.Selector('name')
+        xmlutil.SubTemplateElement(root_slave, 'attrs', selector='attrs',
+                                   count=2)
+        master.attach(xmlutil.SlaveTemplate(root_slave, 1,
+                                            nsmap=dict(b='bar')))
+        return master
+
+    def test_make_tree(self):
+        objs = [{'test': {'name': 'foobar',
+                          'owner': 'admin',
+                          'values': [1, 2, 3, 4],
+                          'attrs': {'a': 1, 'b': 2, 'c': 3, 'd': 4},
+                          'image': {'name': 'image_foobar', 'id': 42}}},
+                {'test': {'name': 'barfoo',
+                          'values': [],
+                          'attrs': [],
+                          'image': None}},
+                {'test': {}}]
+        master = self._attached_master()
+        for obj in objs:
+            expected = master._serialize(None, obj, master._siblings(),
+                                         master._nsmap())
+            self.assertEqual(etree.tostring(master.make_tree(obj)),
+                             etree.tostring(expected))
+
+        # Nothing is rendered when the root element selects nothing
+        self.assertEqual(master.make_tree({}), None)
+
+    def test_make_tree_reuses_plan(self):
+        master = self._attached_master()
+        plan = xmlutil.compile_siblings(master._siblings())
+        self.assertTrue(plan is xmlutil.compile_siblings(master._siblings()))
+
+        # Building other templates leaves the plan alone
+        self._attached_master()
+        self.assertTrue(plan is xmlutil.compile_siblings(master._siblings()))
+
+        # Changing the template compiles it again
+        xmlutil.SubTemplateElement(master.root, 'extra', selector='name')
+        self.assertFalse(plan is
+                         xmlutil.compile_siblings(master._siblings()))
+        result = master.make_tree({'test': {'name': 'foobar'}})
+        self.assertEqual(result.find('extra').tag, 'extra')
+
+    def test_make_tree_render_override(self):
+        class RenderedElement(xmlutil.TemplateElement):
+            def render(self, parent, obj, patches=[], nsmap=None):
+                elems = super(RenderedElement, self).render(parent, obj,
+                                                            patches, nsmap)
+                for elem, datum in elems:
+                    elem.set('rendered', 'yes')
+                return elems
+
+        root = RenderedElement('test', selector='test')
+        master = xmlutil.MasterTemplate(root, 1)
+        self.assertEqual(xmlutil.compile_siblings(master._siblings()), None)
+        result = master.make_tree({'test': {}})
+        self.assertEqual(result.get('rendered'), 'yes')
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
@@ -0,0 +1,105 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from cinder.brick.local_dev import lvm
+
+
+class FakeBrickLVM(lvm.LVM):
+    """Brick LVM object of an in-memory volume group, for unit tests.
+
+    The LVM commands are recorded in commands. The logical volumes they
+    create and remove are kept in disk, which can be shared by several
+    objects to stand for LVM objects of different processes, and the lvs
+    report shows them.
+    """
+
+    def __init__(self, vg_name, size=10.0, disk=None):
+        self.commands = []
+        self.disk = disk if disk is not None else {}
+        self._fake_size = size
+        super(FakeBrickLVM, self).__init__(vg_name,
+                                           executor=self._fake_execute)
+
+    def _fake_execute(self, *cmd, **kwargs):
+        self.commands.append(cmd)
+        if cmd[:2] == ('vgs', '--version'):
+            return ('  LVM version:     2.02.95(2) (2012-03-06)\n', '')
+        if cmd == ('vgs', '--noheadings', '-o', 'name'):
+            return ('  %s\n' % self.vg_name, '')
+        if cmd[0] == 'vgs':
+            return ('  %s:%.2f:%.2f:fake-uuid\n' %
+                    (self.vg_name, self._fake_size, self._fake_free()), '')
+        if cmd[0] == 'lvs':
+            return (''.join('  %s:%.2f:%.2f:fake-uuid:%s:%s:%.2f:%s:%s:%s:%s\n'
+                            % (self.vg_name, self._fake_size,
+                               self._fake_free(), lv['name'],
+                               self._fake_attr(lv), lv['size'],
+                               lv['origin'], lv['pool_lv'],
+                               lv['data_percent'], lv['metadata_percent'])
+                            for lv in self.disk.itervalues()), '')
+        if cmd[0] == 'lvcreate':
+            self._fake_lvcreate(list(cmd[1:]))
+        if cmd[0] == 'lvremove':
+            self.disk.pop(cmd[-1].split('/')[-1], None)
+        return ('', '')
+
+    def _fake_lvcreate(self, args):
+        def pop_option(*names):
+            for name in names:
+                if name in args:
+                    index = args.index(name)
+                    args.pop(index)
+                    return args.pop(index)
+
+        name = pop_option('-n', '--name')
+        origin = pop_option('--snapshot')
+        thin = '-T' in args
+        virtual_size = pop_option('-V')
+        size = pop_option('-L') or virtual_size
+        path = [arg for arg in args if '/' in arg]
+        pool_lv = ''
+        if origin is not None:
+            origin = origin.split('/')[-1]
+            if size is None:
+                pool_lv = self.disk[origin]['pool_lv']
+                size = '%.2fg' % self.disk[origin]['size']
+        elif thin and virtual_size is None:
+            name = path[0].split('/')[-1]
+        elif thin:
+            pool_lv = path[0].split('/')[-1]
+        self.disk[name] = {'name': name,
+                           'pool': thin and virtual_size is None,
+                           'size': self._size_in_g(size),
+                           'origin': origin or '',
+                           'pool_lv': pool_lv,
+                           'data_percent': 0.0,
+                           'metadata_percent': 0.0}
+
+    def _fake_attr(self, lv):
+        if lv.get('pool'):
+            return 'twi-a-tz--'
+        if lv['origin']:
+            return 'swi-a-s---'
+        if any(other['origin'] == lv['name']
+               for other in self.disk.itervalues()):
+            return 'owi-a-----'
+        return '-wi-a-----'
+
+    def _fake_free(self):
+        return self._fake_size - sum(lv['size'] for lv
+                                     in self.disk.itervalues()
+                                     if not lv['pool_lv'])
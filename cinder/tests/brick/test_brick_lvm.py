@@ -72,9 +72,15 @@ class BrickLvmTestCase(test.TestCase):
                     "lWyauW-dKpG-Rz7E-xtKY-jeju-QsYU-SLG7Z2\n"
             data += "  fake-volumes-3:10.00g:10.00g:0:"\
                     "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z3\n"
-        elif 'lvs, --noheadings, -o, vg_name,name,size' in cmd_string:
-            data = "  fake-volumes fake-1 1.00g\n"
-            data += "  fake-volumes fake-2 1.00g\n"
+        elif 'lvs, --noheadings, --nosuffix, --unit=g, --separator, :, '\
+                '-o, vg_name,vg_size,vg_free,vg_uuid,lv_name' in cmd_string:
+            vg = "  fake-volumes:10.00:4.00:"\
+                 "kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1:"
+            data = vg + "fake-1:owi-a-:1.00::::\n"
+            data += vg + "fake-2:-wi-a-:1.00::::\n"
+            data += vg + "fake-snap:swi-a-:1.00:fake-1::0.10:\n"
+            data += vg + "fake-pool:twi-a-tz-:3.00:::25.00:2.50\n"
+            data += vg + "fake-thin:Vwi-a-tz-:2.00::fake-pool:0.00:\n"
         elif 'lvs, --noheadings, -o, vg_name,name,size' in cmd_string:
             data = "  fake-volumes fake-1 1.00g\n"
             data += "  fake-volumes fake-2 1.00g\n"
@@ -130,8 +136,48 @@ class BrickLvmTestCase(test.TestCase):
 
     def test_update_vg_info(self):
         self.stubs.Set(processutils, 'execute', self.fake_execute)
-        self.assertEqual(self.vg.update_volume_group_info()['name'],
-                         'fake-volumes')
+        vg_info = self.vg.update_volume_group_info()
+        self.assertEqual(vg_info['name'], 'fake-volumes')
+        self.assertEqual(vg_info['available'], 4.0)
+        self.assertEqual(vg_info['lv_count'], 5)
+        self.assertEqual(self.vg.vg_available_space, 4.0)
+
+    def test_inventory_updated_in_place(self):
+        commands = []
+
+        def fake_execute(*cmd, **kwargs):
+            commands.append(cmd)
+            return self.fake_execute(*cmd, **kwargs)
+
+        self.stubs.Set(processutils, 'execute', fake_execute)
+        self.vg.update_volume_group_info()
+        del commands[:]
+
+        self.vg.create_volume('fake-3', '2')
+        self.assertEqual(self.vg.get_volume('fake-3')['size'], '2.00g')
+        self.assertEqual(self.vg.vg_available_space, 2.0)
+        self.vg.delete('fake-2')
+        self.assertEqual([lv['name'] for lv in self.vg.get_volumes()],
+                         ['fake-1', 'fake-snap', 'fake-pool', 'fake-thin',
+                          'fake-3'])
+        self.assertEqual(self.vg.vg_available_space, 3.0)
+        self.assertEqual([cmd[0] for cmd in commands],
+                         ['lvcreate', 'lvremove'])
+
+    def test_lv_has_snapshot(self):
+        self.stubs.Set(processutils, 'execute', self.fake_execute)
+        self.assertTrue(self.vg.lv_has_snapshot('fake-1'))
+        self.assertFalse(self.vg.lv_has_snapshot('fake-2'))
+        self.assertFalse(self.vg.lv_has_snapshot('fake-pool'))
+
+    def test_get_thin_pool_info(self):
+        self.stubs.Set(processutils, 'execute', self.fake_execute)
+        pool = self.vg.get_thin_pool_info('fake-pool')
+        self.assertEqual(pool['size'], 3.0)
+        self.assertEqual(pool['free'], 2.25)
+        self.assertEqual(pool['provisioned'], 2.0)
+        self.assertEqual(pool['metadata_percent'], 2.5)
+        self.assertEqual(self.vg.get_thin_pool_info('fake-1'), None)
 
     def test_thin_support(self):
         self.stubs.Set(processutils, 'execute', self.fake_execute)
@@ -94,3 +94,19 @@ class CapacityWeigherTestCase(test.TestCase):
         weighed_host = self._get_weighed_host(hostinfo_list)
         self.assertEqual(weighed_host.weight, 921.0 * 2)
         self.assertEqual(weighed_host.obj.host, 'host1')
+
+    @testtools.skipIf(not test_utils.is_cinder_installed(),
+                      'Test requires Cinder installed')
+    def test_thin_provisioned_host(self):
+        hostinfo_list = self._get_all_hosts()
+        # host3: total_capacity_gb=512, provisioned_capacity_gb=4096,
+        # free=512*10-4096
+        host3 = [host for host in hostinfo_list if host.host == 'host3'][0]
+        host3.thin_provisioning_support = True
+        host3.max_over_subscription_ratio = 10.0
+        host3.provisioned_capacity_gb = 4096
+
+        # so, host3 should win:
+        weighed_host = self._get_weighed_host(hostinfo_list)
+        self.assertEqual(weighed_host.weight, 1024.0)
+        self.assertEqual(weighed_host.obj.host, 'host3')
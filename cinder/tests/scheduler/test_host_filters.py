@@ -131,6 +131,76 @@ class HostFiltersTestCase(test.TestCase):
                                     'service': service})
         self.assertTrue(filt_cls.host_passes(host, filter_properties))
 
+    @testtools.skipIf(not test_utils.is_cinder_installed(),
+                      'Test requires Cinder installed')
+    def test_capacity_filter_passes_thin_over_subscribed(self):
+        self._stub_service_is_up(True)
+        filt_cls = self.class_map['CapacityFilter']()
+        filter_properties = {'size': 100}
+        service = {'disabled': False}
+        host = fakes.FakeHostState('host1',
+                                   {'total_capacity_gb': 100,
+                                    'free_capacity_gb': 50,
+                                    'provisioned_capacity_gb': 1000,
+                                    'thin_provisioning_support': True,
+                                    'max_over_subscription_ratio': 20.0,
+                                    'updated_at': None,
+                                    'service': service})
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
+    @testtools.skipIf(not test_utils.is_cinder_installed(),
+                      'Test requires Cinder installed')
+    def test_capacity_filter_fails_thin_ratio(self):
+        self._stub_service_is_up(True)
+        filt_cls = self.class_map['CapacityFilter']()
+        filter_properties = {'size': 100}
+        service = {'disabled': False}
+        host = fakes.FakeHostState('host1',
+                                   {'total_capacity_gb': 100,
+                                    'free_capacity_gb': 50,
+                                    'provisioned_capacity_gb': 1950,
+                                    'thin_provisioning_support': True,
+                                    'max_over_subscription_ratio': 20.0,
+                                    'updated_at': None,
+                                    'service': service})
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+
+    @testtools.skipIf(not test_utils.is_cinder_installed(),
+                      'Test requires Cinder installed')
+    def test_capacity_filter_fails_thin_pool_full(self):
+        self._stub_service_is_up(True)
+        filt_cls = self.class_map['CapacityFilter']()
+        filter_properties = {'size': 100}
+        service = {'disabled': False}
+        host = fakes.FakeHostState('host1',
+                                   {'total_capacity_gb': 100,
+                                    'free_capacity_gb': 0,
+                                    'provisioned_capacity_gb': 200,
+                                    'thin_provisioning_support': True,
+                                    'max_over_subscription_ratio': 20.0,
+                                    'updated_at': None,
+                                    'service': service})
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+
+    @testtools.skipIf(not test_utils.is_cinder_installed(),
+                      'Test requires Cinder installed')
+    def test_capacity_filter_fails_thin_pool_nearly_full(self):
+        self._stub_service_is_up(True)
+        filt_cls = self.class_map['CapacityFilter']()
+        filter_properties = {'size': 500}
+        service = {'disabled': False}
+        host = fakes.FakeHostState('host1',
+                                   {'total_capacity_gb': 100,
+                                    'free_capacity_gb': 1,
+                                    'provisioned_capacity_gb': 200,
+                                    'thin_provisioning_support': True,
+                                    'max_over_subscription_ratio': 20.0,
+                                    'updated_at': None,
+                                    'service': service})
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+        filter_properties = {'size': 20}
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
     @testtools.skipIf(not test_utils.is_cinder_installed(),
                       'Test requires Cinder installed')
     def test_retry_filter_disabled(self):
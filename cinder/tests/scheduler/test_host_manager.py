@@ -25,6 +25,7 @@ from cinder.openstack.common import timeutils
 from cinder.scheduler import host_manager
 from cinder import test
 from cinder.tests.scheduler import fakes
+from cinder.volume import rpcapi as volume_rpcapi
 
 
 CONF = cfg.CONF
@@ -135,6 +136,109 @@ class HostManagerTestCase(test.TestCase):
                     'host3': host3_volume_capabs}
         self.assertDictMatch(service_states, expected)
 
+    def test_update_service_capabilities_delta(self):
+        service_states = self.host_manager.service_states
+        self.mox.StubOutWithMock(timeutils, 'utcnow')
+        timeutils.utcnow().AndReturn(31337)
+        timeutils.utcnow().AndReturn(31338)
+
+        self.mox.ReplayAll()
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1',
+            dict(free_capacity_gb=4321, total_capacity_gb=5000, foo='bar'),
+            generation=1)
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=4000),
+            generation=2, full_sync=False, removed=['foo'])
+        # Stale deltas are ignored
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=1),
+            generation=2, full_sync=False, removed=[])
+
+        expected = {'host1': dict(free_capacity_gb=4000,
+                                  total_capacity_gb=5000,
+                                  timestamp=31338)}
+        self.assertDictMatch(service_states, expected)
+        self.assertEqual(self.host_manager.service_generations['host1'], 2)
+
+    def test_update_service_capabilities_backup(self):
+        self.mox.StubOutWithMock(timeutils, 'utcnow')
+        timeutils.utcnow().AndReturn(31337)
+        timeutils.utcnow().AndReturn(31338)
+        timeutils.utcnow().AndReturn(31339)
+
+        self.mox.ReplayAll()
+        self.host_manager.update_service_capabilities(
+            'backup', 'host1',
+            dict(backups_running=1, backups_queued=0,
+                 backup_max_concurrent_jobs=4),
+            generation=1)
+        self.host_manager.update_service_capabilities(
+            'backup', 'host1', dict(backups_running=4, backups_queued=2),
+            generation=2, full_sync=False, removed=[])
+        self.assertDictMatch(self.host_manager.service_states, {})
+        self.assertDictMatch(self.host_manager.backup_states,
+                             {'host1': dict(backups_running=4,
+                                            backups_queued=2,
+                                            backup_max_concurrent_jobs=4,
+                                            timestamp=31338)})
+
+        # The delta of generation 3 was lost
+        self.host_manager.update_service_capabilities(
+            'backup', 'host1', dict(backups_queued=0),
+            generation=4, full_sync=False, removed=[])
+        self.assertDictMatch(self.host_manager.backup_states, {})
+
+        self.host_manager.update_service_capabilities(
+            'backup', 'host1',
+            dict(backups_running=3, backups_queued=0,
+                 backup_max_concurrent_jobs=4),
+            generation=5)
+        self.assertEqual(
+            self.host_manager.backup_states['host1']['backups_running'], 3)
+
+    def test_update_service_capabilities_delta_unknown_host(self):
+        resyncs = []
+        self.stubs.Set(volume_rpcapi.VolumeAPI,
+                       'publish_service_capabilities',
+                       lambda api, ctxt, host=None: resyncs.append(host))
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=4000),
+            generation=5, full_sync=False, removed=[])
+
+        self.assertDictMatch(self.host_manager.service_states, {})
+        self.assertEqual(resyncs, ['host1'])
+
+    def test_update_service_capabilities_delta_gap(self):
+        resyncs = []
+        self.stubs.Set(volume_rpcapi.VolumeAPI,
+                       'publish_service_capabilities',
+                       lambda api, ctxt, host=None: resyncs.append(host))
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=4321), generation=1)
+        # The delta of generation 2 was lost
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=4000),
+            generation=3, full_sync=False, removed=[])
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=3000),
+            generation=4, full_sync=False, removed=[])
+
+        self.assertEqual(
+            self.host_manager.service_states['host1']['free_capacity_gb'],
+            4321)
+        self.assertEqual(resyncs, ['host1'])
+
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=3000), generation=5)
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=2000),
+            generation=6, full_sync=False, removed=[])
+        self.assertEqual(
+            self.host_manager.service_states['host1']['free_capacity_gb'],
+            2000)
+        self.assertEqual(self.host_manager.resync_requested, set())
+
     def test_get_all_host_states(self):
         context = 'fake_context'
         topic = CONF.volume_topic
@@ -201,3 +305,24 @@ class HostStateTestCase(test.TestCase):
         fake_host.update_from_volume_capability(volume_capability)
         self.assertEqual(fake_host.total_capacity_gb, 'infinite')
         self.assertEqual(fake_host.free_capacity_gb, 'unknown')
+
+    def test_update_from_volume_thin_capability(self):
+        fake_host = host_manager.HostState('host1')
+        self.assertFalse(fake_host.thin_provisioning_support)
+
+        volume_capability = {'total_capacity_gb': 100,
+                             'free_capacity_gb': 60,
+                             'provisioned_capacity_gb': 500,
+                             'thin_provisioning_support': True,
+                             'max_over_subscription_ratio': 20.0,
+                             'reserved_percentage': 0,
+                             'timestamp': None}
+
+        fake_host.update_from_volume_capability(volume_capability)
+        self.assertTrue(fake_host.thin_provisioning_support)
+        self.assertEqual(fake_host.provisioned_capacity_gb, 500)
+        self.assertEqual(fake_host.max_over_subscription_ratio, 20.0)
+
+        fake_host.consume_from_volume({'size': 10})
+        self.assertEqual(fake_host.free_capacity_gb, 50)
+        self.assertEqual(fake_host.provisioned_capacity_gb, 510)
@@ -69,7 +69,11 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  rpc_method='fanout_cast',
                                  service_name='fake_name',
                                  host='fake_host',
-                                 capabilities='fake_capabilities')
+                                 capabilities='fake_capabilities',
+                                 generation=2,
+                                 full_sync=False,
+                                 removed=['fake_removed'],
+                                 version='1.3')
 
     def test_create_volume(self):
         self._test_scheduler_api('create_volume',
@@ -81,3 +85,15 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  request_spec='fake_request_spec',
                                  filter_properties='filter_properties',
                                  version='1.2')
+
+    def test_create_volume_slim(self):
+        self.flags(slim_rpc_payloads=True)
+        self._test_scheduler_api('create_volume',
+                                 rpc_method='cast',
+                                 topic='topic',
+                                 volume_id='volume_id',
+                                 snapshot_id='snapshot_id',
+                                 image_id='image_id',
+                                 request_spec=None,
+                                 filter_properties='filter_properties',
+                                 version='1.4')
@@ -62,7 +62,10 @@ class SchedulerManagerTestCase(test.TestCase):
 
         # Test no capabilities passes empty dictionary
         self.manager.driver.update_service_capabilities(service_name,
-                                                        host, {})
+                                                        host, {},
+                                                        generation=None,
+                                                        full_sync=True,
+                                                        removed=None)
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(
             self.context,
@@ -75,7 +78,10 @@ class SchedulerManagerTestCase(test.TestCase):
         capabilities = {'fake_capability': 'fake_value'}
         self.manager.driver.update_service_capabilities(service_name,
                                                         host,
-                                                        capabilities)
+                                                        capabilities,
+                                                        generation=None,
+                                                        full_sync=True,
+                                                        removed=None)
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(
             self.context,
@@ -105,6 +111,34 @@ class SchedulerManagerTestCase(test.TestCase):
                                    request_spec=request_spec,
                                    filter_properties={})
 
+    def test_create_volume_builds_request_spec(self):
+        ctxt = context.get_admin_context()
+        volume_type = db.volume_type_create(ctxt,
+                                            {'name': 'gold',
+                                             'extra_specs': {'qos': 'high'}})
+        volume = db.volume_create(ctxt, {'size': 2,
+                                         'availability_zone': 'zone1',
+                                         'volume_type_id': volume_type['id'],
+                                         'metadata': {'key': 'value'}})
+        specs = []
+        self.stubs.Set(self.manager.driver, 'schedule_create_volume',
+                       lambda ctxt, spec, props: specs.append(spec))
+
+        self.manager.create_volume(ctxt, 'fake_topic', volume['id'],
+                                   image_id='fake_image',
+                                   request_spec=None,
+                                   filter_properties={'retry': {}})
+        self.assertEqual(len(specs), 1)
+        self.assertEqual(specs[0]['volume_id'], volume['id'])
+        self.assertEqual(specs[0]['image_id'], 'fake_image')
+        self.assertEqual(specs[0]['volume_type']['name'], 'gold')
+        self.assertEqual(specs[0]['volume_type']['extra_specs'],
+                         {'qos': 'high'})
+        properties = specs[0]['volume_properties']
+        self.assertEqual(properties['size'], 2)
+        self.assertEqual(properties['availability_zone'], 'zone1')
+        self.assertEqual(properties['metadata'], {'key': 'value'})
+
     def _mox_schedule_method_helper(self, method_name):
         # Make sure the method exists that we're going to test call
         def stub_method(*args, **kwargs):
@@ -136,9 +170,9 @@ class SchedulerTestCase(test.TestCase):
                                  'update_service_capabilities')
 
         capabilities = {'fake_capability': 'fake_value'}
-        self.driver.host_manager.update_service_capabilities(service_name,
-                                                             host,
-                                                             capabilities)
+        self.driver.host_manager.update_service_capabilities(
+            service_name, host, capabilities, generation=None,
+            full_sync=True, removed=None)
         self.mox.ReplayAll()
         result = self.driver.update_service_capabilities(service_name,
                                                          host,
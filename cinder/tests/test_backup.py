@@ -19,12 +19,15 @@ Tests for Backup code.
 
 import tempfile
 
+import eventlet
 from oslo.config import cfg
 
+from cinder.backup import manager
 from cinder import context
 from cinder import db
 from cinder import exception
 from cinder.openstack.common import importutils
+from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
 from cinder import test
@@ -61,7 +64,8 @@ class BackupTestCase(test.TestCase):
                                 status='creating',
                                 size=0,
                                 object_count=0,
-                                project_id='fake'):
+                                project_id='fake',
+                                checkpoint=None):
         """
         Create a backup entry in the DB.
         Return the entry ID
@@ -80,6 +84,7 @@ class BackupTestCase(test.TestCase):
         backup['service'] = CONF.backup_service
         backup['size'] = size
         backup['object_count'] = object_count
+        backup['checkpoint'] = checkpoint
         return db.backup_create(self.ctxt, backup)['id']
 
     def _create_volume_db_entry(self, display_name='test_volume',
@@ -126,6 +131,96 @@ class BackupTestCase(test.TestCase):
                           self.ctxt,
                           backup3_id)
 
+    def test_init_host_resumes(self):
+        """Make sure backups and restores with a checkpoint are resumed
+        when backup_manager.init_host() is called
+        """
+        vol1_id = self._create_volume_db_entry(status='backing-up')
+        vol2_id = self._create_volume_db_entry(status='restoring-backup')
+        checkpoint = jsonutils.dumps({'backup': {'id': 3}})
+        backup1_id = self._create_backup_db_entry(status='creating',
+                                                  volume_id=vol1_id,
+                                                  checkpoint=checkpoint)
+        checkpoint = jsonutils.dumps({'restore': {'volume_id': vol2_id}})
+        backup2_id = self._create_backup_db_entry(status='restoring',
+                                                  checkpoint=checkpoint)
+        resumed = []
+        self.stubs.Set(eventlet, 'spawn_n',
+                       lambda func, ctxt, backup, status, volume_id:
+                       resumed.append((backup['id'], status, volume_id)))
+
+        self.backup_mgr.init_host()
+        self.assertEqual(sorted(resumed),
+                         sorted([(backup1_id, 'creating', vol1_id),
+                                 (backup2_id, 'restoring', vol2_id)]))
+        vol1 = db.volume_get(self.ctxt, vol1_id)
+        self.assertEquals(vol1['status'], 'backing-up')
+        vol2 = db.volume_get(self.ctxt, vol2_id)
+        self.assertEquals(vol2['status'], 'restoring-backup')
+        backup1 = db.backup_get(self.ctxt, backup1_id)
+        self.assertEquals(backup1['status'], 'creating')
+        backup2 = db.backup_get(self.ctxt, backup2_id)
+        self.assertEquals(backup2['status'], 'restoring')
+
+    def test_init_host_restarts_queued(self):
+        """Make sure queued backups and restores are run when
+        backup_manager.init_host() is called
+        """
+        self.flags(backup_resume_interrupted=False)
+        vol1_id = self._create_volume_db_entry(status='backing-up')
+        vol2_id = self._create_volume_db_entry(status='restoring-backup')
+        backup1_id = self._create_backup_db_entry(status='queued',
+                                                  volume_id=vol1_id)
+        checkpoint = jsonutils.dumps({'restore': {'volume_id': vol2_id}})
+        backup2_id = self._create_backup_db_entry(status='queued',
+                                                  checkpoint=checkpoint)
+        resumed = []
+        self.stubs.Set(eventlet, 'spawn_n',
+                       lambda func, ctxt, backup, status, volume_id:
+                       resumed.append((backup['id'], status, volume_id)))
+
+        self.backup_mgr.init_host()
+        self.assertEqual(sorted(resumed),
+                         sorted([(backup1_id, 'creating', vol1_id),
+                                 (backup2_id, 'restoring', vol2_id)]))
+        vol1 = db.volume_get(self.ctxt, vol1_id)
+        self.assertEquals(vol1['status'], 'backing-up')
+        vol2 = db.volume_get(self.ctxt, vol2_id)
+        self.assertEquals(vol2['status'], 'restoring-backup')
+
+    def test_create_backup_queued(self):
+        """Test a backup is queued while the maximum number of backups
+        are running, and runs when one of them finishes
+        """
+        self.flags(backup_use_temp_snapshot=False)
+        vol_id = self._create_volume_db_entry(size=1)
+        backup_id = self._create_backup_db_entry(volume_id=vol_id)
+        spawned = []
+        self.stubs.Set(eventlet, 'spawn_n',
+                       lambda func, *args: spawned.append((func, args)))
+        self.stubs.Set(self.backup_mgr.driver, 'backup_volume',
+                       lambda context, backup, backup_service: None)
+        self.backup_mgr.jobs.max_jobs = 1
+        self.backup_mgr.jobs.running = 1
+
+        self.backup_mgr.create_backup(self.ctxt, backup_id)
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'queued')
+        self.assertEquals(self.backup_mgr.jobs.queued, 1)
+        capabilities = self.backup_mgr.last_capabilities
+        self.assertEquals(capabilities['backups_running'], 1)
+        self.assertEquals(capabilities['backups_queued'], 1)
+
+        self.backup_mgr.jobs._finished()
+        self.assertEquals(len(spawned), 1)
+        func, args = spawned[0]
+        func(*args)
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEquals(vol['status'], 'available')
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'available')
+        self.assertEquals(self.backup_mgr.jobs.running, 0)
+
     def test_create_backup_with_bad_volume_status(self):
         """Test error handling when creating a backup from a volume
         with a bad status
@@ -151,6 +246,7 @@ class BackupTestCase(test.TestCase):
 
     def test_create_backup_with_error(self):
         """Test error handling when an error occurs during backup creation"""
+        self.flags(backup_use_temp_snapshot=False)
         vol_id = self._create_volume_db_entry(size=1)
         backup_id = self._create_backup_db_entry(volume_id=vol_id)
 
@@ -171,6 +267,7 @@ class BackupTestCase(test.TestCase):
 
     def test_create_backup(self):
         """Test normal backup creation"""
+        self.flags(backup_use_temp_snapshot=False)
         vol_size = 1
         vol_id = self._create_volume_db_entry(size=vol_size)
         backup_id = self._create_backup_db_entry(volume_id=vol_id)
@@ -188,6 +285,157 @@ class BackupTestCase(test.TestCase):
         self.assertEquals(backup['status'], 'available')
         self.assertEqual(backup['size'], vol_size)
 
+    def _stub_backup_snapshot(self, backup_snapshot):
+        calls = []
+
+        def fake_create_backup_snapshot(context, backup, volume):
+            calls.append('create')
+            return {'id': backup['id'], 'volume_id': volume['id']}
+
+        def fake_backup_snapshot(context, backup, snapshot, backup_service):
+            calls.append('backup')
+            backup_snapshot(context, backup, snapshot, backup_service)
+
+        def fake_delete_backup_snapshot(context, backup, volume):
+            calls.append('delete')
+
+        self.stubs.Set(self.backup_mgr.driver, 'create_backup_snapshot',
+                       fake_create_backup_snapshot)
+        self.stubs.Set(self.backup_mgr.driver, 'backup_snapshot',
+                       fake_backup_snapshot)
+        self.stubs.Set(self.backup_mgr.driver, 'delete_backup_snapshot',
+                       fake_delete_backup_snapshot)
+        return calls
+
+    def test_create_backup_from_snapshot(self):
+        """Test the volume is released once the snapshot is taken"""
+        vol_size = 1
+        vol_id = self._create_volume_db_entry(size=vol_size)
+        backup_id = self._create_backup_db_entry(volume_id=vol_id)
+
+        def backup_snapshot(context, backup, snapshot, backup_service):
+            vol = db.volume_get(self.ctxt, vol_id)
+            self.assertEquals(vol['status'], 'available')
+            self.assertEquals(snapshot['volume_id'], vol_id)
+            # The volume is attached while its backup runs
+            db.volume_update(self.ctxt, vol_id, {'status': 'in-use'})
+
+        calls = self._stub_backup_snapshot(backup_snapshot)
+
+        self.backup_mgr.create_backup(self.ctxt, backup_id)
+        self.assertEqual(calls, ['create', 'backup', 'delete'])
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEquals(vol['status'], 'in-use')
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'available')
+        self.assertEqual(backup['size'], vol_size)
+
+    def test_create_backup_from_snapshot_with_error(self):
+        """Test the snapshot is deleted when the backup fails"""
+        vol_id = self._create_volume_db_entry(size=1)
+        backup_id = self._create_backup_db_entry(volume_id=vol_id)
+
+        def backup_snapshot(context, backup, snapshot, backup_service):
+            db.volume_update(self.ctxt, vol_id, {'status': 'in-use'})
+            raise FakeBackupException('fake')
+
+        calls = self._stub_backup_snapshot(backup_snapshot)
+
+        self.assertRaises(FakeBackupException,
+                          self.backup_mgr.create_backup,
+                          self.ctxt,
+                          backup_id)
+        self.assertEqual(calls, ['create', 'backup', 'delete'])
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEquals(vol['status'], 'in-use')
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'error')
+
+    def test_create_backup_without_snapshot_support(self):
+        """Test drivers without snapshot backups back the volume up"""
+        vol_id = self._create_volume_db_entry(size=1)
+        backup_id = self._create_backup_db_entry(volume_id=vol_id)
+
+        def fake_backup_volume(context, backup, backup_service):
+            vol = db.volume_get(self.ctxt, vol_id)
+            self.assertEquals(vol['status'], 'backing-up')
+
+        self.stubs.Set(self.backup_mgr.driver, 'create_backup_snapshot',
+                       lambda context, backup, volume: None)
+        self.stubs.Set(self.backup_mgr.driver, 'backup_volume',
+                       fake_backup_volume)
+
+        self.backup_mgr.create_backup(self.ctxt, backup_id)
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEquals(vol['status'], 'available')
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'available')
+
+    def test_create_backup_snapshot_failure(self):
+        """Test the busy volume is backed up when no snapshot is taken"""
+        vol_id = self._create_volume_db_entry(size=1)
+        backup_id = self._create_backup_db_entry(volume_id=vol_id)
+        calls = self._stub_backup_snapshot(None)
+
+        def fake_create_backup_snapshot(context, backup, volume):
+            calls.append('create')
+            raise exception.ProcessExecutionError(
+                stderr='Insufficient free extents')
+
+        def fake_backup_volume(context, backup, backup_service):
+            calls.append('backup_volume')
+            vol = db.volume_get(self.ctxt, vol_id)
+            self.assertEquals(vol['status'], 'backing-up')
+
+        self.stubs.Set(self.backup_mgr.driver, 'create_backup_snapshot',
+                       fake_create_backup_snapshot)
+        self.stubs.Set(self.backup_mgr.driver, 'backup_volume',
+                       fake_backup_volume)
+
+        self.backup_mgr.create_backup(self.ctxt, backup_id)
+        self.assertEqual(calls, ['create', 'delete', 'backup_volume'])
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEquals(vol['status'], 'available')
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'available')
+
+    def test_create_backup_resume_from_snapshot(self):
+        """Test an interrupted backup resumes from its snapshot"""
+        vol_id = self._create_volume_db_entry(status='in-use', size=1)
+        checkpoint = jsonutils.dumps({'backup': {'id': 3}})
+        backup_id = self._create_backup_db_entry(volume_id=vol_id,
+                                                 checkpoint=checkpoint)
+
+        def backup_snapshot(context, backup, snapshot, backup_service):
+            self.assertEquals(backup['checkpoint'], checkpoint)
+
+        calls = self._stub_backup_snapshot(backup_snapshot)
+        self.stubs.Set(self.backup_mgr.driver, 'get_backup_snapshot',
+                       lambda context, backup, volume: {'id': backup['id']})
+
+        self.backup_mgr.create_backup(self.ctxt, backup_id)
+        self.assertEqual(calls, ['backup', 'delete'])
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEquals(vol['status'], 'in-use')
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'available')
+
+    def test_create_backup_resume_without_snapshot(self):
+        """Test a released volume without its snapshot can not resume"""
+        vol_id = self._create_volume_db_entry(status='in-use', size=1)
+        checkpoint = jsonutils.dumps({'backup': {'id': 3}})
+        backup_id = self._create_backup_db_entry(volume_id=vol_id,
+                                                 checkpoint=checkpoint)
+        self.stubs.Set(self.backup_mgr.driver, 'get_backup_snapshot',
+                       lambda context, backup, volume: None)
+
+        self.assertRaises(exception.InvalidVolume,
+                          self.backup_mgr.create_backup,
+                          self.ctxt,
+                          backup_id)
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'error')
+
     def test_restore_backup_with_bad_volume_status(self):
         """Test error handling when restoring a backup to a volume
         with a bad status
@@ -290,6 +538,29 @@ class BackupTestCase(test.TestCase):
         backup = db.backup_get(self.ctxt, backup_id)
         self.assertEquals(backup['status'], 'available')
 
+    def test_restore_backup_ignores_checkpoint(self):
+        """Test a new restore does not resume an earlier one"""
+        vol_id = self._create_volume_db_entry(status='restoring-backup',
+                                              size=1)
+        checkpoint = jsonutils.dumps({'restore': {'volume_id': vol_id,
+                                                  'index': 3,
+                                                  'offset': 1024}})
+        backup_id = self._create_backup_db_entry(status='restoring',
+                                                 volume_id=vol_id,
+                                                 checkpoint=checkpoint)
+
+        def fake_restore_backup(context, backup, volume, backup_service):
+            self.assertEquals(jsonutils.loads(backup['checkpoint']),
+                              {'restore': {'volume_id': vol_id}})
+
+        self.stubs.Set(self.backup_mgr.driver, 'restore_backup',
+                       fake_restore_backup)
+
+        self.backup_mgr.restore_backup(self.ctxt, backup_id, vol_id)
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'available')
+        self.assertEquals(backup['checkpoint'], None)
+
     def test_delete_backup_with_bad_backup_status(self):
         """Test error handling when deleting a backup with a backup
         with a bad status
@@ -407,3 +678,66 @@ class BackupTestCase(test.TestCase):
         ctxt_read_deleted = context.get_admin_context('yes')
         backups = db.backup_get_all_by_host(ctxt_read_deleted, 'testhost')
         self.assertEqual(len(backups), 2)
+
+
+class BackupJobQueueTestCase(test.TestCase):
+    """Test Case for the backup job queue."""
+
+    def setUp(self):
+        super(BackupJobQueueTestCase, self).setUp()
+        self.spawned = []
+        self.stubs.Set(eventlet, 'spawn_n',
+                       lambda func, *args: self.spawned.append((func, args)))
+        self.ran = []
+        self.jobs = manager.BackupJobQueue(2)
+
+    def _job(self, name):
+        self.ran.append(name)
+
+    def _run_spawned(self):
+        func, args = self.spawned.pop(0)
+        func(*args)
+
+    def test_run_below_limit(self):
+        self.assertTrue(self.jobs.run('p1', self._job, 'a'))
+        self.assertEqual(self.ran, ['a'])
+        self.assertEqual(self.jobs.running, 0)
+        self.assertFalse(self.jobs.is_full())
+
+    def test_unlimited(self):
+        self.jobs = manager.BackupJobQueue(0)
+        self.jobs.running = 100
+        self.assertTrue(self.jobs.run('p1', self._job, 'a'))
+
+    def test_queued_jobs_take_turns(self):
+        self.jobs.running = 2
+        for name in ('a1', 'a2', 'a3'):
+            self.assertFalse(self.jobs.run('a', self._job, name))
+        for name in ('b1', 'b2'):
+            self.assertFalse(self.jobs.run('b', self._job, name))
+        self.assertTrue(self.jobs.is_full())
+        self.assertEqual(self.jobs.queued, 5)
+
+        # One of the running jobs finishes, the queued jobs then run in
+        # its slot one after the other.
+        self.jobs._finished()
+        self.assertEqual(self.jobs.running, 2)
+        self.assertEqual(len(self.spawned), 1)
+        while self.spawned:
+            self._run_spawned()
+        self.assertEqual(self.ran, ['a1', 'b1', 'a2', 'b2', 'a3'])
+        self.assertEqual(self.jobs.queued, 0)
+        self.assertEqual(self.jobs.running, 1)
+
+    def test_queued_job_failure(self):
+        def fail():
+            raise FakeBackupException()
+
+        self.jobs.running = 2
+        self.jobs.run('p1', fail)
+        self.jobs.run('p1', self._job, 'a')
+        self.jobs._finished()
+        self._run_spawned()
+        self._run_spawned()
+        self.assertEqual(self.ran, ['a'])
+        self.assertEqual(self.jobs.running, 1)
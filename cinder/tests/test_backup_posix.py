@@ -0,0 +1,276 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for Backup posix code.
+
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import eventlet
+
+from cinder.backup.services.posix import PosixBackupService
+from cinder import context
+from cinder import db
+from cinder import exception
+from cinder.openstack.common import log as logging
+from cinder import test
+
+
+LOG = logging.getLogger(__name__)
+
+
+class BackupPosixTestCase(test.TestCase):
+    """Test Case for posix."""
+
+    def _create_volume_db_entry(self):
+        vol = {'id': '1234-5678-1234-8888',
+               'size': 1,
+               'status': 'available'}
+        return db.volume_create(self.ctxt, vol)['id']
+
+    def _create_backup_db_entry(self, container='test-container',
+                                project_id='fake-project'):
+        backup = {'id': 123,
+                  'size': 1,
+                  'container': container,
+                  'project_id': project_id,
+                  'volume_id': '1234-5678-1234-8888'}
+        return db.backup_create(self.ctxt, backup)['id']
+
+    def setUp(self):
+        super(BackupPosixTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.backup_path = tempfile.mkdtemp()
+        self.flags(backup_posix_path=self.backup_path,
+                   backup_posix_object_size=32 * 1024)
+
+        self._create_volume_db_entry()
+        self.volume_file = tempfile.NamedTemporaryFile()
+        for i in xrange(0, 128):
+            self.volume_file.write(os.urandom(1024))
+
+    def tearDown(self):
+        self.volume_file.close()
+        shutil.rmtree(self.backup_path)
+        super(BackupPosixTestCase, self).tearDown()
+
+    def _backup(self, container='test-container',
+                project_id='fake-project'):
+        self._create_backup_db_entry(container=container,
+                                     project_id=project_id)
+        service = PosixBackupService(self.ctxt)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        return db.backup_get(self.ctxt, 123)
+
+    def _container_path(self, backup):
+        return os.path.join(self.backup_path, backup['project_id'],
+                            backup['container'])
+
+    def _read_metadata(self, backup):
+        path = os.path.join(self._container_path(backup),
+                            '%s_metadata' % backup['service_metadata'])
+        with open(path) as metadata_file:
+            return json.load(metadata_file)
+
+    def _assert_restores(self, backup):
+        service = PosixBackupService(self.ctxt)
+        with tempfile.NamedTemporaryFile() as restored_file:
+            service.restore(backup, '1234-5678-1234-8888', restored_file)
+            restored_file.seek(0)
+            self.volume_file.seek(0)
+            self.assertEqual(restored_file.read(), self.volume_file.read())
+
+    def test_backup_uncompressed(self):
+        self.flags(backup_compression_algorithm='none')
+        backup = self._backup()
+        metadata = self._read_metadata(backup)
+        self.assertEqual(len(metadata['objects']), 4)
+        self.assertEqual(metadata['objects'][0].values()[0]['compression'],
+                         'none')
+        self.assertEqual(backup['object_count'], 5)
+        self._assert_restores(backup)
+
+    def test_backup_bz2(self):
+        self.flags(backup_compression_algorithm='bz2')
+        backup = self._backup()
+        self._assert_restores(backup)
+
+    def test_backup_zlib(self):
+        self.flags(backup_compression_algorithm='zlib')
+        backup = self._backup()
+        metadata = self._read_metadata(backup)
+        self.assertEqual([obj.keys()[0] for obj in metadata['objects']],
+                         ['%s-%05d' % (backup['service_metadata'], i)
+                          for i in range(1, 5)])
+        self._assert_restores(backup)
+
+    def test_backup_default_container(self):
+        backup = self._backup(container=None)
+        self.assertEquals(backup['container'], 'volumebackups')
+        self.assertTrue(os.path.isdir(os.path.join(self.backup_path,
+                                                   'fake-project',
+                                                   'volumebackups')))
+
+    def test_backup_containers_per_project(self):
+        backup = self._backup(container='shared', project_id='project-1')
+        db.backup_update(self.ctxt, 123, {'project_id': 'project-2'})
+        other = db.backup_get(self.ctxt, 123)
+        service = PosixBackupService(self.ctxt)
+        self.volume_file.seek(0)
+        service.backup(other, self.volume_file)
+        self.assertEqual(sorted(os.listdir(self.backup_path)),
+                         ['project-1', 'project-2'])
+        service.delete(db.backup_get(self.ctxt, 123))
+        self._assert_restores(backup)
+
+    def test_backup_invalid_container(self):
+        self._create_backup_db_entry()
+        service = PosixBackupService(self.ctxt)
+        for container in ('../../x', '/etc', '..', 'a/b'):
+            db.backup_update(self.ctxt, 123, {'container': container})
+            backup = db.backup_get(self.ctxt, 123)
+            self.assertRaises(exception.InvalidBackup,
+                              service.backup, backup, self.volume_file)
+            self.assertRaises(exception.InvalidBackup,
+                              service.delete, backup)
+        self.assertEqual(os.listdir(self.backup_path), [])
+
+    def test_backup_single_worker(self):
+        self.flags(backup_posix_workers=1)
+        backup = self._backup()
+        self._assert_restores(backup)
+
+    def _count_running(self, service, name):
+        """Wrap a method of the service, counting the calls started and
+        those still running.
+        """
+        calls = {'started': 0, 'running': 0}
+        method = getattr(service, name)
+
+        def wrapper(*args):
+            calls['started'] += 1
+            calls['running'] += 1
+            try:
+                return method(*args)
+            finally:
+                calls['running'] -= 1
+
+        self.stubs.Set(service, name, wrapper)
+        return calls
+
+    def test_backup_error_stops_workers(self):
+        self.flags(backup_posix_object_size=8 * 1024,
+                   backup_posix_workers=2)
+        self._create_backup_db_entry()
+        backup = db.backup_get(self.ctxt, 123)
+        service = PosixBackupService(self.ctxt)
+        calls = self._count_running(service, '_backup_object')
+        write_file = service._write_file
+
+        def fake_write_file(path, data):
+            if path.endswith('-00002'):
+                write_file(path, data[:10])
+                raise IOError('No space left on device')
+            write_file(path, data)
+
+        self.stubs.Set(service, '_write_file', fake_write_file)
+        self.volume_file.seek(0)
+        self.assertRaises(IOError, service.backup, backup, self.volume_file)
+        # Let any greenthread left behind run
+        eventlet.sleep(0.1)
+        # Reading the volume stopped with the failed file, of 16
+        self.assertTrue(calls['started'] <= 3)
+        self.assertTrue(self.volume_file.tell() <= 4 * 8 * 1024)
+        self.assertEqual(calls['running'], 0)
+        container_path = self._container_path(backup)
+        self.assertEqual([name for name in os.listdir(os.path.join(
+            container_path, os.path.dirname(backup['service_metadata'])))
+            if name.endswith('.part')], [])
+
+    def test_restore_error_stops_workers(self):
+        self.flags(backup_posix_object_size=8 * 1024,
+                   backup_posix_workers=2)
+        backup = self._backup()
+        service = PosixBackupService(self.ctxt)
+        calls = self._count_running(service, '_restore_object')
+
+        class FailingFile(object):
+            def write(self, data):
+                raise IOError('Input/output error')
+
+        self.assertRaises(IOError, service.restore, backup,
+                          '1234-5678-1234-8888', FailingFile())
+        eventlet.sleep(0.1)
+        self.assertTrue(calls['started'] <= 2)
+        self.assertEqual(calls['running'], 0)
+
+    def test_restore_corrupted(self):
+        backup = self._backup()
+        path = os.path.join(self._container_path(backup),
+                            '%s-00002' % backup['service_metadata'])
+        with open(path, 'r+b') as object_file:
+            object_file.write('corrupted')
+        service = PosixBackupService(self.ctxt)
+        with tempfile.NamedTemporaryFile() as volume_file:
+            self.assertRaises(exception.InvalidBackup,
+                              service.restore,
+                              backup, '1234-5678-1234-8888', volume_file)
+
+    def test_restore_missing_object(self):
+        backup = self._backup()
+        os.unlink(os.path.join(self._container_path(backup),
+                               '%s-00003' % backup['service_metadata']))
+        service = PosixBackupService(self.ctxt)
+        with tempfile.NamedTemporaryFile() as volume_file:
+            self.assertRaises(exception.InvalidBackup,
+                              service.restore,
+                              backup, '1234-5678-1234-8888', volume_file)
+
+    def test_restore_unsupported_version(self):
+        backup = self._backup()
+        path = os.path.join(self._container_path(backup),
+                            '%s_metadata' % backup['service_metadata'])
+        metadata = self._read_metadata(backup)
+        metadata['version'] = '9.9.9'
+        with open(path, 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+        service = PosixBackupService(self.ctxt)
+        with tempfile.NamedTemporaryFile() as volume_file:
+            self.assertRaises(exception.InvalidBackup,
+                              service.restore,
+                              backup, '1234-5678-1234-8888', volume_file)
+
+    def test_delete(self):
+        backup = self._backup()
+        container_path = self._container_path(backup)
+        # Left behind by an interrupted backup
+        open(os.path.join(container_path, '%s-00005.part' %
+                          backup['service_metadata']), 'w').close()
+        service = PosixBackupService(self.ctxt)
+        service.delete(backup)
+        self.assertEqual(os.listdir(container_path), [])
+
+    def test_get_compressor(self):
+        service = PosixBackupService(self.ctxt)
+        self.assertEquals(service._get_compressor('None'), None)
+        self.assertRaises(ValueError, service._get_compressor, 'fake')
@@ -19,6 +19,7 @@ Tests for Backup swift code.
 
 import bz2
 import hashlib
+import json
 import os
 import tempfile
 import zlib
@@ -30,6 +31,9 @@ from cinder import context
 from cinder import db
 from cinder import exception
 from cinder.openstack.common import log as logging
+from cinder.openstack.common.notifier import api as notifier_api
+from cinder.openstack.common.notifier import test_notifier
+from cinder.openstack.common import timeutils
 from cinder import test
 from cinder.tests.backup.fake_swift_client import FakeSwiftClient
 
@@ -55,11 +59,14 @@ class BackupSwiftTestCase(test.TestCase):
                'status': 'available'}
         return db.volume_create(self.ctxt, vol)['id']
 
-    def _create_backup_db_entry(self, container='test-container'):
+    def _create_backup_db_entry(self, container='test-container',
+                                service_metadata=None, checkpoint=None):
         backup = {'id': 123,
                   'size': 1,
                   'container': container,
-                  'volume_id': '1234-5678-1234-8888'}
+                  'volume_id': '1234-5678-1234-8888',
+                  'service_metadata': service_metadata,
+                  'checkpoint': checkpoint}
         return db.backup_create(self.ctxt, backup)['id']
 
     def setUp(self):
@@ -121,6 +128,133 @@ class BackupSwiftTestCase(test.TestCase):
         backup = db.backup_get(self.ctxt, 123)
         self.assertEquals(backup['container'], container_name)
 
+    def test_backup_checkpoints(self):
+        self._create_backup_db_entry()
+        self.flags(backup_swift_object_size=32 * 1024,
+                   backup_swift_checkpoint_interval=2)
+        service = SwiftBackupService(self.ctxt)
+        checkpoints = []
+
+        def fake_backup_update(context, backup_id, values):
+            if values.get('checkpoint'):
+                checkpoints.append(json.loads(values['checkpoint']))
+            return db_backup_update(context, backup_id, values)
+
+        db_backup_update = service.db.backup_update
+        self.stubs.Set(service.db, 'backup_update', fake_backup_update)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        self.assertEqual([checkpoint['backup']['id']
+                          for checkpoint in checkpoints], [3, 5])
+        self.assertEqual(checkpoints[0]['backup']['offset'], 64 * 1024)
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertEqual(backup['checkpoint'], None)
+        self.assertEqual(backup['object_count'], 5)
+
+    def test_backup_progress(self):
+        self._create_backup_db_entry()
+        self.flags(backup_swift_object_size=32 * 1024,
+                   backup_compression_algorithm='none',
+                   backup_progress_interval=2,
+                   notification_driver=[test_notifier.__name__])
+        notifier_api._reset_drivers()
+        self.addCleanup(notifier_api._reset_drivers)
+        test_notifier.NOTIFICATIONS = []
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        service = SwiftBackupService(self.ctxt)
+
+        def fake_put_object(*args, **kwargs):
+            timeutils.advance_time_seconds(1)
+            return swift_put_object(*args, **kwargs)
+
+        swift_put_object = service.conn.put_object
+        self.stubs.Set(service.conn, 'put_object', fake_put_object)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        self.assertEqual([msg['event_type']
+                          for msg in test_notifier.NOTIFICATIONS],
+                         ['backup.create.progress',
+                          'backup.create.progress',
+                          'backup.create.end'])
+        payload = test_notifier.NOTIFICATIONS[0]['payload']
+        self.assertEqual(payload['backup_id'], '123')
+        self.assertEqual(payload['bytes'], 64 * 1024)
+        self.assertEqual(payload['objects'], 2)
+        self.assertEqual(payload['throughput'], 32 * 1024)
+        backup = db.backup_get(self.ctxt, 123)
+        progress = json.loads(backup['progress'])
+        self.assertEqual(progress['operation'], 'create')
+        self.assertEqual(progress['bytes'], 128 * 1024)
+        self.assertEqual(progress['objects'], 4)
+        self.assertEqual(progress['percent'], 0)
+        self.assertEqual(progress['stages']['upload'], 4)
+        self.assertEqual(progress['stages']['read'], 0)
+
+    def test_backup_resume(self):
+        checkpoint = {'backup': {'id': 3,
+                                 'offset': 64 * 1024,
+                                 'object_size': 32 * 1024,
+                                 'compression': 'none'}}
+        self._create_backup_db_entry(service_metadata='prefix',
+                                     checkpoint=json.dumps(checkpoint))
+        self.flags(backup_compression_algorithm='zlib')
+        service = SwiftBackupService(self.ctxt)
+        swift_objects = [{'name': 'prefix-%05d' % object_id,
+                          'hash': 'md5-%d' % object_id}
+                         for object_id in (1, 2, 3)]
+        self.stubs.Set(service.conn, 'get_container',
+                       lambda container, **kwargs: (None, swift_objects))
+        put_objects = []
+
+        def fake_put_object(container, name, reader, content_length=None):
+            put_objects.append((name, reader.read()))
+            return 'fake-md5-sum'
+
+        self.stubs.Set(service.conn, 'put_object', fake_put_object)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        self.volume_file.seek(64 * 1024)
+        data = self.volume_file.read(32 * 1024)
+        self.assertEqual(put_objects[0], ('prefix-00003', data))
+        self.assertEqual([name for name, _data in put_objects],
+                         ['prefix-00003', 'prefix-00004', 'prefix_metadata'])
+        metadata = json.loads(put_objects[-1][1])
+        self.assertEqual(metadata['objects'][:2],
+                         [{'prefix-00001': {'offset': 32 * 1024,
+                                            'length': 32 * 1024,
+                                            'compression': 'none',
+                                            'md5': 'md5-1'}},
+                          {'prefix-00002': {'offset': 64 * 1024,
+                                            'length': 32 * 1024,
+                                            'compression': 'none',
+                                            'md5': 'md5-2'}}])
+        self.assertEqual(metadata['objects'][2]['prefix-00003']['offset'],
+                         96 * 1024)
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertEqual(backup['checkpoint'], None)
+
+    def test_backup_resume_missing_object(self):
+        checkpoint = {'backup': {'id': 3,
+                                 'offset': 64 * 1024,
+                                 'object_size': 32 * 1024,
+                                 'compression': 'zlib'}}
+        self._create_backup_db_entry(service_metadata='prefix',
+                                     checkpoint=json.dumps(checkpoint))
+        service = SwiftBackupService(self.ctxt)
+        swift_objects = [{'name': 'prefix-00001', 'hash': 'md5-1'}]
+        self.stubs.Set(service.conn, 'get_container',
+                       lambda container, **kwargs: (None, swift_objects))
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertRaises(exception.InvalidBackup,
+                          service.backup,
+                          backup, self.volume_file)
+
     def test_create_backup_container_check_wraps_socket_error(self):
         container_name = 'socket_error_on_head'
         self._create_backup_db_entry(container=container_name)
@@ -149,6 +283,41 @@ class BackupSwiftTestCase(test.TestCase):
             backup = db.backup_get(self.ctxt, 123)
             service.restore(backup, '1234-5678-1234-8888', volume_file)
 
+    def test_restore_resume(self):
+        volume_id = '1234-5678-1234-8888'
+        checkpoint = {'restore': {'volume_id': volume_id,
+                                  'index': 2,
+                                  'offset': 2048}}
+        self._create_backup_db_entry(checkpoint=json.dumps(checkpoint))
+        self.flags(backup_swift_checkpoint_interval=1)
+        service = SwiftBackupService(self.ctxt)
+        names = ['backup_001', 'backup_002', 'backup_003']
+        metadata = {'version': '1.0.0',
+                    'objects': [{name: {'compression': 'none'}}
+                                for name in names]}
+        self.stubs.Set(service, '_read_metadata', lambda backup: metadata)
+        self.stubs.Set(service, '_generate_object_names',
+                       lambda backup: names)
+        fetched = []
+
+        def fake_get_object(container, name):
+            fetched.append(name)
+            return None, 'x' * 1024
+
+        self.stubs.Set(service.conn, 'get_object', fake_get_object)
+
+        with tempfile.NamedTemporaryFile() as volume_file:
+            backup = db.backup_get(self.ctxt, 123)
+            service.restore(backup, volume_id, volume_file)
+            self.assertEqual(volume_file.tell(), 3072)
+        self.assertEqual(fetched, ['backup_003'])
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertEqual(backup['checkpoint'], None)
+        progress = json.loads(backup['progress'])
+        self.assertEqual(progress['operation'], 'restore')
+        self.assertEqual(progress['bytes'], 3072)
+        self.assertEqual(progress['objects'], 3)
+
     def test_restore_wraps_socket_error(self):
         container_name = 'socket_error_on_get'
         self._create_backup_db_entry(container=container_name)
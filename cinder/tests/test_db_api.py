@@ -142,6 +142,27 @@ class DBAPIServiceTestCase(BaseTest):
         for key, value in new_values.iteritems():
             self.assertEqual(value, updated_service[key])
 
+    def test_service_heartbeat(self):
+        service1 = self._create_service({})
+        service2 = self._create_service({'host': 'fake_host2'})
+        service3 = self._create_service({'host': 'fake_host3'})
+
+        updated = db.service_heartbeat(self.ctxt,
+                                       [service1['id'], service2['id']])
+
+        self.assertEqual(updated, 2)
+        for service in (service1, service2):
+            real_service = db.service_get(self.ctxt, service['id'])
+            self.assertEqual(real_service['report_count'], 4)
+            self.assertFalse(real_service['updated_at'] is None)
+        self.assertEqual(
+            db.service_get(self.ctxt, service3['id'])['report_count'], 3)
+
+    def test_service_heartbeat_missing_service(self):
+        service = self._create_service({})
+        db.service_destroy(self.ctxt, service['id'])
+        self.assertEqual(db.service_heartbeat(self.ctxt, [service['id']]), 0)
+
     def test_service_update_not_found_exception(self):
         self.assertRaises(exception.ServiceNotFound,
                           db.service_update, self.ctxt, 100500, {})
@@ -607,6 +628,20 @@ class DBAPIIscsiTargetTestCase(BaseTest):
         self.assertEqual(db.iscsi_target_count_by_host(self.ctxt, 'fake_host'),
                          3)
 
+    def test_iscsi_target_create_missing(self):
+        db.iscsi_target_create_safe(self.ctxt, {'target_num': 2,
+                                                'host': 'fake_host'})
+        self.assertEqual(
+            db.iscsi_target_create_missing(self.ctxt, 'fake_host', 4), 3)
+        self.assertEqual(db.iscsi_target_count_by_host(self.ctxt, 'fake_host'),
+                         4)
+        self.assertEqual(
+            db.iscsi_target_create_missing(self.ctxt, 'fake_host', 4), 0)
+        self.assertEqual(db.iscsi_target_count_by_host(self.ctxt, 'other'), 0)
+        target_num = db.volume_allocate_iscsi_target(self.ctxt, 'fake_volume',
+                                                     'fake_host')
+        self.assertTrue(1 <= target_num <= 4)
+
     @test.testtools.skip("bug 1187367")
     def test_integrity_error(self):
         db.iscsi_target_create_safe(self.ctxt, self._get_base_values())
@@ -640,7 +675,9 @@ class DBAPIBackupTestCase(BaseTest):
             'service_metadata': 'metadata',
             'service': 'service',
             'size': 1000,
-            'object_count': 100}
+            'object_count': 100,
+            'checkpoint': 'checkpoint',
+            'progress': 'progress'}
         if one:
             return base_values
 
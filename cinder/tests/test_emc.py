@@ -27,6 +27,7 @@ from cinder import exception
 from cinder.openstack.common import log as logging
 from cinder import test
 from cinder.volume import configuration as conf
+from cinder.volume.drivers.emc import emc_smis_common
 from cinder.volume.drivers.emc.emc_smis_common import EMCSMISCommon
 from cinder.volume.drivers.emc.emc_smis_iscsi import EMCSMISISCSIDriver
 
@@ -228,9 +229,11 @@ class FakeEcomConnection():
             result = self._default_enum()
         return result
 
-    def EnumerateInstances(self, name):
+    def EnumerateInstances(self, name, PropertyList=None):
         result = None
-        if name == 'EMC_VirtualProvisioningPool':
+        if name == 'EMC_StorageVolume':
+            result = self._enum_storagevolumes()
+        elif name == 'EMC_VirtualProvisioningPool':
             result = self._enum_pool_details()
         elif name == 'EMC_UnifiedStoragePool':
             result = self._enum_pool_details()
@@ -244,7 +247,7 @@ class FakeEcomConnection():
         except KeyError:
             name = objectpath.classname
         result = None
-        if name == 'Clar_StorageVolume':
+        if name in ('Clar_StorageVolume', 'Symm_StorageVolume'):
             result = self._getinstance_storagevolume(objectpath)
         elif name == 'CIM_ProtocolControllerForUnit':
             result = self._getinstance_unit(objectpath)
@@ -282,6 +285,8 @@ class FakeEcomConnection():
         result = None
         if ResultClass == 'CIM_ProtocolControllerForUnit':
             result = self._ref_unitnames()
+        elif ResultClass == 'SE_StorageSynchronized_SV_SV':
+            result = self._ref_syncsvsvs(objectpath)
         else:
             result = self._default_ref(objectpath)
         return result
@@ -308,6 +313,14 @@ class FakeEcomConnection():
 
         return units
 
+    def _ref_syncsvsvs(self, objectpath):
+        syncs = []
+        for sync in self._enum_syncsvsvs():
+            if objectpath['DeviceID'] in (sync['SyncedElement']['DeviceID'],
+                                          sync['SystemElement']['DeviceID']):
+                syncs.append(sync)
+        return syncs
+
     def _default_ref(self, objectpath):
         return objectpath
 
@@ -447,7 +460,6 @@ class FakeEcomConnection():
         vol['ElementName'] = test_volume['name']
         vol['DeviceID'] = test_volume['id']
         vol['SystemName'] = storage_system
-        vol.path = {'DeviceID': vol['DeviceID']}
         vols.append(vol)
 
         snap_vol = EMC_StorageVolume()
@@ -455,7 +467,6 @@ class FakeEcomConnection():
         snap_vol['ElementName'] = test_snapshot['name']
         snap_vol['DeviceID'] = test_snapshot['id']
         snap_vol['SystemName'] = storage_system
-        snap_vol.path = {'DeviceID': snap_vol['DeviceID']}
         vols.append(snap_vol)
 
         clone_vol = EMC_StorageVolume()
@@ -463,7 +474,6 @@ class FakeEcomConnection():
         clone_vol['ElementName'] = test_clone['name']
         clone_vol['DeviceID'] = test_clone['id']
         clone_vol['SystemName'] = storage_system
-        clone_vol.path = {'DeviceID': clone_vol['DeviceID']}
         vols.append(clone_vol)
 
         clone_vol3 = EMC_StorageVolume()
@@ -471,7 +481,6 @@ class FakeEcomConnection():
         clone_vol3['ElementName'] = test_clone3['name']
         clone_vol3['DeviceID'] = test_clone3['id']
         clone_vol3['SystemName'] = storage_system
-        clone_vol3.path = {'DeviceID': clone_vol3['DeviceID']}
         vols.append(clone_vol3)
 
         snap_vol_vmax = EMC_StorageVolume()
@@ -479,7 +488,6 @@ class FakeEcomConnection():
         snap_vol_vmax['ElementName'] = test_snapshot_vmax['name']
         snap_vol_vmax['DeviceID'] = test_snapshot_vmax['id']
         snap_vol_vmax['SystemName'] = storage_system_vmax
-        snap_vol_vmax.path = {'DeviceID': snap_vol_vmax['DeviceID']}
         vols.append(snap_vol_vmax)
 
         failed_snap_replica = EMC_StorageVolume()
@@ -487,8 +495,6 @@ class FakeEcomConnection():
         failed_snap_replica['ElementName'] = failed_snapshot_replica['name']
         failed_snap_replica['DeviceID'] = failed_snapshot_replica['id']
         failed_snap_replica['SystemName'] = storage_system
-        failed_snap_replica.path = {
-            'DeviceID': failed_snap_replica['DeviceID']}
         vols.append(failed_snap_replica)
 
         failed_snap_sync = EMC_StorageVolume()
@@ -496,8 +502,6 @@ class FakeEcomConnection():
         failed_snap_sync['ElementName'] = failed_snapshot_sync['name']
         failed_snap_sync['DeviceID'] = failed_snapshot_sync['id']
         failed_snap_sync['SystemName'] = storage_system
-        failed_snap_sync.path = {
-            'DeviceID': failed_snap_sync['DeviceID']}
         vols.append(failed_snap_sync)
 
         failed_clone_rep = EMC_StorageVolume()
@@ -505,8 +509,6 @@ class FakeEcomConnection():
         failed_clone_rep['ElementName'] = failed_clone_replica['name']
         failed_clone_rep['DeviceID'] = failed_clone_replica['id']
         failed_clone_rep['SystemName'] = storage_system
-        failed_clone_rep.path = {
-            'DeviceID': failed_clone_rep['DeviceID']}
         vols.append(failed_clone_rep)
 
         failed_clone_s = EMC_StorageVolume()
@@ -514,8 +516,6 @@ class FakeEcomConnection():
         failed_clone_s['ElementName'] = failed_clone_sync['name']
         failed_clone_s['DeviceID'] = failed_clone_sync['id']
         failed_clone_s['SystemName'] = storage_system
-        failed_clone_s.path = {
-            'DeviceID': failed_clone_s['DeviceID']}
         vols.append(failed_clone_s)
 
         failed_delete_vol = EMC_StorageVolume()
@@ -523,9 +523,13 @@ class FakeEcomConnection():
         failed_delete_vol['ElementName'] = 'failed_delete_vol'
         failed_delete_vol['DeviceID'] = '99999'
         failed_delete_vol['SystemName'] = storage_system
-        failed_delete_vol.path = {'DeviceID': failed_delete_vol['DeviceID']}
         vols.append(failed_delete_vol)
 
+        for vol in vols:
+            vol.path = {'CreationClassName': vol['CreationClassName'],
+                        'DeviceID': vol['DeviceID'],
+                        'SystemName': vol['SystemName']}
+
         return vols
 
     def _enum_syncsvsvs(self):
@@ -756,6 +760,70 @@ class EMCSMISISCSIDriverTestCase(test.TestCase):
                           self.driver.delete_volume,
                           failed_delete_vol)
 
+    def test_find_lun_cached(self):
+        enumerations = []
+        real_enumerate = FakeEcomConnection.EnumerateInstances
+
+        def fake_enumerate(conn, name, PropertyList=None):
+            enumerations.append(name)
+            return real_enumerate(conn, name, PropertyList)
+
+        self.stubs.Set(FakeEcomConnection, 'EnumerateInstances',
+                       fake_enumerate)
+        common = self.driver.common
+        volume = {'name': test_clone['name']}
+        self.assertEqual(common._find_lun(volume)['DeviceID'],
+                         test_clone['id'])
+        self.assertEqual(volume['provider_location'], test_clone['id'])
+        self.assertEqual(common._find_lun(volume)['ElementName'],
+                         test_clone['name'])
+        self.assertEqual(
+            common._find_lun({'name': test_clone3['name']})['DeviceID'],
+            test_clone3['id'])
+        self.assertEqual(enumerations, ['EMC_StorageVolume'])
+
+        # A volume unknown to the cache makes it refresh
+        self.assertEqual(common._find_lun({'name': 'notfound'}), None)
+        self.assertEqual(enumerations, ['EMC_StorageVolume'] * 2)
+
+    def test_find_lun_stale(self):
+        common = self.driver.common
+        stale = {'CreationClassName': vol_creationclass,
+                 'DeviceID': '12345',
+                 'SystemName': storage_system}
+        common._remember_lun_name(stale, test_clone['name'])
+        instance = common._find_lun({'name': test_clone['name']})
+        self.assertEqual(instance['DeviceID'], test_clone['id'])
+        self.assertEqual(common._lookup_lun_name('DeviceID', '12345'), None)
+
+    def test_delete_volume_forgets_lun(self):
+        common = self.driver.common
+        volume = {'name': test_clone['name']}
+        common._find_lun(volume)
+        self.assertNotEqual(
+            common._lookup_lun_name('DeviceID', test_clone['id']), None)
+        self.driver.delete_volume(volume)
+        self.assertEqual(
+            common._lookup_lun_name('DeviceID', test_clone['id']), None)
+        self.assertEqual(
+            common._lookup_lun_name('ElementName', test_clone['name']), None)
+
+    def test_wait_for_job_complete_backs_off(self):
+        states = [2L, 4L, 4L, 4L, 4L, 4L, 4L, 7L]
+        sleeps = []
+
+        def fake_get_instance(objectpath, LocalOnly=False):
+            return {'JobState': states.pop(0),
+                    'ErrorCode': 0L,
+                    'ErrorDescription': ''}
+
+        self.stubs.Set(emc_smis_common.time, 'sleep', sleeps.append)
+        common = self.driver.common
+        self.stubs.Set(common.conn, 'GetInstance', fake_get_instance)
+        rc, errordesc = common._wait_for_job_complete({'Job': {}})
+        self.assertEqual(rc, 0L)
+        self.assertEqual(sleeps, [0.5, 1, 2, 4, 8, 10, 10])
+
     def _cleanup(self):
         bExists = os.path.exists(self.config_file_path)
         if bExists:
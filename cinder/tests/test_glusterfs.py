@@ -67,6 +67,7 @@ class GlusterFsDriverTestCase(test.TestCase):
         self._configuration.glusterfs_mount_point_base = \
             self.TEST_MNT_POINT_BASE
         self._configuration.glusterfs_disk_util = 'df'
+        self._configuration.glusterfs_allocated_reconcile_interval = 600
         self._configuration.glusterfs_sparsed_volumes = True
 
         self.stubs = stubout.StubOutForTesting()
@@ -245,7 +246,6 @@ class GlusterFsDriverTestCase(test.TestCase):
         df_output = df_title + df_mnt_data
 
         du_used = 490560
-        du_output = '%d /mnt' % du_used
 
         mox.StubOutWithMock(drv, '_get_mount_point_for_share')
         drv._get_mount_point_for_share(self.TEST_EXPORT1).\
@@ -256,10 +256,9 @@ class GlusterFsDriverTestCase(test.TestCase):
                      self.TEST_MNT_POINT,
                      run_as_root=True).\
             AndReturn((df_output, None))
-        drv._execute('du', '-sb', '--apparent-size',
-                     '--exclude', '*snapshot*',
-                     self.TEST_MNT_POINT,
-                     run_as_root=True).AndReturn((du_output, None))
+
+        mox.StubOutWithMock(drv, '_get_allocated')
+        drv._get_allocated(self.TEST_EXPORT1).AndReturn(du_used)
 
         mox.ReplayAll()
 
@@ -545,6 +544,7 @@ class GlusterFsDriverTestCase(test.TestCase):
         volume = DumbVolume()
         volume['name'] = 'volume-123'
         volume['provider_location'] = self.TEST_EXPORT1
+        volume['size'] = self.TEST_SIZE_IN_GB
 
         mox.StubOutWithMock(drv, 'local_path')
         drv.local_path(volume).AndReturn(self.TEST_LOCAL_PATH)
@@ -568,6 +568,7 @@ class GlusterFsDriverTestCase(test.TestCase):
         volume = DumbVolume()
         volume['name'] = 'volume-123'
         volume['provider_location'] = self.TEST_EXPORT1
+        volume['size'] = self.TEST_SIZE_IN_GB
 
         mox.StubOutWithMock(drv, '_ensure_share_mounted')
         drv._ensure_share_mounted(self.TEST_EXPORT1)
@@ -18,6 +18,7 @@
 """
 Unit tests for OpenStack Cinder volume drivers
 """
+import contextlib
 import mox
 import shutil
 import tempfile
@@ -28,6 +29,7 @@ from cinder import exception
 from cinder.openstack.common import log as logging
 from cinder import test
 from cinder.volume import configuration as conf
+from cinder.volume.drivers.san.hp import hp_3par_common as hpcommon
 from cinder.volume.drivers.san.hp import hp_3par_fc as hpfcdriver
 from cinder.volume.drivers.san.hp import hp_3par_iscsi as hpdriver
 
@@ -406,6 +408,54 @@ class HP3PARBaseDriver():
                           self.driver.create_volume_from_snapshot,
                           volume, self.snapshot)
 
+    def test_client_session_is_shared(self):
+        self.mox.StubOutWithMock(self.driver.common.client, 'login')
+        self.mox.StubOutWithMock(self.driver.common.client, 'logout')
+        self.driver.common.client.login(mox.IgnoreArg(), mox.IgnoreArg())
+        self.driver.common.client.logout()
+        self.mox.ReplayAll()
+
+        with self.driver.common.client_session():
+            with self.driver.common.client_session():
+                pass
+        self.assertEqual(self.driver.common._client_sessions, 0)
+
+    def test_client_calls_are_serialized(self):
+        common = self.driver.common
+        self.assertTrue(isinstance(common.client,
+                                   hpcommon.SerializedClient))
+        calls = []
+
+        def _get_cpg(name):
+            calls.append(common.client._semaphore.locked())
+            return {}
+
+        self.stubs.Set(common.client._client, 'getCPG', _get_cpg)
+        common.client.getCPG(HP3PAR_CPG)
+        self.assertEqual(calls, [True])
+        self.assertFalse(common.client._semaphore.locked())
+
+    def test_volumes_lock_order(self):
+        locked = []
+
+        @contextlib.contextmanager
+        def _volume_lock(volume_id):
+            locked.append(volume_id)
+            yield
+
+        self.stubs.Set(self.driver.common, 'volume_lock', _volume_lock)
+        with self.driver.common.volumes_lock('b', 'a', 'b'):
+            pass
+        self.assertEqual(locked, ['a', 'b'])
+
+    def test_client_session_logs_out_on_error(self):
+        def _raise():
+            with self.driver.common.client_session():
+                raise exception.VolumeBackendAPIException(data='fake')
+
+        self.assertRaises(exception.VolumeBackendAPIException, _raise)
+        self.assertEqual(self.driver.common._client_sessions, 0)
+
     def test_terminate_connection(self):
         self.flags(lock_path=self.tempdir)
         #setup the connections
@@ -441,6 +491,7 @@ class TestHP3PARFCDriver(HP3PARBaseDriver, test.TestCase):
         configuration.san_ip = '2.2.2.2'
         configuration.san_login = 'test'
         configuration.san_password = 'test'
+        configuration.ssh_cache_ttl = 2
         configuration.hp3par_snapshot_expiration = ""
         configuration.hp3par_snapshot_retention = ""
         self.stubs.Set(hpfcdriver.hpcommon.HP3PARCommon, "_create_client",
@@ -534,7 +585,7 @@ class TestHP3PARFCDriver(HP3PARBaseDriver, test.TestCase):
                   'size': 2,
                   'host': HP3PARBaseDriver.FAKE_HOST,
                   'source_volid': HP3PARBaseDriver.VOLUME_ID}
-        src_vref = {}
+        src_vref = {'id': HP3PARBaseDriver.VOLUME_ID}
         model_update = self.driver.create_cloned_volume(volume, src_vref)
         self.assertTrue(model_update is not None)
         metadata = model_update['metadata']
@@ -662,6 +713,7 @@ class TestHP3PARISCSIDriver(HP3PARBaseDriver, test.TestCase):
         configuration.san_ip = '2.2.2.2'
         configuration.san_login = 'test'
         configuration.san_password = 'test'
+        configuration.ssh_cache_ttl = 2
         configuration.hp3par_snapshot_expiration = ""
         configuration.hp3par_snapshot_retention = ""
 
@@ -762,7 +814,7 @@ class TestHP3PARISCSIDriver(HP3PARBaseDriver, test.TestCase):
                   'size': 2,
                   'host': HP3PARBaseDriver.FAKE_HOST,
                   'source_volid': HP3PARBaseDriver.VOLUME_ID}
-        src_vref = {}
+        src_vref = {'id': HP3PARBaseDriver.VOLUME_ID}
         model_update = self.driver.create_cloned_volume(volume, src_vref)
         self.assertTrue(model_update is not None)
         metadata = model_update['metadata']
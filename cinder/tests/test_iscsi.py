@@ -14,16 +14,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os.path
 import shutil
 import string
 import tempfile
 
 from cinder.brick.iscsi import iscsi
+from cinder import exception
 from cinder import test
+from cinder import utils
 from cinder.volume import utils as volume_utils
 
 
+def fake_lio_init(obj):
+    obj.targets = iscsi.TargetTable(dict)
+
+
 class TargetAdminTestCase(object):
 
     def setUp(self):
@@ -40,10 +47,7 @@ class TargetAdminTestCase(object):
         self.stubs.Set(os, 'unlink', lambda _: '')
         self.stubs.Set(iscsi.TgtAdm, '_get_target', self.fake_get_target)
         self.stubs.Set(iscsi.LioAdm, '_get_target', self.fake_get_target)
-        self.stubs.Set(iscsi.LioAdm, '__init__', self.fake_init)
-
-    def fake_init(obj):
-        return
+        self.stubs.Set(iscsi.LioAdm, '__init__', fake_lio_init)
 
     def fake_get_target(obj, iqn):
         return 1
@@ -101,7 +105,7 @@ class TgtAdmTestCase(test.TestCase, TargetAdminTestCase):
         self.flags(iscsi_helper='tgtadm')
         self.flags(volumes_dir=self.persist_tempdir)
         self.script_template = "\n".join([
-            'tgt-admin --update iqn.2011-09.org.foo.bar:blaa',
+            'tgt-admin --verbose --update iqn.2011-09.org.foo.bar:blaa',
             'tgt-admin --force '
             '--delete iqn.2010-10.org.openstack:volume-blaa'])
 
@@ -112,6 +116,125 @@ class TgtAdmTestCase(test.TestCase, TargetAdminTestCase):
             pass
         super(TgtAdmTestCase, self).tearDown()
 
+    def _bulk_targets(self):
+        return [{'name': 'iqn.2010-10.org.openstack:volume-%s' % vol_id,
+                 'tid': 1, 'lun': 0, 'path': '/dev/vg/volume-%s' % vol_id,
+                 'chap_auth': None, 'old_name': None}
+                for vol_id in ('a', 'b')]
+
+    def test_create_iscsi_targets(self):
+        show = ('Target 1: iqn.2010-10.org.openstack:volume-a\n'
+                '    System information:\n'
+                'Target 2: iqn.2010-10.org.openstack:volume-b\n')
+
+        def fake_execute(*cmd, **kwargs):
+            self.cmds.append(string.join(cmd))
+            return show, None
+
+        tgtadm = iscsi.get_target_admin()
+        tgtadm.set_execute(fake_execute)
+        tids = tgtadm.create_iscsi_targets(self._bulk_targets())
+
+        self.verify_cmds(['tgt-admin --update ALL', 'tgt-admin --show'])
+        self.assertEqual(tids, {'iqn.2010-10.org.openstack:volume-a': '1',
+                                'iqn.2010-10.org.openstack:volume-b': '2'})
+        self.assertEqual(sorted(os.listdir(self.persist_tempdir)),
+                         ['volume-a', 'volume-b'])
+
+    def test_create_iscsi_target_new_tid(self):
+        self.stubs.UnsetAll()
+        self.flags(iscsi_target_prefix='iqn.2010-10.org.openstack:')
+        update = ('# Adding target: iqn.2010-10.org.openstack:volume-a\n'
+                  'tgtadm -C 0 --lld iscsi --op new --mode target --tid 3 '
+                  '-T iqn.2010-10.org.openstack:volume-a\n')
+
+        def fake_execute(*cmd, **kwargs):
+            self.cmds.append(string.join(cmd))
+            if '--update' in cmd:
+                return update, None
+            return 'Target 3: iqn.2010-10.org.openstack:volume-a\n', None
+
+        tgtadm = iscsi.get_target_admin()
+        tgtadm.set_execute(fake_execute)
+        tgtadm.targets.refresh()
+        self.clear_cmds()
+        tid = tgtadm.create_iscsi_target(
+            'iqn.2010-10.org.openstack:volume-a', 1, 0, '/dev/vg/volume-a')
+
+        self.assertEqual(tid, '3')
+        self.verify_cmds(['tgt-admin --verbose --update '
+                          'iqn.2010-10.org.openstack:volume-a'])
+        self.assertEqual(
+            tgtadm.targets.get('iqn.2010-10.org.openstack:volume-a'), '3')
+        self.assertEqual(len(self.cmds), 1)
+
+    def test_target_table(self):
+        show = ('Target 1: iqn.2010-10.org.openstack:volume-a\n'
+                '    System information:\n'
+                '        Driver: iscsi\n'
+                'Target 2: iqn.2010-10.org.openstack:volume-b\n')
+
+        def fake_execute(*cmd, **kwargs):
+            self.cmds.append(string.join(cmd))
+            return show, None
+
+        tgtadm = iscsi.get_target_admin()
+        tgtadm.set_execute(fake_execute)
+        table = tgtadm.targets
+        self.assertEqual(table.get('iqn.2010-10.org.openstack:volume-a'), '1')
+        self.assertEqual(table.get('iqn.2010-10.org.openstack:volume-b'), '2')
+        self.assertEqual(len(self.cmds), 1)
+
+        # Missing targets are looked up again.
+        self.assertEqual(table.get('iqn.2010-10.org.openstack:volume-c'),
+                         None)
+        self.assertEqual(len(self.cmds), 2)
+
+        table.remove('iqn.2010-10.org.openstack:volume-a')
+        table.add('iqn.2010-10.org.openstack:volume-c', '3')
+        self.assertEqual(table.get('iqn.2010-10.org.openstack:volume-c'), '3')
+        self.assertEqual(len(self.cmds), 2)
+
+        table.invalidate()
+        self.assertEqual(table.get('iqn.2010-10.org.openstack:volume-a'), '1')
+        self.assertEqual(len(self.cmds), 3)
+
+    def test_target_table_refresh_interval(self):
+        now = [1000]
+        self.stubs.Set(iscsi.time, 'time', lambda: now[0])
+        self.flags(iscsi_targets_refresh_interval=60)
+        table = iscsi.TargetTable(lambda: self.cmds.append('list') or
+                                  {'iqn.2010-10.org.openstack:volume-a': '1'})
+        table.get('iqn.2010-10.org.openstack:volume-a')
+        now[0] += 60
+        table.get('iqn.2010-10.org.openstack:volume-a')
+        self.assertEqual(self.cmds, ['list'])
+        now[0] += 1
+        table.get('iqn.2010-10.org.openstack:volume-a')
+        self.assertEqual(self.cmds, ['list', 'list'])
+
+    def test_create_iscsi_targets_missing(self):
+        tgtadm = iscsi.get_target_admin()
+        tgtadm.set_execute(self.fake_execute)
+        self.assertRaises(exception.NotFound,
+                          tgtadm.create_iscsi_targets, self._bulk_targets())
+
+    def test_create_iscsi_targets_fallback(self):
+        def fake_execute(*cmd, **kwargs):
+            self.cmds.append(string.join(cmd))
+            if 'ALL' in cmd:
+                raise exception.ProcessExecutionError()
+            return "", None
+
+        tgtadm = iscsi.get_target_admin()
+        tgtadm.set_execute(fake_execute)
+        tgtadm.create_iscsi_targets(self._bulk_targets())
+        self.verify_cmds(['tgt-admin --update ALL',
+                          'tgt-admin --verbose --update '
+                          'iqn.2010-10.org.openstack:volume-a',
+                          'tgt-admin --verbose --update '
+                          'iqn.2010-10.org.openstack:volume-b'])
+
 
 class IetAdmTestCase(test.TestCase, TargetAdminTestCase):
 
@@ -127,6 +250,34 @@ class IetAdmTestCase(test.TestCase, TargetAdminTestCase):
             'ietadm --op delete --tid=%(tid)s --lun=%(lun)s',
             'ietadm --op delete --tid=%(tid)s'])
 
+    def test_create_iscsi_targets(self):
+        (fd, conf_file) = tempfile.mkstemp()
+        self.addCleanup(os.remove, conf_file)
+        with os.fdopen(fd, 'w') as f:
+            f.write('Target iqn.2010-10.org.openstack:volume-a\n')
+        self.flags(iet_conf=conf_file)
+
+        @contextlib.contextmanager
+        def fake_temporary_chown(path):
+            yield
+
+        self.stubs.Set(utils, 'temporary_chown', fake_temporary_chown)
+        targets = [{'name': 'iqn.2010-10.org.openstack:volume-%s' % vol_id,
+                    'tid': tid, 'lun': 0, 'path': '/foo', 'chap_auth': None}
+                   for (tid, vol_id) in ((1, 'a'), (2, 'b'))]
+
+        tgtadm = iscsi.get_target_admin()
+        tgtadm.set_execute(self.fake_execute)
+        tids = tgtadm.create_iscsi_targets(targets)
+
+        self.assertEqual(len(self.cmds), 4)
+        self.assertEqual(tids, {'iqn.2010-10.org.openstack:volume-a': 1,
+                                'iqn.2010-10.org.openstack:volume-b': 2})
+        with open(conf_file) as f:
+            conf = f.read()
+        self.assertEqual(conf.count('Target '), 2)
+        self.assertTrue('Target iqn.2010-10.org.openstack:volume-b' in conf)
+
 
 class IetAdmBlockIOTestCase(test.TestCase, TargetAdminTestCase):
 
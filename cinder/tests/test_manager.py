@@ -0,0 +1,86 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit Tests for cinder.manager
+"""
+
+from cinder import context
+from cinder import manager
+from cinder import test
+
+
+class SchedulerDependentManagerTestCase(test.TestCase):
+    """Test case for capability publication to the schedulers."""
+
+    def setUp(self):
+        super(SchedulerDependentManagerTestCase, self).setUp()
+        self.flags(capabilities_full_sync_interval=3)
+        self.manager = manager.SchedulerDependentManager(
+            host='fake_host', service_name='volume')
+        self.context = context.get_admin_context()
+        self.published = []
+
+        def fake_update(ctxt, service_name, host, capabilities, **kwargs):
+            kwargs['capabilities'] = capabilities
+            self.published.append(kwargs)
+
+        self.stubs.Set(self.manager.scheduler_rpcapi,
+                       'update_service_capabilities', fake_update)
+
+    def _publish(self, capabilities, **kwargs):
+        self.manager.update_service_capabilities(capabilities)
+        self.manager._publish_service_capabilities(self.context, **kwargs)
+
+    def test_publish_nothing_without_capabilities(self):
+        self.manager._publish_service_capabilities(self.context)
+        self.assertEqual(self.published, [])
+
+    def test_publish_only_changed_capabilities(self):
+        self._publish({'free_capacity_gb': 10, 'foo': 'bar'})
+        self._publish({'free_capacity_gb': 10, 'foo': 'bar'})
+        self._publish({'free_capacity_gb': 8})
+
+        self.assertEqual(self.published,
+                         [{'capabilities': {'free_capacity_gb': 10,
+                                            'foo': 'bar'},
+                           'generation': 1, 'full_sync': True,
+                           'removed': []},
+                          {'capabilities': {},
+                           'generation': 2, 'full_sync': False,
+                           'removed': []},
+                          {'capabilities': {'free_capacity_gb': 8},
+                           'generation': 3, 'full_sync': False,
+                           'removed': ['foo']}])
+
+    def test_publish_periodic_full_sync(self):
+        for i in range(5):
+            self._publish({'free_capacity_gb': 10})
+
+        self.assertEqual([p['full_sync'] for p in self.published],
+                         [True, False, False, False, True])
+        self.assertEqual([p['generation'] for p in self.published],
+                         [1, 2, 3, 4, 5])
+
+    def test_publish_forced_full_sync(self):
+        self._publish({'free_capacity_gb': 10})
+        self._publish({'free_capacity_gb': 10}, full_sync=True)
+
+        self.assertEqual(self.published[1],
+                         {'capabilities': {'free_capacity_gb': 10},
+                          'generation': 2, 'full_sync': True,
+                          'removed': []})
@@ -721,3 +721,27 @@ class TestMigrations(test.TestCase):
             # Make sure we put all the columns back
             for column in volumes_v10.c:
                 self.assertTrue(volumes.c.__contains__(column.name))
+
+    def test_upgrade_012_adds_backup_checkpoint(self):
+        for metadata in self.metadatas_upgraded_to(12):
+            backups = sqlalchemy.Table('backups', metadata, autoload=True)
+            self.assertTrue(isinstance(backups.c.checkpoint.type,
+                                       sqlalchemy.types.VARCHAR))
+
+    def test_downgrade_012_removes_backup_checkpoint(self):
+        for metadata in self.metadatas_downgraded_from(12):
+            backups = sqlalchemy.Table('backups', metadata, autoload=True)
+
+            self.assertTrue('checkpoint' not in backups.c)
+
+    def test_upgrade_013_adds_backup_progress(self):
+        for metadata in self.metadatas_upgraded_to(13):
+            backups = sqlalchemy.Table('backups', metadata, autoload=True)
+            self.assertTrue(isinstance(backups.c.progress.type,
+                                       sqlalchemy.types.VARCHAR))
+
+    def test_downgrade_013_removes_backup_progress(self):
+        for metadata in self.metadatas_downgraded_from(13):
+            backups = sqlalchemy.Table('backups', metadata, autoload=True)
+
+            self.assertTrue('progress' not in backups.c)
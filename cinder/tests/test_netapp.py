@@ -20,7 +20,9 @@ Tests for NetApp volume driver
 """
 
 import BaseHTTPServer
+import errno
 import httplib
+import socket
 import StringIO
 
 from lxml import etree
@@ -30,6 +32,7 @@ from cinder.exception import VolumeBackendAPIException
 from cinder.openstack.common import log as logging
 from cinder import test
 from cinder.volume import configuration as conf
+from cinder.volume.drivers.netapp import api
 from cinder.volume.drivers.netapp import common
 from cinder.volume.drivers.netapp.options import netapp_7mode_opts
 from cinder.volume.drivers.netapp.options import netapp_basicauth_opts
@@ -450,6 +453,9 @@ class FakeDirectCmodeHTTPConnection(object):
     def set_debuglevel(self, level):
         pass
 
+    def close(self):
+        pass
+
     def getresponse(self):
         self.http_response.begin()
         return self.http_response
@@ -1019,6 +1025,9 @@ class FakeDirect7modeHTTPConnection(object):
     def set_debuglevel(self, level):
         pass
 
+    def close(self):
+        pass
+
     def getresponse(self):
         self.http_response.begin()
         return self.http_response
@@ -1103,3 +1112,138 @@ class NetAppDirect7modeISCSIDriverTestCase_WV(
         configuration.netapp_server_port = '80'
         configuration.netapp_vfiler = 'openstack'
         return configuration
+
+
+class FakeKeepAliveHTTPConnection(object):
+    """A fake httplib.HTTPConnection answering from a list of bodies.
+
+    Keeps track of the connections made and of the requests sent on them.
+    """
+    connections = []
+    bodies = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.requests = []
+        self.closed = False
+        # Errors raised when sending the next request or reading its
+        # response
+        self.request_error = None
+        self.response_error = None
+        FakeKeepAliveHTTPConnection.connections.append(self)
+
+    def request(self, method, path, data=None, headers=None):
+        if self.request_error is not None:
+            raise self.request_error
+        self.requests.append((method, path, data, headers))
+
+    def getresponse(self):
+        if self.response_error is not None:
+            raise self.response_error
+        body = FakeKeepAliveHTTPConnection.bodies.pop(0)
+        response = httplib.HTTPResponse(FakeHttplibSocket(
+            'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s'
+            % (len(body), body)))
+        response.begin()
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+def _direct_response(results):
+    return (RESPONSE_PREFIX_DIRECT_CMODE + RESPONSE_PREFIX_DIRECT +
+            results + RESPONSE_SUFFIX_DIRECT)
+
+
+class NetAppApiServerTestCase(test.TestCase):
+    """Test case for the NaServer transport."""
+
+    def setUp(self):
+        super(NetAppApiServerTestCase, self).setUp()
+        self.stubs.Set(httplib, 'HTTPConnection',
+                       FakeKeepAliveHTTPConnection)
+        FakeKeepAliveHTTPConnection.connections = []
+        FakeKeepAliveHTTPConnection.bodies = []
+        self.client = api.NaServer('127.0.0.1', username='admin',
+                                   password='pass', pool_size=2)
+
+    def test_invoke_keeps_connection(self):
+        FakeKeepAliveHTTPConnection.bodies = [
+            _direct_response('<results status="passed"/>'),
+            _direct_response('<results status="passed"/>')]
+        for _i in range(2):
+            self.client.invoke_successfully(
+                api.NaElement('system-get-version'))
+
+        connections = FakeKeepAliveHTTPConnection.connections
+        self.assertEqual(len(connections), 1)
+        self.assertEqual(connections[0].host, '127.0.0.1:80')
+        self.assertEqual(len(connections[0].requests), 2)
+        (method, path, data, headers) = connections[0].requests[0]
+        self.assertEqual(method, 'POST')
+        self.assertEqual(path, '/' + api.NaServer.URL_FILER)
+        self.assertEqual(headers['Authorization'], 'Basic YWRtaW46cGFzcw==')
+        self.assertEqual(headers['Content-Length'], str(len(data)))
+
+    def test_invoke_stale_connection(self):
+        FakeKeepAliveHTTPConnection.bodies = [
+            _direct_response('<results status="passed"/>'),
+            _direct_response('<results status="passed"/>')]
+        self.client.invoke_successfully(api.NaElement('system-get-version'))
+        # The server closed the idle connection
+        FakeKeepAliveHTTPConnection.connections[0].response_error = (
+            httplib.BadStatusLine(''))
+        self.client.invoke_successfully(api.NaElement('system-get-version'))
+        self.assertEqual(len(FakeKeepAliveHTTPConnection.connections), 2)
+
+        FakeKeepAliveHTTPConnection.bodies = [
+            _direct_response('<results status="passed"/>')]
+        FakeKeepAliveHTTPConnection.connections[1].request_error = (
+            socket.error(errno.EPIPE, 'Broken pipe'))
+        self.client.invoke_successfully(api.NaElement('system-get-version'))
+        self.assertEqual(len(FakeKeepAliveHTTPConnection.connections), 3)
+
+    def test_invoke_timeout_not_retried(self):
+        FakeKeepAliveHTTPConnection.bodies = [
+            _direct_response('<results status="passed"/>')]
+        self.client.invoke_successfully(api.NaElement('system-get-version'))
+        # The request may have run, e.g. created a LUN, before the timeout
+        conn = FakeKeepAliveHTTPConnection.connections[0]
+        conn.response_error = socket.timeout('timed out')
+        self.assertRaises(api.NaApiError, self.client.invoke_successfully,
+                          api.NaElement('lun-create-by-size'))
+        self.assertEqual(len(conn.requests), 2)
+        self.assertEqual(len(FakeKeepAliveHTTPConnection.connections), 1)
+        self.assertTrue(conn.closed)
+
+    def test_invoke_iter(self):
+        FakeKeepAliveHTTPConnection.bodies = [
+            _direct_response('<results status="passed"><attributes-list>'
+                             '<lun-info><path>/vol/v/lun1</path></lun-info>'
+                             '<lun-info><path>/vol/v/lun2</path></lun-info>'
+                             '</attributes-list>'
+                             '<next-tag>&lt;key&gt;lun2&lt;/key&gt;</next-tag>'
+                             '<num-records>2</num-records></results>'),
+            _direct_response('<results status="passed"><attributes-list>'
+                             '<lun-info><path>/vol/v/lun3</path></lun-info>'
+                             '</attributes-list>'
+                             '<num-records>1</num-records></results>')]
+        luns = self.client.invoke_iter(api.NaElement('lun-get-iter'), 2)
+        self.assertEqual([lun.get_child_content('path') for lun in luns],
+                         ['/vol/v/lun1', '/vol/v/lun2', '/vol/v/lun3'])
+
+        connections = FakeKeepAliveHTTPConnection.connections
+        self.assertEqual(len(connections), 1)
+        request = etree.fromstring(connections[0].requests[1][2])[0]
+        ns = api.NaServer.NETAPP_NS
+        self.assertEqual(request.findtext('{%s}max-records' % ns), '2')
+        self.assertEqual(request.findtext('{%s}tag' % ns), '<key>lun2</key>')
+
+    def test_invoke_iter_failed(self):
+        FakeKeepAliveHTTPConnection.bodies = [
+            _direct_response('<results status="failed" errno="13005" '
+                             'reason="Unable to find API"/>')]
+        luns = self.client.invoke_iter(api.NaElement('lun-get-iter'))
+        self.assertRaises(api.NaApiError, list, luns)
+        self.assertTrue(FakeKeepAliveHTTPConnection.connections[0].closed)
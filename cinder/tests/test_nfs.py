@@ -19,7 +19,11 @@
 import __builtin__
 import errno
 import os
+import shutil
+import tempfile
 
+from eventlet import event
+import eventlet
 from oslo.config import cfg
 
 import mox as mox_lib
@@ -30,6 +34,7 @@ from mox import stubout
 from cinder import context
 from cinder import exception
 from cinder.exception import ProcessExecutionError
+from cinder.openstack.common import timeutils
 from cinder import test
 from cinder import units
 
@@ -132,6 +137,9 @@ class NfsDriverTestCase(test.TestCase):
         self.configuration.nfs_sparsed_volumes = True
         self.configuration.nfs_used_ratio = 0.95
         self.configuration.nfs_oversub_ratio = 1.0
+        self.configuration.nfs_allocated_reconcile_interval = 600
+        self.configuration.nfs_probe_timeout = 30
+        self.configuration.nfs_capacity_cache_ttl = 60
         self._driver = nfs.NfsDriver(configuration=self.configuration)
         self._driver.shares = {}
         self.addCleanup(self.stubs.UnsetAll)
@@ -301,7 +309,6 @@ class NfsDriverTestCase(test.TestCase):
         stat_output = '1 %d %d' % (stat_total_size, stat_avail)
 
         du_used = 490560
-        du_output = '%d /mnt' % du_used
 
         mox.StubOutWithMock(drv, '_get_mount_point_for_share')
         drv._get_mount_point_for_share(self.TEST_NFS_EXPORT1).\
@@ -312,10 +319,8 @@ class NfsDriverTestCase(test.TestCase):
                      self.TEST_MNT_POINT,
                      run_as_root=True).AndReturn((stat_output, None))
 
-        drv._execute('du', '-sb', '--apparent-size',
-                     '--exclude', '*snapshot*',
-                     self.TEST_MNT_POINT,
-                     run_as_root=True).AndReturn((du_output, None))
+        mox.StubOutWithMock(drv, '_get_allocated')
+        drv._get_allocated(self.TEST_NFS_EXPORT1).AndReturn(du_used)
 
         mox.ReplayAll()
 
@@ -334,7 +339,6 @@ class NfsDriverTestCase(test.TestCase):
         stat_output = '1 %d %d' % (stat_total_size, stat_avail)
 
         du_used = 490560
-        du_output = '%d /mnt' % du_used
 
         mox.StubOutWithMock(drv, '_get_mount_point_for_share')
         drv._get_mount_point_for_share(self.TEST_NFS_EXPORT_SPACES).\
@@ -345,10 +349,8 @@ class NfsDriverTestCase(test.TestCase):
                      self.TEST_MNT_POINT_SPACES,
                      run_as_root=True).AndReturn((stat_output, None))
 
-        drv._execute('du', '-sb', '--apparent-size',
-                     '--exclude', '*snapshot*',
-                     self.TEST_MNT_POINT_SPACES,
-                     run_as_root=True).AndReturn((du_output, None))
+        mox.StubOutWithMock(drv, '_get_allocated')
+        drv._get_allocated(self.TEST_NFS_EXPORT_SPACES).AndReturn(du_used)
 
         mox.ReplayAll()
 
@@ -357,6 +359,90 @@ class NfsDriverTestCase(test.TestCase):
 
         mox.VerifyAll()
 
+    def test_get_allocated_runs_du_only_once(self):
+        """_get_allocated should serve repeated lookups from memory."""
+        mox = self._mox
+        drv = self._driver
+        self.configuration.nfs_mount_point_base = self.TEST_MNT_POINT_BASE
+
+        mox.StubOutWithMock(drv, '_load_allocated')
+        mox.StubOutWithMock(drv, '_save_allocated')
+        drv._load_allocated(self.TEST_NFS_EXPORT1).AndReturn(None)
+        drv._save_allocated(self.TEST_NFS_EXPORT1)
+
+        mox.StubOutWithMock(drv, '_execute')
+        drv._execute('du', '-sb', '--apparent-size',
+                     '--exclude', '*snapshot*',
+                     drv._get_mount_point_for_share(self.TEST_NFS_EXPORT1),
+                     run_as_root=True).AndReturn(('%d /mnt' % units.GiB,
+                                                  None))
+
+        mox.ReplayAll()
+
+        self.assertEqual(units.GiB, drv._get_allocated(self.TEST_NFS_EXPORT1))
+        self.assertEqual(units.GiB, drv._get_allocated(self.TEST_NFS_EXPORT1))
+
+        mox.VerifyAll()
+
+    def test_update_allocated(self):
+        """_update_allocated should adjust tracked shares only."""
+        mox = self._mox
+        drv = self._driver
+
+        drv._allocated[self.TEST_NFS_EXPORT1] = {'allocated': 2.0 * units.GiB,
+                                                 'synced_at': 0}
+
+        mox.StubOutWithMock(drv, '_save_allocated')
+        drv._save_allocated(self.TEST_NFS_EXPORT1)
+        drv._save_allocated(self.TEST_NFS_EXPORT1)
+
+        mox.ReplayAll()
+
+        drv._update_allocated(self.TEST_NFS_EXPORT1, 3)
+        self.assertEqual(5 * units.GiB,
+                         drv._allocated[self.TEST_NFS_EXPORT1]['allocated'])
+        drv._update_allocated(self.TEST_NFS_EXPORT1, -10)
+        self.assertEqual(0, drv._allocated[self.TEST_NFS_EXPORT1]['allocated'])
+        drv._update_allocated(self.TEST_NFS_EXPORT2, 1)
+        self.assertFalse(self.TEST_NFS_EXPORT2 in drv._allocated)
+
+        mox.VerifyAll()
+
+    def test_reconcile_stale_allocated(self):
+        """Only shares not scanned within the interval are reconciled."""
+        mox = self._mox
+        drv = self._driver
+
+        now = timeutils.utcnow_ts()
+        drv._allocated[self.TEST_NFS_EXPORT1] = {'allocated': 0,
+                                                 'synced_at': now - 10}
+        drv._allocated[self.TEST_NFS_EXPORT2] = {'allocated': 0,
+                                                 'synced_at': now - 1000}
+
+        mox.StubOutWithMock(drv, '_reconcile_allocated')
+        drv._reconcile_allocated(self.TEST_NFS_EXPORT2)
+
+        mox.ReplayAll()
+
+        drv._reconcile_stale_allocated(
+            [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2], 600)
+
+        mox.VerifyAll()
+
+    def test_allocated_persisted_across_drivers(self):
+        """Allocated space saved by one driver is loaded by the next."""
+        drv = self._driver
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        self.configuration.nfs_mount_point_base = tempdir
+
+        drv._allocated[self.TEST_NFS_EXPORT1] = {'allocated': 42.0,
+                                                 'synced_at': 1.0}
+        drv._save_allocated(self.TEST_NFS_EXPORT1)
+
+        new_drv = nfs.NfsDriver(configuration=self.configuration)
+        self.assertEqual(42.0, new_drv._get_allocated(self.TEST_NFS_EXPORT1))
+
     def test_load_shares_config(self):
         mox = self._mox
         drv = self._driver
@@ -415,8 +501,11 @@ class NfsDriverTestCase(test.TestCase):
             AndReturn(config_data)
 
         mox.StubOutWithMock(drv, '_ensure_share_mounted')
+        mox.StubOutWithMock(drv, '_stat_share')
         drv.configuration.nfs_shares_config = self.TEST_SHARES_CONFIG_FILE
         drv._ensure_share_mounted(self.TEST_NFS_EXPORT1)
+        drv._stat_share(self.TEST_NFS_EXPORT1).AndReturn((10 * units.GiB,
+                                                          2 * units.GiB))
 
         mox.ReplayAll()
 
@@ -424,6 +513,9 @@ class NfsDriverTestCase(test.TestCase):
 
         self.assertEqual(1, len(drv._mounted_shares))
         self.assertEqual(self.TEST_NFS_EXPORT1, drv._mounted_shares[0])
+        self.assertEqual(2 * units.GiB,
+                         drv._share_capacity[self.TEST_NFS_EXPORT1]
+                         ['available'])
 
         mox.VerifyAll()
 
@@ -447,9 +539,52 @@ class NfsDriverTestCase(test.TestCase):
         drv._ensure_shares_mounted()
 
         self.assertEqual(0, len(drv._mounted_shares))
+        self.assertIn(self.TEST_NFS_EXPORT1, drv._quarantined_shares)
 
         mox.VerifyAll()
 
+    def test_ensure_shares_mounted_should_quarantine_hung_share(self):
+        """A share not answering in time is left out until it recovers."""
+        drv = self._driver
+        self.configuration.nfs_probe_timeout = 0.05
+        drv.shares = {self.TEST_NFS_EXPORT1: None,
+                      self.TEST_NFS_EXPORT2: None}
+        self.stubs.Set(drv, '_load_shares_config', lambda config: None)
+        self.stubs.Set(drv, '_ensure_share_mounted', lambda share: None)
+
+        hung = event.Event()
+        probed = []
+
+        def _stat_share(share):
+            probed.append(share)
+            if share == self.TEST_NFS_EXPORT2 and not hung.ready():
+                hung.wait()
+            return 10 * units.GiB, 2 * units.GiB
+
+        self.stubs.Set(drv, '_stat_share', _stat_share)
+
+        drv._ensure_shares_mounted()
+        self.assertEqual([self.TEST_NFS_EXPORT1], drv._mounted_shares)
+        self.assertIn(self.TEST_NFS_EXPORT2, drv._quarantined_shares)
+
+        # A new probe does not wait again for the hung share
+        drv._ensure_shares_mounted(max_age=0)
+        self.assertEqual([self.TEST_NFS_EXPORT1] * 2 +
+                         [self.TEST_NFS_EXPORT2],
+                         sorted(probed))
+
+        hung.send()
+        eventlet.sleep(0)
+        self.assertEqual({}, drv._quarantined_shares)
+
+        # The probes are reused until they are older than the cache ttl
+        del probed[:]
+        drv._ensure_shares_mounted()
+        self.assertEqual([], probed)
+        self.assertEqual(sorted([self.TEST_NFS_EXPORT1,
+                                 self.TEST_NFS_EXPORT2]),
+                         sorted(drv._mounted_shares))
+
     def test_setup_should_throw_error_if_shares_config_not_configured(self):
         """do_setup should throw error if shares config is not configured."""
         drv = self._driver
@@ -517,11 +652,11 @@ class NfsDriverTestCase(test.TestCase):
 
         drv._mounted_shares = [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2]
 
-        mox.StubOutWithMock(drv, '_get_capacity_info')
-        drv._get_capacity_info(self.TEST_NFS_EXPORT1).\
+        mox.StubOutWithMock(drv, '_get_share_capacity')
+        drv._get_share_capacity(self.TEST_NFS_EXPORT1).\
             AndReturn((5 * units.GiB, 2 * units.GiB,
                        2 * units.GiB))
-        drv._get_capacity_info(self.TEST_NFS_EXPORT2).\
+        drv._get_share_capacity(self.TEST_NFS_EXPORT2).\
             AndReturn((10 * units.GiB, 3 * units.GiB,
                        1 * units.GiB))
 
@@ -539,10 +674,10 @@ class NfsDriverTestCase(test.TestCase):
 
         drv._mounted_shares = [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2]
 
-        mox.StubOutWithMock(drv, '_get_capacity_info')
-        drv._get_capacity_info(self.TEST_NFS_EXPORT1).\
+        mox.StubOutWithMock(drv, '_get_share_capacity')
+        drv._get_share_capacity(self.TEST_NFS_EXPORT1).\
             AndReturn((5 * units.GiB, 0, 5 * units.GiB))
-        drv._get_capacity_info(self.TEST_NFS_EXPORT2).\
+        drv._get_share_capacity(self.TEST_NFS_EXPORT2).\
             AndReturn((10 * units.GiB, 0,
                        10 * units.GiB))
 
@@ -655,6 +790,7 @@ class NfsDriverTestCase(test.TestCase):
         volume = DumbVolume()
         volume['name'] = 'volume-123'
         volume['provider_location'] = self.TEST_NFS_EXPORT1
+        volume['size'] = self.TEST_SIZE_IN_GB
 
         mox.StubOutWithMock(drv, 'local_path')
         drv.local_path(volume).AndReturn(self.TEST_LOCAL_PATH)
@@ -678,6 +814,7 @@ class NfsDriverTestCase(test.TestCase):
         volume = DumbVolume()
         volume['name'] = 'volume-123'
         volume['provider_location'] = self.TEST_NFS_EXPORT1
+        volume['size'] = self.TEST_SIZE_IN_GB
 
         mox.StubOutWithMock(drv, '_ensure_share_mounted')
         drv._ensure_share_mounted(self.TEST_NFS_EXPORT1)
@@ -713,23 +850,29 @@ class NfsDriverTestCase(test.TestCase):
         drv = self._driver
 
         drv._mounted_shares = [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2]
+        drv._share_capacity = {
+            self.TEST_NFS_EXPORT1: {'total': 10 * units.GiB,
+                                    'available': 2 * units.GiB,
+                                    'probed_at': 0},
+            self.TEST_NFS_EXPORT2: {'total': 20 * units.GiB,
+                                    'available': 3 * units.GiB,
+                                    'probed_at': 0}}
 
         mox.StubOutWithMock(drv, '_ensure_shares_mounted')
-        mox.StubOutWithMock(drv, '_get_capacity_info')
+        mox.StubOutWithMock(drv, '_reconcile_stale_allocated')
 
-        drv._ensure_shares_mounted()
-
-        drv._get_capacity_info(self.TEST_NFS_EXPORT1).\
-            AndReturn((10 * units.GiB, 2 * units.GiB,
-                       2 * units.GiB))
-        drv._get_capacity_info(self.TEST_NFS_EXPORT2).\
-            AndReturn((20 * units.GiB, 3 * units.GiB,
-                       3 * units.GiB))
+        drv._ensure_shares_mounted(max_age=0)
+        drv._reconcile_stale_allocated(
+            [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2], 600)
 
         mox.ReplayAll()
 
         drv.get_volume_stats()
         self.assertEqual(drv._stats['total_capacity_gb'], 30.0)
         self.assertEqual(drv._stats['free_capacity_gb'], 5.0)
+        # The allocated space is reconciled in the background
+        self.assertTrue(drv._reconciling)
+        eventlet.sleep(0)
+        self.assertFalse(drv._reconciling)
 
         mox.VerifyAll()
@@ -147,8 +147,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(mox.IgnoreArg(),
-                               mox.IgnoreArg()).AndRaise(Exception())
+        service.db.service_heartbeat(mox.IgnoreArg(),
+                                     mox.IgnoreArg()).AndRaise(Exception())
 
         self.mox.ReplayAll()
         serv = service.Service(host,
@@ -180,10 +180,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(mox.IgnoreArg(),
-                               service_ref['id']).AndReturn(service_ref)
-        service.db.service_update(mox.IgnoreArg(), service_ref['id'],
-                                  mox.ContainsKeyValue('report_count', 1))
+        service.db.service_heartbeat(mox.IgnoreArg(),
+                                     [service_ref['id']]).AndReturn(1)
 
         self.mox.ReplayAll()
         serv = service.Service(host,
@@ -196,6 +194,118 @@ class ServiceTestCase(test.TestCase):
 
         self.assert_(not serv.model_disconnected)
 
+    def test_report_state_recreates_missing_service(self):
+        host = 'foo'
+        binary = 'bar'
+        topic = 'test'
+        service_create = {'host': host,
+                          'binary': binary,
+                          'topic': topic,
+                          'report_count': 0,
+                          'availability_zone': 'nova'}
+        service_ref = {'host': host,
+                       'binary': binary,
+                       'topic': topic,
+                       'report_count': 0,
+                       'availability_zone': 'nova',
+                       'id': 1}
+
+        service.db.service_get_by_args(mox.IgnoreArg(),
+                                       host,
+                                       binary).AndReturn(service_ref)
+        service.db.service_heartbeat(mox.IgnoreArg(),
+                                     [service_ref['id']]).AndReturn(0)
+        service.db.service_create(mox.IgnoreArg(),
+                                  service_create).AndReturn(
+                                      dict(service_ref, id=2))
+
+        self.mox.ReplayAll()
+        serv = service.Service(host,
+                               binary,
+                               topic,
+                               'cinder.tests.test_service.FakeManager')
+        serv.start()
+        serv.report_state()
+
+        self.assertEqual(serv.service_id, 2)
+        self.assert_(not serv.model_disconnected)
+
+    def test_start_updates_availability_zone(self):
+        self.flags(storage_availability_zone='zone1')
+        service_ref = {'host': 'foo',
+                       'binary': 'bar',
+                       'topic': 'test',
+                       'report_count': 0,
+                       'availability_zone': 'nova',
+                       'id': 1}
+
+        service.db.service_get_by_args(mox.IgnoreArg(), 'foo',
+                                       'bar').AndReturn(service_ref)
+        service.db.service_update(mox.IgnoreArg(), 1,
+                                  {'availability_zone': 'zone1'})
+
+        self.mox.ReplayAll()
+        serv = service.Service('foo', 'bar', 'test',
+                               'cinder.tests.test_service.FakeManager')
+        serv.start()
+
+
+class BatchedStateReporterTestCase(test.TestCase):
+    """Test cases for reporting the state of several services at once"""
+
+    def setUp(self):
+        super(BatchedStateReporterTestCase, self).setUp()
+        self.mox.StubOutWithMock(service, 'db')
+        self.reporter = service.BatchedStateReporter(10)
+        self.services = []
+        for service_id in (1, 2):
+            serv = service.Service('foo%s' % service_id, 'bar', 'test',
+                                   'cinder.tests.test_service.FakeManager')
+            serv.service_id = service_id
+            serv.model_disconnected = False
+            self.services.append(serv)
+            self.reporter.services.append(serv)
+
+    def test_report_state_single_update(self):
+        service.db.service_heartbeat(mox.IgnoreArg(), [1, 2]).AndReturn(2)
+
+        self.mox.ReplayAll()
+        self.reporter.report_state()
+
+    def test_report_state_disconnected(self):
+        service.db.service_heartbeat(mox.IgnoreArg(),
+                                     [1, 2]).AndRaise(Exception())
+
+        self.mox.ReplayAll()
+        self.reporter.report_state()
+
+        for serv in self.services:
+            self.assert_(serv.model_disconnected)
+
+    def test_report_state_missing_service(self):
+        self.mox.StubOutWithMock(self.services[0], 'report_state')
+        self.mox.StubOutWithMock(self.services[1], 'report_state')
+        service.db.service_heartbeat(mox.IgnoreArg(), [1, 2]).AndReturn(1)
+        self.services[0].report_state()
+        self.services[1].report_state()
+
+        self.mox.ReplayAll()
+        self.reporter.report_state()
+
+    def test_add_and_remove(self):
+        reporter = service.BatchedStateReporter(10)
+        reporter.add(self.services[0])
+        reporter.add(self.services[1])
+        timer = reporter.timer
+        self.mox.StubOutWithMock(timer, 'stop')
+        timer.stop()
+
+        self.mox.ReplayAll()
+        reporter.remove(self.services[0])
+        self.assertEqual(reporter.timer, timer)
+        reporter.remove(self.services[1])
+        self.assertEqual(reporter.timer, None)
+
 
 class TestWSGIService(test.TestCase):
 
@@ -15,6 +15,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
+import httplib
+import json
+import socket
+import StringIO
+
 import mox
 from mox import IgnoreArg
 from mox import IsA
@@ -30,6 +36,44 @@ from cinder.volume.drivers.solidfire import SolidFire
 LOG = logging.getLogger(__name__)
 
 
+class FakeHTTPSConnection(object):
+    """A fake httplib.HTTPSConnection answering json-rpc requests."""
+    connections = []
+
+    def __init__(self, host, port):
+        self.requests = []
+        self.closed = False
+        # Errors raised when sending the next request or reading its
+        # response
+        self.request_error = None
+        self.response_error = None
+        FakeHTTPSConnection.connections.append(self)
+
+    def request(self, method, url, payload, header):
+        if self.request_error is not None:
+            raise self.request_error
+        self.requests.append(json.loads(payload))
+
+    def getresponse(self):
+        if self.response_error is not None:
+            raise self.response_error
+        command = self.requests[-1]
+        result = {'GetClusterCapacity': {
+                  'clusterCapacity': {'maxProvisionedSpace': 99999999,
+                                      'usedSpace': 999,
+                                      'compressionPercent': 100,
+                                      'deDuplicationPercent': 100,
+                                      'thinProvisioningPercent': 100}},
+                  'GetClusterInfo': {'clusterInfo': {'svip': '1.1.1.1'}}}
+        response = StringIO.StringIO(json.dumps(
+            {'id': command['id'], 'result': result[command['method']]}))
+        response.status = 200
+        return response
+
+    def close(self):
+        self.closed = True
+
+
 def create_configuration():
     configuration = mox.MockObject(conf.Configuration)
     configuration.san_is_local = False
@@ -271,6 +315,94 @@ class SolidFireVolumeTestCase(test.TestCase):
         sfv = SolidFire(configuration=self.configuration)
         sfv._get_cluster_info()
 
+    def test_issue_api_request_keeps_connection(self):
+        self.stubs.UnsetAll()
+        self.stubs.Set(httplib, 'HTTPSConnection', FakeHTTPSConnection)
+        FakeHTTPSConnection.connections = []
+        self.configuration.san_ip = '1.1.1.1'
+        self.configuration.san_login = 'admin'
+        self.configuration.san_password = 'password'
+        sfv = SolidFire(configuration=self.configuration)
+        sfv._issue_api_request('GetClusterInfo', {})
+
+        connections = FakeHTTPSConnection.connections
+        self.assertEqual(len(connections), 1)
+        self.assertEqual([request['method']
+                          for request in connections[0].requests],
+                         ['GetClusterCapacity', 'GetClusterInfo'])
+
+        # The cluster closed the idle connection
+        connections[0].response_error = httplib.BadStatusLine('')
+        data = sfv._issue_api_request('GetClusterInfo', {})
+        self.assertEqual(data['result']['clusterInfo']['svip'], '1.1.1.1')
+        self.assertEqual(len(connections), 2)
+
+        connections[1].request_error = socket.error(errno.ECONNRESET,
+                                                    'Connection reset')
+        sfv._issue_api_request('GetClusterInfo', {})
+        self.assertEqual(len(connections), 3)
+
+    def test_issue_api_request_error_not_resent(self):
+        self.stubs.UnsetAll()
+        self.stubs.Set(httplib, 'HTTPSConnection', FakeHTTPSConnection)
+        FakeHTTPSConnection.connections = []
+        self.configuration.san_ip = '1.1.1.1'
+        self.configuration.san_login = 'admin'
+        self.configuration.san_password = 'password'
+        sfv = SolidFire(configuration=self.configuration)
+
+        # The call may have run before the connection was reset
+        connection = FakeHTTPSConnection.connections[0]
+        connection.response_error = socket.error(errno.ECONNRESET,
+                                                 'Connection reset')
+        self.assertRaises(socket.error, sfv._issue_api_request,
+                          'CreateVolume', {})
+        self.assertEqual(len(connection.requests), 2)
+        self.assertTrue(connection.closed)
+        self.assertEqual(len(FakeHTTPSConnection.connections), 1)
+
+    def test_get_cluster_info_cached(self):
+        calls = []
+
+        def fake_issue_api_request(obj, method, params):
+            calls.append(method)
+            return self.fake_issue_api_request(method, params)
+
+        self.stubs.Set(SolidFire, '_issue_api_request',
+                       fake_issue_api_request)
+        sfv = SolidFire(configuration=self.configuration)
+        sfv._get_cluster_info()
+        sfv._get_cluster_info()
+        self.assertEqual(calls.count('GetClusterInfo'), 1)
+
+        sfv.get_volume_stats(refresh=True)
+        sfv._get_cluster_info()
+        self.assertEqual(calls.count('GetClusterInfo'), 2)
+
+    def test_delete_volume_cached(self):
+        calls = []
+
+        def fake_issue_api_request(obj, method, params):
+            calls.append(method)
+            return self.fake_issue_api_request(method, params)
+
+        self.stubs.Set(SolidFire, '_issue_api_request',
+                       fake_issue_api_request)
+        testvol = {'project_id': 'testprjid',
+                   'name': 'testvol',
+                   'size': 1,
+                   'id': 'a720b3c0-d1f0-11e1-9b23-0800200c9a66',
+                   'volume_type_id': None}
+        sfv = SolidFire(configuration=self.configuration)
+        sfv.create_volume(testvol)
+        self.assertEqual(calls.count('ListVolumesForAccount'), 1)
+
+        # The volume is known from the listing of the create
+        sfv.delete_volume(testvol)
+        self.assertEqual(calls.count('ListVolumesForAccount'), 1)
+        self.assertEqual(calls[-1], 'DeleteVolume')
+        self.assertFalse(testvol['id'] in sfv._sf_volumes)
+
     def test_get_cluster_info_fail(self):
         # NOTE(JDG) This test just fakes update_cluster_status
         # this is inentional for this test
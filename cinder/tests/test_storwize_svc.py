@@ -1228,6 +1228,9 @@ class StorwizeSVCFakeDriver(storwize_svc.StorwizeSVCDriver):
 
         return ret
 
+    def _run_ssh_many(self, cmds, check_exit_code=True):
+        return [self._run_ssh(cmd, check_exit_code) for cmd in cmds]
+
 
 class StorwizeSVCFakeSock:
     def settimeout(self, time):
@@ -20,7 +20,9 @@ import datetime
 import hashlib
 import os
 import paramiko
+import shutil
 import StringIO
+import sys
 import tempfile
 import uuid
 
@@ -29,6 +31,7 @@ from oslo.config import cfg
 
 import cinder
 from cinder import exception
+from cinder.openstack.common.rootwrap import client as rootwrap_client
 from cinder.openstack.common import timeutils
 from cinder import test
 from cinder import utils
@@ -119,6 +122,88 @@ grep foo
             os.unlink(tmpfilename2)
 
 
+class RootwrapDaemonTestCase(test.TestCase):
+    def setUp(self):
+        super(RootwrapDaemonTestCase, self).setUp()
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        filters_dir = os.path.join(tempdir, 'rootwrap.d')
+        os.mkdir(filters_dir)
+        with open(os.path.join(filters_dir, 'test.filters'), 'w') as f:
+            f.write('[Filters]\n'
+                    'echo: CommandFilter, echo, root\n'
+                    'cat: CommandFilter, cat, root\n')
+        config_file = os.path.join(tempdir, 'rootwrap.conf')
+        with open(config_file, 'w') as f:
+            f.write('[DEFAULT]\n'
+                    'filters_path=%s\n'
+                    'exec_dirs=/bin,/usr/bin\n' % filters_dir)
+
+        daemon = os.path.join(os.path.dirname(cinder.__file__), os.pardir,
+                              'bin', 'cinder-rootwrap-daemon')
+        self.client = rootwrap_client.Client([sys.executable, daemon,
+                                              config_file])
+        self.addCleanup(self._stop_daemon, self.client)
+
+    @staticmethod
+    def _stop_daemon(client):
+        process = client._process
+        client._stop_daemon()
+        if process is not None:
+            process.wait()
+
+    def test_execute(self):
+        self.assertEqual(self.client.execute(['echo', 'foo']),
+                         (0, 'foo\n', ''))
+        self.assertEqual(self.client.execute(['cat'], 'bar\0baz'),
+                         (0, 'bar\0baz', ''))
+
+    def test_execute_unauthorized(self):
+        (returncode, stdout, stderr) = self.client.execute(['ls', '/'])
+        self.assertEqual(returncode, 99)
+        self.assertTrue('Unauthorized command' in stderr)
+
+    def test_execute_restarts_daemon(self):
+        self.client.execute(['echo', 'foo'])
+        process = self.client._process
+        # A killed daemon leaves its socket directory behind.
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.client._address),
+                        True)
+        process.kill()
+        process.wait()
+        self.assertEqual(self.client.execute(['echo', 'foo']),
+                         (0, 'foo\n', ''))
+        self.assertNotEqual(self.client._process, process)
+
+    def test_execute_bad_authkey(self):
+        self.client.execute(['echo', 'foo'])
+        self.client._authkey = 'bad'
+        self.assertRaises(rootwrap_client.DaemonError,
+                          self.client.execute, ['echo', 'foo'])
+
+    def test_utils_execute_uses_daemon(self):
+        self.stubs.Set(os, 'geteuid', lambda: 1000)
+        self.assertEqual(utils.execute('cat', process_input='foo',
+                                       run_as_root=True,
+                                       root_helper=self.client),
+                         ('foo', ''))
+        self.assertRaises(exception.ProcessExecutionError,
+                          utils.execute, 'ls', '/', run_as_root=True,
+                          root_helper=self.client)
+
+    def test_get_root_helper(self):
+        self.flags(rootwrap_config='/etc/cinder/rootwrap.conf')
+        self.assertEqual(utils.get_root_helper(),
+                         'sudo cinder-rootwrap /etc/cinder/rootwrap.conf')
+        self.stubs.Set(utils, '_ROOTWRAP_CLIENT', None)
+        self.flags(use_rootwrap_daemon=True)
+        root_helper = utils.get_root_helper()
+        self.assertEqual(root_helper.daemon_cmd,
+                         ['sudo', 'cinder-rootwrap-daemon',
+                          '/etc/cinder/rootwrap.conf'])
+        self.assertEqual(utils.get_root_helper(), root_helper)
+
+
 class GetFromPathTestCase(test.TestCase):
     def test_tolerates_nones(self):
         f = utils.get_from_path
@@ -455,6 +540,25 @@ class GenericUtilsTestCase(test.TestCase):
         h2 = hashlib.sha1(data).hexdigest()
         self.assertEquals(h1, h2)
 
+    def test_lock_external(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, lock_dir)
+        lock_file = os.path.join(lock_dir, 'cinder-test-lock')
+        self.addCleanup(os.unlink, lock_file)
+        self.flags(lock_path=lock_dir)
+
+        with utils.lock('test-lock', external=True):
+            self.assertTrue(os.path.exists(lock_file))
+
+    def test_lock_names_are_independent(self):
+        with utils.lock('test-lock-a') as sem_a:
+            self.assertFalse(sem_a.balance)
+            with utils.lock('test-lock-b') as sem_b:
+                self.assertFalse(sem_b.balance)
+                self.assertNotEqual(sem_a, sem_b)
+        with utils.lock('test-lock-a') as sem:
+            self.assertEqual(sem, sem_a)
+
 
 class MonkeyPatchTestCase(test.TestCase):
     """Unit test for utils.monkey_patch()."""
@@ -683,6 +787,9 @@ class FakeTransport(object):
     def is_active(self):
         return self.active
 
+    def send_ignore(self):
+        self.probed = True
+
 
 class SSHPoolTestCase(test.TestCase):
     """Unit test for SSH Connection Pool."""
@@ -726,3 +833,106 @@ class SSHPoolTestCase(test.TestCase):
             third_id = ssh.id
 
         self.assertNotEqual(first_id, third_id)
+
+    def test_warm_up(self):
+        self.stubs.Set(utils.SSHPool, 'create',
+                       lambda sshpool: FakeSSHClient())
+        sshpool = utils.SSHPool("127.0.0.1", 22, 10, "test", password="test",
+                                min_size=2, max_size=3)
+        self.assertEqual(sshpool.get_stats()['connecting'], 2)
+
+        # Callers wait for the connections being opened
+        with sshpool.item() as ssh:
+            stats = sshpool.get_stats()
+            self.assertEqual(stats['created'], 2)
+            self.assertEqual(stats['in_use'], 1)
+            self.assertEqual(stats['free'], 1)
+            self.assertEqual(stats['connecting'], 0)
+
+    def test_warm_up_failed(self):
+        def fake_create(sshpool):
+            raise paramiko.SSHException()
+
+        self.stubs.Set(utils.SSHPool, 'create', fake_create)
+        sshpool = utils.SSHPool("127.0.0.1", 22, 10, "test", password="test",
+                                min_size=1, max_size=1)
+        self.assertRaises(paramiko.SSHException, sshpool.get)
+        stats = sshpool.get_stats()
+        self.assertEqual(stats['failed'], 2)
+        self.assertEqual(stats['size'], 0)
+
+    def test_probe_idle_connection(self):
+        self.stubs.Set(utils.SSHPool, 'create',
+                       lambda sshpool: FakeSSHClient())
+        sshpool = utils.SSHPool("127.0.0.1", 22, 10, "test", password="test",
+                                min_size=1, max_size=1)
+        with sshpool.item() as ssh:
+            first_id = ssh.id
+        with sshpool.item() as ssh:
+            self.assertFalse(hasattr(ssh.get_transport(), 'probed'))
+        # The connection has been idle for longer than conn_timeout
+        sshpool.free_items[0].last_used = 0
+        with sshpool.item() as ssh:
+            self.assertEqual(ssh.id, first_id)
+            self.assertTrue(ssh.get_transport().probed)
+        self.assertEqual(sshpool.get_stats()['probed'], 1)
+
+
+class SSHExecuteManyTestCase(test.TestCase):
+    """Unit test for running several SSH commands at once."""
+
+    def test_ssh_execute_many(self):
+        def fake_ssh_execute(ssh, cmd, check_exit_code=True):
+            return ('%s out' % cmd, '')
+
+        self.stubs.Set(utils, 'ssh_execute', fake_ssh_execute)
+        results = utils.ssh_execute_many(None, ['cmd%d' % i
+                                                for i in range(25)],
+                                         max_channels=4)
+        self.assertEqual(results, [('cmd%d out' % i, '') for i in range(25)])
+
+    def test_ssh_execute_many_error(self):
+        def fake_ssh_execute(ssh, cmd, check_exit_code=True):
+            if cmd == 'bad':
+                raise exception.ProcessExecutionError(cmd=cmd)
+            return ('', '')
+
+        self.stubs.Set(utils, 'ssh_execute', fake_ssh_execute)
+        self.assertRaises(exception.ProcessExecutionError,
+                          utils.ssh_execute_many, None,
+                          ['good', 'bad', 'good'])
+
+
+class SSHCommandCacheTestCase(test.TestCase):
+    """Unit test for the cache of read-only SSH commands."""
+
+    def setUp(self):
+        super(SSHCommandCacheTestCase, self).setUp()
+        self.now = 1000.0
+        self.stubs.Set(utils.time, 'time', lambda: self.now)
+        self.cache = utils.SSHCommandCache(2, ('svcinfo ',))
+
+    def test_get_put(self):
+        self.assertEqual(self.cache.get('svcinfo lshost'), None)
+        self.cache.put('svcinfo lshost', ('out', ''), self.cache.generation)
+        self.assertEqual(self.cache.get('svcinfo lshost'), ('out', ''))
+        self.now += 3
+        self.assertEqual(self.cache.get('svcinfo lshost'), None)
+
+    def test_write_clears(self):
+        self.cache.put('svcinfo lshost', ('out', ''), self.cache.generation)
+        self.assertEqual(self.cache.get('svctask mkhost'), None)
+        self.cache.put('svctask mkhost', ('', ''), self.cache.generation)
+        self.assertEqual(self.cache.get('svcinfo lshost'), None)
+        self.assertEqual(self.cache.get('svctask mkhost'), None)
+
+    def test_put_after_write(self):
+        generation = self.cache.generation
+        self.cache.get('svctask mkhost')
+        self.cache.put('svcinfo lshost', ('out', ''), generation)
+        self.assertEqual(self.cache.get('svcinfo lshost'), None)
+
+    def test_disabled(self):
+        cache = utils.SSHCommandCache(0, ('svcinfo ',))
+        cache.put('svcinfo lshost', ('out', ''), cache.generation)
+        self.assertEqual(cache.get('svcinfo lshost'), None)
@@ -25,10 +25,13 @@ import os
 import shutil
 import tempfile
 
+from eventlet import event
+from eventlet import greenthread
 import mox
 from oslo.config import cfg
 
 from cinder.brick.iscsi import iscsi
+from cinder.brick.local_dev import lvm as brick_lvm
 from cinder import context
 from cinder import db
 from cinder import exception
@@ -40,6 +43,7 @@ from cinder.openstack.common import rpc
 import cinder.policy
 from cinder import quota
 from cinder import test
+from cinder.tests.brick import fake_lvm
 from cinder.tests import fake_flags
 from cinder.tests.image import fake as fake_image
 from cinder.volume import configuration as conf
@@ -105,6 +109,18 @@ class VolumeTestCase(test.TestCase):
         self.assertEquals(volume['status'], "error")
         self.volume.delete_volume(self.context, volume_id)
 
+    def test_init_host_ensures_exports(self):
+        """Test that init_host re-exports the volumes in a single call."""
+        available = self._create_volume(status='available')
+        self._create_volume(status='error')
+        self.mox.StubOutWithMock(self.volume.driver, 'ensure_exports')
+        self.volume.driver.ensure_exports(
+            mox.IgnoreArg(),
+            mox.Func(lambda volumes: [v['id'] for v in volumes] ==
+                     [available['id']]))
+        self.mox.ReplayAll()
+        self.volume.init_host()
+
     def test_create_delete_volume(self):
         """Test volume can be created and deleted."""
         # Need to stub out reserve, commit, and rollback
@@ -1273,6 +1289,93 @@ class VolumeTestCase(test.TestCase):
         self.volume.delete_volume(self.context, volume_dst['id'])
         self.volume.delete_volume(self.context, volume_src['id'])
 
+    def test_reschedule_without_request_spec(self):
+        volume = self._create_volume()
+        calls = []
+
+        def fake_scheduler_method(context, *args):
+            calls.append(args)
+
+        filter_properties = {'retry': {'num_attempts': 1, 'hosts': []}}
+        self.assertFalse(self.volume._reschedule(self.context, None,
+                                                 filter_properties,
+                                                 volume['id'],
+                                                 fake_scheduler_method,
+                                                 ('fake_topic',)))
+        self.assertEqual(calls, [])
+
+        self.flags(slim_rpc_payloads=True)
+        self.assertTrue(self.volume._reschedule(self.context, None,
+                                                filter_properties,
+                                                volume['id'],
+                                                fake_scheduler_method,
+                                                ('fake_topic',)))
+        self.assertEqual(calls, [('fake_topic',)])
+        self.assertEqual(db.volume_get(self.context, volume['id'])['status'],
+                         'creating')
+        db.volume_destroy(self.context, volume['id'])
+
+    def test_rpc_lanes_priority(self):
+        self.flags(rpc_thread_pool_size=1)
+        lanes = self.volume._create_rpc_lanes()
+        release = event.Event()
+        calls = []
+
+        def _call(method):
+            if not calls:
+                release.wait()
+            calls.append(method)
+
+        lanes.spawn('create_volume', _call, 'create_volume')
+        greenthread.sleep(0)
+        for method in ('delete_volume', 'extend_volume',
+                       'initialize_connection'):
+            lanes.spawn(method, _call, method)
+        self.assertEqual(lanes.get_stats()['priority']['queued'], 1)
+        self.assertEqual(lanes.get_stats()['background']['running'], 1)
+        release.send()
+        lanes.wait()
+
+        self.assertEqual(calls, ['create_volume', 'initialize_connection',
+                                 'extend_volume', 'delete_volume'])
+        stats = lanes.get_stats()
+        self.assertEqual(stats['background']['dispatched'], 2)
+        self.assertEqual(stats['priority']['dispatched'], 1)
+        self.assertEqual(stats['priority']['queued'], 0)
+        self.assertTrue(stats['priority']['wait_max'] > 0)
+
+    def test_rpc_lanes_method_limits(self):
+        self.flags(volume_rpc_method_limits=['create_volume:1'])
+        lanes = self.volume._create_rpc_lanes()
+        release = event.Event()
+        calls = []
+
+        def _call(method):
+            calls.append(method)
+            if method == 'create_volume':
+                release.wait()
+
+        for method in ('create_volume', 'create_volume', 'delete_volume'):
+            lanes.spawn(method, _call, method)
+        greenthread.sleep(0)
+        # The second create waits for the first one without holding back
+        # the delete queued behind it.
+        self.assertEqual(calls, ['create_volume', 'delete_volume'])
+        self.assertEqual(lanes.get_stats()['background']['queued'], 1)
+        release.send()
+        lanes.wait()
+        self.assertEqual(calls, ['create_volume', 'delete_volume',
+                                 'create_volume'])
+
+    def test_rpc_lanes_invalid_limit(self):
+        self.flags(volume_rpc_method_limits=['create_volume'])
+        self.assertRaises(exception.InvalidInput,
+                          self.volume._create_rpc_lanes)
+
+    def test_create_rpc_dispatcher_uses_lanes(self):
+        dispatcher = self.volume.create_rpc_dispatcher()
+        self.assertEqual(dispatcher.lanes, self.volume.rpc_lanes)
+
 
 class DriverTestCase(test.TestCase):
     """Base Test class for Drivers."""
@@ -1320,26 +1423,128 @@ class VolumeDriverTestCase(DriverTestCase):
 
     def test_delete_busy_volume(self):
         """Test deleting a busy volume."""
+        self.volume.driver.vg = fake_lvm.FakeBrickLVM(CONF.volume_group)
         self.stubs.Set(self.volume.driver, '_volume_not_present',
                        lambda x: False)
         self.stubs.Set(self.volume.driver, '_delete_volume',
                        lambda x, y: False)
-        # Want DriverTestCase._fake_execute to return 'o' so that
-        # volume.driver.delete_volume() raises the VolumeIsBusy exception.
-        self.output = 'o'
+        # A volume with snapshots can not be deleted.
+        self.stubs.Set(self.volume.driver.vg, 'lv_has_snapshot',
+                       lambda name: True)
         self.assertRaises(exception.VolumeIsBusy,
                           self.volume.driver.delete_volume,
                           {'name': 'test1', 'size': 1024})
-        # when DriverTestCase._fake_execute returns something other than
-        # 'o' volume.driver.delete_volume() does not raise an exception.
-        self.output = 'x'
+        self.stubs.Set(self.volume.driver.vg, 'lv_has_snapshot',
+                       lambda name: False)
         self.volume.driver.delete_volume({'name': 'test1', 'size': 1024})
 
+    def test_delete_volume_with_snapshot_of_other_process(self):
+        """Test snapshots taken by another process keep a volume busy"""
+        vg = fake_lvm.FakeBrickLVM(CONF.volume_group)
+        self.volume.driver.vg = vg
+        self.stubs.Set(self.volume.driver, '_delete_volume',
+                       lambda volume, size: vg.delete(volume['name']))
+        vg.create_volume('test1', '1')
+        vg.get_volumes()
+
+        # The backup service has its own LVM object of the volume group
+        backup_vg = fake_lvm.FakeBrickLVM(CONF.volume_group, disk=vg.disk)
+        backup_vg.create_lv_snapshot('backup-snapshot-1', 'test1')
+        self.assertRaises(exception.VolumeIsBusy,
+                          self.volume.driver.delete_volume,
+                          {'name': 'test1', 'size': 1})
+
+        backup_vg.delete('backup-snapshot-1')
+        self.volume.driver.delete_volume({'name': 'test1', 'size': 1})
+        self.assertEqual(vg.disk, {})
+
+    def test_lvm_commands_retried(self):
+        self.stubs.Set(driver.time, 'sleep', lambda seconds: None)
+        executed = []
+
+        def _fake_execute(*cmd, **kwargs):
+            executed.append(cmd[0])
+            if cmd[0] == 'lvremove' and executed.count('lvremove') == 1:
+                raise exception.ProcessExecutionError(
+                    stderr='Logical volume in use')
+            if cmd[0] == 'lvcreate':
+                raise exception.ProcessExecutionError(
+                    stderr='Insufficient free extents')
+            if cmd[0] == 'vgs':
+                return '  %s\n' % CONF.volume_group, None
+            return '', None
+
+        self.volume.driver.set_execute(_fake_execute)
+        self.volume.driver.vg = brick_lvm.LVM(
+            CONF.volume_group, executor=self.volume.driver._execute_lvm)
+        self.volume.driver.vg.delete('volume-1')
+        self.assertEqual(executed.count('lvremove'), 2)
+        self.assertRaises(exception.ProcessExecutionError,
+                          self.volume.driver._create_volume, 'volume-2', 1)
+        self.assertEqual(executed.count('lvcreate'), 1)
+
+    def test_ensure_exports(self):
+        ensured = []
+        self.stubs.Set(self.volume.driver, 'ensure_export',
+                       lambda context, volume: ensured.append(volume['id']))
+        volumes = [{'id': str(i)} for i in xrange(10)]
+        self.volume.driver.ensure_exports(self.context, volumes)
+        self.assertEqual(sorted(ensured), sorted(v['id'] for v in volumes))
+
+    def test_backup_snapshot(self):
+        vg = fake_lvm.FakeBrickLVM(CONF.volume_group)
+        vg.create_volume('volume-1', '1')
+        executed = vg.commands
+        self.volume.driver.vg = vg
+        backed_up = []
+        self.stubs.Set(self.volume.driver, '_backup_device',
+                       lambda path, backup, service: backed_up.append(path))
+        backup = {'id': 'fake_backup'}
+        volume = {'id': 'fake_volume', 'name': 'volume-1', 'size': 1}
+
+        snapshot = self.volume.driver.create_backup_snapshot(
+            self.context, backup, volume)
+        self.assertEqual(executed[-1],
+                         ('lvcreate', '--name', 'backup-snapshot-fake_backup',
+                          '--snapshot', '%s/volume-1' % CONF.volume_group,
+                          '-L', '1.00g'))
+        self.volume.driver.backup_snapshot(self.context, backup, snapshot,
+                                           None)
+        self.assertEqual(backed_up,
+                         [self.volume.driver.local_path(snapshot)])
+        self.assertEqual(self.volume.driver.get_backup_snapshot(
+            self.context, backup, volume), snapshot)
+        self.volume.driver.delete_backup_snapshot(self.context, backup,
+                                                  volume)
+        self.assertEqual(executed[-1],
+                         ('lvremove', '-f', '%s/backup-snapshot-fake_backup'
+                          % CONF.volume_group))
+
 
 class ISCSITestCase(DriverTestCase):
     """Test Case for ISCSIDriver"""
     driver_name = "cinder.volume.drivers.lvm.LVMISCSIDriver"
 
+    def test_ensure_exports(self):
+        self.volume.driver.tgtadm = iscsi.TgtAdm()
+        volumes = [{'id': vol_id,
+                    'name': 'volume-%s' % vol_id,
+                    'status': 'available',
+                    'provider_location': '10.0.0.1:3260,1 '
+                    'iqn.2010-10.org.openstack:volume-%s 0' % vol_id}
+                   for vol_id in ('a', 'b')]
+        commands = []
+
+        def _fake_execute(*cmd, **kwargs):
+            commands.append(cmd)
+            return ('Target 1: iqn.2010-10.org.openstack:volume-a\n'
+                    'Target 2: iqn.2010-10.org.openstack:volume-b\n', None)
+
+        self.volume.driver.set_execute(_fake_execute)
+        self.volume.driver.ensure_exports(self.context, volumes)
+        self.assertEqual(commands, [('tgt-admin', '--update', 'ALL'),
+                                    ('tgt-admin', '--show')])
+
     def _attach_volume(self):
         """Attach volumes to an instance."""
         volume_id_list = []
@@ -1383,12 +1588,15 @@ class ISCSITestCase(DriverTestCase):
         self.assertEquals(result["target_lun"], 0)
 
     def test_get_volume_stats(self):
-        def _emulate_vgs_execute(_command, *_args, **_kwargs):
-            out = "  test1-volumes  5,52  0,52"
-            out += " test2-volumes  5.52  0.52"
-            return out, None
+        def _emulate_vgs_execute(*cmd, **kwargs):
+            if 'name' in cmd:
+                return "  %s\n" % CONF.volume_group, None
+            if cmd[0] == 'vgs':
+                return "  %s:5,52:0,52:fake-uuid\n" % CONF.volume_group, None
+            return "", None
 
-        self.volume.driver.set_execute(_emulate_vgs_execute)
+        self.volume.driver.vg = brick_lvm.LVM(CONF.volume_group,
+                                              executor=_emulate_vgs_execute)
 
         self.volume.driver._update_volume_status()
 
@@ -1411,6 +1619,40 @@ class ISCSITestCase(DriverTestCase):
                           iscsi_driver.validate_connector, connector)
 
 
+class ThinLVMTestCase(DriverTestCase):
+    """Test Case for ThinLVMVolumeDriver"""
+    driver_name = "cinder.volume.drivers.lvm.ThinLVMVolumeDriver"
+
+    def test_get_volume_stats(self):
+        def _emulate_lvs_execute(*cmd, **kwargs):
+            if cmd[0] == 'vgs':
+                return "  %s\n" % CONF.volume_group, None
+            vg = "  %s:120,00:10,00:fake-uuid:" % CONF.volume_group
+            out = vg + "%s-pool:twi-a-tz-:100,00:::40,00:2,50\n" % (
+                CONF.volume_group)
+            out += vg + "volume-1:Vwi-a-tz-:500,00::%s-pool:10,00:\n" % (
+                CONF.volume_group)
+            out += vg + "volume-2:Vwi-a-tz-:250,50::%s-pool:0,00:\n" % (
+                CONF.volume_group)
+            out += vg + "other-lv:-wi-a-:10,00::::\n"
+            return out, None
+
+        self.volume.driver.vg = brick_lvm.LVM(CONF.volume_group,
+                                              executor=_emulate_lvs_execute)
+
+        self.volume.driver._update_volume_status()
+
+        stats = self.volume.driver._stats
+
+        self.assertEquals(stats['total_capacity_gb'], 100.0)
+        self.assertEquals(stats['free_capacity_gb'], 60.0)
+        self.assertEquals(stats['provisioned_capacity_gb'], 750.5)
+        self.assertEquals(stats['pool_data_used_percent'], 40.0)
+        self.assertEquals(stats['pool_metadata_used_percent'], 2.5)
+        self.assertTrue(stats['thin_provisioning_support'])
+        self.assertEquals(stats['max_over_subscription_ratio'], 20.0)
+
+
 class FibreChannelTestCase(DriverTestCase):
     """Test Case for FibreChannelDriver"""
     driver_name = "cinder.volume.driver.FibreChannelDriver"
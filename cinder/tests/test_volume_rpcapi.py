@@ -19,12 +19,16 @@ Unit Tests for cinder.volume.rpcapi
 """
 
 
+import json
+import logging
+
 from oslo.config import cfg
 
 from cinder import context
 from cinder import db
 from cinder.openstack.common import jsonutils
 from cinder.openstack.common import rpc
+from cinder.openstack.common.rpc import common as rpc_common
 from cinder import test
 from cinder.volume import rpcapi as volume_rpcapi
 
@@ -121,6 +125,32 @@ class VolumeRpcAPITestCase(test.TestCase):
                               source_volid='fake_src_id',
                               version='1.4')
 
+    def test_create_volume_slim(self):
+        self.flags(slim_rpc_payloads=True)
+        self.fake_args = None
+
+        def _fake_cast(*args, **kwargs):
+            self.fake_args = args
+
+        self.stubs.Set(rpc, 'cast', _fake_cast)
+        filter_properties = {'retry': {'num_attempts': 1, 'hosts': []},
+                             'scheduler_hints': {'same_host': 'fake_id'},
+                             'request_spec': {'volume_id': 'fake_id'},
+                             'config_options': {},
+                             'size': 1}
+        rpcapi = volume_rpcapi.VolumeAPI()
+        rpcapi.create_volume(self.context, self.fake_volume, 'fake_host1',
+                             request_spec={'volume_id': 'fake_id'},
+                             filter_properties=filter_properties)
+
+        msg = self.fake_args[2]
+        self.assertEqual(msg['version'], '1.7')
+        self.assertEqual(msg['args']['request_spec'], None)
+        self.assertEqual(msg['args']['filter_properties'],
+                         {'retry': {'num_attempts': 1, 'hosts': []},
+                          'scheduler_hints': {'same_host': 'fake_id'}})
+        self.assertTrue('request_spec' in filter_properties)
+
     def test_delete_volume(self):
         self._test_volume_api('delete_volume',
                               rpc_method='cast',
@@ -184,3 +214,98 @@ class VolumeRpcAPITestCase(test.TestCase):
                               volume=self.fake_volume,
                               new_size=1,
                               version='1.6')
+
+    def test_publish_service_capabilities_to_host(self):
+        self._test_volume_api('publish_service_capabilities',
+                              rpc_method='cast',
+                              host='fake_host',
+                              version='1.2')
+
+
+class RpcSerializationTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RpcSerializationTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        volume_type = db.volume_type_create(self.context,
+                                            {'name': 'gold',
+                                             'extra_specs': {'qos': 'high'}})
+        self.volume = db.volume_create(self.context,
+                                       {'host': 'fake_host',
+                                        'size': 1,
+                                        'volume_type_id': volume_type['id'],
+                                        'metadata': {'key': 'value'}})
+        self.volume = db.volume_get(self.context, self.volume['id'])
+
+    def _create_volume_msg(self):
+        request_spec = {'volume_id': self.volume['id'],
+                        'volume_properties': {'size': 1,
+                                              'status': 'creating'},
+                        'volume_type': {'name': 'gold',
+                                        'created_at':
+                                        self.volume['created_at']},
+                        'snapshot_id': None,
+                        'image_id': None}
+        return {'method': 'create_volume',
+                'args': {'volume': self.volume,
+                         'request_spec': request_spec,
+                         'filter_properties': {'retry': {'num_attempts': 1,
+                                                         'hosts': []}}},
+                '_context_auth_token': 'secret'}
+
+    def test_dumps_matches_to_primitive(self):
+        msg = self._create_volume_msg()
+        self.assertEqual(
+            json.loads(jsonutils.dumps(msg)),
+            json.loads(json.dumps(msg, default=jsonutils.to_primitive)))
+        self.assertEqual(json.loads(jsonutils.dumps(self.volume)),
+                         jsonutils.to_primitive(self.volume))
+
+    def test_dumps_keeps_to_primitive_depth(self):
+        msg = {'volume': self.volume}
+        primitive = json.loads(jsonutils.dumps(msg))
+        self.assertEqual(primitive['volume']['volume_type']['name'], 'gold')
+        legacy = json.dumps(msg, default=jsonutils.to_primitive)
+        self.assertEqual(primitive, json.loads(legacy))
+
+    def test_to_primitive_simple_dict(self):
+        capabilities = {'total_capacity_gb': 100, 'free_capacity_gb': 50.5,
+                        'volume_backend_name': 'lvm', 'reserved': None}
+        primitive = jsonutils.to_primitive(capabilities)
+        self.assertEqual(primitive, capabilities)
+        self.assertFalse(primitive is capabilities)
+        self.assertEqual(jsonutils.to_primitive((1, 'a', None)),
+                         [1, 'a', None])
+
+    def test_safe_log_skipped_when_disabled(self):
+        logged = []
+
+        class FakeLogger(object):
+            def isEnabledFor(self, level):
+                return level >= logging.INFO
+
+            def debug(self, msg, data):
+                logged.append(data)
+
+            def info(self, msg, data):
+                logged.append(data)
+
+        logger = FakeLogger()
+        msg = {'method': 'create_volume', '_context_auth_token': 'secret',
+               'args': {'size': 1}}
+        rpc_common._safe_log(logger.debug, 'received %s', msg)
+        self.assertEqual(logged, [])
+
+        rpc_common._safe_log(logger.info, 'received %s', msg)
+        self.assertEqual(logged[0]['_context_auth_token'], '<SANITIZED>')
+        self.assertEqual(msg['_context_auth_token'], 'secret')
+
+    def test_safe_log_sanitizes_nested_copy(self):
+        logged = []
+        msg = {'method': 'set_admin_password',
+               'args': {'new_pass': 'secret', 'other': 'value'}}
+        rpc_common._safe_log(lambda fmt, data: logged.append(data),
+                             'received %s', msg)
+        self.assertEqual(logged[0]['args'], {'new_pass': '<SANITIZED>',
+                                             'other': 'value'})
+        self.assertEqual(msg['args']['new_pass'], 'secret')
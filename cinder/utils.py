@@ -41,8 +41,10 @@ from xml.sax import expatreader
 from xml.sax import saxutils
 
 from eventlet import event
+from eventlet import greenpool
 from eventlet import greenthread
 from eventlet import pools
+from eventlet import tpool
 
 from oslo.config import cfg
 
@@ -52,6 +54,7 @@ from cinder.openstack.common import importutils
 from cinder.openstack.common import lockutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import processutils
+from cinder.openstack.common.rootwrap import client as rootwrap_client
 from cinder.openstack.common import timeutils
 
 
@@ -61,6 +64,7 @@ ISO_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
 PERFECT_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
 
 synchronized = lockutils.synchronized_with_prefix('cinder-')
+lock = lockutils.lock_with_prefix('cinder-')
 
 
 def find_config(config_path):
@@ -91,11 +95,28 @@ def fetchfile(url, target):
     execute('curl', '--fail', url, '-o', target)
 
 
+_ROOTWRAP_CLIENT = None
+
+
+def get_root_helper():
+    """Return the root_helper to run commands as root with.
+
+    With use_rootwrap_daemon this is a client of a cinder-rootwrap-daemon
+    shared by the whole service, otherwise a sudo cinder-rootwrap prefix.
+    """
+    global _ROOTWRAP_CLIENT
+    if CONF.use_rootwrap_daemon:
+        if _ROOTWRAP_CLIENT is None:
+            _ROOTWRAP_CLIENT = rootwrap_client.Client(
+                ['sudo', 'cinder-rootwrap-daemon', CONF.rootwrap_config])
+        return _ROOTWRAP_CLIENT
+    return 'sudo cinder-rootwrap %s' % CONF.rootwrap_config
+
+
 def execute(*cmd, **kwargs):
     """Convenience wrapper around oslo's execute() method."""
     if 'run_as_root' in kwargs and not 'root_helper' in kwargs:
-        kwargs['root_helper'] =\
-            'sudo cinder-rootwrap %s' % CONF.rootwrap_config
+        kwargs['root_helper'] = get_root_helper()
     try:
         (stdout, stderr) = processutils.execute(*cmd, **kwargs)
     except processutils.ProcessExecutionError as ex:
@@ -107,14 +128,16 @@ def execute(*cmd, **kwargs):
             description=ex.description)
     except processutils.UnknownArgumentError as ex:
         raise exception.Error(ex.message)
+    except rootwrap_client.DaemonError as ex:
+        raise exception.ProcessExecutionError(cmd=' '.join(cmd),
+                                              description=unicode(ex))
     return (stdout, stderr)
 
 
 def trycmd(*args, **kwargs):
     """Convenience wrapper around oslo's trycmd() method."""
     if 'run_as_root' in kwargs and not 'root_helper' in kwargs:
-        kwargs['root_helper'] =\
-            'sudo cinder-rootwrap %s' % CONF.rootwrap_config
+        kwargs['root_helper'] = get_root_helper()
     try:
         (stdout, stderr) = processutils.trycmd(*args, **kwargs)
     except processutils.ProcessExecutionError as ex:
@@ -126,6 +149,9 @@ def trycmd(*args, **kwargs):
             description=ex.description)
     except processutils.UnknownArgumentError as ex:
         raise exception.Error(ex.message)
+    except rootwrap_client.DaemonError as ex:
+        raise exception.ProcessExecutionError(cmd=' '.join(args),
+                                              description=unicode(ex))
     return (stdout, stderr)
 
 
@@ -167,6 +193,77 @@ def ssh_execute(ssh, cmd, process_input=None,
     return (stdout, stderr)
 
 
+def ssh_execute_many(ssh, cmds, check_exit_code=True, max_channels=10):
+    """Run several commands at once over one SSH connection.
+
+    Every command gets its own channel of the connection, up to
+    max_channels at a time, so that the round trips of the commands overlap
+    instead of adding up. Returns the (stdout, stderr) of each command, in
+    order, or raises the error of the first command that failed.
+    """
+    def _execute(cmd):
+        try:
+            return ssh_execute(ssh, cmd, check_exit_code=check_exit_code), None
+        except Exception as e:
+            return None, e
+
+    pool = greenpool.GreenPool(max_channels)
+    results = list(pool.imap(_execute, cmds))
+    for result, error in results:
+        if error is not None:
+            raise error
+    return [result for result, error in results]
+
+
+class SSHCommandCache(object):
+    """Remembers the output of read-only SSH commands for ttl seconds.
+
+    Only the commands starting with one of read_only_prefixes are cached.
+    Running any other command empties the cache, as it may change what the
+    cached commands list.
+    """
+
+    def __init__(self, ttl, read_only_prefixes=()):
+        self.ttl = ttl
+        self.read_only_prefixes = tuple(read_only_prefixes)
+        self.generation = 0
+        self._entries = {}
+
+    def is_read_only(self, cmd):
+        return cmd.startswith(self.read_only_prefixes)
+
+    def get(self, cmd):
+        """Return the cached output of cmd, or None.
+
+        Call it before running any command, so that write commands empty
+        the cache.
+        """
+        if not self.is_read_only(cmd):
+            self.clear()
+            return None
+        entry = self._entries.get(cmd)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < time.time():
+            del self._entries[cmd]
+            return None
+        return result
+
+    def put(self, cmd, result, generation):
+        """Cache the output of cmd, run while at generation.
+
+        The output is dropped if a write command ran in the meantime.
+        """
+        if (self.ttl > 0 and generation == self.generation and
+                self.is_read_only(cmd)):
+            self._entries[cmd] = (time.time() + self.ttl, result)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+
 def create_channel(client, width, height):
     """Invoke an interactive shell session on server."""
     channel = client.invoke_shell()
@@ -175,7 +272,13 @@ def create_channel(client, width, height):
 
 
 class SSHPool(pools.Pool):
-    """A simple eventlet pool to hold ssh connections."""
+    """A simple eventlet pool to hold ssh connections.
+
+    The min_size first connections are opened in the background as soon as
+    the pool is created, and callers wait for them rather than all opening
+    connections of their own. Connections idle for more than conn_timeout
+    seconds are probed before being handed out again.
+    """
 
     def __init__(self, ip, port, conn_timeout, login, password=None,
                  privatekey=None, *args, **kwargs):
@@ -185,7 +288,24 @@ class SSHPool(pools.Pool):
         self.password = password
         self.conn_timeout = conn_timeout if conn_timeout else None
         self.privatekey = privatekey
+        self._pkey = None
+        self._pending = 0
+        self._connectors = greenpool.GreenPool()
+        self._stats = {'created': 0, 'failed': 0, 'discarded': 0,
+                       'probed': 0}
+        min_size = kwargs.pop('min_size', 0)
         super(SSHPool, self).__init__(*args, **kwargs)
+        self.min_size = min_size
+        self.warm_up()
+
+    def _get_private_key(self):
+        if self._pkey is None:
+            pkfile = os.path.expanduser(self.privatekey)
+            # Parsing the key is CPU bound, so it runs in a native thread
+            # rather than blocking the other greenthreads.
+            self._pkey = tpool.execute(paramiko.RSAKey.from_private_key_file,
+                                       pkfile)
+        return self._pkey
 
     def create(self):
         try:
@@ -198,12 +318,10 @@ class SSHPool(pools.Pool):
                             password=self.password,
                             timeout=self.conn_timeout)
             elif self.privatekey:
-                pkfile = os.path.expanduser(self.privatekey)
-                privatekey = paramiko.RSAKey.from_private_key_file(pkfile)
                 ssh.connect(self.ip,
                             port=self.port,
                             username=self.login,
-                            pkey=privatekey,
+                            pkey=self._get_private_key(),
                             timeout=self.conn_timeout)
             else:
                 msg = _("Specify a password or private_key")
@@ -226,6 +344,53 @@ class SSHPool(pools.Pool):
             LOG.error(msg)
             raise paramiko.SSHException(msg)
 
+    def _create(self):
+        try:
+            conn = self.create()
+        except Exception:
+            self._stats['failed'] += 1
+            raise
+        self._stats['created'] += 1
+        return conn
+
+    def warm_up(self):
+        """Open connections in the background until there are min_size."""
+        while self.current_size < self.min_size:
+            self.current_size += 1
+            self._pending += 1
+            self._connectors.spawn_n(self._create_in_background)
+
+    def _create_in_background(self):
+        try:
+            conn = self._create()
+        except Exception:
+            self.current_size -= 1
+            conn = None
+        self._pending -= 1
+        if conn is not None:
+            self.put(conn)
+        elif self.waiting():
+            # Wake up a caller waiting for this connection, it will open
+            # one itself.
+            self.channel.put(None)
+
+    def _is_usable(self, conn):
+        """Check a free connection before handing it out."""
+        transport = conn.get_transport()
+        if not transport or not transport.is_active():
+            return False
+        idle = time.time() - getattr(conn, 'last_used', 0)
+        if self.conn_timeout and idle > self.conn_timeout:
+            # Sending a packet finds connections the array dropped
+            # while they were idle.
+            self._stats['probed'] += 1
+            try:
+                transport.send_ignore()
+            except Exception:
+                return False
+            return transport.is_active()
+        return True
+
     def get(self):
         """
         Return an item from the pool, when one is available.  This may
@@ -233,19 +398,31 @@ class SSHPool(pools.Pool):
         before returning it. For dead connections create and return a new
         connection.
         """
-        if self.free_items:
-            conn = self.free_items.popleft()
-            if conn:
-                if conn.get_transport().is_active():
+        while True:
+            while self.free_items:
+                conn = self.free_items.popleft()
+                if conn and self._is_usable(conn):
                     return conn
-                else:
+                self._stats['discarded'] += 1
+                self.current_size -= 1
+                if conn:
                     conn.close()
-            return self.create()
-        if self.current_size < self.max_size:
-            created = self.create()
-            self.current_size += 1
-            return created
-        return self.channel.get()
+            if (self._pending <= self.waiting() and
+                    self.current_size < self.max_size):
+                self.current_size += 1
+                try:
+                    return self._create()
+                except Exception:
+                    self.current_size -= 1
+                    raise
+            conn = self.channel.get()
+            if conn is not None:
+                return conn
+
+    def put(self, conn):
+        if conn:
+            conn.last_used = time.time()
+        super(SSHPool, self).put(conn)
 
     def remove(self, ssh):
         """Close an ssh client and remove it from free_items."""
@@ -256,6 +433,17 @@ class SSHPool(pools.Pool):
         if self.current_size > 0:
             self.current_size -= 1
 
+    def get_stats(self):
+        """Return the number of connections by state, and counters."""
+        stats = dict(self._stats)
+        stats.update({'size': self.current_size,
+                      'free': len(self.free_items),
+                      'connecting': self._pending,
+                      'in_use': (self.current_size - len(self.free_items) -
+                                 self._pending),
+                      'waiting': self.waiting()})
+        return stats
+
 
 def cinderdir():
     import cinder
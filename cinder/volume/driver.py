@@ -24,6 +24,7 @@ import os
 import socket
 import time
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from cinder import exception
@@ -57,7 +58,11 @@ volume_opts = [
                help='The port that the iSCSI daemon is listening on'),
     cfg.StrOpt('volume_backend_name',
                default=None,
-               help='The backend name for a given driver implementation'), ]
+               help='The backend name for a given driver implementation'),
+    cfg.IntOpt('ensure_export_workers',
+               default=4,
+               help='Number of volume exports recreated concurrently at '
+                    'startup by drivers without a bulk implementation'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(volume_opts)
@@ -144,6 +149,25 @@ class VolumeDriver(object):
         """Synchronously recreates an export for a volume."""
         raise NotImplementedError()
 
+    def ensure_exports(self, context, volumes):
+        """Synchronously recreates the exports of a list of volumes.
+
+        Drivers able to restore many exports in one pass should override
+        this, by default ensure_export() runs for up to
+        ensure_export_workers volumes at a time.
+        """
+        if self.configuration:
+            workers = self.configuration.ensure_export_workers
+        else:
+            workers = CONF.ensure_export_workers
+
+        def _ensure_export(volume):
+            self.ensure_export(context, volume)
+
+        pool = greenpool.GreenPool(max(workers, 1))
+        for _result in pool.imap(_ensure_export, volumes):
+            pass
+
     def create_export(self, context, volume):
         """Exports the volume. Can optionally return a Dictionary of changes
         to the volume object to be persisted.
@@ -207,6 +231,34 @@ class VolumeDriver(object):
         """Create a new backup from an existing volume."""
         raise NotImplementedError()
 
+    def create_backup_snapshot(self, context, backup, volume):
+        """Take a temporary snapshot of the volume to back it up from.
+
+        Returns the snapshot to pass to backup_snapshot(), or None when
+        the driver only backs up the volume itself, in which case the
+        volume stays busy until backup_volume() returns.
+        """
+        return None
+
+    def get_backup_snapshot(self, context, backup, volume):
+        """Return the snapshot create_backup_snapshot() took, if it exists.
+
+        An interrupted backup resumes from this snapshot.
+        """
+        return None
+
+    def backup_snapshot(self, context, backup, snapshot, backup_service):
+        """Create a new backup from a snapshot of create_backup_snapshot()."""
+        raise NotImplementedError()
+
+    def delete_backup_snapshot(self, context, backup, volume):
+        """Delete the snapshot create_backup_snapshot() took, if any.
+
+        This is also called for backups interrupted by a restart of the
+        service, so the snapshot may not exist.
+        """
+        pass
+
     def restore_backup(self, context, backup, volume, backup_service):
         """Restore an existing backup to a new or existing volume."""
         raise NotImplementedError()
@@ -43,6 +43,21 @@ except ImportError:
 
 CINDER_EMC_CONFIG_FILE = '/etc/cinder/cinder_emc_config.xml'
 
+# Jobs and synchronizations are polled every JOB_POLL_INTERVAL_MIN seconds
+# at first, most of them completing within a few seconds, then less and less
+# often up to every JOB_POLL_INTERVAL_MAX seconds.
+JOB_POLL_INTERVAL_MIN = 0.5
+JOB_POLL_INTERVAL_MAX = 10
+
+# From ValueMap of JobState in CIM_ConcreteJob
+# 2L=New, 3L=Starting, 4L=Running, 32767L=Queue Pending
+# ValueMap("2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13..32767,
+# 32768..65535"),
+# Values("New, Starting, Running, Suspended, Shutting Down,
+# Completed, Terminated, Killed, Exception, Service,
+# Query Pending, DMTF Reserved, Vendor Reserved")]
+JOB_RUNNING_STATES = [2L, 3L, 4L, 32767L]
+
 
 class EMCSMISCommon():
     """Common code that can be used by ISCSI and FC drivers."""
@@ -71,6 +86,14 @@ class EMCSMISCommon():
         self.url = 'http://' + ip + ':' + port
         self.conn = self._get_ecom_connection()
 
+        # Instance names of the storage volumes of each array, indexed by
+        # DeviceID and by ElementName, see _find_lun_instance()
+        self._lun_names = {}
+        # LunMaskingSCSIProtocolControllers by storage system and initiators
+        self._lunmask_ctrls = {}
+        # LunMaskingSCSIProtocolControllers by masking view name
+        self._masking_views = {}
+
     def create_volume(self, volume):
         """Creates a EMC(VMAX/VNX) volume."""
 
@@ -139,6 +162,8 @@ class EMCSMISCommon():
                              'error': errordesc})
                 raise exception.VolumeBackendAPIException(data=errordesc)
 
+        self._remember_job_element(job, 'TheElement', volumename)
+
         LOG.debug(_('Leaving create_volume: %(volumename)s  '
                   'Return code: %(rc)lu')
                   % {'volumename': volumename,
@@ -225,6 +250,8 @@ class EMCSMISCommon():
                 raise exception.VolumeBackendAPIException(
                     data=exception_message)
 
+        self._remember_job_element(job, 'TargetElement', volumename)
+
         LOG.debug(_('Create Volume from Snapshot: Volume: %(volumename)s  '
                   'Snapshot: %(snapshotname)s.  Successfully clone volume '
                   'from snapshot.  Finding the clone relationship.')
@@ -349,6 +376,8 @@ class EMCSMISCommon():
                 raise exception.VolumeBackendAPIException(
                     data=exception_message)
 
+        self._remember_job_element(job, 'TargetElement', volumename)
+
         LOG.debug(_('Create Cloned Volume: Volume: %(volumename)s  '
                   'Source Volume: %(srcname)s.  Successfully cloned volume '
                   'from source volume.  Finding the clone relationship.')
@@ -460,6 +489,8 @@ class EMCSMISCommon():
                 raise exception.VolumeBackendAPIException(
                     data=exception_message)
 
+        self._forget_lun_name(vol_instance.path)
+
         LOG.debug(_('Leaving delete_volume: %(volumename)s  Return code: '
                   '%(rc)lu')
                   % {'volumename': volumename,
@@ -530,6 +561,8 @@ class EMCSMISCommon():
                 raise exception.VolumeBackendAPIException(
                     data=exception_message)
 
+        self._remember_job_element(job, 'TargetElement', snapshotname)
+
         LOG.debug(_('Leaving create_snapshot: Snapshot: %(snapshot)s '
                   'Volume: %(volume)s  Return code: %(rc)lu.') %
                   {'snapshot': snapshotname, 'volume': volumename, 'rc': rc})
@@ -606,6 +639,8 @@ class EMCSMISCommon():
                 raise exception.VolumeBackendAPIException(
                     data=exception_message)
 
+        self._forget_lun_name(sync_name['SyncedElement'])
+
         LOG.debug(_('Leaving delete_snapshot: Volume: %(volumename)s  '
                   'Snapshot: %(snapshotname)s  Return code: %(rc)lu.')
                   % {'volumename': volumename,
@@ -1082,7 +1117,6 @@ class EMCSMISCommon():
         return poolname, systemname
 
     def _find_lun(self, volume):
-        foundinstance = None
         try:
             device_id = volume['provider_location']
         except Exception:
@@ -1090,23 +1124,12 @@ class EMCSMISCommon():
 
         volumename = volume['name']
 
-        names = self.conn.EnumerateInstanceNames('EMC_StorageVolume')
-
-        for n in names:
-            if device_id is not None:
-                if n['DeviceID'] == device_id:
-                    vol_instance = self.conn.GetInstance(n)
-                    foundinstance = vol_instance
-                    break
-                else:
-                    continue
-
-            else:
-                vol_instance = self.conn.GetInstance(n)
-                if vol_instance['ElementName'] == volumename:
-                    foundinstance = vol_instance
-                    volume['provider_location'] = foundinstance['DeviceID']
-                    break
+        if device_id is not None:
+            foundinstance = self._find_lun_instance('DeviceID', device_id)
+        else:
+            foundinstance = self._find_lun_instance('ElementName', volumename)
+            if foundinstance is not None:
+                volume['provider_location'] = foundinstance['DeviceID']
 
         if foundinstance is None:
             LOG.debug(_("Volume %(volumename)s not found on the array.")
@@ -1119,6 +1142,71 @@ class EMCSMISCommon():
 
         return foundinstance
 
+    def _find_lun_instance(self, key, value):
+        """Finds a storage volume by DeviceID or by ElementName.
+
+        The instance names of the volumes are cached, so that finding a
+        volume costs a single GetInstance instead of enumerating all the
+        volumes of the arrays. The cache is refreshed when the volume is
+        not in it, or when the cached instance name is stale.
+        """
+        for refresh in (False, True):
+            if refresh:
+                self._refresh_lun_names()
+            name = self._lookup_lun_name(key, value)
+            if name is None:
+                continue
+            try:
+                vol_instance = self.conn.GetInstance(name)
+                if vol_instance[key] == value:
+                    return vol_instance
+            except Exception:
+                pass
+            LOG.debug(_("Cached volume %(key)s %(value)s is stale.")
+                      % {'key': key, 'value': value})
+            self._forget_lun_name(name)
+        return None
+
+    def _lookup_lun_name(self, key, value):
+        for names in self._lun_names.values():
+            name = names[key].get(value)
+            if name is not None:
+                return name
+        return None
+
+    def _refresh_lun_names(self):
+        """Caches the instance names of all the volumes of the arrays."""
+        self._lun_names = {}
+        instances = self.conn.EnumerateInstances(
+            'EMC_StorageVolume', PropertyList=['ElementName'])
+        for instance in instances:
+            self._remember_lun_name(instance.path, instance['ElementName'])
+
+    def _remember_lun_name(self, name, elementname):
+        names = self._lun_names.setdefault(name['SystemName'],
+                                           {'DeviceID': {},
+                                            'ElementName': {}})
+        names['DeviceID'][name['DeviceID']] = name
+        names['ElementName'][elementname] = name
+
+    def _forget_lun_name(self, name):
+        names = self._lun_names.get(name['SystemName'])
+        if names is None:
+            return
+        names['DeviceID'].pop(name['DeviceID'], None)
+        for elementname, cached in names['ElementName'].items():
+            if cached['DeviceID'] == name['DeviceID']:
+                del names['ElementName'][elementname]
+
+    def _remember_job_element(self, job, param, elementname):
+        """Caches the volume a successful method returned in param."""
+        try:
+            name = job[param]
+        except Exception:
+            name = None
+        if name is not None:
+            self._remember_lun_name(name, elementname)
+
     def _find_storage_sync_sv_sv(self, snapshotname, volumename,
                                  waitforsync=True):
         foundsyncname = None
@@ -1128,24 +1216,27 @@ class EMCSMISCommon():
         LOG.debug(_("Source: %(volumename)s  Target: %(snapshotname)s.")
                   % {'volumename': volumename, 'snapshotname': snapshotname})
 
-        names = self.conn.EnumerateInstanceNames(
-            'SE_StorageSynchronized_SV_SV')
-
-        for n in names:
-            snapshot_instance = self.conn.GetInstance(n['SyncedElement'],
-                                                      LocalOnly=False)
-            if snapshotname != snapshot_instance['ElementName']:
-                continue
-
-            vol_instance = self.conn.GetInstance(n['SystemElement'],
-                                                 LocalOnly=False)
-            if vol_instance['ElementName'] == volumename:
-                foundsyncname = n
-                storage_system = vol_instance['SystemName']
-                if waitforsync:
-                    sync_instance = self.conn.GetInstance(n, LocalOnly=False)
-                    percent_synced = sync_instance['PercentSynced']
-                break
+        # Only look at the synchronizations the target takes part in,
+        # rather than enumerating all of them on all the arrays.
+        snapshot_instance = self._find_lun_instance('ElementName',
+                                                    snapshotname)
+        vol_instance = self._find_lun_instance('ElementName', volumename)
+        if snapshot_instance is not None and vol_instance is not None:
+            names = self.conn.ReferenceNames(
+                snapshot_instance.path,
+                ResultClass='SE_StorageSynchronized_SV_SV')
+            for n in names:
+                if (n['SyncedElement']['DeviceID'] ==
+                        snapshot_instance['DeviceID'] and
+                        n['SystemElement']['DeviceID'] ==
+                        vol_instance['DeviceID']):
+                    foundsyncname = n
+                    storage_system = vol_instance['SystemName']
+                    if waitforsync:
+                        sync_instance = self.conn.GetInstance(
+                            n, LocalOnly=False)
+                        percent_synced = sync_instance['PercentSynced']
+                    break
 
         if foundsyncname is None:
             LOG.debug(_("Source: %(volumename)s  Target: %(snapshotname)s. "
@@ -1158,8 +1249,10 @@ class EMCSMISCommon():
                       % {'storage_system': storage_system,
                          'sync': str(foundsyncname)})
             # Wait for SE_StorageSynchronized_SV_SV to be fully synced
+            interval = JOB_POLL_INTERVAL_MIN
             while waitforsync and percent_synced < 100:
-                time.sleep(10)
+                time.sleep(interval)
+                interval = min(interval * 2, JOB_POLL_INTERVAL_MAX)
                 sync_instance = self.conn.GetInstance(foundsyncname,
                                                       LocalOnly=False)
                 percent_synced = sync_instance['PercentSynced']
@@ -1191,57 +1284,67 @@ class EMCSMISCommon():
     def _wait_for_job_complete(self, job):
         jobinstancename = job['Job']
 
+        interval = JOB_POLL_INTERVAL_MIN
         while True:
             jobinstance = self.conn.GetInstance(jobinstancename,
                                                 LocalOnly=False)
             jobstate = jobinstance['JobState']
-            # From ValueMap of JobState in CIM_ConcreteJob
-            # 2L=New, 3L=Starting, 4L=Running, 32767L=Queue Pending
-            # ValueMap("2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13..32767,
-            # 32768..65535"),
-            # Values("New, Starting, Running, Suspended, Shutting Down,
-            # Completed, Terminated, Killed, Exception, Service,
-            # Query Pending, DMTF Reserved, Vendor Reserved")]
-            if jobstate in [2L, 3L, 4L, 32767L]:
-                time.sleep(10)
-            else:
+            if jobstate not in JOB_RUNNING_STATES:
                 break
+            time.sleep(interval)
+            interval = min(interval * 2, JOB_POLL_INTERVAL_MAX)
 
         rc = jobinstance['ErrorCode']
         errordesc = jobinstance['ErrorDescription']
 
         return rc, errordesc
 
+    def _ctrl_has_initiator(self, ctrl, initiators):
+        """Tells if a LunMaskingSCSIProtocolController has an initiator."""
+        associators =\
+            self.conn.Associators(ctrl,
+                                  resultClass='EMC_StorageHardwareID')
+        for assoc in associators:
+            # if EMC_StorageHardwareID matches the initiator,
+            # we found the existing EMC_LunMaskingSCSIProtocolController
+            # (Storage Group for VNX)
+            # we can use for masking a new LUN
+            hardwareid = assoc['StorageID']
+            for initiator in initiators:
+                if hardwareid.lower() == initiator.lower():
+                    return True
+        return False
+
     # Find LunMaskingSCSIProtocolController for the local host on the
     # specified storage system
     def _find_lunmasking_scsi_protocol_controller(self, storage_system,
                                                   connector):
         foundCtrl = None
         initiators = self._find_initiator_names(connector)
-        controllers = self.conn.EnumerateInstanceNames(
-            'EMC_LunMaskingSCSIProtocolController')
-        for ctrl in controllers:
-            if storage_system != ctrl['SystemName']:
-                continue
-            associators =\
-                self.conn.Associators(ctrl,
-                                      resultClass='EMC_StorageHardwareID')
-            for assoc in associators:
-                # if EMC_StorageHardwareID matches the initiator,
-                # we found the existing EMC_LunMaskingSCSIProtocolController
-                # (Storage Group for VNX)
-                # we can use for masking a new LUN
-                hardwareid = assoc['StorageID']
-                for initiator in initiators:
-                    if hardwareid.lower() == initiator.lower():
-                        foundCtrl = ctrl
-                        break
-
-                if foundCtrl is not None:
+        key = (storage_system, tuple(sorted(i.lower() for i in initiators)))
+
+        # The controller found last time is checked before enumerating
+        # the controllers of all the arrays again.
+        cached = self._lunmask_ctrls.pop(key, None)
+        if cached is not None:
+            try:
+                if self._ctrl_has_initiator(cached, initiators):
+                    foundCtrl = cached
+            except Exception:
+                pass
+
+        if foundCtrl is None:
+            controllers = self.conn.EnumerateInstanceNames(
+                'EMC_LunMaskingSCSIProtocolController')
+            for ctrl in controllers:
+                if storage_system != ctrl['SystemName']:
+                    continue
+                if self._ctrl_has_initiator(ctrl, initiators):
+                    foundCtrl = ctrl
                     break
 
-            if foundCtrl is not None:
-                break
+        if foundCtrl is not None:
+            self._lunmask_ctrls[key] = foundCtrl
 
         LOG.debug(_("LunMaskingSCSIProtocolController for storage system "
                   "%(storage_system)s and initiator %(initiator)s is  "
@@ -1263,25 +1366,8 @@ class EMCSMISCommon():
                 resultClass='EMC_LunMaskingSCSIProtocolController')
 
         for ctrl in controllers:
-            associators =\
-                self.conn.Associators(
-                    ctrl,
-                    resultClass='EMC_StorageHardwareID')
-            for assoc in associators:
-                # if EMC_StorageHardwareID matches the initiator,
-                # we found the existing EMC_LunMaskingSCSIProtocolController
-                # (Storage Group for VNX)
-                # we can use for masking a new LUN
-                hardwareid = assoc['StorageID']
-                for initiator in initiators:
-                    if hardwareid.lower() == initiator.lower():
-                        foundCtrl = ctrl
-                        break
-
-                if foundCtrl is not None:
-                    break
-
-            if foundCtrl is not None:
+            if self._ctrl_has_initiator(ctrl, initiators):
+                foundCtrl = ctrl
                 break
 
         LOG.debug(_("LunMaskingSCSIProtocolController for storage volume "
@@ -1423,18 +1509,34 @@ class EMCSMISCommon():
         foundMaskingGroup = None
         maskingview_name = self._get_masking_view()
 
-        maskingviews = self.conn.EnumerateInstanceNames(
-            'EMC_LunMaskingSCSIProtocolController')
-        for view in maskingviews:
-            instance = self.conn.GetInstance(view, LocalOnly=False)
-            if maskingview_name == instance['ElementName']:
-                foundView = view
-                break
+        # The masking view found last time is tried before reading the
+        # name of every LunMaskingSCSIProtocolController again.
+        groups = None
+        foundView = self._masking_views.pop(maskingview_name, None)
+        if foundView is not None:
+            try:
+                groups = self.conn.AssociatorNames(
+                    foundView,
+                    ResultClass='SE_DeviceMaskingGroup')
+            except Exception:
+                groups = None
+
+        if not groups:
+            foundView = None
+            maskingviews = self.conn.EnumerateInstanceNames(
+                'EMC_LunMaskingSCSIProtocolController')
+            for view in maskingviews:
+                instance = self.conn.GetInstance(view, LocalOnly=False)
+                if maskingview_name == instance['ElementName']:
+                    foundView = view
+                    break
+
+            groups = self.conn.AssociatorNames(
+                foundView,
+                ResultClass='SE_DeviceMaskingGroup')
 
-        groups = self.conn.AssociatorNames(
-            foundView,
-            ResultClass='SE_DeviceMaskingGroup')
         foundMaskingGroup = groups[0]
+        self._masking_views[maskingview_name] = foundView
 
         LOG.debug(_("Masking view: %(view)s DeviceMaskingGroup: %(masking)s.")
                   % {'view': maskingview_name,
@@ -40,7 +40,12 @@ volume_opts = [
                 default=True,
                 help=('Create volumes as sparsed files which take no space.'
                       'If set to False volume is created as regular file.'
-                      'In such case volume creation takes a lot of time.'))]
+                      'In such case volume creation takes a lot of time.')),
+    cfg.IntOpt('glusterfs_allocated_reconcile_interval',
+               default=600,
+               help=('Seconds between full du scans used to reconcile the '
+                     'allocated space tracked for each gluster share when '
+                     'glusterfs_disk_util is du.'))]
 VERSION = '1.0'
 
 CONF = cfg.CONF
@@ -100,6 +105,7 @@ class GlusterfsDriver(nfs.RemoteFsDriver):
         LOG.info(_('casted to %s') % volume['provider_location'])
 
         self._do_create_volume(volume)
+        self._update_allocated(volume['provider_location'], volume['size'])
 
         return {'provider_location': volume['provider_location']}
 
@@ -116,6 +122,7 @@ class GlusterfsDriver(nfs.RemoteFsDriver):
         mounted_path = self.local_path(volume)
 
         self._execute('rm', '-f', mounted_path, run_as_root=True)
+        self._update_allocated(volume['provider_location'], -volume['size'])
 
     def ensure_export(self, ctx, volume):
         """Synchronously recreates an export for a logical volume."""
@@ -230,10 +237,7 @@ class GlusterfsDriver(nfs.RemoteFsDriver):
         if self.configuration.glusterfs_disk_util == 'df':
             available = int(out.split()[3])
         else:
-            out, _ = self._execute('du', '-sb', '--apparent-size',
-                                   '--exclude', '*snapshot*', mount_point,
-                                   run_as_root=True)
-            used = int(out.split()[0])
+            used = int(self._get_allocated(glusterfs_share))
             available = size - used
 
         return available, size
@@ -276,6 +280,10 @@ class GlusterfsDriver(nfs.RemoteFsDriver):
         data['storage_protocol'] = 'glusterfs'
 
         self._ensure_shares_mounted()
+        if self.configuration.glusterfs_disk_util != 'df':
+            self._reconcile_stale_allocated(
+                self._mounted_shares,
+                self.configuration.glusterfs_allocated_reconcile_interval)
 
         global_capacity = 0
         global_free = 0
@@ -238,6 +238,19 @@ class HUSDriver(driver.ISCSIDriver):
         vol = self.db.volume_get(self.context, idd)
         return vol
 
+    def _lu_lock(self, loc):
+        """Lock serializing operations on a single LU.
+
+        Only LU allocation, which picks free LU numbers on the array, is
+        still serialized array wide through the 'hds_hus' lock.
+        """
+        return utils.lock('hds_hus-lu-%s' % loc, external=True)
+
+    def _port_lock(self, ctl, port):
+        """Lock serializing iSCSI target changes on a controller port."""
+        return utils.lock('hds_hus-%s-port-%s-%s' % (self.arid, ctl, port),
+                          external=True)
+
     def __init__(self, *args, **kwargs):
         """Initialize, read different config parameters."""
         super(HUSDriver, self).__init__(*args, **kwargs)
@@ -304,36 +317,35 @@ class HUSDriver(driver.ISCSIDriver):
                      'sz': sz})
         return {'provider_location': lun}
 
-    @utils.synchronized('hds_hus', external=True)
     def delete_volume(self, volume):
         """Delete an LU on HUS."""
         loc = volume['provider_location']
         if loc is None:         # to take care of spurious input
             return              # which could cause exception.
-        (arid, lun) = loc.split('.')
-        myid = self.arid
-        if arid != myid:
-            LOG.error(_("Array Mismatch %(myid)s vs %(arid)s")
-                      % {'myid': myid,
-                         'arid': arid})
-            msg = 'Array id mismatch in volume delete'
-            raise exception.VolumeBackendAPIException(data=msg)
-        name = self.hus_name
-        LOG.debug(_("delete lun %(lun)s on %(name)s")
-                  % {'lun': lun,
-                     'name': name})
-        _out = self.bend.delete_lu(self.config['hus_cmd'],
-                                   self.config['mgmt_ip0'],
-                                   self.config['mgmt_ip1'],
-                                   self.config['username'],
-                                   self.config['password'],
-                                   self.arid, lun)
+        with self._lu_lock(loc):
+            (arid, lun) = loc.split('.')
+            myid = self.arid
+            if arid != myid:
+                LOG.error(_("Array Mismatch %(myid)s vs %(arid)s")
+                          % {'myid': myid,
+                             'arid': arid})
+                msg = 'Array id mismatch in volume delete'
+                raise exception.VolumeBackendAPIException(data=msg)
+            name = self.hus_name
+            LOG.debug(_("delete lun %(lun)s on %(name)s")
+                      % {'lun': lun,
+                         'name': name})
+            _out = self.bend.delete_lu(self.config['hus_cmd'],
+                                       self.config['mgmt_ip0'],
+                                       self.config['mgmt_ip1'],
+                                       self.config['username'],
+                                       self.config['password'],
+                                       self.arid, lun)
 
     def remove_export(self, context, volume):
         """Disconnect a volume from an attached instance."""
         return
 
-    @utils.synchronized('hds_hus', external=True)
     def initialize_connection(self, volume, connector):
         """Map the created volume to connector['initiator']."""
         service = self._get_service(volume)
@@ -343,14 +355,17 @@ class HUSDriver(driver.ISCSIDriver):
         iqn = HI_IQN + loc
         tgt_alias = 'cinder.' + loc
         init_alias = connector['host'][:(31 - len(loc))] + '.' + loc
-        _out = self.bend.add_iscsi_conn(self.config['hus_cmd'],
-                                        self.config['mgmt_ip0'],
-                                        self.config['mgmt_ip1'],
-                                        self.config['username'],
-                                        self.config['password'],
-                                        self.arid, lun, ctl, port, iqn,
-                                        tgt_alias, connector['initiator'],
-                                        init_alias)
+        with self._lu_lock(loc):
+            with self._port_lock(ctl, port):
+                _out = self.bend.add_iscsi_conn(self.config['hus_cmd'],
+                                                self.config['mgmt_ip0'],
+                                                self.config['mgmt_ip1'],
+                                                self.config['username'],
+                                                self.config['password'],
+                                                self.arid, lun, ctl, port,
+                                                iqn, tgt_alias,
+                                                connector['initiator'],
+                                                init_alias)
         hus_portal = ip + ':' + ipp
         tgt = hus_portal + ',' + iqn + ',' + loc + ',' + ctl + ',' + port
         properties = {}
@@ -362,7 +377,6 @@ class HUSDriver(driver.ISCSIDriver):
         properties['volume_id'] = volume['id']
         return {'driver_volume_type': 'iscsi', 'data': properties}
 
-    @utils.synchronized('hds_hus', external=True)
     def terminate_connection(self, volume, connector, **kwargs):
         """Terminate a connection to a volume."""
         loc = volume['provider_location']
@@ -370,13 +384,16 @@ class HUSDriver(driver.ISCSIDriver):
         iqn = HI_IQN + loc
         service = self._get_service(volume)
         (_ip, _ipp, ctl, port, _hdp) = service
-        _out = self.bend.del_iscsi_conn(self.config['hus_cmd'],
-                                        self.config['mgmt_ip0'],
-                                        self.config['mgmt_ip1'],
-                                        self.config['username'],
-                                        self.config['password'],
-                                        self.arid, lun, ctl, port, iqn,
-                                        connector['initiator'], 1)
+        with self._lu_lock(loc):
+            with self._port_lock(ctl, port):
+                _out = self.bend.del_iscsi_conn(self.config['hus_cmd'],
+                                                self.config['mgmt_ip0'],
+                                                self.config['mgmt_ip1'],
+                                                self.config['username'],
+                                                self.config['password'],
+                                                self.arid, lun, ctl, port,
+                                                iqn, connector['initiator'],
+                                                1)
         return {'provider_location': loc}
 
     @utils.synchronized('hds_hus', external=True)
@@ -423,30 +440,28 @@ class HUSDriver(driver.ISCSIDriver):
                      'size': size})
         return {'provider_location': lun}
 
-    @utils.synchronized('hds_hus', external=True)
     def delete_snapshot(self, snapshot):
         """Delete a snapshot."""
         loc = snapshot['provider_location']
         if loc is None:         # to take care of spurious input
             return              # which could cause exception.
-        (arid, lun) = loc.split('.')
-        myid = self.arid
-        if arid != myid:
-            LOG.error(_('Array mismatch %(myid)s vs %(arid)s')
-                      % {'myid': myid,
-                         'arid': arid})
-            msg = 'Array id mismatch in delete snapshot'
-            raise exception.VolumeBackendAPIException(data=msg)
-        _out = self.bend.delete_lu(self.config['hus_cmd'],
-                                   self.config['mgmt_ip0'],
-                                   self.config['mgmt_ip1'],
-                                   self.config['username'],
-                                   self.config['password'],
-                                   self.arid, lun)
-        LOG.debug(_("LUN %s is deleted.") % lun)
-        return
+        with self._lu_lock(loc):
+            (arid, lun) = loc.split('.')
+            myid = self.arid
+            if arid != myid:
+                LOG.error(_('Array mismatch %(myid)s vs %(arid)s')
+                          % {'myid': myid,
+                             'arid': arid})
+                msg = 'Array id mismatch in delete snapshot'
+                raise exception.VolumeBackendAPIException(data=msg)
+            _out = self.bend.delete_lu(self.config['hus_cmd'],
+                                       self.config['mgmt_ip0'],
+                                       self.config['mgmt_ip1'],
+                                       self.config['username'],
+                                       self.config['password'],
+                                       self.arid, lun)
+            LOG.debug(_("LUN %s is deleted.") % lun)
 
-    @utils.synchronized('hds_hus', external=True)
     def get_volume_stats(self, refresh=False):
         """Get volume stats. If 'refresh', run update the stats first."""
         if refresh:
@@ -20,13 +20,13 @@ Driver for Linux servers running LVM.
 
 """
 
-import math
 import os
 import re
 
 from oslo.config import cfg
 
 from cinder.brick.iscsi import iscsi
+from cinder.brick.local_dev import lvm
 from cinder import exception
 from cinder.image import image_utils
 from cinder.openstack.common import fileutils
@@ -54,6 +54,12 @@ volume_opts = [
                default=None,
                help='Size of thin provisioning pool '
                     '(None uses entire cinder VG)'),
+    cfg.FloatOpt('max_over_subscription_ratio',
+                 default=20.0,
+                 help='The ratio of the capacity provisioned in the thin '
+                      'provisioning pool to the size of the pool that the '
+                      'scheduler will not go over. Below 1 the volumes '
+                      'have to fit in the free space of the pool instead'),
     cfg.IntOpt('lvm_mirrors',
                default=0,
                help='If set, create lvms with multiple mirrors. Note that '
@@ -69,37 +75,41 @@ class LVMVolumeDriver(driver.VolumeDriver):
 
     VERSION = '1.0'
 
+    NO_RETRY_LIST = ['Insufficient free extents',
+                     'One or more specified logical volume(s) not found']
+
     def __init__(self, *args, **kwargs):
         super(LVMVolumeDriver, self).__init__(*args, **kwargs)
         self.configuration.append_config_values(volume_opts)
+        # The brick LVM object of the volume group, which keeps its
+        # inventory of logical volumes, set up by check_for_setup_error.
+        self.vg = None
 
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met"""
-        out, err = self._execute('vgs', '--noheadings', '-o', 'name',
-                                 run_as_root=True)
-        volume_groups = out.split()
-        if self.configuration.volume_group not in volume_groups:
+        try:
+            self.vg = lvm.LVM(self.configuration.volume_group,
+                              root_helper=utils.get_root_helper(),
+                              executor=self._execute_lvm)
+        except lvm.VolumeGroupNotFound:
             exception_message = (_("volume group %s doesn't exist")
                                  % self.configuration.volume_group)
             raise exception.VolumeBackendAPIException(data=exception_message)
 
-    def _create_volume(self, volume_name, sizestr):
-
-        no_retry_list = ['Insufficient free extents',
-                         'One or more specified logical volume(s) not found']
-
-        cmd = ['lvcreate', '-L', sizestr, '-n', volume_name,
-               self.configuration.volume_group]
-        if self.configuration.lvm_mirrors:
-            cmd += ['-m', self.configuration.lvm_mirrors, '--nosync']
-            terras = int(sizestr[:-1]) / 1024.0
-            if terras >= 1.5:
-                rsize = int(2 ** math.ceil(math.log(terras) / math.log(2)))
-                # NOTE(vish): Next power of two for region size. See:
-                #             http://red.ht/U2BPOD
-                cmd += ['-R', str(rsize)]
-
-        self._try_execute(*cmd, run_as_root=True, no_retry_list=no_retry_list)
+    def _execute_lvm(self, *cmd, **kwargs):
+        # Looked up on every call, so that set_execute() applies.
+        if cmd[0] in ('lvcreate', 'lvremove'):
+            # These can fail transiently, for instance while udev still
+            # holds the device, so they are retried unless retrying can
+            # not help.
+            self._try_execute(*cmd, no_retry_list=self.NO_RETRY_LIST,
+                              **kwargs)
+            return ('', '')
+        return self._execute(*cmd, **kwargs)
+
+    def _create_volume(self, volume_name, size_in_g):
+        self.vg.create_volume(volume_name, '%s' % size_in_g,
+                              mirror_count=self.configuration.lvm_mirrors)
 
     def _copy_volume(self, srcstr, deststr, size_in_g, clearing=False):
         # Use O_DIRECT to avoid thrashing the system buffer cache
@@ -125,13 +135,7 @@ class LVMVolumeDriver(driver.VolumeDriver):
                       *extra_flags, run_as_root=True)
 
     def _volume_not_present(self, volume_name):
-        path_name = '%s/%s' % (self.configuration.volume_group, volume_name)
-        try:
-            self._try_execute('lvdisplay', path_name, run_as_root=True)
-        except Exception as e:
-            # If the volume isn't present
-            return True
-        return False
+        return self.vg.get_volume(volume_name) is None
 
     def _delete_volume(self, volume, size_in_g):
         """Deletes a logical volume."""
@@ -141,15 +145,7 @@ class LVMVolumeDriver(driver.VolumeDriver):
         if os.path.exists(dev_path):
             self.clear_volume(volume)
 
-        self._try_execute('lvremove', '-f', "%s/%s" %
-                          (self.configuration.volume_group,
-                           self._escape_snapshot(volume['name'])),
-                          run_as_root=True)
-
-    def _sizestr(self, size_in_g):
-        if int(size_in_g) == 0:
-            return '100M'
-        return '%sG' % size_in_g
+        self.vg.delete(self._escape_snapshot(volume['name']))
 
     # Linux LVM reserves name that starts with snapshot, so that
     # such volume name can't be created. Mangle it.
@@ -162,11 +158,11 @@ class LVMVolumeDriver(driver.VolumeDriver):
         """Creates a logical volume. Can optionally return a Dictionary of
         changes to the volume object to be persisted.
         """
-        self._create_volume(volume['name'], self._sizestr(volume['size']))
+        self._create_volume(volume['name'], volume['size'])
 
     def create_volume_from_snapshot(self, volume, snapshot):
         """Creates a volume from a snapshot."""
-        self._create_volume(volume['name'], self._sizestr(volume['size']))
+        self._create_volume(volume['name'], volume['size'])
         self._copy_volume(self.local_path(snapshot), self.local_path(volume),
                           snapshot['volume_size'])
 
@@ -178,16 +174,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
 
         # TODO(yamahata): lvm can't delete origin volume only without
         # deleting derived snapshots. Can we do something fancy?
-        out, err = self._execute('lvdisplay', '--noheading',
-                                 '-C', '-o', 'Attr',
-                                 '%s/%s' % (self.configuration.volume_group,
-                                            volume['name']),
-                                 run_as_root=True)
-        # fake_execute returns None resulting unit test error
-        if out:
-            out = out.strip()
-            if (out[0] == 'o') or (out[0] == 'O'):
-                raise exception.VolumeIsBusy(volume_name=volume['name'])
+        if self.vg.lv_has_snapshot(volume['name']):
+            raise exception.VolumeIsBusy(volume_name=volume['name'])
 
         self._delete_volume(volume, volume['size'])
 
@@ -229,12 +217,10 @@ class LVMVolumeDriver(driver.VolumeDriver):
 
     def create_snapshot(self, snapshot):
         """Creates a snapshot."""
-        orig_lv_name = "%s/%s" % (self.configuration.volume_group,
-                                  snapshot['volume_name'])
-        self._try_execute('lvcreate', '-L',
-                          self._sizestr(snapshot['volume_size']),
-                          '--name', self._escape_snapshot(snapshot['name']),
-                          '--snapshot', orig_lv_name, run_as_root=True)
+        if not self.vg.create_lv_snapshot(
+                self._escape_snapshot(snapshot['name']),
+                snapshot['volume_name']):
+            raise exception.VolumeNotFound(volume_id=snapshot['volume_name'])
 
     def delete_snapshot(self, snapshot):
         """Deletes a snapshot."""
@@ -279,7 +265,7 @@ class LVMVolumeDriver(driver.VolumeDriver):
                          'name': 'clone-snap-%s' % src_vref['id'],
                          'id': temp_id}
         self.create_snapshot(temp_snapshot)
-        self._create_volume(volume['name'], self._sizestr(volume['size']))
+        self._create_volume(volume['name'], volume['size'])
         try:
             self._copy_volume(self.local_path(temp_snapshot),
                               self.local_path(volume),
@@ -293,10 +279,40 @@ class LVMVolumeDriver(driver.VolumeDriver):
     def backup_volume(self, context, backup, backup_service):
         """Create a new backup from an existing volume."""
         volume = self.db.volume_get(context, backup['volume_id'])
-        volume_path = self.local_path(volume)
-        with utils.temporary_chown(volume_path):
-            with fileutils.file_open(volume_path) as volume_file:
-                backup_service.backup(backup, volume_file)
+        self._backup_device(self.local_path(volume), backup, backup_service)
+
+    def _backup_device(self, device_path, backup, backup_service):
+        with utils.temporary_chown(device_path):
+            with fileutils.file_open(device_path) as device_file:
+                backup_service.backup(backup, device_file)
+
+    def _get_backup_snapshot(self, backup, volume):
+        return {'id': backup['id'],
+                'name': 'backup-snapshot-%s' % backup['id'],
+                'volume_id': volume['id'],
+                'volume_name': volume['name'],
+                'volume_size': volume['size']}
+
+    def create_backup_snapshot(self, context, backup, volume):
+        """Take a temporary snapshot of the volume to back it up from."""
+        snapshot = self._get_backup_snapshot(backup, volume)
+        self.create_snapshot(snapshot)
+        return snapshot
+
+    def get_backup_snapshot(self, context, backup, volume):
+        """Return the snapshot create_backup_snapshot() took, if it exists."""
+        snapshot = self._get_backup_snapshot(backup, volume)
+        if self._volume_not_present(self._escape_snapshot(snapshot['name'])):
+            return None
+        return snapshot
+
+    def backup_snapshot(self, context, backup, snapshot, backup_service):
+        """Create a new backup from a snapshot of create_backup_snapshot()."""
+        self._backup_device(self.local_path(snapshot), backup, backup_service)
+
+    def delete_backup_snapshot(self, context, backup, volume):
+        """Delete the snapshot create_backup_snapshot() took, if any."""
+        self.delete_snapshot(self._get_backup_snapshot(backup, volume))
 
     def restore_backup(self, context, backup, volume, backup_service):
         """Restore an existing backup to a new or existing volume."""
@@ -332,6 +348,30 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
 
     def ensure_export(self, context, volume):
         """Synchronously recreates an export for a logical volume."""
+        target = self._get_export_target(context, volume)
+        if target is not None:
+            # NOTE(jdg): For TgtAdm case iscsi_name is the ONLY param we
+            # need should clean this all up at some point in the future
+            self.tgtadm.create_iscsi_target(target['name'], target['tid'],
+                                            target['lun'], target['path'],
+                                            target['chap_auth'],
+                                            check_exit_code=False,
+                                            old_name=target['old_name'])
+
+    def ensure_exports(self, context, volumes):
+        """Recreates the exports of many logical volumes at once."""
+        targets = []
+        for volume in volumes:
+            target = self._get_export_target(context, volume)
+            if target is not None:
+                targets.append(target)
+        self.tgtadm.create_iscsi_targets(targets, check_exit_code=False)
+
+    def _get_export_target(self, context, volume):
+        """Return the iSCSI target arguments to export a volume with.
+
+        Returns None when the volume has no target provisioned.
+        """
         # NOTE(jdg): tgtadm doesn't use the iscsi_targets table
         # TODO(jdg): In the future move all of the dependent stuff into the
         # cooresponding target admin class
@@ -349,18 +389,15 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
                 LOG.debug("volume_info:", volume_info)
                 LOG.info(_("Skipping ensure_export. No iscsi_target "
                            "provision for volume: %s"), volume['id'])
-                return
+                return None
 
             iscsi_name = "%s%s" % (self.configuration.iscsi_target_prefix,
                                    volume['name'])
             volume_path = "/dev/%s/%s" % (self.configuration.volume_group,
                                           volume['name'])
-            iscsi_target = 1
-
-            self.tgtadm.create_iscsi_target(iscsi_name, iscsi_target,
-                                            0, volume_path, chap_auth,
-                                            check_exit_code=False)
-            return
+            return {'name': iscsi_name, 'tid': 1, 'lun': 0,
+                    'path': volume_path, 'chap_auth': chap_auth,
+                    'old_name': None}
 
         if not isinstance(self.tgtadm, iscsi.TgtAdm):
             try:
@@ -370,7 +407,7 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
             except exception.NotFound:
                 LOG.info(_("Skipping ensure_export. No iscsi_target "
                            "provisioned for volume: %s"), volume['id'])
-                return
+                return None
         else:
             iscsi_target = 1  # dummy value when using TgtAdm
 
@@ -394,12 +431,9 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
         volume_path = "/dev/%s/%s" % (self.configuration.volume_group,
                                       volume_name)
 
-        # NOTE(jdg): For TgtAdm case iscsi_name is the ONLY param we need
-        # should clean this all up at some point in the future
-        self.tgtadm.create_iscsi_target(iscsi_name, iscsi_target,
-                                        0, volume_path, chap_auth,
-                                        check_exit_code=False,
-                                        old_name=old_name)
+        return {'name': iscsi_name, 'tid': iscsi_target, 'lun': 0,
+                'path': volume_path, 'chap_auth': chap_auth,
+                'old_name': old_name}
 
     def _fix_id_migration(self, context, volume):
         """Fix provider_location and dev files to address bug 1065702.
@@ -457,11 +491,8 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
             if host_iscsi_targets >= self.configuration.iscsi_num_targets:
                 return
 
-            # NOTE(vish): Target ids start at 1, not 0.
-            target_end = self.configuration.iscsi_num_targets + 1
-            for target_num in xrange(1, target_end):
-                target = {'host': host, 'target_num': target_num}
-                self.db.iscsi_target_create_safe(context, target)
+            self.db.iscsi_target_create_missing(
+                context, host, self.configuration.iscsi_num_targets)
 
     def create_export(self, context, volume):
         """Creates an export for a logical volume."""
@@ -583,18 +614,15 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
         data['QoS_support'] = False
 
         try:
-            out, err = self._execute('vgs', '--noheadings', '--nosuffix',
-                                     '--unit=G', '-o', 'name,size,free',
-                                     self.configuration.volume_group,
-                                     run_as_root=True)
-        except exception.ProcessExecutionError as exc:
-            LOG.error(_("Error retrieving volume status: %s"), exc.stderr)
-            out = False
-
-        if out:
-            volume = out.split()
-            data['total_capacity_gb'] = float(volume[1].replace(',', '.'))
-            data['free_capacity_gb'] = float(volume[2].replace(',', '.'))
+            # Reloads the inventory of the volume group, which picks up
+            # changes made outside of the driver.
+            vg_info = self.vg.update_volume_group_info()
+        except (exception.ProcessExecutionError,
+                lvm.VolumeGroupNotFound) as exc:
+            LOG.error(_("Error retrieving volume status: %s"), exc)
+        else:
+            data['total_capacity_gb'] = vg_info['size']
+            data['free_capacity_gb'] = vg_info['available']
 
         self._stats = data
 
@@ -616,69 +644,40 @@ class ThinLVMVolumeDriver(LVMISCSIDriver):
 
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met"""
-        out, err = self._execute('lvs', '--option',
-                                 'name', '--noheadings',
-                                 run_as_root=True)
+        super(ThinLVMVolumeDriver, self).check_for_setup_error()
         pool_name = "%s-pool" % self.configuration.volume_group
-        if pool_name not in out:
-            if not self.configuration.pool_size:
-                out, err = self._execute('vgs',
-                                         self.configuration.volume_group,
-                                         '--noheadings',
-                                         '--options',
-                                         'name,size',
-                                         run_as_root=True)
-
-                size = re.sub(r'[\.][\d][\d]', '', out.split()[1])
-            else:
+        if self.vg.get_volume(pool_name) is None:
+            size = 0
+            if self.configuration.pool_size:
                 size = "%s" % self.configuration.pool_size
+            self.vg.create_thin_pool(pool_name, size)
 
-            pool_path = '%s/%s' % (self.configuration.volume_group,
-                                   pool_name)
-            out, err = self._execute('lvcreate', '-T', '-L', size,
-                                     pool_path, run_as_root=True)
-
-    def _do_lvm_snapshot(self, src_lvm_name, dest_vref, is_cinder_snap=True):
+    def _do_lvm_snapshot(self, src_lv_name, dest_vref, is_cinder_snap=True):
             if is_cinder_snap:
                 new_name = self._escape_snapshot(dest_vref['name'])
             else:
                 new_name = dest_vref['name']
 
-            self._try_execute('lvcreate', '-s', '-n', new_name,
-                              src_lvm_name, run_as_root=True)
-
-    def _create_volume(self, volume):
-        sizestr = self._sizestr(volume['size'])
-        vg_name = ("%s/%s-pool" % (self.configuration.volume_group,
-                                   self.configuration.volume_group))
-        self._try_execute('lvcreate', '-T', '-V', sizestr, '-n',
-                          volume['name'], vg_name, run_as_root=True)
+            if not self.vg.create_lv_snapshot(new_name, src_lv_name, 'thin'):
+                raise exception.VolumeNotFound(volume_id=src_lv_name)
 
-    def create_volume(self, volume):
-        """Creates a logical volume."""
-        self._create_volume(volume)
+    def _create_volume(self, volume_name, size_in_g):
+        self.vg.create_volume(volume_name, '%s' % size_in_g, 'thin')
 
     def delete_volume(self, volume):
         """Deletes a logical volume."""
         if self._volume_not_present(volume['name']):
             return True
-        self._try_execute('lvremove', '-f', "%s/%s" %
-                          (self.configuration.volume_group,
-                           self._escape_snapshot(volume['name'])),
-                          run_as_root=True)
+        self.vg.delete(self._escape_snapshot(volume['name']))
 
     def create_cloned_volume(self, volume, src_vref):
         """Creates a clone of the specified volume."""
         LOG.info(_('Creating clone of volume: %s') % src_vref['id'])
-        orig_lv_name = "%s/%s" % (self.configuration.volume_group,
-                                  src_vref['name'])
-        self._do_lvm_snapshot(orig_lv_name, volume, False)
+        self._do_lvm_snapshot(src_vref['name'], volume, False)
 
     def create_snapshot(self, snapshot):
         """Creates a snapshot of a volume."""
-        orig_lv_name = "%s/%s" % (self.configuration.volume_group,
-                                  snapshot['volume_name'])
-        self._do_lvm_snapshot(orig_lv_name, snapshot)
+        self._do_lvm_snapshot(snapshot['volume_name'], snapshot)
 
     def get_volume_stats(self, refresh=False):
         """Get volume status.
@@ -702,6 +701,28 @@ class ThinLVMVolumeDriver(LVMISCSIDriver):
         data["storage_protocol"] = 'iSCSI'
         data['reserved_percentage'] = self.configuration.reserved_percentage
         data['QoS_support'] = False
-        data['total_capacity_gb'] = 'infinite'
-        data['free_capacity_gb'] = 'infinite'
+        data['thin_provisioning_support'] = True
+        data['max_over_subscription_ratio'] = \
+            self.configuration.max_over_subscription_ratio
+        data['total_capacity_gb'] = 0
+        data['free_capacity_gb'] = 0
+        data['provisioned_capacity_gb'] = 0
+
+        try:
+            self.vg.update_volume_group_info()
+            pool = self.vg.get_thin_pool_info()
+        except (exception.ProcessExecutionError,
+                lvm.VolumeGroupNotFound) as exc:
+            LOG.error(_("Error retrieving volume status: %s"), exc)
+            pool = None
+
+        if pool is not None:
+            # The free space of the pool is what its data does not use,
+            # the volumes in it only take space once written to.
+            data['total_capacity_gb'] = pool['size']
+            data['free_capacity_gb'] = pool['free']
+            data['provisioned_capacity_gb'] = pool['provisioned']
+            data['pool_data_used_percent'] = pool['data_percent']
+            data['pool_metadata_used_percent'] = pool['metadata_percent']
+
         self._stats = data
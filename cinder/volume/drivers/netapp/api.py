@@ -21,8 +21,12 @@ NetApp api for ONTAP and OnCommand DFM.
 Contains classes required to issue api calls to ONTAP and OnCommand DFM.
 """
 
+import base64
+import errno
+import httplib
+import socket
+
 from lxml import etree
-import urllib2
 
 from cinder.openstack.common import log as logging
 
@@ -45,13 +49,15 @@ class NaServer(object):
     def __init__(self, host, server_type=SERVER_TYPE_FILER,
                  transport_type=TRANSPORT_TYPE_HTTP,
                  style=STYLE_LOGIN_PASSWORD, username=None,
-                 password=None):
+                 password=None, pool_size=1):
         self._host = host
         self.set_server_type(server_type)
         self.set_transport_type(transport_type)
         self.set_style(style)
+        self.set_pool_size(pool_size)
         self._username = username
         self._password = password
+        self._connections = []
         self._refresh_conn = True
 
     def get_transport_type(self):
@@ -122,7 +128,6 @@ class NaServer(object):
             self._api_version = str(major) + "." + str(minor)
         except ValueError:
             raise ValueError('Major and minor versions must be integers')
-        self._refresh_conn = True
 
     def get_api_version(self):
         """Gets the api version."""
@@ -149,6 +154,7 @@ class NaServer(object):
             self._timeout = int(seconds)
         except ValueError:
             raise ValueError('timeout in seconds must be integer')
+        self._refresh_conn = True
 
     def get_timeout(self):
         """Gets the timeout in seconds if set."""
@@ -156,6 +162,17 @@ class NaServer(object):
             return self._timeout
         return None
 
+    def set_pool_size(self, size):
+        """Sets the number of idle connections kept open to the server."""
+        try:
+            self._pool_size = int(size)
+        except ValueError:
+            raise ValueError('Pool size must be integer')
+
+    def get_pool_size(self):
+        """Gets the number of idle connections kept open to the server."""
+        return self._pool_size
+
     def get_vfiler(self):
         """Get the vfiler to use in tunneling."""
         return self._vfiler
@@ -186,21 +203,14 @@ class NaServer(object):
         """Invoke the api on the server."""
         if na_element and not isinstance(na_element, NaElement):
             ValueError('NaElement must be supplied to invoke api')
-        request = self._create_request(na_element, enable_tunneling)
-        if not hasattr(self, '_opener') or not self._opener \
-                or self._refresh_conn:
-            self._build_opener()
+        (conn, response) = self._send_request(na_element, enable_tunneling)
         try:
-            if hasattr(self, '_timeout'):
-                response = self._opener.open(request, timeout=self._timeout)
-            else:
-                response = self._opener.open(request)
-        except urllib2.HTTPError as e:
-            raise NaApiError(e.code, e.msg)
-        except Exception as e:
-            raise NaApiError('Unexpected error', e)
-        xml = response.read()
-        return self._get_result(xml)
+            result = self._get_result(response)
+        except Exception:
+            conn.close()
+            raise
+        self._release_connection(conn)
+        return result
 
     def invoke_successfully(self, na_element, enable_tunneling=False):
         """Invokes api and checks execution status as success.
@@ -211,8 +221,78 @@ class NaServer(object):
         otherwise tunneling remains disabled.
         """
         result = self.invoke_elem(na_element, enable_tunneling)
+        self._check_result(result)
+        return result
+
+    def invoke_iter(self, na_element, max_records=None,
+                    enable_tunneling=False):
+        """Invokes a *-get-iter api and yields the records of all pages.
+
+        Follows next-tag from page to page. Each page is parsed as it is
+        read from the server, and a record is freed once the next one is
+        yielded, so large listings are never held in memory at once.
+        """
+        if max_records:
+            self._set_child_content(na_element, 'max-records',
+                                    str(max_records))
+        while True:
+            (conn, response) = self._send_request(na_element,
+                                                  enable_tunneling)
+            done = False
+            tag = None
+            try:
+                results = None
+                records = None
+                for event, elem in etree.iterparse(
+                        response, events=('start', 'end')):
+                    name = etree.QName(elem.tag).localname
+                    parent = elem.getparent()
+                    if event == 'start':
+                        if results is None and name == 'results':
+                            results = elem
+                        elif parent is results and name == 'attributes-list':
+                            records = elem
+                    elif parent is None:
+                        continue
+                    elif parent is records:
+                        yield NaElement(elem)
+                        # Free the records already handled
+                        elem.clear()
+                        while elem.getprevious() is not None:
+                            del parent[0]
+                    elif parent is results and name == 'next-tag':
+                        tag = elem.text
+                    elif elem is results:
+                        self._check_result(NaElement(results))
+                done = True
+            except etree.XMLSyntaxError as e:
+                raise NaApiError('Unexpected error', e)
+            finally:
+                if done:
+                    self._release_connection(conn)
+                else:
+                    conn.close()
+            if results is None:
+                raise NaApiError('No response received')
+            if not tag:
+                break
+            self._set_child_content(na_element, 'tag', tag, True)
+
+    @staticmethod
+    def _set_child_content(na_element, name, content, convert=False):
+        child = na_element.get_child_by_name(name)
+        if child is None:
+            na_element.add_new_child(name, content, convert)
+        else:
+            if convert:
+                content = NaElement._convert_entity_refs(content)
+            child.set_content(content)
+
+    @staticmethod
+    def _check_result(result):
+        """Raises NaApiError unless the execution status is passed."""
         if result.has_attr('status') and result.get_attr('status') == 'passed':
-            return result
+            return
         code = result.get_attr('errno')\
             or result.get_child_content('errorno')\
             or 'ESTATUSFAILED'
@@ -230,11 +310,7 @@ class NaServer(object):
         if enable_tunneling:
             self._enable_tunnel_request(netapp_elem)
         netapp_elem.add_child_elem(na_element)
-        request_d = netapp_elem.to_string()
-        request = urllib2.Request(
-            self._get_url(), data=request_d,
-            headers={'Content-Type': 'text/xml', 'charset': 'utf-8'})
-        return request
+        return netapp_elem.to_string()
 
     def _enable_tunnel_request(self, netapp_elem):
         """Enables vserver or vfiler tunneling."""
@@ -258,10 +334,11 @@ class NaServer(object):
                                  ' to send request to vserver')
 
     def _parse_response(self, response):
-        """Get the NaElement for the response."""
-        if not response:
+        """Get the NaElement for the response, parsed as it is read."""
+        try:
+            xml = etree.parse(response).getroot()
+        except etree.XMLSyntaxError:
             raise NaApiError('No response received')
-        xml = etree.XML(response)
         return NaElement(xml)
 
     def _get_result(self, response):
@@ -273,22 +350,101 @@ class NaServer(object):
         return '%s://%s:%s/%s' % (self._protocol, self._host, self._port,
                                   self._url)
 
-    def _build_opener(self):
+    def _send_request(self, na_element, enable_tunneling=False):
+        """Posts the api request on a kept alive connection.
+
+        Returns the connection and the response, to be read before the
+        connection is released.
+        """
+        body = self._create_request(na_element, enable_tunneling)
+        headers = {'Content-Type': 'text/xml', 'charset': 'utf-8',
+                   'Content-Length': str(len(body))}
         if self._auth_style == NaServer.STYLE_LOGIN_PASSWORD:
-            auth_handler = self._create_basic_auth_handler()
+            headers['Authorization'] = self._create_basic_auth_header()
+        else:
+            headers.update(self._create_certificate_auth_header())
+        if self._refresh_conn:
+            self._close_connections()
+            self._refresh_conn = False
+
+        while True:
+            (conn, reused) = self._get_connection()
+            try:
+                conn.request('POST', '/%s' % self._url, body, headers)
+            except Exception as e:
+                conn.close()
+                if reused and self._is_reset(e):
+                    # The server closed the idle connection, the request
+                    # did not reach it and is safe to send again.
+                    continue
+                raise NaApiError('Unexpected error', e)
+            try:
+                response = conn.getresponse()
+            except Exception as e:
+                conn.close()
+                if reused and isinstance(e, httplib.BadStatusLine):
+                    # The server closed the idle connection without
+                    # answering, as it does before reading the request.
+                    continue
+                raise NaApiError('Unexpected error', e)
+            break
+
+        if response.status != httplib.OK:
+            conn.close()
+            raise NaApiError(response.status, response.reason)
+        return (conn, response)
+
+    @staticmethod
+    def _is_reset(error):
+        """Whether sending a request failed because the server had closed
+        the connection.
+
+        Other errors, e.g. timeouts, may happen after the server started
+        running the request, which is then not sent again.
+        """
+        return (isinstance(error, socket.error) and
+                not isinstance(error, socket.timeout) and
+                error.errno in (errno.ECONNRESET, errno.EPIPE))
+
+    def _get_connection(self):
+        """Returns an idle connection or a new one, and if it is reused."""
+        try:
+            return (self._connections.pop(), True)
+        except IndexError:
+            pass
+        host = self._host
+        if ':' in host and not host.startswith('['):
+            host = '[%s]' % host
+        host = '%s:%s' % (host, self._port)
+        if self._protocol == NaServer.TRANSPORT_TYPE_HTTPS:
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+        timeout = self.get_timeout()
+        if timeout is None:
+            return (connection_class(host), False)
+        return (connection_class(host, timeout=timeout), False)
+
+    def _release_connection(self, conn):
+        """Keeps the connection open for the next request, if there is
+        room in the pool.
+        """
+        if len(self._connections) < self._pool_size:
+            self._connections.append(conn)
         else:
-            auth_handler = self._create_certificate_auth_handler()
-        opener = urllib2.build_opener(auth_handler)
-        self._opener = opener
-
-    def _create_basic_auth_handler(self):
-        password_man = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        password_man.add_password(None, self._get_url(), self._username,
-                                  self._password)
-        auth_handler = urllib2.HTTPBasicAuthHandler(password_man)
-        return auth_handler
-
-    def _create_certificate_auth_handler(self):
+            conn.close()
+
+    def _close_connections(self):
+        while self._connections:
+            self._connections.pop().close()
+
+    def _create_basic_auth_header(self):
+        # Sent with every request, saving the 401 round trip of a
+        # challenged authentication.
+        credentials = '%s:%s' % (self._username, self._password)
+        return 'Basic %s' % base64.b64encode(credentials)
+
+    def _create_certificate_auth_header(self):
         raise NotImplementedError()
 
 
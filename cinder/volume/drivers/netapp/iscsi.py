@@ -109,7 +109,8 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
                                transport_type=kwargs['transport_type'],
                                style=NaServer.STYLE_LOGIN_PASSWORD,
                                username=kwargs['login'],
-                               password=kwargs['password'])
+                               password=kwargs['password'],
+                               pool_size=kwargs['pool_size'])
 
     def _do_custom_setup(self):
         """Does custom setup depending on the type of filer."""
@@ -136,7 +137,8 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             login=self.configuration.netapp_login,
             password=self.configuration.netapp_password,
             hostname=self.configuration.netapp_server_hostname,
-            port=self.configuration.netapp_server_port)
+            port=self.configuration.netapp_server_port,
+            pool_size=self.configuration.netapp_connection_pool_size)
         self._do_custom_setup()
 
     def check_for_setup_error(self):
@@ -595,7 +597,8 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
 
     def _create_avl_vol_request(self, vserver, tag=None):
         vol_get_iter = NaElement('volume-get-iter')
-        vol_get_iter.add_new_child('max-records', '100')
+        vol_get_iter.add_new_child('max-records',
+                                   str(self.configuration.netapp_max_records))
         if tag:
             vol_get_iter.add_new_child('tag', tag, True)
         query = NaElement('query')
@@ -665,25 +668,15 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
 
         Gets the luns from cluster with vserver.
         """
-        tag = None
-        while True:
-            api = NaElement('lun-get-iter')
-            api.add_new_child('max-records', '100')
-            if tag:
-                api.add_new_child('tag', tag, True)
-            lun_info = NaElement('lun-info')
-            lun_info.add_new_child('vserver', self.vserver)
-            query = NaElement('query')
-            query.add_child_elem(lun_info)
-            api.add_child_elem(query)
-            result = self.client.invoke_successfully(api)
-            if result.get_child_by_name('num-records') and\
-                    int(result.get_child_content('num-records')) >= 1:
-                attr_list = result.get_child_by_name('attributes-list')
-                self._extract_and_populate_luns(attr_list.get_children())
-            tag = result.get_child_content('next-tag')
-            if tag is None:
-                break
+        api = NaElement('lun-get-iter')
+        lun_info = NaElement('lun-info')
+        lun_info.add_new_child('vserver', self.vserver)
+        query = NaElement('query')
+        query.add_child_elem(lun_info)
+        api.add_child_elem(query)
+        luns = self.client.invoke_iter(api,
+                                       self.configuration.netapp_max_records)
+        self._extract_and_populate_luns(luns)
 
     def _find_mapped_lun_igroup(self, path, initiator, os=None):
         """Find the igroup for mapped lun with initiator."""
@@ -704,7 +697,8 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
         map_list = []
         while True:
             lun_map_iter = NaElement('lun-map-get-iter')
-            lun_map_iter.add_new_child('max-records', '100')
+            lun_map_iter.add_new_child(
+                'max-records', str(self.configuration.netapp_max_records))
             if tag:
                 lun_map_iter.add_new_child('tag', tag, True)
             query = NaElement('query')
@@ -733,7 +727,8 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
         igroup_list = []
         while True:
             igroup_iter = NaElement('igroup-get-iter')
-            igroup_iter.add_new_child('max-records', '100')
+            igroup_iter.add_new_child(
+                'max-records', str(self.configuration.netapp_max_records))
             if tag:
                 igroup_iter.add_new_child('tag', tag, True)
             query = NaElement('query')
@@ -82,6 +82,7 @@ class NetAppNFSDriver(nfs.NfsDriver):
 
         self._clone_volume(snapshot.name, volume.name, snapshot.volume_id)
         share = self._get_volume_location(snapshot.volume_id)
+        self._update_allocated(share, vol_size)
 
         return {'provider_location': share}
 
@@ -179,6 +180,7 @@ class NetAppNFSDriver(nfs.NfsDriver):
 
         self._clone_volume(src_vref.name, volume.name, src_vref.id)
         share = self._get_volume_location(src_vref.id)
+        self._update_allocated(share, vol_size)
 
         return {'provider_location': share}
 
@@ -228,7 +230,8 @@ class NetAppDirectNfsDriver (NetAppNFSDriver):
             transport_type=self.configuration.netapp_transport_type,
             style=NaServer.STYLE_LOGIN_PASSWORD,
             username=self.configuration.netapp_login,
-            password=self.configuration.netapp_password)
+            password=self.configuration.netapp_password,
+            pool_size=self.configuration.netapp_connection_pool_size)
         return client
 
     def _do_custom_setup(self, client):
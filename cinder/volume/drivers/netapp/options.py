@@ -42,7 +42,11 @@ netapp_connection_opts = [
                help='Host name for the storage controller'),
     cfg.IntOpt('netapp_server_port',
                default=80,
-               help='Port number for the storage controller'), ]
+               help='Port number for the storage controller'),
+    cfg.IntOpt('netapp_connection_pool_size',
+               default=4,
+               help='Number of idle connections kept open to the storage '
+                    'controller for the next api calls'), ]
 
 netapp_transport_opts = [
     cfg.StrOpt('netapp_transport_type',
@@ -69,7 +73,11 @@ netapp_provisioning_opts = [
 netapp_cluster_opts = [
     cfg.StrOpt('netapp_vserver',
                default='openstack',
-               help='Cluster vserver to use for provisioning'), ]
+               help='Cluster vserver to use for provisioning'),
+    cfg.IntOpt('netapp_max_records',
+               default=1000,
+               help='Number of records requested per call when listing '
+                    'luns, lun maps, igroups and volumes of the cluster'), ]
 
 netapp_7mode_opts = [
     cfg.StrOpt('netapp_vfiler',
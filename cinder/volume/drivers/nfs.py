@@ -18,12 +18,17 @@
 import errno
 import hashlib
 import os
+import time
 
+import eventlet
+from eventlet import greenpool
 from oslo.config import cfg
 
 from cinder import exception
 from cinder.image import image_utils
+from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
 from cinder import units
 from cinder.volume import driver
 
@@ -54,7 +59,21 @@ volume_opts = [
                  default=1.0,
                  help=('This will compare the allocated to available space on '
                        'the volume destination.  If the ratio exceeds this '
-                       'number, the destination will no longer be valid.'))
+                       'number, the destination will no longer be valid.')),
+    cfg.IntOpt('nfs_allocated_reconcile_interval',
+               default=600,
+               help=('Seconds between full du scans used to reconcile the '
+                     'allocated space tracked for each nfs share.')),
+    cfg.IntOpt('nfs_probe_timeout',
+               default=30,
+               help=('Seconds to wait for an nfs share to mount and report '
+                     'its capacity. Shares that fail or do not answer in '
+                     'time are not used until a later probe succeeds.')),
+    cfg.IntOpt('nfs_capacity_cache_ttl',
+               default=60,
+               help=('Seconds the probed capacity of an nfs share is reused '
+                     'when placing volumes, 0 to probe the shares before '
+                     'every volume creation.'))
 ]
 
 VERSION = '1.1'
@@ -66,6 +85,11 @@ CONF.register_opts(volume_opts)
 class RemoteFsDriver(driver.VolumeDriver):
     """Common base for drivers that work like NFS."""
 
+    def __init__(self, *args, **kwargs):
+        super(RemoteFsDriver, self).__init__(*args, **kwargs)
+        # share address : {'allocated': bytes, 'synced_at': timestamp}
+        self._allocated = {}
+
     def check_for_setup_error(self):
         """Just to override parent behavior."""
         pass
@@ -185,6 +209,94 @@ class RemoteFsDriver(driver.VolumeDriver):
     def _get_mount_point_for_share(self, path):
         raise NotImplementedError()
 
+    def _get_allocated_file(self, share):
+        """Returns path of the file persisting allocated space of share."""
+        return self._get_mount_point_for_share(share) + '.allocated'
+
+    def _load_allocated(self, share):
+        """Loads the persisted allocated space record of share, if any."""
+        try:
+            with open(self._get_allocated_file(share)) as f:
+                entry = jsonutils.loads(f.read())
+            entry = {'allocated': float(entry['allocated']),
+                     'synced_at': float(entry['synced_at'])}
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+        self._allocated[share] = entry
+        return entry
+
+    def _save_allocated(self, share):
+        """Persists allocated space of share next to its mount point."""
+        try:
+            with open(self._get_allocated_file(share), 'w') as f:
+                f.write(jsonutils.dumps(self._allocated[share]))
+        except (IOError, OSError) as exc:
+            LOG.debug(_('Unable to persist allocated space of %(share)s: '
+                        '%(exc)s'), {'share': share, 'exc': exc})
+
+    def _du_allocated(self, share):
+        """Returns apparent size of all volume files on share, using du."""
+        mount_point = self._get_mount_point_for_share(share)
+        du, _ = self._execute('du', '-sb', '--apparent-size', '--exclude',
+                              '*snapshot*', mount_point, run_as_root=True)
+        return float(du.split()[0])
+
+    def _reconcile_allocated(self, share):
+        """Replaces tracked allocated space of share with a fresh du scan."""
+        allocated = self._du_allocated(share)
+        self._allocated[share] = {'allocated': allocated,
+                                  'synced_at': timeutils.utcnow_ts()}
+        self._save_allocated(share)
+        return allocated
+
+    def _reconcile_stale_allocated(self, shares, interval):
+        """Reconciles shares not scanned within the last interval seconds.
+
+        The du scans of the shares run concurrently.
+        """
+        now = timeutils.utcnow_ts()
+        stale = []
+        for share in shares:
+            entry = self._allocated.get(share) or self._load_allocated(share)
+            if entry is None or now - entry['synced_at'] >= interval:
+                stale.append(share)
+
+        def _reconcile(share):
+            try:
+                self._reconcile_allocated(share)
+            except exception.ProcessExecutionError as exc:
+                LOG.warning(_('Unable to reconcile allocated space of '
+                              '%(share)s: %(exc)s'),
+                            {'share': share, 'exc': exc})
+
+        pool = greenpool.GreenPool(max(len(stale), 1))
+        for _result in pool.imap(_reconcile, stale):
+            pass
+
+    def _get_allocated(self, share):
+        """Returns allocated space of share in bytes.
+
+        The value is served from memory and only falls back to a du scan
+        when nothing is known about the share yet.
+        """
+        entry = self._allocated.get(share) or self._load_allocated(share)
+        if entry is None:
+            return self._reconcile_allocated(share)
+        return entry['allocated']
+
+    def _update_allocated(self, share, size_in_gib):
+        """Adjusts allocated space of share by size_in_gib (may be < 0).
+
+        Shares not tracked yet are left alone, the next reconcile picks
+        up the change.
+        """
+        entry = self._allocated.get(share)
+        if entry is None:
+            return
+        entry['allocated'] = max(0.0, entry['allocated'] +
+                                 size_in_gib * units.GiB)
+        self._save_allocated(share)
+
 
 class NfsDriver(RemoteFsDriver):
     """NFS based cinder driver. Creates file on NFS share for using it
@@ -193,6 +305,15 @@ class NfsDriver(RemoteFsDriver):
     def __init__(self, *args, **kwargs):
         super(NfsDriver, self).__init__(*args, **kwargs)
         self.configuration.append_config_values(volume_opts)
+        self._mounted_shares = []
+        # share address : {'total': bytes, 'available': bytes,
+        #                  'probed_at': timestamp} of its last good probe
+        self._share_capacity = {}
+        # share address : green thread of its probe still running
+        self._share_probes = {}
+        # share address : reason it is not used
+        self._quarantined_shares = {}
+        self._reconciling = False
 
     def do_setup(self, context):
         """Any initialization the volume driver does while starting"""
@@ -246,6 +367,7 @@ class NfsDriver(RemoteFsDriver):
         LOG.info(_('casted to %s') % volume['provider_location'])
 
         self._do_create_volume(volume)
+        self._update_allocated(volume['provider_location'], volume['size'])
 
         return {'provider_location': volume['provider_location']}
 
@@ -262,6 +384,7 @@ class NfsDriver(RemoteFsDriver):
         mounted_path = self.local_path(volume)
 
         self._execute('rm', '-f', mounted_path, run_as_root=True)
+        self._update_allocated(volume['provider_location'], -volume['size'])
 
     def ensure_export(self, ctx, volume):
         """Synchronously recreates an export for a logical volume."""
@@ -306,21 +429,96 @@ class NfsDriver(RemoteFsDriver):
 
         self._set_rw_permissions_for_all(volume_path)
 
-    def _ensure_shares_mounted(self):
-        """Look for NFS shares in the flags and tries to mount them locally."""
-        self._mounted_shares = []
+    def _ensure_shares_mounted(self, max_age=None):
+        """Look for NFS shares in the flags and tries to mount them locally.
+
+        The shares are mounted and their capacity probed concurrently.
+        Shares that fail or do not answer within nfs_probe_timeout are
+        quarantined, and left out of the mounted shares until a probe of
+        them succeeds.
+
+        :param max_age: seconds a previous probe of a share is reused,
+                        default is nfs_capacity_cache_ttl
+        """
+        if max_age is None:
+            max_age = self.configuration.nfs_capacity_cache_ttl
 
         self._load_shares_config(self.configuration.nfs_shares_config)
+        self._probe_shares(self.shares.keys(), max_age)
 
-        for share in self.shares.keys():
-            try:
-                self._ensure_share_mounted(share)
-                self._mounted_shares.append(share)
-            except Exception as exc:
-                LOG.warning(_('Exception during mounting %s') % (exc,))
+        self._mounted_shares = [share for share in self.shares.keys()
+                                if share in self._share_capacity and
+                                share not in self._quarantined_shares]
 
         LOG.debug('Available shares %s' % str(self._mounted_shares))
 
+    def _probe_shares(self, shares, max_age):
+        """Probe the shares concurrently, each within nfs_probe_timeout."""
+        now = timeutils.utcnow_ts()
+        probes = []
+        for share in shares:
+            if share in self._share_probes:
+                # Still hung on an earlier probe, the share stays
+                # quarantined until that probe returns.
+                continue
+            capacity = self._share_capacity.get(share)
+            if (capacity is not None and
+                    share not in self._quarantined_shares and
+                    now - capacity['probed_at'] < max_age):
+                continue
+            probe = eventlet.spawn(self._probe_share, share)
+            self._share_probes[share] = probe
+            probes.append((share, probe))
+
+        timeout = self.configuration.nfs_probe_timeout
+        deadline = time.time() + timeout
+        for share, probe in probes:
+            timer = eventlet.Timeout(max(deadline - time.time(), 0))
+            try:
+                probe.wait()
+            except eventlet.Timeout as exc:
+                if exc is not timer:
+                    raise
+                # The probe goes on, and brings the share back if it
+                # eventually succeeds.
+                self._quarantine_share(share, _('no answer within %d '
+                                                'seconds') % timeout)
+            finally:
+                timer.cancel()
+
+    def _probe_share(self, nfs_share):
+        """Mount a share and record its capacity, quarantine it on error."""
+        try:
+            self._ensure_share_mounted(nfs_share)
+            total_size, total_available = self._stat_share(nfs_share)
+        except Exception as exc:
+            self._quarantine_share(nfs_share, exc)
+        else:
+            self._share_capacity[nfs_share] = {
+                'total': total_size,
+                'available': total_available,
+                'probed_at': timeutils.utcnow_ts()}
+            if self._quarantined_shares.pop(nfs_share, None) is not None:
+                LOG.info(_('NFS share %s is available again'), nfs_share)
+        finally:
+            self._share_probes.pop(nfs_share, None)
+
+    def _quarantine_share(self, nfs_share, reason):
+        if nfs_share not in self._quarantined_shares:
+            LOG.warning(_('NFS share %(share)s is not used until it '
+                          'recovers: %(reason)s'),
+                        {'share': nfs_share, 'reason': reason})
+        self._quarantined_shares[nfs_share] = reason
+
+    def _get_share_capacity(self, nfs_share):
+        """Capacity of a share from its last probe.
+
+        :returns: total size, available and allocated space in bytes
+        """
+        capacity = self._share_capacity[nfs_share]
+        return (capacity['total'], capacity['available'],
+                self._get_allocated(nfs_share))
+
     def _ensure_share_mounted(self, nfs_share):
         mount_path = self._get_mount_point_for_share(nfs_share)
         self._mount_nfs(nfs_share, mount_path, ensure=True)
@@ -355,7 +553,7 @@ class NfsDriver(RemoteFsDriver):
 
         for nfs_share in self._mounted_shares:
             total_size, total_available, total_allocated = \
-                self._get_capacity_info(nfs_share)
+                self._get_share_capacity(nfs_share)
             apparent_size = max(0, total_size * oversub_ratio)
             apparent_available = max(0, apparent_size - total_allocated)
             used = (total_size - total_available) / total_size
@@ -400,20 +598,24 @@ class NfsDriver(RemoteFsDriver):
 
     def _get_capacity_info(self, nfs_share):
         """Calculate available space on the NFS share.
+
+        Allocated space comes from the in-memory ledger kept up to date by
+        create/delete and reconciled by _update_volume_status.
+
         :param nfs_share: example 172.18.194.100:/var/nfs
         """
+        total_size, total_available = self._stat_share(nfs_share)
+        total_allocated = self._get_allocated(nfs_share)
+        return total_size, total_available, total_allocated
+
+    def _stat_share(self, nfs_share):
+        """Returns the total size and available space of the share."""
         mount_point = self._get_mount_point_for_share(nfs_share)
 
         df, _ = self._execute('stat', '-f', '-c', '%S %b %a', mount_point,
                               run_as_root=True)
         block_size, blocks_total, blocks_avail = map(float, df.split())
-        total_available = block_size * blocks_avail
-        total_size = block_size * blocks_total
-
-        du, _ = self._execute('du', '-sb', '--apparent-size', '--exclude',
-                              '*snapshot*', mount_point, run_as_root=True)
-        total_allocated = float(du.split()[0])
-        return total_size, total_available, total_allocated
+        return block_size * blocks_total, block_size * blocks_avail
 
     def _mount_nfs(self, nfs_share, mount_path, ensure=False):
         """Mount NFS share to mount path."""
@@ -455,17 +657,33 @@ class NfsDriver(RemoteFsDriver):
         data["driver_version"] = VERSION
         data["storage_protocol"] = 'nfs'
 
-        self._ensure_shares_mounted()
+        self._ensure_shares_mounted(max_age=0)
+        if not self._reconciling:
+            # The du scans can take long on large shares, they run in the
+            # background rather than hold up the stats.
+            self._reconciling = True
+            eventlet.spawn_n(self._reconcile_in_background,
+                             list(self._mounted_shares))
 
         global_capacity = 0
         global_free = 0
         for nfs_share in self._mounted_shares:
-            capacity, free, allocated = self._get_capacity_info(nfs_share)
-            global_capacity += capacity
-            global_free += free
+            capacity = self._share_capacity[nfs_share]
+            global_capacity += capacity['total']
+            global_free += capacity['available']
 
         data['total_capacity_gb'] = global_capacity / float(units.GiB)
         data['free_capacity_gb'] = global_free / float(units.GiB)
         data['reserved_percentage'] = 0
         data['QoS_support'] = False
         self._stats = data
+
+    def _reconcile_in_background(self, shares):
+        try:
+            self._reconcile_stale_allocated(
+                shares, self.configuration.nfs_allocated_reconcile_interval)
+        except Exception:
+            LOG.exception(_('Failed to reconcile allocated space of the '
+                            'nfs shares'))
+        finally:
+            self._reconciling = False
@@ -39,6 +39,8 @@ array.
 
 
 import base64
+import contextlib
+import functools
 import json
 import paramiko
 import pprint
@@ -48,6 +50,7 @@ import time
 import uuid
 
 from eventlet import greenthread
+from eventlet import semaphore
 from hp3parclient import client
 from hp3parclient import exceptions as hpexceptions
 from oslo.config import cfg
@@ -102,6 +105,29 @@ CONF = cfg.CONF
 CONF.register_opts(hp3par_opts)
 
 
+class SerializedClient(object):
+    """Wraps an HP3ParClient so that its REST calls run one at a time.
+
+    The client keeps one HTTP connection to the array, concurrent
+    requests on it would interleave their requests and responses.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._semaphore = semaphore.Semaphore()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def _serialized(*args, **kwargs):
+            with self._semaphore:
+                return attr(*args, **kwargs)
+        return _serialized
+
+
 class HP3PARCommon(object):
 
     stats = {}
@@ -121,9 +147,15 @@ class HP3PARCommon(object):
 
     def __init__(self, config):
         self.sshpool = None
+        self.ssh_cache = None
         self.config = config
         self.hosts_naming_dict = dict()
         self.client = None
+        # Operations no longer share one array-wide lock, so the REST
+        # session is reference counted: the first caller logs in and the
+        # last one out logs out.
+        self._client_sessions = 0
+        self._client_semaphore = semaphore.Semaphore()
 
     def check_flags(self, options, required_flags):
         for flag in required_flags:
@@ -134,22 +166,71 @@ class HP3PARCommon(object):
         return client.HP3ParClient(self.config.hp3par_api_url)
 
     def client_login(self):
-        try:
-            LOG.debug("Connecting to 3PAR")
-            self.client.login(self.config.hp3par_username,
-                              self.config.hp3par_password)
-        except hpexceptions.HTTPUnauthorized as ex:
-            LOG.warning("Failed to connect to 3PAR (%s) because %s" %
-                       (self.config.hp3par_api_url, str(ex)))
-            msg = _("Login to 3PAR array invalid")
-            raise exception.InvalidInput(reason=msg)
+        with self._client_semaphore:
+            if self._client_sessions == 0:
+                try:
+                    LOG.debug("Connecting to 3PAR")
+                    self.client.login(self.config.hp3par_username,
+                                      self.config.hp3par_password)
+                except hpexceptions.HTTPUnauthorized as ex:
+                    LOG.warning("Failed to connect to 3PAR (%s) because %s" %
+                               (self.config.hp3par_api_url, str(ex)))
+                    msg = _("Login to 3PAR array invalid")
+                    raise exception.InvalidInput(reason=msg)
+            self._client_sessions += 1
 
     def client_logout(self):
-        self.client.logout()
-        LOG.debug("Disconnect from 3PAR")
+        with self._client_semaphore:
+            self._client_sessions -= 1
+            if self._client_sessions == 0:
+                self.client.logout()
+                LOG.debug("Disconnect from 3PAR")
+
+    @contextlib.contextmanager
+    def client_session(self):
+        """Hold a logged in REST session for the duration of the block."""
+        self.client_login()
+        try:
+            yield
+        finally:
+            self.client_logout()
+
+    def volume_lock(self, volume_id):
+        """Lock serializing the operations on a single volume."""
+        return utils.lock('3par-volume-%s' % volume_id, external=True)
+
+    @contextlib.contextmanager
+    def volumes_lock(self, *volume_ids):
+        """Lock several volumes, such as a new volume and its source.
+
+        The volumes are locked in the order of their ids, so that two
+        operations on the same volumes can not deadlock.
+        """
+        volume_ids = sorted(set(volume_ids))
+        if not volume_ids:
+            yield
+            return
+        with self.volume_lock(volume_ids[0]):
+            with self.volumes_lock(*volume_ids[1:]):
+                yield
+
+    def host_lock(self, hostname):
+        """Lock serializing the VLUN changes of a single 3PAR host."""
+        return utils.lock('3par-%s-host-%s' % (self.config.san_ip, hostname),
+                          external=True)
+
+    def array_lock(self):
+        """Array wide lock, only needed while creating 3PAR hosts.
+
+        Locks are always taken in the order volume, host, array, and
+        several volumes in the order of their ids.
+        """
+        return utils.lock('3par-%s' % self.config.san_ip, external=True)
 
     def do_setup(self, context):
-        self.client = self._create_client()
+        # The volume and host locks only order the changes to the array,
+        # the client itself must not be used by two operations at once.
+        self.client = SerializedClient(self._create_client())
         if self.config.hp3par_debug:
             self.client.debug_rest(True)
 
@@ -225,6 +306,13 @@ class HP3PARCommon(object):
         capacity = int(round(capacity / MiB))
         return capacity
 
+    def _get_ssh_cache(self):
+        if self.ssh_cache is None:
+            # The show commands only list what is on the array
+            self.ssh_cache = utils.SSHCommandCache(self.config.ssh_cache_ttl,
+                                                   ('show',))
+        return self.ssh_cache
+
     def _cli_run(self, verb, cli_args):
         """Runs a CLI command over SSH, without doing any result parsing."""
         cli_arg_strings = []
@@ -238,7 +326,13 @@ class HP3PARCommon(object):
         cmd = verb + ''.join(cli_arg_strings)
         LOG.debug("SSH CMD = %s " % cmd)
 
-        (stdout, stderr) = self._run_ssh(cmd, False)
+        cache = self._get_ssh_cache()
+        result = cache.get(cmd)
+        if result is None:
+            generation = cache.generation
+            result = self._run_ssh(cmd, False)
+            cache.put(cmd, result, generation)
+        (stdout, stderr) = result
 
         # we have to strip out the input and exit lines
         tmp = stdout.split("\r\n")
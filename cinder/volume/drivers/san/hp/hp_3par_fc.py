@@ -35,7 +35,6 @@ from oslo.config import cfg
 
 from cinder import exception
 from cinder.openstack.common import log as logging
-from cinder import utils
 import cinder.volume.driver
 from cinder.volume.drivers.san.hp import hp_3par_common as hpcommon
 from cinder.volume.drivers.san import san
@@ -68,14 +67,12 @@ class HP3PARFCDriver(cinder.volume.driver.FibreChannelDriver):
                           'san_ip', 'san_login', 'san_password']
         self.common.check_flags(self.configuration, required_flags)
 
-    @utils.synchronized('3par', external=True)
     def get_volume_stats(self, refresh):
-        self.common.client_login()
-        stats = self.common.get_volume_stats(refresh)
+        with self.common.client_session():
+            stats = self.common.get_volume_stats(refresh)
         stats['storage_protocol'] = 'FC'
         backend_name = self.configuration.safe_get('volume_backend_name')
         stats['volume_backend_name'] = backend_name or self.__class__.__name__
-        self.common.client_logout()
         return stats
 
     def do_setup(self, context):
@@ -87,50 +84,43 @@ class HP3PARFCDriver(cinder.volume.driver.FibreChannelDriver):
         """Returns an error if prerequisites aren't met."""
         self._check_flags()
 
-    @utils.synchronized('3par', external=True)
     def create_volume(self, volume):
-        self.common.client_login()
-        metadata = self.common.create_volume(volume)
-        self.common.client_logout()
+        with self.common.volume_lock(volume['id']):
+            with self.common.client_session():
+                metadata = self.common.create_volume(volume)
         return {'metadata': metadata}
 
-    @utils.synchronized('3par', external=True)
     def create_cloned_volume(self, volume, src_vref):
-        self.common.client_login()
-        new_vol = self.common.create_cloned_volume(volume, src_vref)
-        self.common.client_logout()
+        with self.common.volumes_lock(volume['id'], src_vref['id']):
+            with self.common.client_session():
+                new_vol = self.common.create_cloned_volume(volume, src_vref)
         return {'metadata': new_vol}
 
-    @utils.synchronized('3par', external=True)
     def delete_volume(self, volume):
-        self.common.client_login()
-        self.common.delete_volume(volume)
-        self.common.client_logout()
+        with self.common.volume_lock(volume['id']):
+            with self.common.client_session():
+                self.common.delete_volume(volume)
 
-    @utils.synchronized('3par', external=True)
     def create_volume_from_snapshot(self, volume, snapshot):
         """
         Creates a volume from a snapshot.
 
         TODO: support using the size from the user.
         """
-        self.common.client_login()
-        self.common.create_volume_from_snapshot(volume, snapshot)
-        self.common.client_logout()
+        with self.common.volumes_lock(volume['id'], snapshot['volume_id']):
+            with self.common.client_session():
+                self.common.create_volume_from_snapshot(volume, snapshot)
 
-    @utils.synchronized('3par', external=True)
     def create_snapshot(self, snapshot):
-        self.common.client_login()
-        self.common.create_snapshot(snapshot)
-        self.common.client_logout()
+        with self.common.volume_lock(snapshot['volume_id']):
+            with self.common.client_session():
+                self.common.create_snapshot(snapshot)
 
-    @utils.synchronized('3par', external=True)
     def delete_snapshot(self, snapshot):
-        self.common.client_login()
-        self.common.delete_snapshot(snapshot)
-        self.common.client_logout()
+        with self.common.volume_lock(snapshot['volume_id']):
+            with self.common.client_session():
+                self.common.delete_snapshot(snapshot)
 
-    @utils.synchronized('3par', external=True)
     def initialize_connection(self, volume, connector):
         """Assigns the volume to a server.
 
@@ -168,30 +158,33 @@ class HP3PARFCDriver(cinder.volume.driver.FibreChannelDriver):
           * Create a VLUN for that HOST with the volume we want to export.
 
         """
-        self.common.client_login()
-        # we have to make sure we have a host
-        host = self._create_host(volume, connector)
+        hostname = self.common._safe_hostname(connector['host'])
+        with self.common.volume_lock(volume['id']):
+            with self.common.client_session():
+                with self.common.host_lock(hostname):
+                    # we have to make sure we have a host
+                    host = self._create_host(volume, connector)
 
-        # now that we have a host, create the VLUN
-        vlun = self.common.create_vlun(volume, host)
+                    # now that we have a host, create the VLUN
+                    vlun = self.common.create_vlun(volume, host)
 
-        ports = self.common.get_ports()
+                ports = self.common.get_ports()
 
-        self.common.client_logout()
         info = {'driver_volume_type': 'fibre_channel',
                 'data': {'target_lun': vlun['lun'],
                          'target_discovered': True,
                          'target_wwn': ports['FC']}}
         return info
 
-    @utils.synchronized('3par', external=True)
     def terminate_connection(self, volume, connector, **kwargs):
         """Driver entry point to unattach a volume from an instance."""
-        self.common.client_login()
-        self.common.terminate_connection(volume,
-                                         connector['host'],
-                                         connector['wwpns'])
-        self.common.client_logout()
+        hostname = self.common._safe_hostname(connector['host'])
+        with self.common.volume_lock(volume['id']):
+            with self.common.client_session():
+                with self.common.host_lock(hostname):
+                    self.common.terminate_connection(volume,
+                                                     connector['host'],
+                                                     connector['wwpns'])
 
     def _create_3par_fibrechan_host(self, hostname, wwn, domain, persona_id):
         """Create a 3PAR host.
@@ -226,23 +219,21 @@ class HP3PARFCDriver(cinder.volume.driver.FibreChannelDriver):
             # get persona from the volume type extra specs
             persona_id = self.common.get_persona_type(volume)
             # host doesn't exist, we have to create it
-            hostname = self._create_3par_fibrechan_host(hostname,
-                                                        connector['wwpns'],
-                                                        self.configuration.
-                                                        hp3par_domain,
-                                                        persona_id)
-            host = self.common._get_3par_host(hostname)
+            with self.common.array_lock():
+                hostname = self._create_3par_fibrechan_host(
+                    hostname,
+                    connector['wwpns'],
+                    self.configuration.hp3par_domain,
+                    persona_id)
+                host = self.common._get_3par_host(hostname)
 
         return host
 
-    @utils.synchronized('3par', external=True)
     def create_export(self, context, volume):
         pass
 
-    @utils.synchronized('3par', external=True)
     def ensure_export(self, context, volume):
         pass
 
-    @utils.synchronized('3par', external=True)
     def remove_export(self, context, volume):
         pass
@@ -70,6 +70,11 @@ san_opts = [
     cfg.IntOpt('ssh_max_pool_conn',
                default=5,
                help='Maximum ssh connections in the pool'),
+    cfg.IntOpt('ssh_cache_ttl',
+               default=2,
+               help='Seconds the output of read-only SAN CLI commands is '
+                    'reused for, until a command changing the SAN runs; '
+                    '0 disables it'),
 ]
 
 CONF = cfg.CONF
@@ -84,11 +89,18 @@ class SanISCSIDriver(ISCSIDriver):
     remote protocol.
     """
 
+    # Prefixes of the CLI commands that only read from the SAN, whose
+    # output is cached for ssh_cache_ttl seconds
+    ssh_read_only_commands = ()
+    # Commands _run_ssh_many() runs at once over a connection
+    ssh_max_channels = 10
+
     def __init__(self, *args, **kwargs):
         super(SanISCSIDriver, self).__init__(*args, **kwargs)
         self.configuration.append_config_values(san_opts)
         self.run_local = self.configuration.san_is_local
         self.sshpool = None
+        self.ssh_cache = None
 
     def _build_iscsi_target_name(self, volume):
         return "%s%s" % (self.configuration.iscsi_target_prefix,
@@ -102,7 +114,7 @@ class SanISCSIDriver(ISCSIDriver):
             command = ' '.join(cmd)
             return self._run_ssh(command, check_exit_code)
 
-    def _run_ssh(self, command, check_exit_code=True, attempts=1):
+    def _get_sshpool(self):
         if not self.sshpool:
             password = self.configuration.san_password
             privatekey = self.configuration.san_private_key
@@ -116,17 +128,36 @@ class SanISCSIDriver(ISCSIDriver):
                                          privatekey=privatekey,
                                          min_size=min_size,
                                          max_size=max_size)
+        return self.sshpool
+
+    def _get_ssh_cache(self):
+        if self.ssh_cache is None:
+            self.ssh_cache = utils.SSHCommandCache(
+                self.configuration.ssh_cache_ttl,
+                self.ssh_read_only_commands)
+        return self.ssh_cache
+
+    def _run_ssh(self, command, check_exit_code=True, attempts=1):
+        cache = self._get_ssh_cache()
+        result = cache.get(command)
+        if result is not None:
+            LOG.debug(_('Reusing output of SSH command: %s') % command)
+            return result
+        generation = cache.generation
+
         last_exception = None
         try:
             total_attempts = attempts
-            with self.sshpool.item() as ssh:
+            with self._get_sshpool().item() as ssh:
                 while attempts > 0:
                     attempts -= 1
                     try:
-                        return utils.ssh_execute(
+                        result = utils.ssh_execute(
                             ssh,
                             command,
                             check_exit_code=check_exit_code)
+                        cache.put(command, result, generation)
+                        return result
                     except Exception as e:
                         LOG.error(e)
                         last_exception = e
@@ -148,6 +179,33 @@ class SanISCSIDriver(ISCSIDriver):
             with excutils.save_and_reraise_exception():
                 LOG.error(_("Error running SSH command: %s") % command)
 
+    def _run_ssh_many(self, commands, check_exit_code=True):
+        """Run several SSH commands at once over one connection.
+
+        Returns the (stdout, stderr) of each command, in order.
+        """
+        cache = self._get_ssh_cache()
+        results = [cache.get(command) for command in commands]
+        missing = [command for command, result in zip(commands, results)
+                   if result is None]
+        if missing:
+            generation = cache.generation
+            try:
+                with self._get_sshpool().item() as ssh:
+                    outputs = utils.ssh_execute_many(
+                        ssh, missing, check_exit_code=check_exit_code,
+                        max_channels=self.ssh_max_channels)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    LOG.error(_("Error running SSH commands: %s")
+                              % '; '.join(missing))
+            outputs = dict(zip(missing, outputs))
+            for command, result in outputs.items():
+                cache.put(command, result, generation)
+            results = [result or outputs[command]
+                       for command, result in zip(commands, results)]
+        return results
+
     def ensure_export(self, context, volume):
         """Synchronously recreates an export for a logical volume."""
         pass
@@ -16,6 +16,7 @@
 #    under the License.
 
 import base64
+import errno
 import httplib
 import json
 import math
@@ -80,13 +81,75 @@ class SolidFire(SanISCSIDriver):
     sf_qos_keys = ['minIOPS', 'maxIOPS', 'burstIOPS']
     cluster_stats = {}
 
+    # Idle connections to the cluster kept open for the next api calls
+    sf_max_idle_connections = 4
+
     GB = math.pow(2, 30)
 
     def __init__(self, *args, **kwargs):
             super(SolidFire, self).__init__(*args, **kwargs)
             self.configuration.append_config_values(sf_opts)
+            self._connections = []
+            self._cluster_info = None
+            # SolidFire volumes by cinder uuid, from the account listings
+            self._sf_volumes = {}
             self._update_cluster_status()
 
+    def _get_connection(self):
+        """Returns an idle connection or a new one, and if it is reused."""
+        try:
+            return (self._connections.pop(), True)
+        except IndexError:
+            # For now 443 is the only port our server accepts requests on
+            return (httplib.HTTPSConnection(self.configuration.san_ip, 443),
+                    False)
+
+    @staticmethod
+    def _is_dropped_connection(error, sent):
+        """Whether an api call failed on an idle connection that the
+        cluster had closed, before the call reached it.
+
+        Sending fails with a reset or a broken pipe, or the cluster closes
+        the connection without a status line. Other errors, e.g. timeouts
+        or a response cut short, may happen after the call ran.
+        """
+        if sent:
+            return isinstance(error, httplib.BadStatusLine)
+        return (isinstance(error, socket.error) and
+                not isinstance(error, socket.timeout) and
+                error.errno in (errno.ECONNRESET, errno.EPIPE))
+
+    def _post_api_request(self, payload, header):
+        """Posts a json-rpc request on a kept alive connection.
+
+        Returns the data of the response.
+        """
+        while True:
+            (connection, reused) = self._get_connection()
+            sent = False
+            try:
+                connection.request('POST', '/json-rpc/1.0', payload, header)
+                sent = True
+                response = connection.getresponse()
+                data = response.read()
+            except (httplib.HTTPException, socket.error) as e:
+                connection.close()
+                if reused and self._is_dropped_connection(e, sent):
+                    # The cluster closed the idle connection before it
+                    # got the request, which is safe to send again.
+                    continue
+                raise
+            break
+
+        if response.status != 200:
+            connection.close()
+            raise exception.SolidFireAPIException(status=response.status)
+        if len(self._connections) < self.sf_max_idle_connections:
+            self._connections.append(connection)
+        else:
+            connection.close()
+        return data
+
     def _issue_api_request(self, method_name, params):
         """All API requests to SolidFire device go through this method.
 
@@ -99,10 +162,6 @@ class SolidFire(SanISCSIDriver):
                                    'xMaxClonesPerVolumeExceeded',
                                    'xMaxSnapshotsPerNodeExceeded',
                                    'xMaxClonesPerNodeExceeded']
-        host = self.configuration.san_ip
-        # For now 443 is the only port our server accepts requests on
-        port = 443
-
         cluster_admin = self.configuration.san_login
         cluster_password = self.configuration.san_password
 
@@ -132,26 +191,13 @@ class SolidFire(SanISCSIDriver):
 
             LOG.debug(_("Payload for SolidFire API call: %s"), payload)
 
-            connection = httplib.HTTPSConnection(host, port)
-            connection.request('POST', '/json-rpc/1.0', payload, header)
-            response = connection.getresponse()
-
-            data = {}
-            if response.status != 200:
-                connection.close()
-                raise exception.SolidFireAPIException(status=response.status)
-
-            else:
-                data = response.read()
-                try:
-                    data = json.loads(data)
-                except (TypeError, ValueError) as exc:
-                    connection.close()
-                    msg = _("Call to json.loads() raised "
-                            "an exception: %s") % exc
-                    raise exception.SfJsonEncodeFailure(msg)
-
-                connection.close()
+            data = self._post_api_request(payload, header)
+            try:
+                data = json.loads(data)
+            except (TypeError, ValueError) as exc:
+                msg = _("Call to json.loads() raised "
+                        "an exception: %s") % exc
+                raise exception.SfJsonEncodeFailure(msg)
 
             LOG.debug(_("Results of SolidFire API call: %s"), data)
 
@@ -184,8 +230,18 @@ class SolidFire(SanISCSIDriver):
         params = {'accountID': account_id}
         data = self._issue_api_request('ListVolumesForAccount', params)
         if 'result' in data:
+            self._cache_sf_volumes(data['result']['volumes'])
             return data['result']['volumes']
 
+    def _cache_sf_volumes(self, sf_volumes):
+        """Remember the cinder uuid of the volumes of a listing."""
+        for v in sf_volumes:
+            name = v.get('name') or ''
+            for prefix in ('UUID-', 'OS-VOLID-'):
+                if name.startswith(prefix):
+                    self._sf_volumes[name[len(prefix):]] = v
+                    break
+
     def _get_sfaccount_by_name(self, sf_account_name):
         """Get SolidFire account object by name."""
         sfaccount = None
@@ -235,13 +291,19 @@ class SolidFire(SanISCSIDriver):
         return sfaccount
 
     def _get_cluster_info(self):
-        """Query the SolidFire cluster for some property info."""
+        """Query the SolidFire cluster for some property info.
+
+        The info is kept until the cluster status is updated again.
+        """
+        if self._cluster_info is not None:
+            return self._cluster_info
         params = {}
         data = self._issue_api_request('GetClusterInfo', params)
         if 'result' not in data:
             raise exception.SolidFireAPIDataException(data=data)
 
-        return data['result']
+        self._cluster_info = data['result']
+        return self._cluster_info
 
     def _do_export(self, volume):
         """Gets the associated account, retrieves CHAP info and updates."""
@@ -401,10 +463,16 @@ class SolidFire(SanISCSIDriver):
                 qos[key] = int(value)
         return qos
 
-    def _get_sf_volume(self, uuid, params):
+    def _get_sf_volume(self, uuid, params, use_cache=True):
+        sf_volref = self._sf_volumes.get(uuid)
+        if (use_cache and sf_volref is not None and
+                sf_volref.get('accountID') == params['accountID']):
+            return sf_volref
+
         data = self._issue_api_request('ListVolumesForAccount', params)
         if 'result' not in data:
             raise exception.SolidFireAPIDataException(data=data)
+        self._cache_sf_volumes(data['result']['volumes'])
 
         found_count = 0
         sf_volref = None
@@ -503,11 +571,26 @@ class SolidFire(SanISCSIDriver):
 
         params = {'accountID': sfaccount['accountID']}
 
+        cached = volume['id'] in self._sf_volumes
         sf_vol = self._get_sf_volume(volume['id'], params)
 
         if sf_vol is not None:
-            params = {'volumeID': sf_vol['volumeID']}
-            data = self._issue_api_request('DeleteVolume', params)
+            self._sf_volumes.pop(volume['id'], None)
+            try:
+                data = self._issue_api_request(
+                    'DeleteVolume', {'volumeID': sf_vol['volumeID']})
+            except exception.SolidFireAPIException:
+                if not cached:
+                    raise
+                # The volume may have changed on the cluster since it was
+                # cached, look it up again.
+                sf_vol = self._get_sf_volume(volume['id'], params,
+                                             use_cache=False)
+                if sf_vol is None:
+                    return
+                self._sf_volumes.pop(volume['id'], None)
+                data = self._issue_api_request(
+                    'DeleteVolume', {'volumeID': sf_vol['volumeID']})
 
             if 'result' not in data:
                 raise exception.SolidFireAPIDataException(data=data)
@@ -575,6 +658,7 @@ class SolidFire(SanISCSIDriver):
 
         LOG.debug(_("Updating cluster status info"))
 
+        self._cluster_info = None
         params = {}
 
         # NOTE(jdg): The SF api provides an UNBELIEVABLE amount
@@ -115,6 +115,10 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
 
     """
 
+    # Listings of the storage system, reused by the following operations
+    # until a svctask command changes it
+    ssh_read_only_commands = ('svcinfo ',)
+
     """====================================================================="""
     """ SETUP                                                               """
     """====================================================================="""
@@ -425,10 +429,12 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
         return host_name[:55]
 
     def _find_host_from_wwpn(self, connector):
-        for wwpn in connector['wwpns']:
-            ssh_cmd = 'svcinfo lsfabric -wwpn %s -delim !' % wwpn
-            out, err = self._run_ssh(ssh_cmd)
-
+        ssh_cmds = ['svcinfo lsfabric -wwpn %s -delim !' % wwpn
+                    for wwpn in connector['wwpns']]
+        outputs = self._run_ssh_many(ssh_cmds)
+        for wwpn, ssh_cmd, output in zip(connector['wwpns'], ssh_cmds,
+                                         outputs):
+            out, err = output
             if not len(out.strip()):
                 # This WWPN is not in use
                 continue
@@ -455,24 +461,29 @@ class StorwizeSVCDriver(san.SanISCSIDriver):
         return None
 
     def _find_host_exhaustive(self, connector, hosts):
-        for host in hosts:
-            ssh_cmd = 'svcinfo lshost -delim ! %s' % host
-            out, err = self._run_ssh(ssh_cmd)
-            self._assert_ssh_return(len(out.strip()),
-                                    '_find_host_exhaustive',
-                                    ssh_cmd, out, err)
-            for attr_line in out.split('\n'):
-                # If '!' not found, return the string and two empty strings
-                attr_name, foo, attr_val = attr_line.partition('!')
-                if (attr_name == 'iscsi_name' and
-                        'initiator' in connector and
-                        attr_val == connector['initiator']):
-                    return host
-                elif (attr_name == 'WWPN' and
-                      'wwpns' in connector and
-                      attr_val.lower() in
-                      map(str.lower, map(str, connector['wwpns']))):
+        # The hosts are listed a batch at a time over one connection,
+        # rather than one round trip after the other.
+        for i in range(0, len(hosts), self.ssh_max_channels):
+            batch = hosts[i:i + self.ssh_max_channels]
+            ssh_cmds = ['svcinfo lshost -delim ! %s' % host for host in batch]
+            outputs = self._run_ssh_many(ssh_cmds)
+            for host, ssh_cmd, (out, err) in zip(batch, ssh_cmds, outputs):
+                self._assert_ssh_return(len(out.strip()),
+                                        '_find_host_exhaustive',
+                                        ssh_cmd, out, err)
+                for attr_line in out.split('\n'):
+                    # If '!' not found, return the string and two empty
+                    # strings
+                    attr_name, foo, attr_val = attr_line.partition('!')
+                    if (attr_name == 'iscsi_name' and
+                            'initiator' in connector and
+                            attr_val == connector['initiator']):
                         return host
+                    elif (attr_name == 'WWPN' and
+                          'wwpns' in connector and
+                          attr_val.lower() in
+                          map(str.lower, map(str, connector['wwpns']))):
+                            return host
         return None
 
     def _get_host_from_connector(self, connector):
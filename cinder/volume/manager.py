@@ -39,6 +39,7 @@ intact.
 
 
 import sys
+import time
 import traceback
 
 from oslo.config import cfg
@@ -51,6 +52,8 @@ from cinder.openstack.common import excutils
 from cinder.openstack.common import importutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import periodic_task
+from cinder.openstack.common.rpc import amqp as rpc_amqp
+from cinder.openstack.common.rpc import dispatcher as rpc_dispatcher
 from cinder.openstack.common import timeutils
 from cinder.openstack.common import uuidutils
 from cinder import quota
@@ -66,10 +69,26 @@ volume_manager_opts = [
     cfg.StrOpt('volume_driver',
                default='cinder.volume.drivers.lvm.LVMISCSIDriver',
                help='Driver to use for volume creation'),
+    cfg.ListOpt('volume_rpc_priority_methods',
+                default=['initialize_connection', 'terminate_connection',
+                         'attach_volume', 'detach_volume'],
+                help='RPC methods dispatched ahead of all the others, '
+                     'typically the ones compute nodes block on'),
+    cfg.ListOpt('volume_rpc_background_methods',
+                default=['create_volume', 'delete_volume',
+                         'copy_volume_to_image'],
+                help='Long running RPC methods dispatched only when no '
+                     'other call is waiting'),
+    cfg.ListOpt('volume_rpc_method_limits',
+                default=['create_volume:8', 'delete_volume:8',
+                         'copy_volume_to_image:4'],
+                help='Maximum number of concurrent calls of RPC methods, '
+                     'as a list of method:limit pairs'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(volume_manager_opts)
+CONF.import_opt('rpc_thread_pool_size', 'cinder.openstack.common.rpc')
 
 MAPPING = {
     'cinder.volume.driver.RBDDriver': 'cinder.volume.drivers.rbd.RBDDriver',
@@ -102,7 +121,7 @@ MAPPING = {
 class VolumeManager(manager.SchedulerDependentManager):
     """Manages attachable block storage devices."""
 
-    RPC_API_VERSION = '1.6'
+    RPC_API_VERSION = '1.7'
 
     def __init__(self, volume_driver=None, service_name=None,
                  *args, **kwargs):
@@ -126,6 +145,34 @@ class VolumeManager(manager.SchedulerDependentManager):
         # NOTE(vish): Implementation specific db handling is done
         #             by the driver.
         self.driver.db = self.db
+        self.rpc_lanes = self._create_rpc_lanes()
+
+    def _create_rpc_lanes(self):
+        """Build the lanes used to prioritize and limit RPC methods."""
+        method_lanes = {}
+        for method in self.configuration.volume_rpc_background_methods:
+            method_lanes[method] = 'background'
+        for method in self.configuration.volume_rpc_priority_methods:
+            method_lanes[method] = 'priority'
+
+        method_limits = {}
+        for entry in self.configuration.volume_rpc_method_limits:
+            try:
+                method, limit = entry.split(':')
+                method_limits[method.strip()] = int(limit)
+            except ValueError:
+                msg = (_("Invalid volume_rpc_method_limits entry %s, "
+                         "expected method:limit") % entry)
+                raise exception.InvalidInput(reason=msg)
+
+        return rpc_amqp.DispatchLanes(CONF.rpc_thread_pool_size,
+                                      ['priority', 'default', 'background'],
+                                      'default',
+                                      method_lanes=method_lanes,
+                                      method_limits=method_limits)
+
+    def create_rpc_dispatcher(self):
+        return rpc_dispatcher.RpcDispatcher([self], lanes=self.rpc_lanes)
 
     def init_host(self):
         """Do any initialization that needs to be run if this is a
@@ -137,10 +184,10 @@ class VolumeManager(manager.SchedulerDependentManager):
         self.driver.check_for_setup_error()
 
         volumes = self.db.volume_get_all_by_host(ctxt, self.host)
-        LOG.debug(_("Re-exporting %s volumes"), len(volumes))
+        exports = []
         for volume in volumes:
             if volume['status'] in ['available', 'in-use']:
-                self.driver.ensure_export(ctxt, volume)
+                exports.append(volume)
             elif volume['status'] == 'downloading':
                 LOG.info(_("volume %s stuck in a downloading state"),
                          volume['id'])
@@ -149,6 +196,12 @@ class VolumeManager(manager.SchedulerDependentManager):
             else:
                 LOG.info(_("volume %s: skipping export"), volume['name'])
 
+        LOG.debug(_("Re-exporting %s volumes"), len(exports))
+        start = time.time()
+        self.driver.ensure_exports(ctxt, exports)
+        LOG.info(_("Re-exported %(count)d volumes in %(elapsed).2fs"),
+                 {'count': len(exports), 'elapsed': time.time() - start})
+
         LOG.debug(_('Resuming any in progress delete operations'))
         for volume in volumes:
             if volume['status'] == 'deleting':
@@ -390,12 +443,14 @@ class VolumeManager(manager.SchedulerDependentManager):
             LOG.debug(_("Retry info not present, will not reschedule"))
             return
 
-        if not request_spec:
+        if request_spec:
+            request_spec['volume_id'] = volume_id
+        elif not CONF.slim_rpc_payloads:
+            # NOTE: with slim_rpc_payloads the scheduler reads the request
+            # spec from the database instead.
             LOG.debug(_("No request spec, will not reschedule"))
             return
 
-        request_spec['volume_id'] = volume_id
-
         LOG.debug(_("volume %(volume_id)s: re-scheduling %(method)s "
                     "attempt %(num)d") %
                   {'volume_id': volume_id,
@@ -737,10 +792,19 @@ class VolumeManager(manager.SchedulerDependentManager):
             # to be sent to the Schedulers.
             self.update_service_capabilities(volume_stats)
 
+    @periodic_task.periodic_task
+    def _report_rpc_lanes_stats(self, context):
+        for lane, stats in sorted(self.rpc_lanes.get_stats().items()):
+            LOG.debug(_("RPC lane %(lane)s: %(queued)d queued, "
+                        "%(running)d running, %(dispatched)d dispatched, "
+                        "average wait %(wait_avg).3fs, "
+                        "maximum wait %(wait_max).3fs"),
+                      dict(stats, lane=lane))
+
     def publish_service_capabilities(self, context):
-        """Collect driver status and then publish."""
+        """Collect driver status and then publish all of it."""
         self._report_driver_status(context)
-        self._publish_service_capabilities(context)
+        self._publish_service_capabilities(context, full_sync=True)
 
     def _reset_stats(self):
         LOG.info(_("Clear capabilities"))
@@ -27,6 +27,12 @@ import cinder.openstack.common.rpc.proxy
 
 CONF = cfg.CONF
 
+# The filter_properties the scheduler fills in again from the request_spec
+# when it schedules a volume, which slim messages leave out.
+SCHEDULER_FILTER_PROPERTIES = ('context', 'request_spec', 'config_options',
+                               'volume_type', 'resource_type', 'size',
+                               'availability_zone', 'user_id', 'metadata')
+
 
 class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
     '''Client side of the volume rpc API.
@@ -41,6 +47,8 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
               allow_reschedule arguments to create_volume().
         1.5 - Add accept_transfer
         1.6 - Add extend_volume
+        1.7 - create_volume() can be sent without request_spec and with
+              the filter_properties the scheduler fills in left out
     '''
 
     BASE_RPC_API_VERSION = '1.0'
@@ -55,6 +63,15 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
                       allow_reschedule=True,
                       snapshot_id=None, image_id=None,
                       source_volid=None):
+        version = '1.4'
+        if CONF.slim_rpc_payloads:
+            request_spec = None
+            if filter_properties:
+                filter_properties = dict(
+                    (key, value)
+                    for key, value in filter_properties.iteritems()
+                    if key not in SCHEDULER_FILTER_PROPERTIES)
+            version = '1.7'
         self.cast(ctxt,
                   self.make_msg('create_volume',
                                 volume_id=volume['id'],
@@ -67,7 +84,7 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
                   topic=rpc.queue_get_for(ctxt,
                                           self.topic,
                                           host),
-                  version='1.4')
+                  version=version)
 
     def delete_volume(self, ctxt, volume):
         self.cast(ctxt,
@@ -128,9 +145,15 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
                                                  self.topic,
                                                  volume['host']))
 
-    def publish_service_capabilities(self, ctxt):
-        self.fanout_cast(ctxt, self.make_msg('publish_service_capabilities'),
-                         version='1.2')
+    def publish_service_capabilities(self, ctxt, host=None):
+        if host is None:
+            self.fanout_cast(ctxt,
+                             self.make_msg('publish_service_capabilities'),
+                             version='1.2')
+        else:
+            self.cast(ctxt, self.make_msg('publish_service_capabilities'),
+                      topic=rpc.queue_get_for(ctxt, self.topic, host),
+                      version='1.2')
 
     def accept_transfer(self, ctxt, volume):
         self.cast(ctxt,
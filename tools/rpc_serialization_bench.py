@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmarks of the serialization of RPC messages.
+
+Compares the former path, where json.dumps() called a fully recursive
+to_primitive() for every db model and received messages were deep copied
+to sanitize them before logging, with jsonutils.dumps() and
+rpc.common._safe_log() on the messages the scheduler and the volume
+services exchange the most, then prints the size of the create_volume
+messages with and without slim_rpc_payloads:
+
+    python tools/rpc_serialization_bench.py [--number N]
+"""
+
+import copy
+import datetime
+import functools
+import json
+import optparse
+import os
+import sys
+import timeit
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from cinder.openstack.common import gettextutils
+gettextutils.install('cinder')
+
+from oslo.config import cfg
+
+from cinder import context
+from cinder.db.sqlalchemy import models
+from cinder import flags  # noqa
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common import log as logging
+from cinder.openstack.common import rpc
+from cinder.openstack.common.rpc import common as rpc_common
+from cinder.openstack.common import timeutils
+from cinder.scheduler import rpcapi as scheduler_rpcapi
+from cinder.volume import rpcapi as volume_rpcapi
+
+
+CONF = cfg.CONF
+
+
+LOG = logging.getLogger('rpc_serialization_bench')
+
+
+def _volume_ref():
+    now = datetime.datetime(2013, 8, 1, 12, 30, 0)
+    volume_type = models.VolumeTypes(id='f2a2c3d4-0000-4000-8000-000000000001',
+                                     name='gold', created_at=now)
+    volume_type.extra_specs = [
+        models.VolumeTypeExtraSpecs(id=i, key='capability:%d' % i,
+                                    value='<is> True', created_at=now)
+        for i in range(4)]
+    volume = models.Volume(id='6c1bd4e2-0000-4000-8000-000000000002',
+                           size=10, host='volume-node-1@lvm',
+                           status='creating', attach_status='detached',
+                           availability_zone='nova', created_at=now,
+                           updated_at=now, display_name='bench',
+                           user_id='fake_user', project_id='fake_project',
+                           volume_type_id=volume_type['id'])
+    volume.volume_type = volume_type
+    volume.volume_metadata = [
+        models.VolumeMetadata(id=i, key='key%d' % i, value='value%d' % i,
+                              created_at=now)
+        for i in range(4)]
+    return volume
+
+
+def create_volume_msg():
+    volume = _volume_ref()
+    request_spec = {'volume_id': volume['id'],
+                    'volume_properties': {'size': 10,
+                                          'status': 'creating',
+                                          'availability_zone': 'nova',
+                                          'user_id': 'fake_user',
+                                          'project_id': 'fake_project',
+                                          'display_name': 'bench',
+                                          'metadata': {'key0': 'value0'}},
+                    'volume_type': {'id': volume['volume_type_id'],
+                                    'name': 'gold',
+                                    'created_at': volume['created_at'],
+                                    'extra_specs': {'capability:0':
+                                                    '<is> True'}},
+                    'snapshot_id': None,
+                    'image_id': None}
+    return {'method': 'create_volume',
+            'version': '1.4',
+            'args': {'volume': volume,
+                     'request_spec': request_spec,
+                     'filter_properties': {'retry': {'num_attempts': 1,
+                                                     'hosts': []}},
+                     'allow_reschedule': True},
+            '_context_auth_token': 'a' * 32,
+            '_context_user_id': 'fake_user',
+            '_context_project_id': 'fake_project',
+            '_context_timestamp': '2013-08-01T12:30:00.000000',
+            '_context_roles': ['admin', 'member']}
+
+
+def capabilities_msg():
+    capabilities = {'volume_backend_name': 'lvm',
+                    'vendor_name': 'Open Source',
+                    'driver_version': '1.0',
+                    'storage_protocol': 'iSCSI',
+                    'total_capacity_gb': 2048.0,
+                    'free_capacity_gb': 1024.5,
+                    'reserved_percentage': 0,
+                    'QoS_support': False}
+    return {'method': 'update_service_capabilities',
+            'version': '1.3',
+            'args': {'service_name': 'volume',
+                     'host': 'volume-node-1@lvm',
+                     'capabilities': capabilities,
+                     'generation': 42,
+                     'full_sync': True,
+                     'removed': None},
+            '_context_auth_token': 'a' * 32,
+            '_context_user_id': None,
+            '_context_project_id': None,
+            '_context_roles': ['admin']}
+
+
+def legacy_to_primitive(value, level=0, max_depth=3):
+    """to_primitive() as it was, recursing through every value."""
+    if isinstance(value, jsonutils._simple_types):
+        return value
+    if isinstance(value, datetime.datetime):
+        return timeutils.strtime(value)
+    if level > max_depth:
+        return '?'
+    try:
+        recursive = functools.partial(legacy_to_primitive, level=level,
+                                      max_depth=max_depth)
+        if isinstance(value, dict):
+            return dict((k, recursive(v)) for k, v in value.iteritems())
+        elif isinstance(value, (list, tuple)):
+            return [recursive(lv) for lv in value]
+        if hasattr(value, 'iteritems'):
+            return recursive(dict(value.iteritems()), level=level + 1)
+        elif hasattr(value, '__iter__'):
+            return recursive(list(value))
+        return value
+    except TypeError:
+        return unicode(value)
+
+
+def legacy_send(msg):
+    return {rpc_common._VERSION_KEY: rpc_common._RPC_ENVELOPE_VERSION,
+            rpc_common._MESSAGE_KEY: json.dumps(msg,
+                                                default=legacy_to_primitive)}
+
+
+def legacy_receive(envelope):
+    msg = rpc_common.deserialize_msg(envelope)
+    # _safe_log() deep copied every message carrying a token, even when
+    # debug logging was off.
+    sanitized = copy.deepcopy(msg)
+    sanitized['_context_auth_token'] = '<SANITIZED>'
+    LOG.debug('received %s', sanitized)
+    return msg
+
+
+def fast_send(msg):
+    return rpc_common.serialize_msg(msg)
+
+
+def fast_receive(envelope):
+    msg = rpc_common.deserialize_msg(envelope)
+    rpc_common._safe_log(LOG.debug, 'received %s', msg)
+    return msg
+
+
+def create_volume_requests():
+    """Send the create_volume messages of the api and of the scheduler."""
+    ctxt = context.RequestContext('fake_user', 'fake_project')
+    volume = _volume_ref()
+    request_spec = create_volume_msg()['args']['request_spec']
+    request_spec['volume_properties']['metadata'] = dict(
+        ('key%d' % i, 'value%d' % i) for i in range(20))
+    request_spec = jsonutils.to_primitive(request_spec)
+    scheduler_rpcapi.SchedulerAPI().create_volume(
+        ctxt, CONF.volume_topic, volume['id'], None, None,
+        request_spec=request_spec,
+        filter_properties={'scheduler_hints': {}})
+    # What the filter scheduler adds before sending the request on.
+    filter_properties = {'retry': {'num_attempts': 1,
+                                   'hosts': ['volume-node-1@lvm']},
+                         'scheduler_hints': {},
+                         'request_spec': request_spec,
+                         'config_options': {},
+                         'volume_type': request_spec['volume_type'],
+                         'resource_type': request_spec['volume_type'],
+                         'size': 10,
+                         'availability_zone': 'nova',
+                         'user_id': 'fake_user',
+                         'metadata': request_spec['volume_properties'][
+                             'metadata']}
+    volume_rpcapi.VolumeAPI().create_volume(
+        ctxt, volume, 'volume-node-1@lvm', request_spec=request_spec,
+        filter_properties=filter_properties)
+
+
+def message_sizes():
+    """Print the bytes of the create_volume messages, with and without
+    slim_rpc_payloads.
+    """
+    sizes = []
+
+    def fake_cast(context, topic, msg):
+        envelope = rpc_common.serialize_msg(msg)
+        sizes.append((topic, len(envelope[rpc_common._MESSAGE_KEY])))
+
+    real_cast = rpc.cast
+    rpc.cast = fake_cast
+    try:
+        for slim in (False, True):
+            CONF.set_override('slim_rpc_payloads', slim)
+            del sizes[:]
+            create_volume_requests()
+            for topic, size in sizes:
+                print('create_volume to %-33s slim=%-5s %6d bytes' %
+                      (topic, slim, size))
+    finally:
+        rpc.cast = real_cast
+        CONF.clear_override('slim_rpc_payloads')
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--number', type='int', default=2000,
+                      help='messages serialized per benchmark')
+    (options, args) = parser.parse_args()
+
+    for name, make_msg in (('create_volume', create_volume_msg),
+                           ('update_service_capabilities',
+                            capabilities_msg)):
+        msg = make_msg()
+        envelope = fast_send(msg)
+        for path, send, receive in (('legacy', legacy_send, legacy_receive),
+                                    ('fast', fast_send, fast_receive)):
+            for step, func, arg in (('send', send, msg),
+                                    ('receive', receive, envelope)):
+                elapsed = timeit.timeit(lambda: func(arg),
+                                        number=options.number)
+                print('%-28s %-7s %-8s %8.1f us/msg' %
+                      (name, step, path,
+                       elapsed * 1000000 / options.number))
+
+    message_sizes()
+
+
+if __name__ == '__main__':
+    main()
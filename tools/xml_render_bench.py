@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the XML rendering of /volumes/detail.
+
+Renders the v1 and v2 volume list templates, with the extension slave
+templates attached by the host and tenant attribute extensions, for lists
+of 1000 and 10000 volumes, and the same lists as JSON for reference:
+
+    python tools/xml_render_bench.py [--sizes 1000,10000] [--repeat N]
+"""
+
+import optparse
+import os
+import sys
+import time
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from cinder.openstack.common import gettextutils
+gettextutils.install('cinder')
+
+from cinder.api.contrib import volume_host_attribute
+from cinder.api.contrib import volume_tenant_attribute
+from cinder.api.v1 import volumes as volumes_v1
+from cinder.api.v2 import volumes as volumes_v2
+from cinder.openstack.common import jsonutils
+
+
+def _volume(i, v2):
+    volume = {'id': '6c1bd4e2-0000-4000-8000-%012d' % i,
+              'status': 'in-use' if i % 2 else 'available',
+              'size': 1 + i % 100,
+              'availability_zone': 'nova',
+              'created_at': '2013-08-01T12:30:00.000000',
+              'volume_type': 'gold',
+              'snapshot_id': None,
+              'source_volid': None,
+              'metadata': {'key%d' % j: 'value%d' % j for j in range(3)},
+              'attachments': [{'id': '6c1bd4e2-0000-4000-8000-%012d' % i,
+                               'server_id': 'f2a2c3d4-0000-4000-8000-'
+                                            '%012d' % i,
+                               'volume_id': '6c1bd4e2-0000-4000-8000-'
+                                            '%012d' % i,
+                               'device': '/dev/vdb'}] if i % 2 else [],
+              'os-vol-host-attr:host': 'volume-node-%d' % (i % 10),
+              'os-vol-tenant-attr:tenant_id': 'fake_project'}
+    if v2:
+        volume['name'] = 'volume-%d' % i
+        volume['description'] = 'benchmark volume %d' % i
+    else:
+        volume['display_name'] = 'volume-%d' % i
+        volume['display_description'] = 'benchmark volume %d' % i
+    return volume
+
+
+def _template(volumes_module):
+    template = volumes_module.VolumesTemplate()
+    template.attach(
+        volume_host_attribute.VolumeListHostAttributeTemplate(),
+        volume_tenant_attribute.VolumeListTenantAttributeTemplate())
+    return template
+
+
+def _time(func, repeat):
+    best = None
+    for _i in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--sizes', default='1000,10000',
+                      help='comma separated numbers of volumes to render')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='renderings per size, the best one is reported')
+    (options, args) = parser.parse_args()
+
+    for size in [int(size) for size in options.sizes.split(',')]:
+        for name, module, v2 in (('v1', volumes_v1, False),
+                                 ('v2', volumes_v2, True)):
+            body = {'volumes': [_volume(i, v2) for i in range(size)]}
+            xml = _time(lambda: _template(module).serialize(body),
+                        options.repeat)
+            json = _time(lambda: jsonutils.dumps(body), options.repeat)
+            print('%s /volumes/detail %6d volumes: xml %8.1f ms, '
+                  'json %8.1f ms' % (name, size, xml * 1000, json * 1000))
+
+
+if __name__ == '__main__':
+    main()